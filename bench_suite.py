@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк всего стека на имитации Bybit (common/fake_bybit.py): N итераций
+цикла L1 (sync и asyncio), старта grid-бота (bootstrap сеток) и тика
+flow-manager для 5/50/500 пар.
+
+На каждую итерацию пишется: время, вызовы по эндпоинтам v5, COMMIT в SQLite;
+отдельной итерацией под tracemalloc — пик памяти Python. Результат — JSON
+(--out) для сравнения прогонов до/после изменения (--compare old.json).
+
+Каждый замер — с чистой биржи и пустой базы. Паузы ботов между ордерами
+(time.sleep у grid) не спятся, а суммируются в sleep_s. Троттлинг ccxt и
+планировщик L1 выключены: меряется сам цикл; --rate-limits включает оба.
+
+Запуск (из корня репозитория):
+    python bench_suite.py --symbols 5,50,500 --iterations 5 --out bench.json
+    python bench_suite.py --compare bench.json --out bench_new.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "l1_bot")]
+
+import ccxt
+
+from common import fake_bybit, markets_cache
+from common.fake_bybit import FakeBybit, Venue
+
+TMP = tempfile.mkdtemp(prefix="stack_bench_")
+BENCHES = ("l1", "grid", "flow")
+START_USDT = 10_000_000.0
+
+
+# ---------- счётчик COMMIT ----------
+
+class Commits:
+    """sqlite3.connect с trace_callback: считает COMMIT во всех соединениях ботов."""
+
+    def __init__(self):
+        self.n = 0
+        self._connect = sqlite3.connect
+
+    def _trace(self, sql: str):
+        if sql.startswith("COMMIT"):
+            self.n += 1
+
+    def connect(self, *args, **kwargs):
+        con = self._connect(*args, **kwargs)
+        con.set_trace_callback(self._trace)
+        return con
+
+    def take(self) -> int:
+        n, self.n = self.n, 0
+        return n
+
+
+COMMITS = Commits()
+
+
+class SleepCounter:
+    """Подмена модуля time у бота: sleep не спит, а копит секунды."""
+
+    def __init__(self):
+        self.sec = 0.0
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    def sleep(self, sec: float):
+        self.sec += max(0.0, sec)
+
+    def take(self) -> float:
+        s, self.sec = self.sec, 0.0
+        return s
+
+
+class Unthrottled(FakeBybit):
+    """Имитация без троттлинга ccxt — для клиентов, которые бот создаёт сам (grid)."""
+
+    def __init__(self, config={}, venue=None):
+        super().__init__(dict(config, enableRateLimit=False), venue)
+
+
+# ---------- загрузка ботов ----------
+
+def perp_bases(markets: int) -> List[str]:
+    return [b for b, m in Venue(markets=markets).markets.items() if m.perp]
+
+
+def load(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(mod)
+    return mod
+
+
+def import_bots(symbols: List[str], args) -> Dict[str, Any]:
+    os.environ.update({
+        "BYBIT_API_KEY": "bench", "BYBIT_API_SECRET": "bench", "BYBIT_ACCOUNT_TYPE": "UNIFIED",
+        "BYBIT_FAKE": "true", "FAKE_BYBIT_MARKETS": str(args.markets), "FAKE_BYBIT_USDT": str(START_USDT),
+        "TG_BOT_TOKEN": "123456:bench", "TG_CHAT_ID": "0", "EXTRA_LOGS": "false", "METRICS_TEXTFILE_DIR": "",
+        # L1: все пары проходят фильтры, без пауз между ногами и ожидания maker
+        "L1_SYMBOLS": ",".join(symbols),
+        "L1_FUNDING_THRESHOLD_8H": "0.00005", "L1_MAX_ALLOC_PCT": "0.0005", "L1_PERP_LEVERAGE": "3",
+        "L1_MIN_FREE_BALANCE_USDT": "1", "L1_POLL_INTERVAL_SEC": "1", "L1_MAX_DAILY_DD_PCT": "50",
+        "L1_START_BASE_USDT": str(START_USDT), "L1_PNL_THRESHOLD_TO_L2": "0.05", "L1_PNL_EXPORT_SHARE": "0.3",
+        "L1_MAX_TOTAL_ALLOC_PCT": "0.85", "L1_SCALEIN_ENABLE": "false", "L1_ORDER_PAUSE_SEC": "0",
+        "L1_MAKER_FALLBACK_MS": "0", "L1_RATE_SCHED_ENABLE": "true" if args.rate_limits else "false",
+        "L1_RECORD_DIR": os.path.join(TMP, "md"), "L1_TRACE_FILE": os.path.join(TMP, "trace.jsonl"),
+        # flow: перевод в L2 на каждом тике (база меньше equity)
+        "BYBIT_ENABLE_AUTO_TRANSFER": "true", "BYBIT_L2_SUBACCOUNT_ID": "200",
+        "GRID_DB_PATH": os.path.join(TMP, "grid.db"),
+    })
+    markets_cache.snapshot_path = lambda exchange_id, name, shared_dir=None: os.path.join(
+        TMP, f"markets_{exchange_id}_{name}.json")
+    sqlite3.connect = COMMITS.connect
+
+    l1 = load("l1_main", "l1_bot/main.py")
+    l1.DB_PATH = os.path.join(TMP, "ledger.db")
+    l1.tg = lambda msg, force=False: None
+    l1.calendar.quiet = lambda sym, ts: False
+
+    grid = load("grid_main", "grid_bot/main.py")
+    grid.time = SleepCounter()
+
+    flow = load("flow_main", "flow_manager/flow_manager.py")
+    flow.DB_PATH = os.path.join(TMP, "flow.db")
+    flow.tg = lambda msg: None
+    if not args.rate_limits:
+        l1.ex.enableRateLimit = flow.ex.enableRateLimit = False
+        grid.FakeBybit = Unthrottled
+    return {"l1": l1, "grid": grid, "flow": flow}
+
+
+# ---------- прогоны ----------
+
+def fresh_venue(args) -> Venue:
+    v = Venue(markets=args.markets, latency=args.latency, usdt=START_USDT)
+    fake_bybit._venue = v
+    return v
+
+
+def drop(*names: str):
+    for f in os.listdir(TMP):
+        if any(f.startswith(n) for n in names):
+            os.remove(os.path.join(TMP, f))
+
+
+def settle():
+    """Дождаться фонового обновления снимка рынков (markets_cache): его вызовы — в счёт итерации, время — нет."""
+    for t in threading.enumerate():
+        if t.name == "markets-refresh":
+            t.join()
+
+
+def measure(step: Callable[[], None], calls: Callable[[], Counter], iterations: int,
+            sleeper: SleepCounter = None):
+    """Итерации step(): время, вызовы, COMMIT; затем ещё одна под tracemalloc — пик памяти."""
+    calls()
+    COMMITS.take()
+    rows = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            step()
+            wall_ms = (time.perf_counter() - t0) * 1000.0
+            settle()
+        row = {"wall_ms": wall_ms, "calls": dict(calls()), "commits": COMMITS.take()}
+        if sleeper is not None:
+            row["sleep_s"] = sleeper.take()
+        rows.append(row)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        step()
+        settle()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    calls()
+    COMMITS.take()
+    if sleeper is not None:
+        sleeper.take()
+    return rows, peak / 1024.0
+
+
+def run_l1(m, mode: str, symbols: List[str], args):
+    v = fresh_venue(args)
+    m.ex.venue = v
+    m.cfg.symbols = symbols
+    m.account = m.AccountSnapshot()
+    m.market = m.MarketSnapshot(m.cfg.snapshot_max_age_sec)
+    m.leverage_set.clear()
+    drop("ledger.db")
+    con = m.sql_conn()
+    st = m.StateStore(con, flush_interval_sec=m.cfg.state_flush_sec)
+    loop = None
+    try:
+        if mode == "async":
+            loop = asyncio.new_event_loop()
+            m.aex = m.make_async_exchange()
+            if not args.rate_limits:
+                m.aex.enableRateLimit = False
+            loop.run_until_complete(m.warm_account_type(m.aex))
+            step = lambda: loop.run_until_complete(m.iteration_async(st, con))
+        else:
+            step = lambda: m.iteration(st, con)
+        return measure(step, v.reset_calls, args.iterations)
+    finally:
+        if loop is not None:
+            loop.run_until_complete(m.aex.close())
+            loop.close()
+            m.aex = None
+        con.close()
+
+
+def run_grid(g, symbols: List[str], args):
+    """Итерация — полный старт на новой бирже: клиент, сетки и лимитные ордера по всем парам."""
+    config = g.GridConfig(symbols=symbols, db_path=os.path.join(TMP, "grid.db"), metrics_dir="", fake_exchange=True)
+    metrics = g.BotMetrics("grid", "")
+
+    def step():
+        drop("grid.db")
+        fresh_venue(args)
+        g.bootstrap(config, metrics)
+
+    # снимок рынков на диске — как у работающего бота после первого старта
+    fresh_venue(args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        g.BybitClient(config)
+    return measure(step, lambda: fake_bybit._venue.reset_calls(), args.iterations, g.time)
+
+
+def run_flow(f, mode: str, n: int, args):
+    """Тик по API с аккаунтом на n монет (баланс разбирается целиком) или реакция на пуш L1; с переводом в L2."""
+    v = fresh_venue(args)
+    f.ex.venue = v
+    for b in list(v.markets)[:n]:
+        v.coins[b] = 1.0
+    drop("flow.db")
+    f.cfg.start_base = START_USDT / 2
+    if mode == "tick":
+        return measure(f.tick, v.reset_calls, args.iterations)
+
+    def step():
+        # пуш L1 (L1_EQUITY_PUSH) выше порога: база с начала, чтобы перевод был на каждой итерации
+        drop("flow.db")
+        f.cfg.start_base = START_USDT / 2
+        f.on_push({"ts": time.time(), "equity": START_USDT, "free": START_USDT})
+
+    return measure(step, v.reset_calls, args.iterations)
+
+
+def summarize(bench: str, mode: str, n: int, rows: List[Dict[str, Any]], peak_kb: float) -> Dict[str, Any]:
+    calls = Counter()
+    for r in rows:
+        calls.update(r["calls"])
+    k = len(rows)
+    out = {
+        "bench": bench, "mode": mode, "symbols": n, "iterations": rows,
+        "wall_ms_median": statistics.median(r["wall_ms"] for r in rows),
+        "wall_ms_max": max(r["wall_ms"] for r in rows),
+        "calls_per_cycle": {p: c / k for p, c in sorted(calls.items())},
+        "calls_total_per_cycle": sum(calls.values()) / k,
+        "commits_per_cycle": sum(r["commits"] for r in rows) / k,
+        "peak_kb": peak_kb,
+    }
+    if "sleep_s" in rows[0]:
+        out["sleep_s_per_cycle"] = sum(r["sleep_s"] for r in rows) / k
+    return out
+
+
+def key(r: Dict[str, Any]) -> str:
+    return f"{r['bench']}/{r['mode']}/{r['symbols']}"
+
+
+def print_table(runs: List[Dict[str, Any]], old: Dict[str, Dict[str, Any]]):
+    print(f"{'bench':>5} {'mode':>5} {'symbols':>7} {'wall ms':>9} {'calls':>7} {'commits':>7} {'peak KB':>8}  top endpoints")
+    for r in runs:
+        top = sorted(r["calls_per_cycle"].items(), key=lambda kv: -kv[1])[:3]
+        line = (f"{r['bench']:>5} {r['mode']:>5} {r['symbols']:>7} {r['wall_ms_median']:>9.1f} "
+                f"{r['calls_total_per_cycle']:>7.1f} {r['commits_per_cycle']:>7.1f} {r['peak_kb']:>8.0f}  "
+                + ", ".join(f"{p.split('/', 1)[1]}={c:g}" for p, c in top))
+        print(line)
+        o = old.get(key(r))
+        if o:
+            d = lambda a, b: f"{(a - b) / b * 100:+.0f}%" if b else f"{a - b:+g}"
+            print(f"{'':>19} vs old: wall {d(r['wall_ms_median'], o['wall_ms_median'])}, "
+                  f"calls {d(r['calls_total_per_cycle'], o['calls_total_per_cycle'])}, "
+                  f"commits {d(r['commits_per_cycle'], o['commits_per_cycle'])}, "
+                  f"peak {d(r['peak_kb'], o['peak_kb'])}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--symbols", default="5,50,500", help="размеры (число пар)")
+    ap.add_argument("--iterations", type=int, default=5, help="итераций на замер")
+    ap.add_argument("--markets", type=int, default=600,
+                    help="монет на имитации (≈ линейка Bybit; тикеры категории приходят целиком)")
+    ap.add_argument("--latency", type=float, default=0.0, help="задержка одного вызова API, сек")
+    ap.add_argument("--bench", default=",".join(BENCHES), help="что мерить: l1,grid,flow")
+    ap.add_argument("--rate-limits", action="store_true", help="троттлинг ccxt и планировщик L1 как в проде")
+    ap.add_argument("--out", default="", help="куда сохранить JSON")
+    ap.add_argument("--compare", default="", help="JSON прошлого прогона для сравнения")
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.symbols.split(",") if x.strip()]
+    benches = [b for b in args.bench.split(",") if b.strip()]
+    # у каждой седьмой монеты имитации нет перпа
+    bases = perp_bases(args.markets)
+    if max(sizes) > len(bases):
+        ap.error(f"--markets {args.markets}: перпов {len(bases)}, меньше {max(sizes)} пар")
+    with contextlib.redirect_stdout(io.StringIO()):
+        bots = import_bots([f"{b}/USDT" for b in bases[:max(sizes)]], args)
+        settle()
+    old = {}
+    if args.compare:
+        with open(args.compare) as f:
+            old = {key(r): r for r in json.load(f)["runs"]}
+
+    runs = []
+    for n in sizes:
+        symbols = [f"{b}/USDT" for b in bases[:n]]
+        if "l1" in benches:
+            for mode in ("sync", "async"):
+                runs.append(summarize("l1", mode, n, *run_l1(bots["l1"], mode, symbols, args)))
+        if "grid" in benches:
+            runs.append(summarize("grid", "boot", n, *run_grid(bots["grid"], symbols, args)))
+        if "flow" in benches:
+            for mode in ("tick", "push"):
+                runs.append(summarize("flow", mode, n, *run_flow(bots["flow"], mode, n, args)))
+
+    print(f"latency={args.latency * 1000:.0f} ms/call, iterations={args.iterations}, "
+          f"rate limits {'on' if args.rate_limits else 'off'}")
+    print_table(runs, old)
+    if args.out:
+        meta = {"ts": int(time.time()), "python": platform.python_version(), "ccxt": ccxt.__version__,
+                "latency": args.latency, "iterations": args.iterations, "rate_limits": args.rate_limits,
+                "markets": args.markets}
+        with open(args.out, "w") as f:
+            json.dump({"meta": meta, "runs": runs}, f, indent=1)
+        print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Общий код для ботов стека (l1_bot, grid_bot, flow_manager)."""
@@ -0,0 +1,741 @@
+"""
+Имитация Bybit v5 в процессе — для нагрузочных и интеграционных прогонов ботов без ключей и сети.
+
+FakeBybit / FakeBybitAsync — наследники ccxt.bybit / ccxt.async_support.bybit,
+у которых подменён только транспорт (fetch): подпись, обёртки ex.request
+(метрики, трассировка, планировщик), разбор ответов и коды ошибок ccxt
+работают как с настоящей биржей. Ответы строит Venue — состояние «биржи»:
+
+  * тысячи синтетических рынков (спот + linear-перп с интервалом funding
+    1/4/8 ч), цены — случайное блуждание при каждом обращении к рынку;
+  * UTA-аккаунт: USDT, монеты спота, linear-позиции, плечо, переводы;
+  * ордера market (сразу по bid/ask) и limit (PostOnly отклоняется при
+    пересечении, покоящиеся исполняются при проходе цены или с вероятностью
+    maker_fill_prob за обращение);
+  * задержка каждого вызова (latency + jitter) и инъекция ошибок по префиксу
+    пути: rate (10006 → RateLimitExceeded), server (10016), timeout и network;
+  * счётчик вызовов по эндпоинтам — API-вызовы на цикл.
+
+Эндпоинты: market/instruments-info, tickers, orderbook, time; order/create,
+create-batch, cancel, realtime, history; execution/list; account/wallet-balance,
+info; position/list, set-leverage; asset/transfer (inter/universal + списки),
+coin/query-info; user/query-api. Этого хватает для fetch_ticker(s),
+fetch_funding_rate(s), fetch_order_book, create_order(s)/fetch/cancel_order,
+fetch_balance, set_leverage, transfer и raw v5 вызовов ботов.
+
+Боты включают имитацию через BYBIT_FAKE=true; один Venue на процесс
+(default_venue), его параметры — из FAKE_BYBIT_* (см. from_env).
+"""
+
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import ccxt
+import ccxt.async_support as ccxt_async
+
+# реальные базы в начале списка — под символы из env.example; дальше синтетика S0000, S0001, ...
+KNOWN = (("BTC", 60000.0), ("ETH", 3000.0), ("SOL", 150.0), ("DOGE", 0.2), ("WIF", 2.0), ("JUP", 1.0),
+         ("OP", 1.8), ("ENA", 0.5), ("XRP", 0.6), ("ADA", 0.45), ("LINK", 14.0), ("AVAX", 30.0))
+ERROR_KINDS = ("rate", "server", "timeout", "network")
+# ордеров в одном order/create-batch (лимиты Bybit v5 по category)
+BATCH_MAX = {"spot": 10, "linear": 20}
+# свой id: снимок рынков имитации (markets_cache) не смешивается со снимком настоящей биржи
+FAKE_ID = "bybit_fake"
+
+
+class FakeTimeout(Exception):
+    pass
+
+
+class FakeNetworkError(Exception):
+    pass
+
+
+class VenueError(Exception):
+    """Ответ с retCode != 0 (коды — как у Bybit v5, их разбирает ccxt.bybit.handle_errors)."""
+
+    def __init__(self, code: int, msg: str):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+
+
+@dataclass
+class Market:
+    base: str
+    px: float
+    spread: float          # доля цены между bid и ask
+    fr: float              # ставка funding за интервал
+    interval_h: int
+    turnover: float        # оборот 24h, USDT
+    qty_step: float
+    tick: float
+    perp: bool = True
+    ts: float = 0.0        # последнее обновление цены (monotonic)
+
+    @property
+    def bid(self) -> float:
+        return self.px * (1.0 - self.spread / 2)
+
+    @property
+    def ask(self) -> float:
+        return self.px * (1.0 + self.spread / 2)
+
+
+@dataclass
+class Order:
+    id: str
+    link_id: str
+    category: str
+    symbol: str
+    side: str              # Buy / Sell
+    type: str              # Market / Limit
+    qty: float
+    price: float
+    tif: str
+    reduce: bool
+    status: str = "New"
+    filled: float = 0.0
+    value: float = 0.0     # cumExecValue, USDT
+    fee: float = 0.0
+    reject: str = ""
+    created: int = 0
+    updated: int = 0
+
+
+@dataclass
+class Position:
+    size: float = 0.0      # лонг +, шорт -
+    avg: float = 0.0
+    lev: int = 10
+    realised: float = 0.0
+
+
+@dataclass
+class Transfer:
+    id: str
+    kind: str              # inter / universal
+    coin: str
+    amount: float
+    from_type: str
+    to_type: str
+    from_member: str = ""
+    to_member: str = ""
+    ts: int = 0
+    status: str = "SUCCESS"
+
+
+def _ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _s(x: float) -> str:
+    return f"{x:.10g}"
+
+
+def _round_step(x: float, step: float) -> float:
+    return math.floor(x / step + 1e-9) * step
+
+
+class Venue:
+    def __init__(self, markets: int = 2000, seed: int = 7, latency: float = 0.0, jitter: float = 0.0,
+                 errors: Optional[Dict[str, Tuple[float, str]]] = None, usdt: float = 10_000.0,
+                 vol: float = 0.0005, maker_fill_prob: float = 0.3, taker_fee: float = 0.00055,
+                 maker_fee: float = 0.0002, uid: str = "100000"):
+        """
+        markets — число базовых монет (у каждой спот и, кроме каждой седьмой, перп);
+        vol — σ шага блуждания цены за секунду; errors — {префикс пути: (вероятность, вид)}.
+        """
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.errors: Dict[str, Tuple[float, str]] = dict(errors or {})
+        bad = [k for _, k in self.errors.values() if k not in ERROR_KINDS]
+        if bad:
+            raise ValueError(f"fake bybit: неизвестный вид ошибки {bad[0]!r}, допустимы {', '.join(ERROR_KINDS)}")
+        self.vol = vol
+        self.maker_fill_prob = maker_fill_prob
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.uid = uid
+        self.lock = threading.RLock()
+        self.calls: Counter = Counter()
+        self.markets: Dict[str, Market] = {}
+        for i in range(markets):
+            base, px = KNOWN[i] if i < len(KNOWN) else (f"S{i:04d}", math.exp(self.rng.uniform(-4.0, 6.0)))
+            self.markets[base] = Market(
+                base=base, px=px, spread=self.rng.choice((0.0001, 0.0002, 0.0005, 0.001, 0.003)),
+                fr=round(self.rng.gauss(0.0001, 0.0002), 6), interval_h=self.rng.choice((1, 4, 8, 8, 8)),
+                turnover=math.exp(self.rng.uniform(11.0, 21.0)),
+                qty_step=10.0 ** min(3, max(-6, math.floor(math.log10(10.0 / px)))),
+                tick=10.0 ** math.floor(math.log10(px) - 4), perp=(i % 7 != 6),
+                ts=time.monotonic(),
+            )
+        self.usdt = usdt
+        self.coins: Dict[str, float] = {}
+        self.positions: Dict[str, Position] = {}
+        self.orders: Dict[str, Order] = {}
+        self.executions: List[Dict[str, Any]] = []  # сделки по ордерам (v5 execution/list), по времени
+        self.open: Dict[str, List[str]] = {}       # symbol id -> открытые limit-ордера
+        self.links: Dict[str, str] = {}            # orderLinkId -> orderId
+        self.transfers: Dict[str, Transfer] = {}
+        self.subs: Dict[str, float] = {}           # memberId -> USDT, переведённые в субаккаунты
+        self.ids = itertools.count(1)
+        self.routes: Dict[Tuple[str, str], Callable[[Dict[str, Any]], Any]] = {
+            ("GET", "v5/market/time"): self._time,
+            ("GET", "v5/market/instruments-info"): self._instruments,
+            ("GET", "v5/market/tickers"): self._tickers,
+            ("GET", "v5/market/orderbook"): self._orderbook,
+            ("GET", "v5/user/query-api"): lambda p: {"uta": 1, "unified": 0, "userID": int(self.uid)},
+            ("GET", "v5/account/info"): lambda p: {"unifiedMarginStatus": 4, "marginMode": "REGULAR_MARGIN"},
+            ("GET", "v5/account/wallet-balance"): self._wallet,
+            ("GET", "v5/position/list"): self._position_list,
+            ("POST", "v5/position/set-leverage"): self._set_leverage,
+            ("POST", "v5/order/create"): self._create,
+            ("POST", "v5/order/create-batch"): self._create_batch,
+            ("POST", "v5/order/cancel"): self._cancel,
+            ("GET", "v5/order/realtime"): lambda p: self._order_list(p, open_only=True),
+            ("GET", "v5/order/history"): lambda p: self._order_list(p, open_only=False),
+            ("GET", "v5/execution/list"): self._execution_list,
+            ("GET", "v5/asset/coin/query-info"): self._coins,
+            ("POST", "v5/asset/transfer/inter-transfer"): lambda p: self._transfer(p, "inter"),
+            ("POST", "v5/asset/transfer/universal-transfer"): lambda p: self._transfer(p, "universal"),
+            ("GET", "v5/asset/transfer/query-inter-transfer-list"): lambda p: self._transfer_list(p, "inter"),
+            ("GET", "v5/asset/transfer/query-universal-transfer-list"): lambda p: self._transfer_list(p, "universal"),
+        }
+
+    @classmethod
+    def from_env(cls, env=os.environ) -> "Venue":
+        """FAKE_BYBIT_MARKETS, _SEED, _LATENCY_MS, _JITTER_MS, _USDT и _ERRORS="v5/order/create:0.01:rate,v5/market:0.005:timeout"."""
+        errors = {}
+        for item in filter(None, (env.get("FAKE_BYBIT_ERRORS") or "").split(",")):
+            prefix, prob, *kind = item.strip().split(":")
+            errors[prefix] = (float(prob), kind[0] if kind else "rate")
+        return cls(markets=int(env.get("FAKE_BYBIT_MARKETS", "2000")), seed=int(env.get("FAKE_BYBIT_SEED", "7")),
+                   latency=float(env.get("FAKE_BYBIT_LATENCY_MS", "0")) / 1000.0,
+                   jitter=float(env.get("FAKE_BYBIT_JITTER_MS", "0")) / 1000.0,
+                   errors=errors, usdt=float(env.get("FAKE_BYBIT_USDT", "10000")))
+
+    # ---- транспорт ----
+
+    def delay(self) -> float:
+        return self.latency + (self.rng.random() * self.jitter if self.jitter else 0.0)
+
+    def handle(self, method: str, url: str, body: Optional[str]) -> Dict[str, Any]:
+        """Ответ Bybit v5 на запрос ccxt; FakeTimeout / FakeNetworkError — обрыв «сети»."""
+        parts = urlsplit(url)
+        path = parts.path.lstrip("/")
+        params: Dict[str, Any] = dict(parse_qsl(parts.query))
+        if body:
+            params.update(json.loads(body))
+        with self.lock:
+            self.calls[path] += 1
+            kind = self._injected(path)
+            if kind == "timeout":
+                raise FakeTimeout(path)
+            if kind == "network":
+                raise FakeNetworkError(path)
+            try:
+                if kind == "rate":
+                    raise VenueError(10006, "Too many visits!")
+                if kind == "server":
+                    raise VenueError(10016, "Server error.")
+                route = self.routes.get((method.upper(), path))
+                if route is None:
+                    raise VenueError(10001, f"fake bybit: {method} {path} not supported")
+                result = route(params)
+                # пачечные эндпоинты отдают коды по каждому элементу в retExtInfo
+                ext = result.pop("retExtInfo", {}) if isinstance(result, dict) else {}
+                return {"retCode": 0, "retMsg": "OK", "result": result, "retExtInfo": ext, "time": _ms()}
+            except VenueError as e:
+                return {"retCode": e.code, "retMsg": e.msg, "result": {}, "retExtInfo": {}, "time": _ms()}
+
+    def _injected(self, path: str) -> str:
+        for prefix, (prob, kind) in self.errors.items():
+            if path.startswith(prefix) and self.rng.random() < prob:
+                return kind
+        return ""
+
+    def reset_calls(self) -> Counter:
+        """Вернуть счётчик вызовов с прошлого сброса и обнулить его."""
+        calls, self.calls = self.calls, Counter()
+        return calls
+
+    # ---- рынки ----
+
+    def _market(self, sym_id: str, category: str) -> Market:
+        m = self.markets.get(sym_id[:-4]) if sym_id.endswith("USDT") else None
+        if m is None or (category == "linear" and not m.perp) or category not in ("spot", "linear"):
+            raise VenueError(10001, f"params error: symbol invalid {sym_id}")
+        return m
+
+    def _touch(self, m: Market, category: str):
+        """Сдвинуть цену на время с прошлого обращения и исполнить покоящиеся limit-ордера."""
+        now = time.monotonic()
+        dt = now - m.ts
+        if dt > 0 and self.vol > 0:
+            m.px = max(m.tick, m.px * math.exp(self.vol * math.sqrt(dt) * self.rng.gauss(0.0, 1.0)))
+        m.ts = now
+        for oid in list(self.open.get(category + m.base, ())):
+            o = self.orders[oid]
+            cross = m.ask <= o.price if o.side == "Buy" else m.bid >= o.price
+            if cross or self.rng.random() < self.maker_fill_prob:
+                self._fill(o, m, o.qty - o.filled, o.price, self.maker_fee)
+
+    def _time(self, p):
+        ns = time.time_ns()
+        return {"timeSecond": str(ns // 10 ** 9), "timeNano": str(ns)}
+
+    def _instruments(self, p):
+        category = p.get("category", "spot")
+        rows = []
+        for m in self.markets.values():
+            if category == "spot":
+                rows.append({
+                    "symbol": f"{m.base}USDT", "baseCoin": m.base, "quoteCoin": "USDT", "innovation": "0",
+                    "status": "Trading", "marginTrading": "both",
+                    "lotSizeFilter": {"basePrecision": _s(m.qty_step), "quotePrecision": "0.0000001",
+                                      "minOrderQty": _s(m.qty_step), "maxOrderQty": "10000000",
+                                      "minOrderAmt": "1", "maxOrderAmt": "4000000"},
+                    "priceFilter": {"tickSize": _s(m.tick)},
+                })
+            elif category == "linear" and m.perp:
+                rows.append({
+                    "symbol": f"{m.base}USDT", "contractType": "LinearPerpetual", "status": "Trading",
+                    "baseCoin": m.base, "quoteCoin": "USDT", "settleCoin": "USDT", "launchTime": "1600000000000",
+                    "deliveryTime": "0", "deliveryFeeRate": "", "priceScale": str(max(0, -int(math.log10(m.tick)))),
+                    "leverageFilter": {"minLeverage": "1", "maxLeverage": "50", "leverageStep": "0.01"},
+                    "priceFilter": {"minPrice": _s(m.tick), "maxPrice": "10000000", "tickSize": _s(m.tick)},
+                    "lotSizeFilter": {"maxOrderQty": "10000000", "minOrderQty": _s(m.qty_step),
+                                      "qtyStep": _s(m.qty_step), "postOnlyMaxOrderQty": "10000000",
+                                      "minNotionalValue": "5"},
+                    "unifiedMarginTrade": True, "fundingInterval": m.interval_h * 60, "copyTrading": "both",
+                })
+        if category == "spot":
+            return {"category": category, "list": rows}
+        # linear/inverse — страницами по limit (по умолчанию 500) с курсором-смещением
+        start = int(p.get("cursor") or 0)
+        limit = min(1000, int(p.get("limit") or 500))
+        page = rows[start:start + limit]
+        cursor = str(start + limit) if start + limit < len(rows) else ""
+        return {"category": category, "list": page, "nextPageCursor": cursor}
+
+    def _tickers(self, p):
+        category = p.get("category", "spot")
+        if p.get("symbol"):
+            items = [self._market(p["symbol"], category)]
+        else:
+            items = [m for m in self.markets.values() if category == "spot" or (category == "linear" and m.perp)]
+        rows = []
+        now_ms = _ms()
+        for m in items:
+            self._touch(m, category)
+            row = {
+                "symbol": f"{m.base}USDT", "lastPrice": _s(m.px), "bid1Price": _s(m.bid), "bid1Size": "100",
+                "ask1Price": _s(m.ask), "ask1Size": "100", "prevPrice24h": _s(m.px), "price24hPcnt": "0",
+                "highPrice24h": _s(m.px * 1.02), "lowPrice24h": _s(m.px * 0.98),
+                "turnover24h": _s(m.turnover), "volume24h": _s(m.turnover / m.px),
+            }
+            if category == "linear":
+                period = m.interval_h * 3600 * 1000
+                row.update({
+                    "indexPrice": _s(m.px), "markPrice": _s(m.px), "fundingRate": _s(m.fr),
+                    "nextFundingTime": str((now_ms // period + 1) * period), "fundingIntervalHour": str(m.interval_h),
+                    "openInterest": _s(m.turnover / m.px / 10), "openInterestValue": _s(m.turnover / 10),
+                    "predictedDeliveryPrice": "", "basisRate": "", "deliveryTime": "0",
+                })
+            rows.append(row)
+        return {"category": category, "list": rows}
+
+    def _orderbook(self, p):
+        category = p.get("category", "spot")
+        m = self._market(p.get("symbol", ""), category)
+        self._touch(m, category)
+        depth = max(1, min(50, int(p.get("limit") or 1)))
+        return {"s": f"{m.base}USDT", "ts": _ms(), "u": next(self.ids), "seq": 0,
+                "b": [[_s(m.bid - i * m.tick), "100"] for i in range(depth)],
+                "a": [[_s(m.ask + i * m.tick), "100"] for i in range(depth)]}
+
+    def _coins(self, p):
+        return {"rows": [{"name": b, "coin": b, "remainAmount": "1000000", "chains": []}
+                         for b in ["USDT"] + list(self.markets)[:200]]}
+
+    # ---- аккаунт ----
+
+    def equity(self) -> float:
+        eq = self.usdt + sum(q * self.markets[b].px for b, q in self.coins.items())
+        return eq + sum(self._upnl(sid, p) for sid, p in self.positions.items())
+
+    def _upnl(self, sid: str, p: Position) -> float:
+        return p.size * (self.markets[sid[:-4]].px - p.avg) if p.size else 0.0
+
+    def _position_im(self) -> float:
+        return sum(abs(p.size) * self.markets[sid[:-4]].px / p.lev for sid, p in self.positions.items())
+
+    def _order_im(self) -> float:
+        total = 0.0
+        for ids in self.open.values():
+            for oid in ids:
+                o = self.orders[oid]
+                rest = (o.qty - o.filled) * o.price
+                if o.category == "spot" and o.side == "Buy":
+                    total += rest
+                elif o.category == "linear" and not o.reduce:
+                    total += rest / self.positions.get(o.symbol, Position()).lev
+        return total
+
+    def available(self) -> float:
+        return max(0.0, self.equity() - self._position_im() - self._order_im())
+
+    def _wallet(self, p):
+        eq = self.equity()
+        avail = self.available()
+        upnl = sum(self._upnl(sid, pos) for sid, pos in self.positions.items())
+        coins = [{
+            "coin": "USDT", "equity": _s(self.usdt + upnl), "usdValue": _s(self.usdt + upnl),
+            "walletBalance": _s(self.usdt), "availableToWithdraw": _s(min(avail, self.usdt)),
+            "availableBalance": _s(avail), "locked": "0", "borrowAmount": "0", "accruedInterest": "0",
+            "totalOrderIM": _s(self._order_im()), "totalPositionIM": _s(self._position_im()),
+            "totalPositionMM": _s(self._position_im() / 2), "unrealisedPnl": _s(upnl),
+            "cumRealisedPnl": _s(sum(x.realised for x in self.positions.values())),
+        }]
+        for b, q in self.coins.items():
+            if q:
+                v = q * self.markets[b].px
+                coins.append({"coin": b, "equity": _s(q), "usdValue": _s(v), "walletBalance": _s(q),
+                              "availableToWithdraw": _s(q), "locked": "0", "borrowAmount": "0",
+                              "totalOrderIM": "0", "totalPositionIM": "0", "unrealisedPnl": "0"})
+        return {"list": [{
+            "accountType": p.get("accountType", "UNIFIED"), "totalEquity": _s(eq), "totalWalletBalance": _s(eq - upnl),
+            "totalMarginBalance": _s(eq), "totalAvailableBalance": _s(avail),
+            "totalInitialMargin": _s(self._position_im() + self._order_im()),
+            "totalMaintenanceMargin": _s(self._position_im() / 2), "totalPerpUPL": _s(upnl),
+            "accountIMRate": _s((self._position_im() / eq) if eq > 0 else 0.0), "accountLTV": "0", "coin": coins,
+        }]}
+
+    def _position_list(self, p):
+        if p.get("symbol"):
+            sids = [p["symbol"]]
+        else:
+            sids = sorted(sid for sid, x in self.positions.items() if x.size)
+        start = int(p.get("cursor") or 0)
+        limit = min(200, int(p.get("limit") or 20))
+        rows = []
+        for sid in sids[start:start + limit]:
+            x = self.positions.get(sid, Position())
+            m = self._market(sid, "linear")
+            rows.append({
+                "symbol": sid, "side": "Buy" if x.size > 0 else "Sell" if x.size < 0 else "", "size": _s(abs(x.size)),
+                "avgPrice": _s(x.avg), "positionValue": _s(abs(x.size) * x.avg), "markPrice": _s(m.px),
+                "leverage": str(x.lev), "unrealisedPnl": _s(self._upnl(sid, x)), "cumRealisedPnl": _s(x.realised),
+                "positionIM": _s(abs(x.size) * m.px / x.lev), "positionMM": _s(abs(x.size) * m.px / x.lev / 2),
+                "positionIdx": 0, "tradeMode": 0, "positionStatus": "Normal", "liqPrice": "", "bustPrice": "",
+                "takeProfit": "", "stopLoss": "", "createdTime": "1600000000000", "updatedTime": str(_ms()),
+            })
+        cursor = str(start + limit) if start + limit < len(sids) else ""
+        return {"category": "linear", "list": rows, "nextPageCursor": cursor}
+
+    def _set_leverage(self, p):
+        sid = p.get("symbol", "")
+        self._market(sid, "linear")
+        lev = int(float(p.get("buyLeverage") or 0))
+        if not 1 <= lev <= 50:
+            raise VenueError(10001, "leverage invalid")
+        pos = self.positions.setdefault(sid, Position())
+        if pos.lev == lev:
+            raise VenueError(110043, "leverage not modified")
+        pos.lev = lev
+        return {}
+
+    # ---- ордера ----
+
+    def _create(self, p):
+        category = p.get("category", "spot")
+        sid = p.get("symbol", "")
+        m = self._market(sid, category)
+        self._touch(m, category)
+        side = p.get("side", "")
+        otype = p.get("orderType", "")
+        if side not in ("Buy", "Sell") or otype not in ("Market", "Limit"):
+            raise VenueError(10001, "params error: side or orderType invalid")
+        link = p.get("orderLinkId") or ""
+        if link and link in self.links:
+            raise VenueError(10001, "duplicate orderLinkId")
+        qty = float(p.get("qty") or 0)
+        if category == "spot" and otype == "Market" and side == "Buy" and p.get("marketUnit") != "baseCoin":
+            qty = qty / m.ask   # по умолчанию спот market buy — в USDT
+        qty = _round_step(qty, m.qty_step)
+        if qty < m.qty_step:
+            raise VenueError(170136 if category == "spot" else 10001, "Order quantity below the lower limit.")
+        reduce = str(p.get("reduceOnly", "")).lower() == "true"
+        pos = self.positions.get(sid) if category == "linear" else None
+        if reduce:
+            cur = pos.size if pos is not None else 0.0
+            if cur == 0 or (cur > 0) == (side == "Buy"):
+                raise VenueError(110017, "reduce-only order has same side with current position")
+            qty = min(qty, abs(cur))
+        price = float(p.get("price") or 0) if otype == "Limit" else (m.ask if side == "Buy" else m.bid)
+        self._check_funds(m, category, side, qty, price, reduce, pos)
+        now_ms = _ms()
+        o = Order(id=f"fake-{next(self.ids)}", link_id=link, category=category, symbol=sid, side=side, type=otype,
+                  qty=qty, price=price, tif=p.get("timeInForce") or ("IOC" if otype == "Market" else "GTC"),
+                  reduce=reduce, created=now_ms, updated=now_ms)
+        self.orders[o.id] = o
+        if link:
+            self.links[link] = o.id
+        crosses = (otype == "Limit") and (m.ask <= price if side == "Buy" else m.bid >= price)
+        if otype == "Market":
+            self._fill(o, m, qty, price, self.taker_fee)
+        elif o.tif == "PostOnly" and crosses:
+            o.status, o.reject = "Cancelled", "EC_PostOnlyWillTakeLiquidity"
+        elif crosses:
+            self._fill(o, m, qty, m.ask if side == "Buy" else m.bid, self.taker_fee)
+        else:
+            self.open.setdefault(category + m.base, []).append(o.id)
+        return {"orderId": o.id, "orderLinkId": link}
+
+    def _create_batch(self, p):
+        """order/create-batch: элементы исполняются по очереди, ошибка одного не отменяет остальные."""
+        category = p.get("category", "spot")
+        reqs = p.get("request") or []
+        if not reqs or len(reqs) > BATCH_MAX.get(category, 0):
+            raise VenueError(10001, f"params error: batch of {len(reqs)} for {category}")
+        rows, codes = [], []
+        for r in reqs:
+            try:
+                res = self._create(dict(r, category=category))
+                rows.append({"category": category, "symbol": r.get("symbol", ""), "orderId": res["orderId"],
+                             "orderLinkId": res["orderLinkId"], "createAt": str(_ms())})
+                codes.append({"code": 0, "msg": "OK"})
+            except VenueError as e:
+                rows.append({"category": category, "symbol": r.get("symbol", ""), "orderId": "",
+                             "orderLinkId": r.get("orderLinkId") or "", "createAt": ""})
+                codes.append({"code": e.code, "msg": e.msg})
+        return {"list": rows, "retExtInfo": {"list": codes}}
+
+    def _check_funds(self, m: Market, category: str, side: str, qty: float, price: float, reduce: bool, pos):
+        if category == "spot":
+            if side == "Buy" and qty * price * (1 + self.taker_fee) > self.available() + 1e-9:
+                raise VenueError(170131, "Insufficient balance.")
+            if side == "Sell" and qty > self.coins.get(m.base, 0.0) + 1e-9:
+                raise VenueError(170131, "Insufficient balance.")
+        elif not reduce:
+            lev = pos.lev if pos is not None else Position().lev
+            if qty * price / lev > self.available() + 1e-9:
+                raise VenueError(110007, "ab not enough for new order")
+
+    def _fill(self, o: Order, m: Market, qty: float, price: float, fee_rate: float):
+        sign = 1.0 if o.side == "Buy" else -1.0
+        fee = qty * price * fee_rate
+        if o.category == "spot":
+            self.coins[m.base] = self.coins.get(m.base, 0.0) + sign * qty
+            self.usdt -= sign * qty * price + fee
+        else:
+            pos = self.positions.setdefault(o.symbol, Position())
+            new = pos.size + sign * qty
+            if pos.size == 0 or (pos.size > 0) == (sign > 0):
+                pos.avg = (abs(pos.size) * pos.avg + qty * price) / abs(new)
+            else:
+                closed = min(qty, abs(pos.size))
+                pnl = closed * (price - pos.avg) * (1.0 if pos.size > 0 else -1.0)
+                pos.realised += pnl
+                self.usdt += pnl
+                if abs(new) > 1e-12 and (new > 0) != (pos.size > 0):
+                    pos.avg = price
+            pos.size = new if abs(new) > 1e-12 else 0.0
+            self.usdt -= fee
+        o.filled += qty
+        o.value += qty * price
+        o.fee += fee
+        o.updated = _ms()
+        o.status = "Filled" if o.filled >= o.qty - 1e-12 else "PartiallyFilled"
+        self.executions.append({
+            "category": o.category, "symbol": o.symbol, "orderId": o.id, "orderLinkId": o.link_id,
+            "side": o.side, "orderPrice": _s(o.price), "orderQty": _s(o.qty), "leavesQty": _s(max(0.0, o.qty - o.filled)),
+            "orderType": o.type, "execId": f"exec-{next(self.ids)}", "execPrice": _s(price), "execQty": _s(qty),
+            "execValue": _s(qty * price), "execFee": _s(fee), "feeCurrency": "USDT", "execType": "Trade",
+            "isMaker": fee_rate == self.maker_fee, "execTime": str(o.updated),
+        })
+        if o.status == "Filled":
+            self._unrest(o)
+
+    def _unrest(self, o: Order):
+        ids = self.open.get(o.category + o.symbol[:-4])
+        if ids and o.id in ids:
+            ids.remove(o.id)
+
+    def _find(self, p) -> Order:
+        oid = p.get("orderId") or self.links.get(p.get("orderLinkId") or "")
+        o = self.orders.get(oid or "")
+        if o is None:
+            raise VenueError(110001, "Order does not exist.")
+        return o
+
+    def _cancel(self, p):
+        o = self._find(p)
+        if o.status not in ("New", "PartiallyFilled"):
+            raise VenueError(110001, "Order does not exist.")
+        o.status = "Cancelled" if o.filled == 0 else "PartiallyFilledCanceled"
+        o.updated = _ms()
+        self._unrest(o)
+        return {"orderId": o.id, "orderLinkId": o.link_id}
+
+    def _order_list(self, p, open_only: bool):
+        if p.get("orderId") or p.get("orderLinkId"):
+            try:
+                o = self._find(p)
+            except VenueError:
+                return {"category": p.get("category", ""), "list": [], "nextPageCursor": ""}
+            m = self.markets[o.symbol[:-4]]
+            self._touch(m, o.category)
+            orders = [o]
+        else:
+            sym = p.get("symbol")
+            orders = [o for o in self.orders.values() if (not sym or o.symbol == sym)
+                      and o.category == p.get("category", o.category)]
+            orders = orders[-int(p.get("limit") or 50):]
+        if open_only:
+            # realtime у UTA отдаёт и недавно закрытые ордера; openOnly=0 — как здесь
+            orders = [o for o in orders if o.status in ("New", "PartiallyFilled")] if p.get("openOnly") == "1" \
+                else orders
+        return {"category": p.get("category", ""), "list": [self._order_row(o) for o in orders], "nextPageCursor": ""}
+
+    def _execution_list(self, p):
+        """Сделки новыми вперёд, страницами по limit (курсор — смещение); startTime/symbol — фильтры.
+        Биржа исполняет покоящиеся ордера и без запросов: здесь — проход цены по всем рынкам с ними."""
+        category = p.get("category", "spot")
+        for key, ids in list(self.open.items()):
+            if ids and key.startswith(category):
+                self._touch(self.markets[key[len(category):]], category)
+        since = int(p.get("startTime") or 0)
+        sym = p.get("symbol")
+        rows = [e for e in reversed(self.executions) if e["category"] == category
+                and int(e["execTime"]) >= since and (not sym or e["symbol"] == sym)]
+        start = int(p.get("cursor") or 0)
+        limit = min(100, int(p.get("limit") or 50))
+        cursor = str(start + limit) if start + limit < len(rows) else ""
+        return {"category": category, "list": rows[start:start + limit], "nextPageCursor": cursor}
+
+    @staticmethod
+    def _order_row(o: Order) -> Dict[str, Any]:
+        return {
+            "orderId": o.id, "orderLinkId": o.link_id, "symbol": o.symbol, "side": o.side, "orderType": o.type,
+            "price": _s(o.price) if o.type == "Limit" else "0", "qty": _s(o.qty), "timeInForce": o.tif,
+            "orderStatus": o.status, "cumExecQty": _s(o.filled), "cumExecValue": _s(o.value),
+            "cumExecFee": _s(o.fee), "avgPrice": _s(o.value / o.filled) if o.filled else "",
+            "leavesQty": _s(0.0 if o.status not in ("New", "PartiallyFilled") else o.qty - o.filled),
+            "leavesValue": "0", "reduceOnly": o.reduce, "rejectReason": o.reject or "EC_NoError",
+            "createdTime": str(o.created), "updatedTime": str(o.updated), "positionIdx": 0,
+            "triggerPrice": "", "takeProfit": "", "stopLoss": "", "smpType": "None",
+        }
+
+    # ---- переводы ----
+
+    def _transfer(self, p, kind: str):
+        tid = p.get("transferId") or ""
+        if not tid:
+            raise VenueError(10001, "params error: transferId")
+        prev = self.transfers.get(tid)
+        if prev is not None:
+            # повтор с тем же transferId не списывает второй раз
+            return {"transferId": prev.id, "status": prev.status}
+        coin = (p.get("coin") or "USDT").upper()
+        amount = float(p.get("amount") or 0)
+        if amount <= 0:
+            raise VenueError(10001, "params error: amount")
+        to_member = str(p.get("toMemberId") or "")
+        from_member = str(p.get("fromMemberId") or "")
+        if kind == "universal" and to_member and to_member != self.uid:
+            if coin != "USDT" or amount > min(self.available(), self.usdt) + 1e-9:
+                raise VenueError(131212, "insufficient balance")
+            self.usdt -= amount
+            self.subs[to_member] = self.subs.get(to_member, 0.0) + amount
+        elif kind == "universal" and from_member and from_member != self.uid:
+            if amount > self.subs.get(from_member, 0.0) + 1e-9:
+                raise VenueError(131212, "insufficient balance")
+            self.subs[from_member] -= amount
+            self.usdt += amount
+        t = Transfer(id=tid, kind=kind, coin=coin, amount=amount, from_type=p.get("fromAccountType", ""),
+                     to_type=p.get("toAccountType", ""), from_member=from_member, to_member=to_member, ts=_ms())
+        self.transfers[tid] = t
+        return {"transferId": tid, "status": t.status}
+
+    def _transfer_list(self, p, kind: str):
+        tid = p.get("transferId")
+        rows = [t for t in self.transfers.values() if t.kind == kind and (not tid or t.id == tid)]
+        rows = rows[-int(p.get("limit") or 20):]
+        return {"list": [{
+            "transferId": t.id, "coin": t.coin, "amount": _s(t.amount), "fromAccountType": t.from_type,
+            "toAccountType": t.to_type, "fromMemberId": t.from_member, "toMemberId": t.to_member,
+            "timestamp": str(t.ts), "status": t.status,
+        } for t in reversed(rows)], "nextPageCursor": ""}
+
+
+_venue: Optional[Venue] = None
+_venue_lock = threading.Lock()
+
+
+def default_venue() -> Venue:
+    """Один Venue на процесс: синхронный ex и asyncio aex бота видят одно состояние."""
+    global _venue
+    with _venue_lock:
+        if _venue is None:
+            _venue = Venue.from_env()
+        return _venue
+
+
+def _fake_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    # подпись ccxt требует непустые ключи; с имитацией подойдут любые
+    return dict(config, apiKey=config.get("apiKey") or "fake", secret=config.get("secret") or "fake")
+
+
+def _respond(ex, venue: Venue, url: str, method: str, headers, body):
+    try:
+        res = venue.handle(method, url, body)
+    except FakeTimeout:
+        raise ccxt.RequestTimeout(f"{ex.id} {method} {url}")
+    except FakeNetworkError:
+        raise ccxt.NetworkError(f"{ex.id} {method} {url}")
+    text = json.dumps(res)
+    ex.handle_errors(200, "OK", url, method, {}, text, res, headers, body)
+    return res
+
+
+class FakeBybit(ccxt.bybit):
+    """ccxt.bybit поверх Venue: только транспорт подменён, задержка — time.sleep."""
+
+    def __init__(self, config: Dict[str, Any] = {}, venue: Optional[Venue] = None):
+        super().__init__(_fake_config(config))
+        self.id = FAKE_ID
+        self.venue = venue or default_venue()
+
+    def fetch(self, url, method="GET", headers=None, body=None):
+        d = self.venue.delay()
+        if d > 0:
+            time.sleep(d)
+        return _respond(self, self.venue, url, method, headers, body)
+
+
+class FakeBybitAsync(ccxt_async.bybit):
+    """То же для ccxt.async_support: задержка — asyncio.sleep."""
+
+    def __init__(self, config: Dict[str, Any] = {}, venue: Optional[Venue] = None):
+        super().__init__(_fake_config(config))
+        self.id = FAKE_ID
+        self.venue = venue or default_venue()
+
+    async def fetch(self, url, method="GET", headers=None, body=None):
+        d = self.venue.delay()
+        if d > 0:
+            await asyncio.sleep(d)
+        return _respond(self, self.venue, url, method, headers, body)
@@ -0,0 +1,241 @@
+"""
+Общий шлюз рыночных данных и аккаунта для ботов на одном ключе Bybit.
+
+L1, flow-manager и grid по отдельности опрашивают wallet-balance, позиции и
+тикеры и делят между собой один бюджет запросов. Здесь опрос ведёт один
+процесс — лидер: каждый бот встраивает Gateway, но REST-снимки снимает тот,
+кто держит flock на <dir>/leader.lock. Падение лидера снимает блокировку,
+и следующий шаг любого другого бота подхватывает роль.
+
+Канал — JSON-файлы в /app/shared/gateway, атомарно (tmp + os.replace), как
+снимок рынков в markets_cache:
+  want_<bot>.json      — подписка бота: {category: {market_id: symbol}}, нужен ли аккаунт;
+  account.json         — сырые ответы v5 wallet-balance и страницы position/list;
+  tickers_<cat>.json   — сырые v5 market/tickers по подписанным id (один запрос на category).
+
+Читатель перечитывает файл только при смене mtime; снимок старше max_age_sec
+не отдаётся — бот идёт в REST сам. Ордера и прочие приватные вызовы шлюз
+не трогает. Для тикеров интерфейс тот же, что у WsTickerCache (subscribe /
+is_stale / ticker), поэтому L1 подключает шлюз как MarketSnapshot.stream.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_DIR = "/app/shared/gateway"
+CATEGORIES = ("spot", "linear")
+# подписка бота, не обновлявшаяся столько интервалов, считается брошенной
+WANT_TTL_INTERVALS = 10
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x) if x not in (None, "") else 0.0
+    except Exception:
+        return 0.0
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+class _File:
+    """JSON-файл канала с разбором только при смене mtime."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = 0.0
+        self.data: Dict[str, Any] = {}
+
+    def read(self) -> Dict[str, Any]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return {}
+        if mtime != self.mtime:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+                self.mtime = mtime
+            except (OSError, ValueError):
+                return self.data
+        return self.data
+
+
+class Gateway:
+    """Встраиваемый шлюз: подписка и чтение снимков + опрос биржи, пока процесс — лидер.
+
+    ex — синхронный ccxt.bybit бота (через него лидер ходит в REST);
+    name — имя бота в файле подписки; acct — accountType для wallet-balance.
+    """
+
+    def __init__(self, ex, name: str, shared_dir: str = DEFAULT_DIR, interval_sec: float = 5.0,
+                 max_age_sec: float = 15.0, acct: str = "UNIFIED", account: bool = False):
+        self.ex = ex
+        self.name = name
+        self.dir = shared_dir
+        self.interval_sec = interval_sec
+        self.max_age_sec = max_age_sec
+        self.acct = (acct or "UNIFIED").upper()
+        self.want_account = account
+        self.leader = False
+        self._ids: Dict[str, Dict[str, str]] = {c: {} for c in CATEGORIES}
+        self._where: Dict[str, Tuple[str, str]] = {}   # symbol -> (category, market_id)
+        self._files = {c: _File(os.path.join(shared_dir, f"tickers_{c}.json")) for c in CATEGORIES}
+        self._account = _File(os.path.join(shared_dir, "account.json"))
+        self._lock = threading.Lock()
+        self._lock_fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    # ---------- управление ----------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._thread_main, name="gateway", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            self.leader = False
+
+    def _thread_main(self):
+        while not self._stopping.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print("gateway error:", e)
+            self._stopping.wait(self.interval_sec)
+
+    def step(self):
+        """Один шаг фонового потока: подписка на диск, попытка стать лидером, опрос."""
+        os.makedirs(self.dir, exist_ok=True)
+        self._publish_want()
+        if self._try_lead():
+            self.poll()
+
+    def subscribe(self, category: str, ids: Dict[str, str]):
+        """Добавить символы {market_id: symbol}; лидер увидит их на следующем шаге."""
+        with self._lock:
+            self._ids[category].update(ids)
+            self._where.update({sym: (category, mid) for mid, sym in ids.items()})
+
+    def _publish_want(self):
+        with self._lock:
+            want = {"ts": time.time(), "pid": os.getpid(), "account": self.want_account,
+                    "ids": {c: dict(v) for c, v in self._ids.items()}}
+        _write_json(os.path.join(self.dir, f"want_{self.name}.json"), want)
+
+    def _try_lead(self) -> bool:
+        if self.leader:
+            return True
+        fd = os.open(os.path.join(self.dir, "leader.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{self.name} {os.getpid()}\n".encode())
+        self._lock_fd = fd
+        self.leader = True
+        print(f"[gateway] {self.name}: лидер опроса ({self.dir})")
+        return True
+
+    # ---------- лидер ----------
+
+    def wants(self) -> Tuple[bool, Dict[str, Dict[str, str]]]:
+        """Объединение живых подписок всех ботов: (нужен ли аккаунт, {category: {id: symbol}})."""
+        account = False
+        ids: Dict[str, Dict[str, str]] = {c: {} for c in CATEGORIES}
+        cutoff = time.time() - WANT_TTL_INTERVALS * self.interval_sec
+        for fn in os.listdir(self.dir):
+            if not (fn.startswith("want_") and fn.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.dir, fn), "r", encoding="utf-8") as f:
+                    want = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if _f(want.get("ts")) < cutoff:
+                continue
+            account = account or bool(want.get("account"))
+            for c, v in (want.get("ids") or {}).items():
+                if c in ids:
+                    ids[c].update(v)
+        return account, ids
+
+    def poll(self):
+        """Снять и опубликовать снимки по объединённой подписке."""
+        account, ids = self.wants()
+        if account:
+            # ts — момент запроса, а не ответа: снимок не выдаётся за более поздний, чем он есть
+            t0 = time.time()
+            wb = self.ex.private_get_v5_account_wallet_balance({"accountType": self.acct})
+            pages, cursor = [], ""
+            while True:
+                req = {"category": "linear", "settleCoin": "USDT", "limit": 200}
+                if cursor:
+                    req["cursor"] = cursor
+                pos = self.ex.private_get_v5_position_list(req) or {}
+                pages.append(pos)
+                cursor = (pos.get("result") or {}).get("nextPageCursor") or ""
+                if not cursor:
+                    break
+            _write_json(self._account.path, {"ts": t0, "leader": self.name,
+                                             "wallet": wb, "positions": pages})
+        for c, wanted in ids.items():
+            if not wanted:
+                continue
+            t0 = time.time()
+            res = self.ex.publicGetV5MarketTickers({"category": c}) or {}
+            rows = {t.get("symbol"): t for t in (res.get("result") or {}).get("list") or []
+                    if t.get("symbol") in wanted}
+            _write_json(self._files[c].path, {"ts": t0, "leader": self.name, "tickers": rows})
+
+    # ---------- чтение ----------
+
+    def account(self, newer_than: float = 0.0) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """(ответ wallet-balance, страницы position/list) из снимка лидера; None — снимка нет,
+        он старше max_age_sec или снят раньше newer_than (time.time(), например своей сделки)."""
+        snap = self._account.read()
+        ts = _f(snap.get("ts"))
+        if ts <= 0 or ts < newer_than or time.time() - ts > self.max_age_sec:
+            return None
+        return snap.get("wallet") or {}, snap.get("positions") or []
+
+    def _raw(self, sym: str) -> Optional[Dict[str, Any]]:
+        where = self._where.get(sym)
+        if where is None:
+            return None
+        snap = self._files[where[0]].read()
+        if time.time() - _f(snap.get("ts")) > self.max_age_sec:
+            return None
+        return (snap.get("tickers") or {}).get(where[1])
+
+    def is_stale(self, sym: str) -> bool:
+        return self._raw(sym) is None
+
+    def ticker(self, sym: str) -> Optional[Dict[str, Any]]:
+        """Тикер в форме WsTickerCache (symbol/last/bid/ask/info); None если данных нет или они несвежие."""
+        raw = self._raw(sym)
+        if raw is None:
+            return None
+        return {"symbol": sym, "last": _f(raw.get("lastPrice")) or None,
+                "bid": _f(raw.get("bid1Price")) or None, "ask": _f(raw.get("ask1Price")) or None,
+                "info": dict(raw)}
@@ -0,0 +1,121 @@
+"""
+Снимок рынков биржи на диске для быстрого и устойчивого к сбоям API старта.
+
+load_markets() у Bybit тянет несколько тысяч инструментов и занимает секунды;
+если API недоступен при рестарте — контейнер падает. Здесь рынки и валюты
+сохраняются в версионированный JSON в /app/shared, урезанный до баз, которыми
+бот торгует. Старт идёт из снимка, свежие данные подтягиваются в фоне.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import ccxt
+
+SNAPSHOT_VERSION = 1
+SHARED_DIR = "/app/shared"
+DEFAULT_TTL_SEC = 6 * 3600
+
+
+def snapshot_path(exchange_id: str, name: str, shared_dir: str = SHARED_DIR) -> str:
+    return os.path.join(shared_dir, f"markets_{exchange_id}_{name}.json")
+
+
+def trim_markets(markets: Iterable[Dict[str, Any]], currencies: Optional[Dict[str, Any]],
+                 symbols: Iterable[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Оставить только рынки с базами из symbols (спот, свопы и прочие) и их валюты."""
+    bases = {s.split("/")[0] for s in symbols}
+    kept = [m for m in markets if m.get("base") in bases]
+    codes = bases | {m.get("quote") for m in kept} | {m.get("settle") for m in kept}
+    cur = {k: v for k, v in (currencies or {}).items() if k in codes}
+    return kept, cur
+
+
+def load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snap.get("version") != SNAPSHOT_VERSION or snap.get("ccxt") != ccxt.__version__:
+        return None
+    return snap
+
+
+def save_snapshot(path: str, exchange_id: str, symbols: Iterable[str],
+                  markets: List[Dict[str, Any]], currencies: Dict[str, Any]):
+    """Атомарная запись: tmp-файл + os.replace, чтобы соседний бот не прочитал половину."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    snap = {
+        "version": SNAPSHOT_VERSION,
+        "ccxt": ccxt.__version__,
+        "exchange": exchange_id,
+        "ts": time.time(),
+        "symbols": sorted(set(symbols)),
+        "markets": markets,
+        "currencies": currencies,
+    }
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snap, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _covers(snap: Dict[str, Any], symbols: Iterable[str]) -> bool:
+    return set(symbols) <= set(snap.get("symbols") or [])
+
+
+def refresh_markets(ex, symbols: List[str], path: str, on_refresh: Callable[[], None] = None):
+    """Загрузить рынки с биржи, урезать, применить к ex и сохранить снимок."""
+    currencies = None
+    if ex.has.get("fetchCurrencies") is True:
+        currencies = ex.fetch_currencies()
+    markets, currencies = trim_markets(ex.fetch_markets(), currencies, symbols)
+    ex.set_markets(markets, currencies)
+    save_snapshot(path, ex.id, symbols, markets, currencies)
+    if on_refresh is not None:
+        on_refresh()
+
+
+def _refresh_in_background(ex, symbols: List[str], path: str, on_refresh: Callable[[], None]):
+    t0 = time.monotonic()
+    try:
+        refresh_markets(ex, symbols, path, on_refresh)
+        print(f"[markets] фоновое обновление: {len(ex.markets)} рынков за {(time.monotonic() - t0) * 1000:.0f} ms")
+    except Exception as e:
+        print("[markets] фоновое обновление не удалось:", e)
+
+
+def load_markets_cached(ex, symbols: List[str], name: str, ttl_sec: float = DEFAULT_TTL_SEC,
+                        shared_dir: str = SHARED_DIR, on_refresh: Callable[[], None] = None,
+                        background: bool = True) -> str:
+    """Заполнить ex.markets из снимка (если он свежий и покрывает symbols) и обновить его в фоне;
+    иначе — синхронная загрузка с биржи, а при её ошибке — старый снимок любой давности.
+    background=False — фоновое обновление запускает сам бот (например, вместе с догрузкой рынков).
+    Возвращает источник: "snapshot", "api" или "stale-snapshot".
+    """
+    t0 = time.monotonic()
+    path = snapshot_path(ex.id, name, shared_dir)
+    snap = load_snapshot(path)
+    usable = snap is not None and _covers(snap, symbols)
+    if usable and (time.time() - float(snap.get("ts") or 0.0)) <= ttl_sec:
+        ex.set_markets(snap["markets"], snap["currencies"])
+        source = "snapshot"
+    else:
+        try:
+            refresh_markets(ex, symbols, path)
+            source = "api"
+        except Exception as e:
+            if not usable:
+                raise
+            print("[markets] загрузка с биржи не удалась, используем старый снимок:", e)
+            ex.set_markets(snap["markets"], snap["currencies"])
+            source = "stale-snapshot"
+    if background and source != "api":
+        threading.Thread(target=_refresh_in_background, args=(ex, symbols, path, on_refresh),
+                         name="markets-refresh", daemon=True).start()
+    print(f"[markets] {source}: {len(ex.markets)} рынков за {(time.monotonic() - t0) * 1000:.0f} ms")
+    return source
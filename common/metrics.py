@@ -0,0 +1,251 @@
+"""
+Метрики Prometheus для ботов через textfile collector node_exporter.
+
+Счётчики, гейджи и гистограммы живут в памяти процесса; фоновый поток раз в
+interval_sec рендерит их в текстовый формат экспозиции и атомарно (tmp +
+os.replace) пишет <dir>/<bot>.prom — node_exporter подхватывает файл
+с --collector.textfile.directory. У всех рядов есть метка bot, поэтому
+имена метрик у трёх ботов общие.
+
+instrument_exchange() оборачивает ex.request (sync или asyncio ccxt): каждый
+REST-вызов попадает в гистограмму задержки по endpoint, исключения — в
+счётчик по классу (RateLimitExceeded, NetworkError, ...). В задержку входит
+ожидание встроенного rate limiter ccxt.
+"""
+
+import asyncio
+import atexit
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_DIR = "/app/shared/metrics"
+# секунды: от быстрого REST до долгого цикла
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, esc)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = registry.lock
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _series(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._series()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, n: float = 1.0, **labels):
+        k = self._key(labels)
+        with self.lock:
+            self.values[k] = self.values.get(k, 0.0) + n
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def _series(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, k, self.registry.const)} {_fmt(v)}"
+                for k, v in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, v: float, **labels):
+        k = self._key(labels)
+        with self.lock:
+            self.values[k] = float(v)
+
+    def replace(self, values: Dict[Tuple[str, ...], float]):
+        """Заменить все ряды разом (исчезнувшие метки — например, закрытые пары — пропадают)."""
+        with self.lock:
+            self.values = {tuple(map(str, k)): float(v) for k, v in values.items()}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *a, buckets: Sequence[float] = DEFAULT_BUCKETS, **kw):
+        super().__init__(*a, **kw)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # метки -> [счётчики по бакетам (не кумулятивные), сумма, количество]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, v: float, **labels):
+        k = self._key(labels)
+        i = next(j for j, b in enumerate(self.buckets) if v <= b)
+        with self.lock:
+            s = self.values.get(k)
+            if s is None:
+                s = self.values[k] = [[0] * len(self.buckets), 0.0, 0]
+            s[0][i] += 1
+            s[1] += v
+            s[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        s = self.values.get(self._key(labels))
+        return s[2] if s else 0
+
+    def _series(self) -> List[str]:
+        out = []
+        for k, (counts, total, n) in sorted(self.values.items()):
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                le = (("le", _fmt(b)),)
+                out.append(f"{self.name}_bucket{_labels(self.label_names, k, tuple(self.registry.const) + le)} {acc}")
+            lab = _labels(self.label_names, k, self.registry.const)
+            out.append(f"{self.name}_sum{lab} {_fmt(total)}")
+            out.append(f"{self.name}_count{lab} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self, const: Optional[Dict[str, str]] = None):
+        self.const = tuple((const or {}).items())   # метки всех рядов, например bot="l1"
+        self.metrics: List[_Metric] = []
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.stop = threading.Event()
+
+    def _add(self, m):
+        self.metrics.append(m)
+        return m
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help, labels, buckets=buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [line for m in self.metrics for line in m.render()]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def start(self, path: str, interval_sec: float = 15.0):
+        """Фоновая запись файла раз в interval_sec и финальная — при выходе процесса."""
+        def loop():
+            while not self.stop.wait(interval_sec):
+                self._write_safe(path)
+
+        self.thread = threading.Thread(target=loop, name="metrics-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self._write_safe, path)
+
+    def _write_safe(self, path: str):
+        try:
+            self.write(path)
+        except Exception as e:
+            print("metrics error:", e)
+
+
+class BotMetrics:
+    """Общий набор метрик ботов стека; путь файла — <textfile_dir>/<bot>.prom, пустой dir — не писать."""
+
+    def __init__(self, bot: str, textfile_dir: str = DEFAULT_DIR, interval_sec: float = 15.0):
+        self.registry = r = Registry({"bot": bot})
+        self.cycle = r.histogram("bot_cycle_seconds", "Длительность торгового цикла")
+        self.api = r.histogram("bot_api_request_seconds", "Задержка REST-вызова ccxt (с ожиданием rate limiter)",
+                               ("endpoint",))
+        self.api_errors = r.counter("bot_api_errors_total", "Ошибки REST-вызовов ccxt по классу исключения",
+                                    ("endpoint", "error"))
+        self.order_fill = r.histogram("bot_order_fill_seconds", "Время от отправки ордера до исполнения",
+                                      ("kind",))
+        self.equity = r.gauge("bot_equity_usdt", "Equity аккаунта, USDT")
+        self.available = r.gauge("bot_available_usdt", "Доступная маржа, USDT")
+        self.exposure = r.gauge("bot_pair_exposure_usdt", "Позиция по паре в USDT (знак — направление)",
+                                ("symbol", "leg"))
+        self.path = os.path.join(textfile_dir, f"{bot}.prom") if textfile_dir else ""
+        self.interval_sec = interval_sec
+
+    def start(self):
+        if self.path:
+            self.registry.start(self.path, self.interval_sec)
+
+
+def instrument_exchange(ex, metrics: BotMetrics):
+    """Подменить ex.request на версию с замером задержки и учётом ошибок (sync и asyncio ccxt)."""
+    orig = ex.request
+
+    def record(path, t0, err=None):
+        endpoint = str(path)
+        metrics.api.observe(time.perf_counter() - t0, endpoint=endpoint)
+        if err is not None:
+            metrics.api_errors.inc(endpoint=endpoint, error=type(err).__name__)
+
+    if asyncio.iscoroutinefunction(orig):
+        async def request(path, *args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                res = await orig(path, *args, **kwargs)
+            except Exception as e:
+                record(path, t0, e)
+                raise
+            record(path, t0)
+            return res
+    else:
+        def request(path, *args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                res = orig(path, *args, **kwargs)
+            except Exception as e:
+                record(path, t0, e)
+                raise
+            record(path, t0)
+            return res
+
+    ex.request = request
+    return ex
@@ -0,0 +1,159 @@
+"""
+Неблокирующая отправка уведомлений (Telegram) из торговых циклов.
+
+notify() только кладёт текст в ограниченную очередь и сразу возвращается;
+сеть — в фоновом потоке. Поток склеивает сообщения, пришедшие за окно
+window_sec, в одно (пачки OPEN/CLOSE/SCALE-IN уходят одним сообщением),
+держит паузу min_interval_sec между отправками и выжидает retry_after,
+если Telegram ответил 429. Критические сообщения (❗️/⛔️) не ждут окна,
+идут первыми и вытесняются из переполненной очереди последними.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+CRITICAL_PREFIXES = ("❗", "⛔")
+MAX_RETRIES = 3
+
+
+def is_critical(msg: str) -> bool:
+    return str(msg).startswith(CRITICAL_PREFIXES)
+
+
+def pack(messages: List[str], max_len: int = 4000) -> List[str]:
+    """Склеить сообщения через пустую строку в тексты не длиннее max_len."""
+    out: List[str] = []
+    cur = ""
+    for m in messages:
+        m = m[:max_len]
+        if cur and len(cur) + 2 + len(m) > max_len:
+            out.append(cur)
+            cur = ""
+        cur = f"{cur}\n\n{m}" if cur else m
+    if cur:
+        out.append(cur)
+    return out
+
+
+class Notifier:
+    def __init__(self, send: Callable[[str], None], window_sec: float = 2.0, min_interval_sec: float = 1.0,
+                 max_queue: int = 200, max_len: int = 4000, name: str = "TG"):
+        self.send = send
+        self.window_sec = max(0.0, window_sec)
+        self.min_interval_sec = max(0.0, min_interval_sec)
+        self.max_queue = max(1, max_queue)
+        self.max_len = max_len
+        self.name = name
+        self.critical: deque = deque()
+        self.normal: deque = deque()
+        self.first_ts = 0.0       # time.monotonic() первого обычного сообщения в окне
+        self.last_send = 0.0
+        self.busy = False
+        self.closed = False
+        self.sent = 0             # отправлено текстов (после склейки)
+        self.dropped = 0
+        self.errors = 0
+        self.cond = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+
+    def notify(self, msg: str, critical: Optional[bool] = None) -> bool:
+        """Поставить сообщение в очередь; False — очередь закрыта."""
+        msg = str(msg)
+        crit = is_critical(msg) if critical is None else critical
+        with self.cond:
+            if self.closed:
+                return False
+            if crit:
+                self.critical.append(msg)
+            else:
+                if not self.normal:
+                    self.first_ts = time.monotonic()
+                self.normal.append(msg)
+            # переполнение: вытесняем самые старые обычные, критические — в последнюю очередь
+            while len(self.critical) + len(self.normal) > self.max_queue:
+                (self.normal or self.critical).popleft()
+                self.dropped += 1
+            self._start()
+            self.cond.notify()
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Дождаться отправки всего, что в очереди (окно склейки не ждём)."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            self.first_ts = 0.0
+            self.cond.notify_all()
+            while self.critical or self.normal or self.busy:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self.cond.wait(left)
+        return True
+
+    def close(self, timeout: float = 10.0) -> bool:
+        ok = self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        return ok
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name=f"notifier-{self.name}", daemon=True)
+            self.thread.start()
+
+    def _take(self) -> Optional[List[str]]:
+        with self.cond:
+            while True:
+                if self.critical:
+                    break
+                if self.normal:
+                    left = self.first_ts + self.window_sec - time.monotonic()
+                    if left <= 0 or self.closed:
+                        break
+                    self.cond.wait(left)
+                    continue
+                if self.closed:
+                    return None
+                self.cond.wait()
+            batch = list(self.critical) + list(self.normal)
+            self.critical.clear()
+            self.normal.clear()
+            self.busy = True
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            try:
+                for text in pack(batch, self.max_len):
+                    self._send(text)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def _send(self, text: str):
+        for _ in range(MAX_RETRIES):
+            wait = self.last_send + self.min_interval_sec - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.send(text)
+                self.last_send = time.monotonic()
+                self.sent += 1
+                return
+            except Exception as e:
+                self.last_send = time.monotonic()
+                retry_after = getattr(e, "retry_after", None)  # telegram.error.RetryAfter (429)
+                if not retry_after:
+                    self.errors += 1
+                    print(f"{self.name} error:", e)
+                    return
+                time.sleep(float(retry_after))
+        self.errors += 1
+        print(f"{self.name} error: retry_after limit exceeded")
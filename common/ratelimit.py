@@ -0,0 +1,210 @@
+"""
+Планировщик REST-запросов Bybit v5 вместо общего троттлинга ccxt.
+
+ccxt с enableRateLimit ставит все вызовы в одну очередь с одинаковой паузой:
+вторая нога связки ждёт за тикерами и отчётами. Здесь у каждого класса
+эндпоинтов свой токен-бакет по лимитам Bybit v5 (на UID в секунду), плюс
+общий бакет на IP. Приоритеты: ордера → позиции/баланс → рыночные данные →
+отчёты. Очереди нет: приоритет — это резерв, а не порядок. Приоритет p
+берёт токен, только если в бакете останется резерв RESERVE[p] от ёмкости:
+срочным запросам бюджет достаётся всегда, фоновые ждут, но уже ждущий
+запрос ничем не обгоняется. Ордера всегда идут с наивысшим приоритетом;
+остальным его можно понизить на время блока (with scheduler.priority(REPORT)).
+
+Ответ 10006 / RateLimitExceeded опустошает бакет класса до сброса лимита из
+заголовка X-Bapi-Limit-Reset-Timestamp (без него — на секунду): ждёт только
+этот класс, а не весь цикл; GET повторяется один раз.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+import ccxt
+
+ORDER, ACCOUNT, MARKET, REPORT = 0, 1, 2, 3
+PRIORITY_NAMES = ("order", "account", "market", "report")
+# доля ёмкости бакета, которую приоритет оставляет более срочным
+RESERVE = (0.0, 0.1, 0.3, 0.5)
+
+# класс -> (префиксы path, запросов в секунду, приоритет по умолчанию); первый совпавший
+BYBIT_V5: Tuple[Tuple[str, Tuple[str, ...], float, int], ...] = (
+    ("order", ("v5/order/create", "v5/order/amend", "v5/order/cancel"), 10.0, ORDER),
+    ("order_query", ("v5/order/", "v5/execution/"), 50.0, ACCOUNT),
+    ("position", ("v5/position/",), 50.0, ACCOUNT),
+    ("account", ("v5/account/",), 50.0, ACCOUNT),
+    ("asset", ("v5/asset/",), 5.0, ACCOUNT),
+    ("market", ("v5/market/",), 100.0, MARKET),
+)
+OTHER = ("other", (), 10.0, MARKET)
+IP_RATE = 120.0  # 600 запросов за 5 с на IP
+RESET_HEADER = "x-bapi-limit-reset-timestamp"  # мс, когда лимит эндпоинта восстановится
+MAX_PENALTY_SEC = 60.0
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("ratelimit_priority", default=None)
+
+
+class Bucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.cap = burst if burst is not None else rate
+        self.tokens = self.cap
+        self.ts = time.monotonic()
+
+    def fill(self, now: float):
+        self.tokens = min(self.cap, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait(self, reserve: float) -> float:
+        """Секунд до момента, когда токен можно взять, оставив reserve * cap."""
+        need = min(self.cap, reserve * self.cap + 1.0) - self.tokens
+        return max(0.0, need / self.rate)
+
+
+class Scheduler:
+    def __init__(self, classes: Sequence[tuple] = BYBIT_V5, ip_rate: float = IP_RATE, safety: float = 0.8,
+                 registry=None):
+        """safety — доля лимитов Bybit, которую используем (запас на часы и соседние процессы)."""
+        self.classes = tuple(classes) + (OTHER,)
+        self.buckets: Dict[str, Bucket] = {name: Bucket(rate * safety) for name, _, rate, _ in self.classes}
+        self.ip = Bucket(ip_rate * safety)
+        self.lock = threading.Lock()
+        self._cache: Dict[str, tuple] = {}
+        self.m = None
+        if registry is not None:
+            self.m = (
+                registry.counter("bot_ratelimit_requests_total", "Запросы через планировщик", ("cls", "prio")),
+                registry.counter("bot_ratelimit_wait_seconds_total", "Суммарное ожидание бюджета, с", ("cls",)),
+                registry.gauge("bot_ratelimit_budget_used", "Доля израсходованного бюджета класса", ("cls",)),
+                registry.counter("bot_ratelimit_exceeded_total", "Ответы RateLimitExceeded (10006)", ("cls",)),
+            )
+
+    def classify(self, path: str) -> tuple:
+        c = self._cache.get(path)
+        if c is None:
+            c = next((c for c in self.classes if any(path.startswith(p) for p in c[1])), OTHER)
+            self._cache[path] = c
+        return c
+
+    @contextmanager
+    def priority(self, prio: int):
+        """Понизить (или поднять) приоритет запросов блока; ордера всё равно идут первыми."""
+        token = _priority.set(prio)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def _prio(self, cls: tuple) -> int:
+        p = _priority.get()
+        return cls[3] if p is None or cls[3] == ORDER else p
+
+    def _try(self, name: str, prio: int) -> float:
+        """0 — токены взяты из бакета класса и IP; иначе — сколько ждать до повторной попытки."""
+        b = self.buckets[name]
+        with self.lock:
+            now = time.monotonic()
+            b.fill(now)
+            self.ip.fill(now)
+            wait = max(b.wait(RESERVE[prio]), self.ip.wait(RESERVE[prio]))
+            if wait <= 0:
+                b.tokens -= 1.0
+                self.ip.tokens -= 1.0
+            used = 1.0 - max(0.0, b.tokens) / b.cap
+        if self.m is not None and wait <= 0:
+            self.m[0].inc(cls=name, prio=PRIORITY_NAMES[prio])
+            self.m[2].set(used, cls=name)
+        return wait
+
+    def _waited(self, name: str, sec: float):
+        if self.m is not None and sec > 0:
+            self.m[1].inc(sec, cls=name)
+
+    def acquire(self, path: str) -> str:
+        cls = self.classify(path)
+        prio = self._prio(cls)
+        t0 = time.monotonic()
+        while True:
+            wait = self._try(cls[0], prio)
+            if wait <= 0:
+                self._waited(cls[0], time.monotonic() - t0)
+                return cls[0]
+            time.sleep(wait)
+
+    async def acquire_async(self, path: str) -> str:
+        cls = self.classify(path)
+        prio = self._prio(cls)
+        t0 = time.monotonic()
+        while True:
+            wait = self._try(cls[0], prio)
+            if wait <= 0:
+                self._waited(cls[0], time.monotonic() - t0)
+                return cls[0]
+            await asyncio.sleep(wait)
+
+    def penalize(self, name: str, sec: float = 1.0):
+        """Биржа ответила 10006: класс ждёт sec, остальные классы не задеты."""
+        b = self.buckets[name]
+        with self.lock:
+            b.fill(time.monotonic())
+            b.tokens = min(b.tokens, -b.rate * sec)
+        if self.m is not None:
+            self.m[3].inc(cls=name)
+
+    def penalty_sec(self) -> float:
+        """Сколько ещё ждать самому оштрафованному классу (0 — штрафов нет)."""
+        with self.lock:
+            now = time.monotonic()
+            waits = []
+            for b in self.buckets.values():
+                b.fill(now)
+                waits.append(max(0.0, -b.tokens / b.rate))
+        return max(waits)
+
+
+def reset_sec(ex) -> float:
+    """Секунд до сброса лимита по заголовкам последнего ответа; 1.0 — заголовка нет."""
+    headers = getattr(ex, "last_response_headers", None) or {}
+    for k, v in headers.items():
+        if str(k).lower() == RESET_HEADER:
+            try:
+                return min(MAX_PENALTY_SEC, max(1.0, int(v) / 1000.0 - time.time()))
+            except (TypeError, ValueError):
+                break
+    return 1.0
+
+
+def schedule_exchange(ex, scheduler: Scheduler):
+    """Пустить ex.request (sync или asyncio ccxt) через планировщик; встроенный троттлинг ccxt выключается."""
+    orig = ex.request
+    ex.enableRateLimit = False
+
+    def retry(method, attempt: int) -> bool:
+        return attempt == 0 and str(method).upper() == "GET"
+
+    if asyncio.iscoroutinefunction(orig):
+        async def request(path, api="public", method="GET", *args, **kwargs):
+            for attempt in range(2):
+                name = await scheduler.acquire_async(str(path))
+                try:
+                    return await orig(path, api, method, *args, **kwargs)
+                except ccxt.RateLimitExceeded:
+                    scheduler.penalize(name, reset_sec(ex))
+                    if not retry(method, attempt):
+                        raise
+    else:
+        def request(path, api="public", method="GET", *args, **kwargs):
+            for attempt in range(2):
+                name = scheduler.acquire(str(path))
+                try:
+                    return orig(path, api, method, *args, **kwargs)
+                except ccxt.RateLimitExceeded:
+                    scheduler.penalize(name, reset_sec(ex))
+                    if not retry(method, attempt):
+                        raise
+
+    ex.request = request
+    return ex
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Проверка имитации Bybit v5 через настоящий ccxt: рынки страницами и интервалы
+funding, ордера/позиции/баланс/плечо/переводы, инъекция ошибок, задержка
+и счётчик вызовов.
+"""
+
+import asyncio
+import time
+
+import ccxt
+
+from common.fake_bybit import FakeBybit, FakeBybitAsync, Venue
+
+
+def test_markets_tickers_funding():
+    v = Venue(markets=700, seed=1)
+    ex = FakeBybit({"enableRateLimit": False, "options": {"defaultType": "unified"}}, venue=v)
+    ex.load_markets()
+    perps = [m for m in ex.markets.values() if m["swap"]]
+    assert len(perps) == 600 and len(ex.markets) == 1300
+    # linear — две страницы по 500
+    assert v.calls["v5/market/instruments-info"] >= 3
+    assert {int(m["info"]["fundingInterval"]) for m in perps} == {60, 240, 480}
+
+    t = ex.fetch_tickers(["BTC/USDT:USDT", "ETH/USDT:USDT"])
+    info = t["BTC/USDT:USDT"]["info"]
+    assert t["BTC/USDT:USDT"]["bid"] < t["BTC/USDT:USDT"]["ask"]
+    assert int(info["nextFundingTime"]) % (int(info["fundingIntervalHour"]) * 3600 * 1000) == 0
+    fr = ex.fetch_funding_rates(["BTC/USDT:USDT", "SOL/USDT:USDT"])
+    assert set(fr) == {"BTC/USDT:USDT", "SOL/USDT:USDT"}
+    assert ex.fetch_ticker("S0100/USDT")["last"] > 0
+    # весь linear одним запросом (как у сканера)
+    raw = ex.publicGetV5MarketTickers({"category": "linear"})
+    assert len(raw["result"]["list"]) == 600
+
+
+def test_orders_account_transfers():
+    v = Venue(markets=20, usdt=10_000.0, taker_fee=0.0, maker_fill_prob=0.0, vol=0.0)
+    ex = FakeBybit({"enableRateLimit": False}, venue=v)
+    ex.load_markets()
+    ex.create_order("BTC/USDT", "market", "buy", 0.01)
+    ex.create_order("BTC/USDT:USDT", "market", "sell", 0.01, params={"reduceOnly": False})
+    pos = ex.private_get_v5_position_list({"category": "linear", "settleCoin": "USDT"})["result"]["list"]
+    assert [(p["symbol"], p["side"], float(p["size"])) for p in pos] == [("BTCUSDT", "Sell", 0.01)]
+    bal = ex.fetch_balance()
+    assert abs(bal["total"]["BTC"] - 0.01) < 1e-12 and bal["total"]["USDT"] < 10_000.0
+    wb = ex.private_get_v5_account_wallet_balance({"accountType": "UNIFIED"})["result"]["list"][0]
+    assert abs(float(wb["totalEquity"]) - 10_000.0) < 1.0   # хедж: спот + шорт ≈ без изменения
+    # reduceOnly без позиции и лишний объём спота — ошибки биржи
+    try:
+        ex.create_order("ETH/USDT:USDT", "market", "buy", 0.1, params={"reduceOnly": True})
+        assert False
+    except ccxt.ExchangeError:
+        pass
+    try:
+        ex.create_order("BTC/USDT", "market", "sell", 1.0)
+        assert False
+    except ccxt.InsufficientFunds:
+        pass
+
+    ex.set_leverage(3, "BTC/USDT:USDT")
+    try:
+        ex.set_leverage(3, "BTC/USDT:USDT")
+        assert False
+    except ccxt.ExchangeError as e:
+        assert "110043" in str(e)
+
+    # limit: PostOnly через спред отменяется, покоящийся исполняется при проходе цены
+    bid = ex.fetch_order_book("ETH/USDT", 1)["bids"][0][0]
+    po = ex.create_order("ETH/USDT", "limit", "buy", 0.1, bid * 1.01, params={"timeInForce": "PO"})
+    assert ex.fetch_order(po["id"], "ETH/USDT", {"acknowledged": True})["status"] == "canceled"
+    lo = ex.create_order("ETH/USDT", "limit", "buy", 0.1, bid * 0.99, params={"timeInForce": "PO"})
+    assert ex.fetch_order(lo["id"], "ETH/USDT", {"acknowledged": True})["status"] == "open"
+    v.markets["ETH"].px = bid * 0.98
+    o = ex.fetch_order(lo["id"], "ETH/USDT", {"acknowledged": True})
+    assert o["status"] == "closed" and o["filled"] == 0.1
+    try:
+        ex.cancel_order(lo["id"], "ETH/USDT")
+        assert False
+    except ccxt.OrderNotFound:
+        pass
+
+    # перевод в субаккаунт: повтор с тем же transferId не списывает второй раз
+    usdt = v.usdt
+    req = {"transferId": "t-1", "coin": "USDT", "amount": "100", "fromMemberId": v.uid, "toMemberId": "200",
+           "fromAccountType": "UNIFIED", "toAccountType": "UNIFIED"}
+    ex.privatePostV5AssetTransferUniversalTransfer(req)
+    ex.privatePostV5AssetTransferUniversalTransfer(req)
+    assert v.usdt == usdt - 100 and v.subs == {"200": 100.0}
+    rows = ex.privateGetV5AssetTransferQueryUniversalTransferList({"transferId": "t-1"})["result"]["list"]
+    assert [r["status"] for r in rows] == ["SUCCESS"]
+    assert ex.transfer("USDT", 10, "UNIFIED", "FUND")["id"]
+
+
+def test_batch_orders():
+    v = Venue(markets=20, usdt=1_000.0, maker_fill_prob=0.0, vol=0.0)
+    ex = FakeBybit({"enableRateLimit": False}, venue=v)
+    ex.load_markets()
+    px = ex.fetch_ticker("ETH/USDT")["last"]
+    # вторая покупка не проходит по балансу — остальные в пачке встают
+    levels = (("b-1", 0.1, 0.9), ("b-2", 10.0, 0.9), ("b-3", 0.1, 0.8))
+    orders = ex.create_orders([{"symbol": "ETH/USDT", "type": "limit", "side": "buy", "amount": qty,
+                                "price": px * k, "params": {"orderLinkId": link}} for link, qty, k in levels])
+    assert v.calls["v5/order/create-batch"] == 1
+    ok = {o["clientOrderId"]: o["id"] for o in orders if o["id"]}
+    assert set(ok) == {"b-1", "b-3"} and len(v.open["spotETH"]) == 2
+    bad = [o for o in orders if not o["id"]]
+    assert len(bad) == 1 and bad[0]["info"]["code"] == 170131
+    try:
+        ex.create_orders([{"symbol": "ETH/USDT", "type": "limit", "side": "buy", "amount": 0.01, "price": px * 0.5}] * 11)
+        assert False
+    except ccxt.ExchangeError:
+        pass
+
+
+def test_errors_latency_async():
+    v = Venue(markets=20, errors={"v5/market/tickers": (1.0, "rate")})
+    ex = FakeBybit({"enableRateLimit": False}, venue=v)
+    ex.load_markets()
+    try:
+        ex.fetch_ticker("BTC/USDT")
+        assert False
+    except ccxt.RateLimitExceeded:
+        pass
+    v.errors = {"v5/market/tickers": (1.0, "timeout")}
+    try:
+        ex.fetch_ticker("BTC/USDT")
+        assert False
+    except ccxt.RequestTimeout:
+        pass
+    v.errors = {}
+    v.reset_calls()
+
+    v.latency = 0.05
+    aex = FakeBybitAsync({"enableRateLimit": False}, venue=v)
+    aex.set_markets(ex.markets, ex.currencies)
+
+    async def run():
+        t0 = time.monotonic()
+        await asyncio.gather(*(aex.fetch_ticker(s) for s in ("BTC/USDT", "ETH/USDT", "SOL/USDT", "DOGE/USDT")))
+        dt = time.monotonic() - t0
+        await aex.close()
+        return dt
+
+    # задержка — на вызов, запросы идут параллельно
+    assert 0.05 <= asyncio.run(run()) < 0.15
+    assert v.reset_calls() == {"v5/market/tickers": 4}
+
+
+if __name__ == "__main__":
+    test_markets_tickers_funding()
+    test_orders_account_transfers()
+    test_errors_latency_async()
+    print("✅ fake bybit OK")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Проверка шлюза: один лидер на каталог, объединение подписок ботов, снимки
+аккаунта и тикеров на диске, отказ по возрасту и своей сделке, смена лидера.
+"""
+
+import os
+import tempfile
+import time
+
+from common.fake_bybit import FakeBybit, Venue
+from common.gateway import Gateway
+
+
+def test_leader_publishes_for_followers():
+    d = tempfile.mkdtemp(prefix="gw_")
+    v = Venue(markets=20)
+    ex = FakeBybit({"enableRateLimit": False}, venue=v)
+    ex.load_markets()
+    v.reset_calls()
+    l1 = Gateway(ex, "l1", d, interval_sec=1.0, max_age_sec=5.0, account=True)
+    grid = Gateway(ex, "grid", d, interval_sec=1.0, max_age_sec=5.0)
+    l1.subscribe("linear", {"BTCUSDT": "BTC/USDT:USDT"})
+    grid.subscribe("spot", {"DOGEUSDT": "DOGE/USDT"})
+    assert grid.ticker("DOGE/USDT") is None and l1.account() is None
+
+    grid.step()   # подписка на диск; лидер — grid, опрос только по своей подписке
+    assert v.reset_calls() == {"v5/market/tickers": 1}
+    l1.step()     # лок занят: только подписка
+    assert grid.leader and not l1.leader
+    grid.step()   # опрос по объединению подписок
+    assert v.reset_calls() == {"v5/account/wallet-balance": 1, "v5/position/list": 1, "v5/market/tickers": 2}
+
+    t = grid.ticker("DOGE/USDT")
+    assert t["bid"] < t["ask"] and t["info"]["symbol"] == "DOGEUSDT"
+    wb, pages = l1.account()
+    assert float(wb["result"]["list"][0]["totalEquity"]) == 10_000.0 and len(pages) == 1
+    # l1 читает и чужие подписки, если подписался сам
+    l1.subscribe("spot", {"DOGEUSDT": "DOGE/USDT"})
+    assert not l1.is_stale("DOGE/USDT") and l1.is_stale("BTC/USDT")
+    # снимок, снятый раньше своей сделки, не годится; старый — тоже
+    assert l1.account(newer_than=time.time() + 1) is None
+    l1.max_age_sec = 0.0
+    assert l1.account() is None and l1.ticker("BTC/USDT:USDT") is None
+    assert v.reset_calls() == {}
+
+    # лидер ушёл — лок подхватывает следующий
+    grid.stop()
+    l1.step()
+    assert l1.leader and os.path.exists(os.path.join(d, "leader.lock"))
+    l1.stop()
+
+
+if __name__ == "__main__":
+    test_leader_publishes_for_followers()
+    print("✅ gateway OK")
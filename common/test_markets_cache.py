@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Проверка снимка рынков: урезание, старт из снимка, фоновое обновление, TTL и работа без API.
+"""
+
+import json
+import tempfile
+import time
+
+import ccxt
+
+from common.markets_cache import load_markets_cached, snapshot_path
+
+
+def _market(base, swap=False):
+    sym = f"{base}/USDT:USDT" if swap else f"{base}/USDT"
+    return {"id": f"{base}USDT", "symbol": sym, "base": base, "quote": "USDT", "settle": "USDT" if swap else None,
+            "baseId": base, "quoteId": "USDT", "type": "swap" if swap else "spot", "spot": not swap, "swap": swap,
+            "linear": True if swap else None, "inverse": False if swap else None, "contract": swap,
+            "active": True, "precision": {"amount": 0.001, "price": 0.01},
+            "limits": {"amount": {"min": 0.001}, "cost": {"min": 5}}, "info": {}}
+
+
+ALL = [_market(b, swap) for b in ("BTC", "ETH", "SOL", "DOGE", "XRP") for swap in (False, True)]
+
+
+class OfflineBybit(ccxt.bybit):
+    """bybit без сети: рынки отдаются из ALL, API можно «уронить»."""
+    down = False
+    fetches = 0
+
+    def fetch_markets(self, params={}):
+        if self.down:
+            raise ccxt.NetworkError("api down")
+        OfflineBybit.fetches += 1
+        return [dict(m) for m in ALL]
+
+    def fetch_currencies(self, params={}):
+        return None
+
+
+def _ex(down=False):
+    ex = OfflineBybit()
+    ex.down = down
+    return ex
+
+
+def _wait(cond, timeout=2.0):
+    t0 = time.monotonic()
+    while not cond() and time.monotonic() - t0 < timeout:
+        time.sleep(0.01)
+
+
+def test_api_then_snapshot_trimmed():
+    with tempfile.TemporaryDirectory() as d:
+        OfflineBybit.fetches = 0
+        ex = _ex()
+        assert load_markets_cached(ex, ["BTC/USDT", "ETH/USDT"], "t", shared_dir=d) == "api"
+        assert set(ex.markets) == {"BTC/USDT", "BTC/USDT:USDT", "ETH/USDT", "ETH/USDT:USDT"}
+        snap = json.load(open(snapshot_path(ex.id, "t", d)))
+        assert len(snap["markets"]) == 4 and snap["symbols"] == ["BTC/USDT", "ETH/USDT"]
+
+        refreshed = []
+        ex2 = _ex()
+        src = load_markets_cached(ex2, ["BTC/USDT"], "t", shared_dir=d, on_refresh=lambda: refreshed.append(1))
+        assert src == "snapshot" and "BTC/USDT:USDT" in ex2.markets
+        _wait(lambda: refreshed)
+        assert refreshed and OfflineBybit.fetches == 2
+
+        # background=False: фоновое обновление — за ботом, снимок только читается
+        assert load_markets_cached(_ex(), ["BTC/USDT"], "t", shared_dir=d, background=False) == "snapshot"
+        time.sleep(0.05)
+        assert OfflineBybit.fetches == 2
+
+
+def test_expired_or_uncovered_snapshot_goes_to_api():
+    with tempfile.TemporaryDirectory() as d:
+        load_markets_cached(_ex(), ["BTC/USDT"], "t", shared_dir=d)
+        assert load_markets_cached(_ex(), ["SOL/USDT"], "t", shared_dir=d) == "api"
+        path = snapshot_path("bybit", "t", d)
+        snap = json.load(open(path))
+        snap["ts"] -= 10
+        json.dump(snap, open(path, "w"))
+        assert load_markets_cached(_ex(), ["SOL/USDT"], "t", ttl_sec=5, shared_dir=d) == "api"
+
+
+def test_api_down_uses_stale_snapshot():
+    with tempfile.TemporaryDirectory() as d:
+        load_markets_cached(_ex(), ["DOGE/USDT"], "t", shared_dir=d)
+        ex = _ex(down=True)
+        assert load_markets_cached(ex, ["DOGE/USDT"], "t", ttl_sec=0, shared_dir=d) == "stale-snapshot"
+        assert "DOGE/USDT:USDT" in ex.markets
+        try:
+            load_markets_cached(_ex(down=True), ["XRP/USDT"], "t", shared_dir=d)
+            assert False, "без снимка и без API старт должен падать"
+        except ccxt.NetworkError:
+            pass
+
+
+if __name__ == "__main__":
+    test_api_then_snapshot_trimmed()
+    test_expired_or_uncovered_snapshot_goes_to_api()
+    test_api_down_uses_stale_snapshot()
+    print("✅ markets_cache OK")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Проверка метрик: формат экспозиции (кумулятивные бакеты, метка bot,
+замена рядов гейджа), замер REST-вызовов sync/asyncio ccxt с учётом
+ошибок по классу, запись файла для textfile collector.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import ccxt
+
+from common.metrics import BotMetrics, Registry, instrument_exchange
+
+
+def test_render_format():
+    r = Registry({"bot": "l1"})
+    h = r.histogram("x_seconds", "x", ("kind",), buckets=(0.1, 1.0))
+    g = r.gauge("exp_usdt", "e", ("symbol",))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, kind="market")
+    g.set(1.0, symbol="A/USDT")
+    g.replace({("B/USDT",): 2.5})
+    text = r.render()
+    assert 'x_seconds_bucket{kind="market",bot="l1",le="0.1"} 1' in text
+    assert 'x_seconds_bucket{kind="market",bot="l1",le="1.0"} 2' in text
+    assert 'x_seconds_bucket{kind="market",bot="l1",le="+Inf"} 3' in text
+    assert 'x_seconds_count{kind="market",bot="l1"} 3' in text and "# TYPE x_seconds histogram" in text
+    assert 'exp_usdt{symbol="B/USDT",bot="l1"} 2.5' in text and "A/USDT" not in text
+
+
+class FakeSync:
+    def request(self, path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+        if path == "v5/order/create":
+            raise ccxt.RateLimitExceeded("10006")
+        return {"retCode": 0}
+
+
+class FakeAsync:
+    async def request(self, path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+        if path == "v5/position/list":
+            raise ccxt.NetworkError("timeout")
+        return {"retCode": 0}
+
+
+def test_instrument_exchange_sync_and_async():
+    m = BotMetrics("l1", "")
+    ex, aex = instrument_exchange(FakeSync(), m), instrument_exchange(FakeAsync(), m)
+    assert ex.request("v5/market/tickers", "public") == {"retCode": 0}
+    try:
+        ex.request("v5/order/create", "private", "POST")
+        assert False
+    except ccxt.RateLimitExceeded:
+        pass
+
+    async def run():
+        await aex.request("v5/market/tickers")
+        try:
+            await aex.request("v5/position/list", "private")
+        except ccxt.NetworkError:
+            return True
+
+    assert asyncio.run(run())
+    assert m.api.count(endpoint="v5/market/tickers") == 2 and m.api.count(endpoint="v5/order/create") == 1
+    assert m.api_errors.get(endpoint="v5/order/create", error="RateLimitExceeded") == 1
+    assert m.api_errors.get(endpoint="v5/position/list", error="NetworkError") == 1
+
+
+def test_textfile_written():
+    with tempfile.TemporaryDirectory() as d:
+        m = BotMetrics("flow", d)
+        m.equity.set(1234.5)
+        m.registry.write(m.path)
+        with open(os.path.join(d, "flow.prom")) as f:
+            assert 'bot_equity_usdt{bot="flow"} 1234.5' in f.read()
+        assert os.listdir(d) == ["flow.prom"]
+
+
+if __name__ == "__main__":
+    test_render_format()
+    test_instrument_exchange_sync_and_async()
+    test_textfile_written()
+    print("✅ metrics OK")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Проверка уведомлений: notify() не ждёт сеть, склейка пачки за окно,
+критические — первыми и без окна, вытеснение при переполнении, 429.
+"""
+
+import threading
+import time
+
+from common.notifier import Notifier, pack
+
+
+class SlowSend:
+    """Отправка с задержкой; пишет тексты и моменты отправки."""
+
+    def __init__(self, delay=0.0, fail_429=0):
+        self.delay = delay
+        self.fail_429 = fail_429
+        self.texts = []
+        self.times = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, text):
+        self.gate.wait()
+        time.sleep(self.delay)
+        if self.fail_429 > 0:
+            self.fail_429 -= 1
+            e = RuntimeError("Flood control exceeded")
+            e.retry_after = 0.05
+            raise e
+        self.texts.append(text)
+        self.times.append(time.monotonic())
+
+
+def test_notify_does_not_block_and_coalesces():
+    send = SlowSend(delay=0.5)
+    n = Notifier(send, window_sec=0.1, min_interval_sec=0.0)
+    t0 = time.monotonic()
+    for i in range(5):
+        assert n.notify(f"🟢 L1 OPEN C{i}")
+    assert time.monotonic() - t0 < 0.05
+    assert n.flush(5)
+    assert send.texts == ["\n\n".join(f"🟢 L1 OPEN C{i}" for i in range(5))]
+
+
+def test_critical_first_and_without_window():
+    send = SlowSend()
+    n = Notifier(send, window_sec=5.0, min_interval_sec=0.0)
+    n.notify("🟢 open")
+    n.notify("⛔️ Дневной лимит просадки")
+    t0 = time.monotonic()
+    while not send.texts and time.monotonic() - t0 < 2:
+        time.sleep(0.01)
+    assert send.texts == ["⛔️ Дневной лимит просадки\n\n🟢 open"]
+
+
+def test_overflow_drops_oldest_normal_and_keeps_critical():
+    send = SlowSend()
+    send.gate.clear()  # сеть «висит»: первая пачка ушла в отправку
+    n = Notifier(send, window_sec=0.0, min_interval_sec=0.0, max_queue=3)
+    n.notify("a")
+    time.sleep(0.05)
+    for m in ("❗️crit", "b", "c", "d"):
+        n.notify(m)
+    assert n.dropped == 1
+    send.gate.set()
+    assert n.flush(5)
+    assert send.texts == ["a", "❗️crit\n\nc\n\nd"]
+
+
+def test_rate_limit_and_retry_after():
+    send = SlowSend(fail_429=1)
+    n = Notifier(send, window_sec=0.0, min_interval_sec=0.2, max_len=10)
+    n.notify("x" * 8)
+    n.notify("y" * 8)
+    assert n.flush(5)
+    assert send.texts == ["x" * 8, "y" * 8] and n.errors == 0
+    assert send.times[1] - send.times[0] >= 0.2
+    assert pack(["z" * 20], 10) == ["z" * 10]
+
+
+if __name__ == "__main__":
+    test_notify_does_not_block_and_coalesces()
+    test_critical_first_and_without_window()
+    test_overflow_drops_oldest_normal_and_keeps_critical()
+    test_rate_limit_and_retry_after()
+    print("✅ notifier OK")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Проверка планировщика: классы эндпоинтов v5, резерв бюджета под срочные
+запросы, 10006 тормозит только свой класс, повтор GET, метрики по классам.
+"""
+
+import asyncio
+import time
+
+import ccxt
+
+from common.metrics import Registry
+from common.ratelimit import ACCOUNT, MARKET, ORDER, REPORT, Scheduler, schedule_exchange
+
+CLASSES = (
+    ("order", ("v5/order/create",), 10.0, ORDER),
+    ("position", ("v5/position/",), 10.0, ACCOUNT),
+    ("market", ("v5/market/",), 10.0, MARKET),
+)
+
+
+def test_classify_and_reserve():
+    s = Scheduler(CLASSES, ip_rate=10.0, safety=1.0)
+    assert s.classify("v5/order/create")[0] == "order" and s.classify("v5/order/realtime")[0] == "other"
+    # рыночные данные выбирают IP-бюджет до резерва 30%: 7 запросов без ожидания, восьмой ждёт
+    assert all(s._try("market", MARKET) == 0 for _ in range(7))
+    assert s._try("market", MARKET) > 0
+    # ордер берёт остаток резерва сразу
+    t0 = time.monotonic()
+    s.acquire("v5/order/create")
+    assert time.monotonic() - t0 < 0.01
+    # отчёты (резерв 50%) ждут, пока бакет не наполнится
+    with s.priority(REPORT):
+        assert s._prio(s.classify("v5/market/tickers")) == REPORT
+        assert s._prio(s.classify("v5/order/create")) == ORDER
+    assert s._prio(s.classify("v5/market/tickers")) == MARKET
+
+
+def test_penalize_only_own_class():
+    s = Scheduler(CLASSES, ip_rate=1000.0, safety=1.0)
+    s.penalize("market", 0.2)
+    assert s._try("market", MARKET) > 0.1
+    assert s._try("position", ACCOUNT) == 0
+
+
+class Fake:
+    def __init__(self, fail):
+        self.fail = fail
+        self.calls = []
+        self.enableRateLimit = True
+
+    def request(self, path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+        self.calls.append((path, method))
+        if self.fail:
+            self.fail -= 1
+            raise ccxt.RateLimitExceeded("10006")
+        return {"retCode": 0}
+
+
+class FakeAsync(Fake):
+    async def request(self, path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+        return Fake.request(self, path, api, method, params)
+
+
+def test_penalty_until_header_reset():
+    s = Scheduler(CLASSES, ip_rate=1000.0, safety=1.0)
+    ex = schedule_exchange(Fake(fail=1), s)
+    # Bybit сообщает сброс лимита через 3 с — класс ждёт до него, а цикл видит остаток штрафа
+    ex.last_response_headers = {"X-Bapi-Limit-Reset-Timestamp": str(int((time.time() + 3.0) * 1000))}
+    try:
+        ex.request("v5/order/create", "private", "POST")
+        assert False
+    except ccxt.RateLimitExceeded:
+        pass
+    assert 2.5 < s.penalty_sec() <= 3.0 and s._try("order", ORDER) > 2.5
+    assert s._try("position", ACCOUNT) == 0
+
+
+def test_retry_get_once_and_metrics():
+    r = Registry({"bot": "l1"})
+    s = Scheduler(CLASSES, ip_rate=1000.0, safety=1.0, registry=r)
+    ex = schedule_exchange(Fake(fail=1), s)
+    assert not ex.enableRateLimit
+    s.buckets["position"].rate = 100.0  # penalize: 1 с × rate — ждём 1 с при rate=1, здесь 10 мс
+    s.buckets["position"].cap = 1.0
+    assert ex.request("v5/position/list", "private", "GET") == {"retCode": 0} and len(ex.calls) == 2
+    ex.fail = 1
+    try:
+        ex.request("v5/order/create", "private", "POST")
+        assert False
+    except ccxt.RateLimitExceeded:
+        pass
+    assert len(ex.calls) == 3
+    text = r.render()
+    assert 'bot_ratelimit_exceeded_total{cls="position",bot="l1"} 1.0' in text
+    assert 'bot_ratelimit_requests_total{cls="order",prio="order",bot="l1"} 1.0' in text
+
+    aex = schedule_exchange(FakeAsync(fail=0), s)
+    with s.priority(REPORT):
+        assert asyncio.run(aex.request("v5/market/tickers")) == {"retCode": 0}
+    assert 'cls="market",prio="report"' in r.render()
+
+
+if __name__ == "__main__":
+    test_classify_and_reserve()
+    test_penalize_only_own_class()
+    test_penalty_until_header_reset()
+    test_retry_get_once_and_metrics()
+    print("✅ ratelimit OK")
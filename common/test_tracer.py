@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Проверка трассировки: вложенность спанов (и в asyncio-задачах), выборка по
+корневому спану, ошибки пишутся всегда, dump() сбрасывает кольцо, спаны REST.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+from common.tracer import Tracer, trace_exchange
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_nesting_and_sampling():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "t.jsonl")
+        t = Tracer(path, sample=1.0, ring=100)
+        with t.span("cycle") as a:
+            a["symbols"] = 2
+            with t.span("symbol", sym="A/USDT"):
+                t.event("enter", ok=False)
+
+        async def task(sym):
+            with t.span("symbol", sym=sym):
+                await asyncio.sleep(0)
+
+        async def cycle():
+            with t.span("cycle", mode="async"):
+                await asyncio.gather(task("B/USDT"), task("C/USDT"))
+
+        asyncio.run(cycle())
+        assert t.flush()
+        recs = read(path)
+    by = {(r["n"], r.get("sym")): r for r in recs}
+    assert by[("enter", None)]["p"] == by[("symbol", "A/USDT")]["id"]
+    sync_cycle, async_cycle = [r for r in recs if r["n"] == "cycle"]
+    assert by[("symbol", "A/USDT")]["p"] == sync_cycle["id"] and sync_cycle["symbols"] == 2
+    assert by[("symbol", "B/USDT")]["p"] == by[("symbol", "C/USDT")]["p"] == async_cycle["id"]
+    assert all("ms" in r for r in recs if r["n"] != "enter")
+
+
+def test_unsampled_kept_in_ring_errors_written_and_dump():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "t.jsonl")
+        t = Tracer(path, sample=0.0, ring=3)
+        for i in range(5):
+            with t.span("cycle", i=i):
+                pass
+        try:
+            with t.span("db.trade"):
+                raise RuntimeError("locked")
+        except RuntimeError:
+            pass
+        assert t.flush()
+        recs = read(path)
+        assert [r["n"] for r in recs] == ["db.trade"] and recs[0]["err"] == "RuntimeError: locked"
+        t.dump("loop error")
+        assert t.flush()
+        recs = read(path)[1:]
+    # кольцо на 3 записи: маркер + две последние cycle + ошибка
+    assert recs[0]["n"] == "dump" and recs[0]["reason"] == "loop error"
+    assert [r.get("i") for r in recs[1:]] == [3, 4, None]
+
+
+class FakeEx:
+    def request(self, path, api="public", method="GET", params={}, headers=None, body=None, config={}):
+        return {"retCode": 0}
+
+
+def test_trace_exchange():
+    t = Tracer("", sample=1.0)
+    ex = trace_exchange(FakeEx(), t)
+    with t.span("cycle"):
+        ex.request("v5/market/tickers")
+    api, cycle = list(t.ring)
+    assert api[2] == "api" and api[5] == {"endpoint": "v5/market/tickers"} and api[1] == cycle[0]
+
+
+if __name__ == "__main__":
+    test_nesting_and_sampling()
+    test_unsampled_kept_in_ring_errors_written_and_dump()
+    test_trace_exchange()
+    print("✅ tracer OK")
@@ -0,0 +1,166 @@
+"""
+Лёгкая трассировка горячего пути: спаны (с длительностью) и события.
+
+Каждая запись — кортеж в кольцевом буфере в памяти (последние ring записей),
+без форматирования на горячем потоке. Сэмплирование — по корневому спану
+(обычно цикл): если цикл попал в выборку (sample — доля), все его вложенные
+спаны и события уходят в очередь фонового писателя, который пишет их JSON
+строками в файл. Кольцо целиком сбрасывается в файл по dump() — при ошибке
+цикла или по запросу (SIGUSR1). Ошибка внутри спана всегда пишется.
+
+Вложенность — через contextvars, поэтому работает и в asyncio-задачах.
+trace_exchange() оборачивает ex.request: каждый REST-вызов — спан api.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# (id спана, попал ли корень в выборку)
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=(0, False))
+
+
+class Tracer:
+    def __init__(self, path: str = "", sample: float = 0.0, ring: int = 4096, max_bytes: int = 50 * 2 ** 20):
+        self.path = path
+        self.sample = max(0.0, min(1.0, sample))
+        self.ring: deque = deque(maxlen=max(1, ring))
+        self.max_bytes = max_bytes
+        self.ids = itertools.count(1)
+        self.queue: deque = deque()
+        self.wake = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+
+    # ---- запись ----
+
+    def _emit(self, rec: tuple, sampled: bool):
+        self.ring.append(rec)
+        if (sampled or rec[6]) and self.path:
+            if len(self.queue) >= self.ring.maxlen:
+                self.dropped += 1
+                return
+            self.queue.append(rec)
+            self._start()
+            self.wake.set()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        parent, sampled = _current.get()
+        if not parent:
+            sampled = self.sample > 0 and random.random() < self.sample
+        sid = next(self.ids)
+        token = _current.set((sid, sampled))
+        ts = time.time()
+        t0 = time.perf_counter()
+        err = None
+        try:
+            yield attrs
+        except BaseException as e:
+            err = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            self._emit((sid, parent, name, ts, (time.perf_counter() - t0) * 1000.0, attrs, err), sampled)
+
+    def event(self, name: str, **attrs):
+        parent, sampled = _current.get()
+        self._emit((next(self.ids), parent, name, time.time(), None, attrs, None), sampled)
+
+    def wrap(self, fn: Callable, name: str) -> Callable:
+        """fn под спаном name (для подмены методов экземпляра, например st.flush)."""
+        def traced(*args, **kwargs):
+            with self.span(name):
+                return fn(*args, **kwargs)
+        return traced
+
+    def dump(self, reason: str = "manual"):
+        """Сбросить всё кольцо в файл (в фоне); маркер dump идёт первой записью."""
+        if not self.path:
+            return
+        recs = list(self.ring)
+        self.queue.append((0, 0, "dump", time.time(), None, {"reason": reason, "records": len(recs)}, None))
+        self.queue.extend(recs)
+        self._start()
+        self.wake.set()
+
+    def install_signal(self, signum: int = getattr(signal, "SIGUSR1", 0)):
+        """dump() по сигналу (kill -USR1 <pid>); только из главного потока."""
+        if signum:
+            signal.signal(signum, lambda *_: self.dump("signal"))
+
+    # ---- фоновый писатель ----
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="tracer-writer", daemon=True)
+            self.thread.start()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        self.wake.set()
+        while self.queue and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self.queue
+
+    def _run(self):
+        while True:
+            self.wake.wait(1.0)
+            self.wake.clear()
+            if not self.queue:
+                continue
+            try:
+                self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    while self.queue:
+                        f.write(to_json(self.queue.popleft()) + "\n")
+                        self.written += 1
+            except Exception as e:
+                print("tracer error:", e)
+                self.queue.clear()
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+
+def to_json(rec: tuple) -> str:
+    sid, parent, name, ts, ms, attrs, err = rec
+    d: Dict[str, Any] = {"ts": round(ts, 6), "id": sid, "p": parent, "n": name}
+    if ms is not None:
+        d["ms"] = round(ms, 3)
+    if err:
+        d["err"] = err
+    if attrs:
+        d.update(attrs)
+    return json.dumps(d, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def trace_exchange(ex, tracer: Tracer):
+    """Подменить ex.request: каждый REST-вызов — спан api с endpoint (sync и asyncio ccxt)."""
+    orig = ex.request
+
+    if asyncio.iscoroutinefunction(orig):
+        async def request(path, *args, **kwargs):
+            with tracer.span("api", endpoint=str(path)):
+                return await orig(path, *args, **kwargs)
+    else:
+        def request(path, *args, **kwargs):
+            with tracer.span("api", endpoint=str(path)):
+                return orig(path, *args, **kwargs)
+
+    ex.request = request
+    return ex
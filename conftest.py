@@ -0,0 +1,2 @@
+# Корень репозитория в sys.path: боты импортируют общий код как `common.*`
+# (в контейнерах он лежит рядом с main.py в /app).
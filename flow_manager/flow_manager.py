@@ -1,9 +1,26 @@
-import os, time, sqlite3
+import os, time, json, math, sqlite3, atexit
 import ccxt
 from pydantic import BaseModel, Field
 from telegram import Bot
 
+from common.fake_bybit import FakeBybit
+from common.gateway import Gateway
+from common.metrics import BotMetrics, instrument_exchange
+from common.notifier import Notifier
+
 DB_PATH = "/app/shared/ledger.db"
+# опрос по API, пока от L1 нет свежего пуша equity
+API_POLL_SEC = 300
+# очередь переводов L1 → L2 (таблица transfers):
+#   pending — доля прибыли ждёт, пока сумма не наберёт MIN_TRANSFER_USDT;
+#   sent — пачка с transferId отправлена или исход неизвестен: повтор с тем же transferId;
+#   done / failed — ответ биржи; batched — pending, ушедший в пачку (info = transferId); manual — без авто-перевода
+TRANSFER_COLUMNS = (("transfer_id", "TEXT"), ("attempts", "INTEGER DEFAULT 0"), ("updated", "REAL DEFAULT 0"))
+TRANSFER_DIRECTION = "L1->L2"
+MIN_TRANSFER_USDT = 10.0  # не гоняем копейки
+TRANSFER_RETRY_SEC = 60.0  # пауза перед повтором, дальше вдвое с каждой попыткой
+TRANSFER_RETRY_MAX_SEC = 3600.0
+TRANSFER_HISTORY_LIMIT = 20  # строк истории на запрос по одному transferId
 
 class Cfg(BaseModel):
     key: str = Field(..., alias="BYBIT_API_KEY")
@@ -17,34 +34,81 @@ class Cfg(BaseModel):
     enable_transfer: bool = Field(..., alias="BYBIT_ENABLE_AUTO_TRANSFER")
     sub_l2: str = Field("", alias="BYBIT_L2_SUBACCOUNT_ID")
     asset: str = Field("USDT", alias="BYBIT_TRANSFER_ASSET")
+    tg_coalesce_sec: float = Field(2.0, alias="TG_COALESCE_SEC")
+    tg_min_interval_sec: float = Field(1.0, alias="TG_MIN_INTERVAL_SEC")
+    tg_queue_max: int = Field(200, alias="TG_QUEUE_MAX")
+    metrics_dir: str = Field("/app/shared/metrics", alias="METRICS_TEXTFILE_DIR")
+    metrics_interval_sec: float = Field(15.0, alias="METRICS_INTERVAL_SEC")
+    fake_exchange: bool = Field(False, alias="BYBIT_FAKE")  # имитация биржи (common/fake_bybit.py)
+    watch_sec: float = Field(5.0, alias="FLOW_WATCH_SEC")  # проверка изменения ledger.db
+    push_max_age_sec: float = Field(900.0, alias="FLOW_PUSH_MAX_AGE_SEC")  # пуш L1 старше — опрос по API
+    gateway_enable: bool = Field(False, alias="GATEWAY_ENABLE")  # общий шлюз баланса/тикеров (common/gateway.py)
+    gateway_dir: str = Field("/app/shared/gateway", alias="GATEWAY_DIR")
+    gateway_interval_sec: float = Field(5.0, alias="GATEWAY_INTERVAL_SEC")
+    gateway_max_age_sec: float = Field(15.0, alias="GATEWAY_MAX_AGE_SEC")
 
 cfg = Cfg(**os.environ)
 bot = Bot(token=cfg.tg_token)
-ex = ccxt.bybit({"apiKey": cfg.key, "secret": cfg.sec, "enableRateLimit": True, "options": {"defaultType": "unified"}})
+# отправка в фоне: очередь со склейкой, ❗️/⛔️ — первыми
+notifier = Notifier(lambda text: bot.send_message(chat_id=cfg.tg_chat, text=text, disable_web_page_preview=True),
+                    window_sec=cfg.tg_coalesce_sec, min_interval_sec=cfg.tg_min_interval_sec,
+                    max_queue=cfg.tg_queue_max)
+atexit.register(notifier.close, 5.0)
+metrics = BotMetrics("flow", cfg.metrics_dir, cfg.metrics_interval_sec)
+ex = (FakeBybit if cfg.fake_exchange else ccxt.bybit)({"apiKey": cfg.key, "secret": cfg.sec, "enableRateLimit": True, "options": {"defaultType": "unified"}})
+instrument_exchange(ex, metrics)
+gateway = Gateway(ex, "flow", cfg.gateway_dir, cfg.gateway_interval_sec, cfg.gateway_max_age_sec,
+                  acct=cfg.acct, account=True) if cfg.gateway_enable else None
 
 def tg(msg: str):
-    try: bot.send_message(chat_id=cfg.tg_chat, text=msg[:4000], disable_web_page_preview=True)
-    except Exception as e: print("TG error:", e)
+    notifier.notify(msg)
 
 def sql_conn():
     con = sqlite3.connect(DB_PATH)
     con.execute("CREATE TABLE IF NOT EXISTS state(k TEXT PRIMARY KEY, v TEXT)")
+    # та же таблица, что создаёт L1; у старых баз — без колонок очереди переводов
+    con.execute("CREATE TABLE IF NOT EXISTS transfers(ts TEXT, direction TEXT, amount REAL, status TEXT, info TEXT)")
+    cols = {r[1] for r in con.execute("PRAGMA table_info(transfers)")}
+    for name, decl in TRANSFER_COLUMNS:
+        if name not in cols:
+            con.execute(f"ALTER TABLE transfers ADD COLUMN {name} {decl}")
+    con.commit()
     return con
 
+def wallet_balance():
+    """Сырой v5 wallet-balance: из снимка шлюза, если он свежий, иначе запросом."""
+    snap = gateway.account() if gateway is not None else None
+    if snap is not None:
+        return snap[0]
+    acct = (cfg.acct or "UNIFIED").upper()
+    return ex.private_get_v5_account_wallet_balance({"accountType": acct})
+
+def fetch_balance():
+    snap = gateway.account() if gateway is not None else None
+    if snap is not None:
+        return ex.parse_balance(snap[0])
+    return ex.fetch_balance(params={"type":"unified"})
+
 def total_equity():
-    bal = ex.fetch_balance(params={"type":"unified"}) or {}
-    total = (bal.get("total") or {})
-    usdt_total = float(total.get("USDT", 0.0))
-    return usdt_total
+    """totalEquity аккаунта из v5 wallet-balance — та же мера, что L1 пишет в пуш;
+    без неё — equity USDT в кошельке."""
+    wb = wallet_balance() or {}
+    acc = (((wb.get("result") or {}).get("list")) or [{}])[0]
+    equity = float(acc.get("totalEquity") or 0.0)
+    if equity <= 0.0:
+        for c in acc.get("coin") or []:
+            if (c.get("coin") or "").upper() == "USDT":
+                equity = float(c.get("equity") or c.get("walletBalance") or 0.0)
+                break
+    return equity
 
 def available_usdt():
-    bal = ex.fetch_balance(params={"type":"unified"}) or {}
+    bal = fetch_balance() or {}
     free = (bal.get("free") or {})
     usdt_free = float(free.get("USDT", 0.0) or 0.0)
     if usdt_free == 0.0:
         try:
-            acct = (cfg.acct or "UNIFIED").upper()
-            wb = ex.private_get_v5_account_wallet_balance({"accountType": acct})
+            wb = wallet_balance()
             coin_list = ((((wb or {}).get("result") or {}).get("list") or [{}])[0].get("coin") or [])
             for c in coin_list:
                 if (c.get("coin") or "").upper() == "USDT":
@@ -67,63 +131,304 @@ def available_usdt():
             pass
     return usdt_free
 
-def auto_transfer_to_sub(amount_usdt: float) -> str:
-    # Варианты: перевод в субаккаунт по API. В ccxt => transfer()
-    # fromAccount/toAccount значения специфичны для биржи; здесь используем "UNIFIED" -> "UNIFIED_SUBACCOUNT"
-    # Требует корректной настройки субаккаунта и прав ключа в Bybit!
+_uid = ""
+
+def main_uid() -> str:
+    """UID ключа (fromMemberId перевода): один вызов v5 user/query-api за жизнь процесса."""
+    global _uid
+    if not _uid:
+        res = ex.privateGetV5UserQueryApi() or {}
+        _uid = str((res.get("result") or {}).get("userID") or "")
+    return _uid
+
+def send_transfer(tid: str, amount: float) -> str:
+    """v5 universal-transfer основной → субаккаунт L2; статус биржи (SUCCESS/PENDING/...)."""
+    acct = (cfg.acct or "UNIFIED").upper()
+    req = {"transferId": tid, "coin": cfg.asset, "amount": f"{amount:.2f}", "fromMemberId": main_uid(),
+           "toMemberId": cfg.sub_l2, "fromAccountType": acct, "toAccountType": acct}
+    with metrics.order_fill.time(kind="transfer"):
+        res = ex.privatePostV5AssetTransferUniversalTransfer(req) or {}
+    return str((res.get("result") or {}).get("status") or "SUCCESS").upper()
+
+def transfer_status(tid: str) -> str:
+    """Статус перевода по transferId из истории universal-transfer; "" — биржа его не знает."""
+    res = ex.privateGetV5AssetTransferQueryUniversalTransferList(
+        {"transferId": tid, "limit": TRANSFER_HISTORY_LIMIT}) or {}
+    for r in (res.get("result") or {}).get("list") or []:
+        if r.get("transferId") == tid:
+            return str(r.get("status") or "").upper()
+    return ""
+
+def pending_usdt(con) -> float:
+    """Сумма, ещё не дошедшая до L2: очередь и пачки в полёте."""
+    cur = con.execute("SELECT COALESCE(SUM(amount), 0) FROM transfers WHERE direction=? AND status IN ('pending','sent')",
+                      (TRANSFER_DIRECTION,)).fetchone()
+    return float(cur[0] or 0.0)
+
+def queue_export(con, amount: float, new_start: float, info: str):
+    """Поставить долю прибыли в очередь и сдвинуть стартовую базу — одной транзакцией."""
+    with con:
+        con.execute("INSERT INTO transfers(ts, direction, amount, status, info, updated) VALUES(?,?,?,?,?,?)",
+                    (time.strftime("%Y-%m-%d %H:%M:%S"), TRANSFER_DIRECTION, amount, "pending", info, time.time()))
+        con.execute("INSERT OR REPLACE INTO state(k,v) VALUES(?,?)", ("L1_START_BASE_USDT", str(new_start)))
+
+def _settle(con, rowid: int, tid: str, amount: float, status: str, info: str):
+    """Итог пачки по статусу биржи: done, failed (сумма — обратно в очередь) или остаётся sent."""
+    now = time.time()
+    with con:
+        if status == "SUCCESS":
+            con.execute("UPDATE transfers SET status='done', info=?, updated=? WHERE rowid=?", (info[:500], now, rowid))
+        elif status == "FAILED":
+            con.execute("UPDATE transfers SET status='failed', info=?, updated=? WHERE rowid=?", (info[:500], now, rowid))
+            con.execute("INSERT INTO transfers(ts, direction, amount, status, info, updated) VALUES(?,?,?,?,?,?)",
+                        (time.strftime("%Y-%m-%d %H:%M:%S"), TRANSFER_DIRECTION, amount, "pending",
+                         f"requeue {tid}", now))
+        else:
+            con.execute("UPDATE transfers SET info=?, updated=? WHERE rowid=?", (info[:500], now, rowid))
+    if status == "SUCCESS":
+        tg(f"✅ Авто-перевод {amount:.2f} {cfg.asset} из L1 → L2 (субаккаунт {cfg.sub_l2}), transferId {tid}")
+    elif status == "FAILED":
+        tg(f"⚠️ Перевод {amount:.2f} {cfg.asset} в L2 отклонён ({info[:200]}); сумма снова в очереди")
+
+def _attempt(con, rowid: int, tid: str, amount: float, attempts: int, check_first: bool):
+    """Отправка пачки; повтор — сначала поиск transferId в истории, затем тот же transferId."""
+    with con:
+        con.execute("UPDATE transfers SET attempts=?, updated=? WHERE rowid=?", (attempts + 1, time.time(), rowid))
     try:
-        params = {
-            "transferId": ex.uuid(),
-            "fromSubAccountId": None,
-            "toSubAccountId": cfg.sub_l2,
-        }
-        res = ex.transfer(cfg.asset, amount_usdt, "UNIFIED", "UNIFIED", params)  # Bybit обрабатывает по subAccountId в params
-        return f"OK:{res}"
-    except Exception as e:
-        return f"ERR:{e}"
+        status = transfer_status(tid) if check_first else ""
+        if not status:
+            try:
+                status = send_transfer(tid, amount)
+            except ccxt.NetworkError:
+                raise
+            except ccxt.BaseError as e:
+                # отказ может быть и повтором уже прошедшего transferId — решает история по этому id
+                status = transfer_status(tid)
+                if not status:
+                    _settle(con, rowid, tid, amount, "FAILED", str(e))
+                    return
+        _settle(con, rowid, tid, amount, status, status)
+    except ccxt.NetworkError as e:
+        # таймаут/обрыв/10006: исход неизвестен — пачка остаётся sent до следующей попытки
+        print("transfer error:", e)
+        with con:
+            con.execute("UPDATE transfers SET info=? WHERE rowid=?", (f"retry: {e}"[:500], rowid))
+    except ccxt.BaseError as e:
+        # история по transferId недоступна: без ответа о судьбе пачки в очередь её не возвращаем
+        print("transfer error:", e)
+        with con:
+            con.execute("UPDATE transfers SET info=? WHERE rowid=?", (f"retry: {e}"[:500], rowid))
+
+def _backoff(attempts: int) -> float:
+    return min(TRANSFER_RETRY_MAX_SEC, TRANSFER_RETRY_SEC * 2 ** max(0, attempts - 1))
+
+def process_transfers(con) -> float:
+    """Повторы пачек в полёте и отправка очереди, набравшей MIN_TRANSFER_USDT.
+    Не больше одной отправки на пачку за попытку. Возвращает секунды до следующей нужной попытки (inf — нечего)."""
+    now = time.time()
+    next_in = float("inf")
+    for rowid, tid, amount, attempts, updated in con.execute(
+            "SELECT rowid, transfer_id, amount, attempts, updated FROM transfers WHERE direction=? AND status='sent'",
+            (TRANSFER_DIRECTION,)).fetchall():
+        wait = float(updated or 0) + _backoff(int(attempts or 0)) - now
+        if wait > 0:
+            next_in = min(next_in, wait)
+            continue
+        _attempt(con, rowid, tid, float(amount), int(attempts or 0), check_first=int(attempts or 0) > 0)
+        next_in = min(next_in, _backoff(int(attempts or 0) + 1))
+
+    rows = con.execute("SELECT rowid, amount, updated FROM transfers WHERE direction=? AND status='pending'",
+                       (TRANSFER_DIRECTION,)).fetchall()
+    total = sum(float(a) for _, a, _ in rows)
+    if total < MIN_TRANSFER_USDT:
+        return next_in
+    # после отказа биржи — та же пауза, что и у повторов, по числу отказов подряд
+    fails = con.execute("SELECT COUNT(*), COALESCE(MAX(updated), 0) FROM transfers WHERE direction=? AND status='failed' "
+                        "AND updated > (SELECT COALESCE(MAX(updated), 0) FROM transfers WHERE direction=? AND status='done')",
+                        (TRANSFER_DIRECTION, TRANSFER_DIRECTION)).fetchone()
+    wait = float(fails[1]) + _backoff(int(fails[0])) - now if fails[0] else 0.0
+    if wait > 0:
+        return min(next_in, wait)
+    ids = [r[0] for r in rows]
+    marks = ",".join("?" * len(ids))
+    if not (cfg.enable_transfer and cfg.sub_l2):
+        # Чёткая инструкция на ручной перевод (если авто отключён)
+        with con:
+            con.execute(f"UPDATE transfers SET status='manual', updated=? WHERE rowid IN ({marks})", (now, *ids))
+        tg(
+            f"📤 Рекомендован перевод в L2: {total:.2f} {cfg.asset}\n"
+            f"Причина: прибыль L1 выше порога {cfg.pnl_thr * 100:.1f}% от стартовой базы.\n"
+            f"Действие: Выполни внутренний трансфер на Bybit в субаккаунт L2 или на биржу/кошелёк L2.\n"
+            f"Подсказка: Bybit → Assets → Transfer → From: Unified(Main) → To: SubAccount(L2) → {cfg.asset} → {total:.2f}"
+        )
+        return next_in
+    # пачка: копейки сверх 2 знаков остаются в очереди; transferId фиксируется до отправки
+    amount = math.floor(total * 100) / 100
+    tid = ex.uuid()
+    with con:
+        con.execute(f"UPDATE transfers SET status='batched', info=?, updated=? WHERE rowid IN ({marks})", (tid, now, *ids))
+        cur = con.execute("INSERT INTO transfers(ts, direction, amount, status, info, transfer_id, attempts, updated) "
+                          "VALUES(?,?,?,?,?,?,?,?)", (time.strftime("%Y-%m-%d %H:%M:%S"), TRANSFER_DIRECTION, amount,
+                                                      "sent", f"batch of {len(ids)}", tid, 0, now))
+        if total - amount > 1e-9:
+            con.execute("INSERT INTO transfers(ts, direction, amount, status, info, updated) VALUES(?,?,?,?,?,?)",
+                        (time.strftime("%Y-%m-%d %H:%M:%S"), TRANSFER_DIRECTION, total - amount, "pending",
+                         f"remainder {tid}", now))
+    _attempt(con, cur.lastrowid, tid, amount, 0, check_first=False)
+    return min(next_in, _backoff(1))
+
+def reconcile_transfers(con):
+    """На старте: каждая пачка sent ищется в истории по своему transferId (запрос на пачку).
+    Найденная получает статус биржи; не найденная сразу отправляется снова с тем же transferId."""
+    sent = con.execute("SELECT rowid, transfer_id, amount, attempts FROM transfers WHERE direction=? AND status='sent'",
+                       (TRANSFER_DIRECTION,)).fetchall()
+    for rowid, tid, amount, attempts in sent:
+        _attempt(con, rowid, tid, float(amount), int(attempts or 0), check_first=True)
+    if sent:
+        print(f"[transfers] сверка: {len(sent)} в полёте")
+
+def sync_start_base(con):
+    """Стартовая база из SQLite (её двигают и L1, и flow), если есть."""
+    cur = con.execute("SELECT v FROM state WHERE k=?", ("L1_START_BASE_USDT",)).fetchone()
+    if cur:
+        try:
+            cfg.start_base = float(cur[0])
+        except Exception:
+            pass
+
+def export_rule(con, eq: float, available):
+    """Equity против стартовой базы; при приросте выше порога — экспорт части прибыли в L2.
+    available() — свободные USDT, спрашиваются только при срабатывании порога."""
+    metrics.equity.set(eq)
+    start = cfg.start_base
+    # прибыль L1 как (equity - start) — в простом варианте, т.к. L1 — единственный потребитель капитала в этом стеке
+    pnl = max(0.0, eq - start)
+    thr_val = start * cfg.pnl_thr
+    if pnl >= thr_val:
+        export_amt = pnl * cfg.export_share
+        avail = available()
+        metrics.available.set(avail)
+        # очередь и пачки в полёте ещё лежат на L1 — второй раз их не экспортируем
+        export_amt = max(0.0, min(export_amt, avail - pending_usdt(con)))
+        if export_amt > 0:
+            # Обновляем «стартовую базу» под новую ступень, чтобы компаунд продолжался;
+            # доля меньше MIN_TRANSFER_USDT копится в очереди до следующих
+            queue_export(con, export_amt, start + export_amt, f"pnl={pnl:.2f} thr={thr_val:.2f}")
+            cfg.start_base = start + export_amt
+    return process_transfers(con)
+
+def tick():
+    """Проход по API: без свежего пуша от L1 (L1 остановлен или ещё не писал)."""
+    con = sql_conn()
+    try:
+        sync_start_base(con)
+        return export_rule(con, total_equity(), available_usdt)
+    finally:
+        con.close()
+
+def read_push(con):
+    """Последний пуш L1 (state L1_EQUITY_PUSH): {"ts", "equity", "free"} или None."""
+    cur = con.execute("SELECT v FROM state WHERE k=?", ("L1_EQUITY_PUSH",)).fetchone()
+    try:
+        push = json.loads(cur[0]) if cur else None
+        return push if push and float(push.get("ts") or 0) > 0 else None
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+def push_fresh(push) -> bool:
+    return push is not None and time.time() - float(push["ts"]) <= cfg.push_max_age_sec
+
+def on_push(push):
+    """Новый пуш L1: правило экспорта — только если equity ушла за порог, без вызовов API до перевода.
+    Как и tick(), возвращает секунды до следующей попытки по очереди переводов (None — правило не сработало)."""
+    con = sql_conn()
+    try:
+        sync_start_base(con)
+        eq = float(push.get("equity") or 0.0)
+        metrics.equity.set(eq)
+        if eq - cfg.start_base >= cfg.start_base * cfg.pnl_thr:
+            return export_rule(con, eq, lambda: float(push.get("free") or 0.0))
+        return None
+    finally:
+        con.close()
+
+class LedgerWatch:
+    """Изменение ledger.db (и его -wal) по mtime/размеру — без открытия SQLite."""
+
+    def __init__(self, path: str):
+        self.paths = (path, path + "-wal")
+        self.sig = None
+
+    def changed(self) -> bool:
+        sig = []
+        for p in self.paths:
+            try:
+                st = os.stat(p)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        sig = tuple(sig)
+        if sig == self.sig:
+            return False
+        self.sig = sig
+        return True
+
+def transfers_step(reconcile: bool = False) -> float:
+    """Очередь переводов вне правила экспорта: сверка на старте, повторы по расписанию."""
+    con = sql_conn()
+    try:
+        if reconcile:
+            reconcile_transfers(con)
+        return process_transfers(con)
+    finally:
+        con.close()
+
+class FlowLoop:
+    """Шаг главного цикла. L1 пишет equity в общий ledger (L1_EQUITY_PUSH): реагируем на изменение
+    файла базы, каждый пуш — один раз; пока пуша нет или он старше FLOW_PUSH_MAX_AGE_SEC —
+    прежний опрос API раз в 5 минут."""
+
+    def __init__(self, retry_at: float = 0.0):
+        self.watch = LedgerWatch(DB_PATH)
+        self.push, self.seen_ts, self.last_poll = None, 0.0, None
+        self.retry_at = retry_at
+
+    def step(self):
+        if self.watch.changed():
+            con = sql_conn()
+            self.push = read_push(con)
+            con.close()
+            if push_fresh(self.push) and float(self.push["ts"]) > self.seen_ts:
+                self.seen_ts = float(self.push["ts"])
+                t0 = time.monotonic()
+                nxt = on_push(self.push)
+                if nxt is not None:
+                    self.retry_at = time.monotonic() + nxt
+                metrics.cycle.observe(time.monotonic() - t0)
+        if not push_fresh(self.push) and (self.last_poll is None
+                                          or time.monotonic() - self.last_poll >= API_POLL_SEC):
+            self.last_poll = time.monotonic()
+            self.retry_at = time.monotonic() + tick()
+            metrics.cycle.observe(time.monotonic() - self.last_poll)
+        if time.monotonic() >= self.retry_at:
+            self.retry_at = time.monotonic() + transfers_step()
 
 def main():
     tg("🧭 Flow-manager запущен.")
-    # базовая логика: раз в 5 минут проверяем прирост L1 vs стартовая база; если > порога — экспорт части прибыли в L2
+    metrics.start()
+    if gateway is not None:
+        gateway.start()
+    # очередь переводов: сверка пачек в полёте с историей биржи, затем повторы без новых пушей
+    retry_at = 0.0
+    try:
+        retry_at = time.monotonic() + transfers_step(reconcile=True)
+    except Exception as e:
+        print("transfers error:", e)
+    loop = FlowLoop(retry_at)
     while True:
         try:
-            con = sql_conn()
-            # синхронизируем стартовую базу из SQLite, если есть
-            cur = con.execute("SELECT v FROM state WHERE k=?", ("L1_START_BASE_USDT",)).fetchone()
-            if cur:
-                try:
-                    cfg.start_base = float(cur[0])
-                except Exception:
-                    pass
-            eq = total_equity()
-            start = cfg.start_base
-            # прибыль L1 как (equity - start) — в простом варианте, т.к. L1 — единственный потребитель капитала в этом стеке
-            pnl = max(0.0, eq - start)
-            thr_val = start * cfg.pnl_thr
-            if pnl >= thr_val:
-                export_amt = pnl * cfg.export_share
-                export_amt = max(0.0, min(export_amt, available_usdt()))
-                if export_amt >= 10:  # не гоняем копейки
-                    if cfg.enable_transfer and cfg.sub_l2:
-                        res = auto_transfer_to_sub(export_amt)
-                        status = "✅" if res.startswith("OK:") else "⚠️"
-                        tg(f"{status} Авто-перевод {export_amt:.2f} {cfg.asset} из L1 → L2 (субаккаунт {cfg.sub_l2}). Результат: {res[:200]}")
-                    else:
-                        # Чёткая инструкция на ручной перевод (если авто отключён)
-                        tg(
-                            f"📤 Рекомендован перевод в L2: {export_amt:.2f} {cfg.asset}\n"
-                            f"Причина: L1 прирос на {pnl:.2f} USDT (порог {thr_val:.2f}).\n"
-                            f"Действие: Выполни внутренний трансфер на Bybit в субаккаунт L2 или на биржу/кошелёк L2.\n"
-                            f"Подсказка: Bybit → Assets → Transfer → From: Unified(Main) → To: SubAccount(L2) → {cfg.asset} → {export_amt:.2f}"
-                        )
-                    # Обновляем «стартовую базу» под новую ступень, чтобы компаунд продолжался
-                    new_start = start + export_amt
-                    # сохраняем в state
-                    con.execute("INSERT OR REPLACE INTO state(k,v) VALUES(?,?)", ("L1_START_BASE_USDT", str(new_start)))
-                    con.commit()
-                    cfg.start_base = new_start
-            con.close()
-            time.sleep(300)
+            loop.step()
+            time.sleep(cfg.watch_sec)
         except Exception as e:
             tg(f"❗️Flow-manager error: {e}")
             time.sleep(10)
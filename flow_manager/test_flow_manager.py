@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Проверка flow-manager на имитации Bybit: очередь переводов в L2 (пачки от 10 USDT,
+повтор с тем же transferId, отказ и возврат в очередь, сверка на старте, ручной режим),
+реакция на пуш L1 и опрос API без свежего пуша.
+"""
+
+import importlib.util
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import ccxt
+
+from common.fake_bybit import Venue
+
+ENV = {
+    "BYBIT_API_KEY": "k", "BYBIT_API_SECRET": "s", "BYBIT_ACCOUNT_TYPE": "unified", "BYBIT_FAKE": "true",
+    "TG_BOT_TOKEN": "123456:test", "TG_CHAT_ID": "0", "METRICS_TEXTFILE_DIR": "",
+    "L1_START_BASE_USDT": "1000", "L1_PNL_THRESHOLD_TO_L2": "0.02", "L1_PNL_EXPORT_SHARE": "0.1",
+    "BYBIT_ENABLE_AUTO_TRANSFER": "true", "BYBIT_L2_SUBACCOUNT_ID": "200",
+}
+_fm = None
+
+
+def flow(tmp_path=None, auto=True):
+    """Модуль flow-manager (env — только на время импорта) с новой базой и биржей."""
+    global _fm
+    if _fm is None:
+        saved = dict(os.environ)
+        os.environ.update(ENV)
+        try:
+            spec = importlib.util.spec_from_file_location("flow_main", os.path.join(os.path.dirname(__file__),
+                                                                                     "flow_manager.py"))
+            _fm = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(_fm)
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+        _fm.ex.enableRateLimit = False
+        _fm.real_send = _fm.send_transfer
+        _fm.real_status = _fm.transfer_status
+    fm = _fm
+    fm.DB_PATH = os.path.join(str(tmp_path or tempfile.mkdtemp()), "ledger.db")
+    fm.ex.venue = Venue(markets=20, usdt=10_000.0)
+    fm.send_transfer, fm.transfer_status = fm.real_send, fm.real_status
+    fm.cfg.start_base, fm.cfg.enable_transfer = 1000.0, auto
+    fm._uid = ""
+    fm.sent_tg = []
+    fm.tg = fm.sent_tg.append
+    return fm
+
+
+def rows(fm):
+    con = sqlite3.connect(fm.DB_PATH)
+    out = con.execute("SELECT amount, status, transfer_id FROM transfers ORDER BY rowid").fetchall()
+    con.close()
+    return out
+
+
+def export(fm, gain: float):
+    """Пуш L1 с приростом gain сверх порога от текущей базы."""
+    con = fm.sql_conn()
+    eq = fm.cfg.start_base * (1 + fm.cfg.pnl_thr) + gain
+    fm.export_rule(con, eq, lambda: 10_000.0)
+    con.close()
+
+
+def make_due(fm):
+    con = fm.sql_conn()
+    with con:
+        con.execute("UPDATE transfers SET updated=0")
+    fm.process_transfers(con)
+    con.close()
+
+
+def test_batching_with_remainder(tmp_path=None):
+    fm = flow(tmp_path)
+    v = fm.ex.venue
+    export(fm, 1.0)        # доля 2.1 — в очереди, без вызовов API
+    export(fm, 30.0)
+    assert [r[1] for r in rows(fm)] == ["pending", "pending"] and not v.calls
+    export(fm, 40.0)       # очередь > 10: одна пачка, копейки сверх 2 знаков — остатком
+    assert [r[1] for r in rows(fm)] == ["batched", "batched", "batched", "done", "pending"]
+    batch, rest = rows(fm)[3], rows(fm)[4]
+    assert abs(v.subs["200"] - batch[0]) < 1e-9 and 0 < rest[0] < 0.01
+    assert v.calls["v5/asset/transfer/universal-transfer"] == 1
+    print("✅ Пачка от 10 USDT с остатком")
+
+
+def test_timeout_retry_same_id(tmp_path=None):
+    fm = flow(tmp_path)
+    v = fm.ex.venue
+
+    def lost(tid, amount):   # перевод прошёл, ответ потерян
+        fm.real_send(tid, amount)
+        raise ccxt.RequestTimeout("lost reply")
+    fm.send_transfer = lost
+    export(fm, 150.0)
+    batch = rows(fm)[1]
+    assert batch[1] == "sent" and v.subs["200"] == batch[0]
+    fm.send_transfer = fm.real_send
+    v.calls.clear()
+    make_due(fm)
+    # повтор находит перевод по transferId и второй раз не шлёт
+    assert rows(fm)[1][1:] == ("done", batch[2]) and v.subs["200"] == batch[0]
+    assert v.calls["v5/asset/transfer/universal-transfer"] == 0
+
+    # таймаут до биржи: повтор с тем же transferId
+    def dropped(tid, amount):
+        raise ccxt.RequestTimeout("no reply")
+    fm.send_transfer = dropped
+    export(fm, 150.0)
+    tid = [r[2] for r in rows(fm) if r[2]][-1]
+    fm.send_transfer = fm.real_send
+    make_due(fm)
+    assert [r[1] for r in rows(fm) if r[2] == tid] == ["done"] and set(v.transfers) == {batch[2], tid}
+    print("✅ Повтор с тем же transferId")
+
+
+def test_duplicate_rejection_is_looked_up(tmp_path=None):
+    fm = flow(tmp_path)
+    v = fm.ex.venue
+
+    def lost(tid, amount):
+        fm.real_send(tid, amount)
+        raise ccxt.RequestTimeout("lost reply")
+    fm.send_transfer = lost
+    export(fm, 150.0)
+    amount = rows(fm)[1][0]
+
+    # история ещё не видит перевод, повтор отвергнут как дубль transferId
+    lag = iter(["", "SUCCESS"])
+    fm.transfer_status = lambda tid: next(lag)
+
+    def duplicate(tid, amount):
+        raise ccxt.BadRequest("bybit duplicate transferId")
+    fm.send_transfer = duplicate
+    make_due(fm)
+    assert [r[1] for r in rows(fm)] == ["batched", "done"] and v.subs["200"] == amount
+    print("✅ Дубль transferId — поиск в истории, не возврат в очередь")
+
+
+def test_failed_requeued(tmp_path=None):
+    fm = flow(tmp_path)
+    v = fm.ex.venue
+    v.usdt = 1.0
+    export(fm, 150.0)
+    amount = rows(fm)[1][0]
+    assert [r[1] for r in rows(fm)] == ["batched", "failed", "pending"] and rows(fm)[2][0] == amount
+    assert any("⚠️" in m for m in fm.sent_tg)
+    con = fm.sql_conn()
+    assert abs(fm.pending_usdt(con) - amount) < 1e-9
+    # до конца паузы после отказа — без вызовов
+    v.calls.clear()
+    fm.process_transfers(con)
+    con.close()
+    assert not v.calls
+    v.usdt = 10_000.0
+    make_due(fm)
+    assert rows(fm)[-1][1] == "done" and v.subs["200"] == amount
+    print("✅ Отказ — сумма снова в очереди")
+
+
+def test_startup_reconcile(tmp_path=None):
+    fm = flow(tmp_path)
+    v = fm.ex.venue
+    ex = fm.ex
+    uid = fm.main_uid()
+    # прошедший перевод далеко в истории — за пределами одной страницы
+    ex.privatePostV5AssetTransferUniversalTransfer({"transferId": "t-old", "coin": "USDT", "amount": "12",
+                                                    "fromMemberId": uid, "toMemberId": "200"})
+    for i in range(60):
+        ex.privatePostV5AssetTransferUniversalTransfer({"transferId": f"t-{i}", "coin": "USDT", "amount": "1",
+                                                        "fromMemberId": uid, "toMemberId": "300"})
+    con = fm.sql_conn()
+    with con:
+        for tid in ("t-old", "t-new"):
+            con.execute("INSERT INTO transfers(ts, direction, amount, status, info, transfer_id, attempts, updated) "
+                        "VALUES('x', 'L1->L2', 12, 'sent', '', ?, 1, 0)", (tid,))
+    v.calls.clear()
+    fm.reconcile_transfers(con)
+    con.close()
+    assert [r[1] for r in rows(fm)] == ["done", "done"] and v.subs["200"] == 24.0
+    assert v.calls["v5/asset/transfer/query-universal-transfer-list"] == 2
+    assert v.calls["v5/asset/transfer/universal-transfer"] == 1
+    print("✅ Сверка на старте по transferId")
+
+
+def test_manual_mode(tmp_path=None):
+    fm = flow(tmp_path, auto=False)
+    v = fm.ex.venue
+    export(fm, 150.0)
+    assert [r[1] for r in rows(fm)] == ["manual"] and not v.calls
+    assert any("Рекомендован перевод" in m for m in fm.sent_tg)
+    print("✅ Ручной режим — инструкция в TG")
+
+
+def write_push(fm, ts: float, equity: float):
+    con = fm.sql_conn()
+    with con:
+        con.execute("INSERT OR REPLACE INTO state(k, v) VALUES('L1_EQUITY_PUSH', ?)",
+                    (json.dumps({"ts": ts, "equity": equity, "free": 10_000.0}),))
+    con.close()
+
+
+def test_push_once_then_api_fallback(tmp_path=None):
+    fm = flow(tmp_path)
+    v = fm.ex.venue
+    loop = fm.FlowLoop()
+    ts = time.time()
+    write_push(fm, ts, 1170.0)
+    loop.step()
+    # пуш выше порога: перевод без опроса баланса
+    assert [r[1] for r in rows(fm)] == ["batched", "done"] and v.calls["v5/account/wallet-balance"] == 0
+    loop.step()
+    write_push(fm, ts, 1170.0)       # тот же пуш заново — не второй экспорт
+    loop.step()
+    assert len(rows(fm)) == 2 and v.calls["v5/asset/transfer/universal-transfer"] == 1
+
+    write_push(fm, ts + 1, 1300.0)   # новый пуш — правило снова
+    loop.step()
+    assert len(rows(fm)) == 4 and v.calls["v5/account/wallet-balance"] == 0
+
+    # пуш старше FLOW_PUSH_MAX_AGE_SEC — опрос API, equity — totalEquity, как в пуше L1
+    write_push(fm, time.time() - fm.cfg.push_max_age_sec - 1, 1300.0)
+    v.coins["ETH"] = 1.0
+    loop.step()
+    polled = v.calls["v5/account/wallet-balance"]
+    # монета на счёте входит в equity, не только USDT кошелька
+    assert polled >= 1 and fm.metrics.equity.get() > v.usdt + 0.9 * v.markets["ETH"].px
+    loop.step()                      # следующий опрос — не раньше API_POLL_SEC
+    assert v.calls["v5/account/wallet-balance"] == polled
+    print("✅ Пуш L1 — один раз, без свежего пуша — totalEquity по API")
+
+
+if __name__ == "__main__":
+    test_batching_with_remainder()
+    test_timeout_retry_same_id()
+    test_duplicate_rejection_is_looked_up()
+    test_failed_requeued()
+    test_startup_reconcile()
+    test_manual_mode()
+    test_push_once_then_api_fallback()
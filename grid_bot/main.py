@@ -15,11 +15,17 @@ import ccxt
 import sqlite3
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Tuple
 from dataclasses import dataclass
 from telegram import Bot
 
+from common.fake_bybit import FakeBybit
+from common.gateway import Gateway
+from common.markets_cache import load_markets_cached
+from common.metrics import BotMetrics, instrument_exchange
+
 # ========== КОНФИГУРАЦИЯ ==========
 @dataclass
 class GridConfig:
@@ -34,25 +40,72 @@ class GridConfig:
     
     # Пары для торговли
     symbols: List[str] = None
+
+    # Выставление сетки пачками v5 order/create-batch (у spot не больше 10 ордеров в пачке)
+    batch_size: int = int(os.environ.get("GRID_BATCH_SIZE", "10"))
+    batch_retries: int = int(os.environ.get("GRID_BATCH_RETRIES", "2"))  # повторов для уровней, не вставших в пачке
+    place_workers: int = int(os.environ.get("GRID_PLACE_WORKERS", "5"))  # пар, выставляемых одновременно
+
+    # Мониторинг исполнений: пауза между опросами v5 execution/list
+    monitor_interval_sec: float = float(os.environ.get("GRID_MONITOR_SEC", "5"))
+    # Баланс для метрик (equity, доступные USDT, позиции пар): v5 wallet-balance не чаще раза в N сек
+    balance_interval_sec: float = float(os.environ.get("GRID_BALANCE_SEC", "60"))
+    
+    # Снимок рынков на диске (сек до принудительной загрузки с биржи)
+    markets_ttl_sec: int = int(os.environ.get("MARKETS_SNAPSHOT_TTL_SEC", "21600"))
+
+    # Метрики Prometheus: <dir>/grid.prom для textfile collector node_exporter (пусто — выкл)
+    metrics_dir: str = os.environ.get("METRICS_TEXTFILE_DIR", "/app/shared/metrics")
+
+    # Имитация биржи в процессе (common/fake_bybit.py) — прогон без ключей и сети
+    fake_exchange: bool = os.environ.get("BYBIT_FAKE", "false").lower() in ("1", "true", "yes")
+
+    # База сеток и сделок
+    db_path: str = os.environ.get("GRID_DB_PATH", "/app/shared/grid_trading.db")
+
+    # Общий шлюз тикеров (common/gateway.py): цены из снимков бота-лидера в GATEWAY_DIR
+    gateway_enable: bool = os.environ.get("GATEWAY_ENABLE", "false").lower() in ("1", "true", "yes")
+    gateway_dir: str = os.environ.get("GATEWAY_DIR", "/app/shared/gateway")
+    gateway_interval_sec: float = float(os.environ.get("GATEWAY_INTERVAL_SEC", "5"))
+    gateway_max_age_sec: float = float(os.environ.get("GATEWAY_MAX_AGE_SEC", "15"))
     
     def __post_init__(self):
         if self.symbols is None:
             self.symbols = ["DOGE/USDT", "WIF/USDT", "JUP/USDT", "OP/USDT", "ENA/USDT"]
 
 # ========== КЛИЕНТ БИРЖИ ==========
+EXEC_PAGE = 100  # максимум строк v5 execution/list за запрос
+
 class BybitClient:
-    def __init__(self, config: GridConfig):
-        self.exchange = ccxt.bybit({
+    def __init__(self, config: GridConfig, metrics: BotMetrics = None):
+        self.exchange = (FakeBybit if config.fake_exchange else ccxt.bybit)({
             "apiKey": config.api_key,
             "secret": config.api_secret,
             "enableRateLimit": True,
             "options": {"defaultType": "unified"}
         })
-        self.exchange.load_markets()
+        if metrics is not None:
+            instrument_exchange(self.exchange, metrics)
+        load_markets_cached(self.exchange, config.symbols, "grid", ttl_sec=config.markets_ttl_sec)
+        self.gateway = None
+        if config.gateway_enable:
+            self.gateway = Gateway(self.exchange, "grid", config.gateway_dir, config.gateway_interval_sec,
+                                   config.gateway_max_age_sec)
+            self.gateway.subscribe("spot", {self.exchange.market(s)["id"]: s
+                                            for s in config.symbols if s in self.exchange.markets})
+            self.gateway.start()
     
     def get_ticker(self, symbol: str) -> Dict:
         """Получить текущие цены"""
         try:
+            cached = self.gateway.ticker(symbol) if self.gateway is not None else None
+            if cached is not None and cached["bid"] and cached["ask"] and cached["last"]:
+                return {
+                    "bid": float(cached["bid"]),
+                    "ask": float(cached["ask"]),
+                    "last": float(cached["last"]),
+                    "volume": float(cached["info"].get("volume24h") or 0.0)
+                }
             ticker = self.exchange.fetch_ticker(symbol)
             return {
                 "bid": float(ticker["bid"]),
@@ -79,13 +132,92 @@ class BybitClient:
             print(f"Ошибка размещения ордера {symbol}: {e}")
             return {}
 
+    def place_orders(self, symbol: str, levels: List[Dict], batch_size: int) -> List[Dict]:
+        """Лимитные ордера уровней пачками create_orders (v5 order/create-batch).
+        Ответ — по уровню в том же порядке: ордер, {} для не вставшего, {"rejected": ...} —
+        уровень не проходит шаг/минимум объёма рынка и повторять его незачем, или {"unknown": ...} —
+        пачка оборвалась по сети и могла дойти до биржи.
+        Уровни сопоставляются по orderLinkId: ccxt сортирует ответ пачки по времени."""
+        valid, rejected = [], {}
+        for level in levels:
+            # ccxt проверяет шаг/минимум объёма до отправки — один негодный уровень не роняет всю пачку
+            try:
+                self.exchange.amount_to_precision(symbol, level["amount"])
+                valid.append(level)
+            except Exception as e:
+                print(f"Ошибка размещения ордера {symbol}: {e}")
+                rejected[level["link_id"]] = {"rejected": str(e)}
+        by_link: Dict[str, Dict] = {}
+        unknown: Dict[str, Dict] = {}
+        for start in range(0, len(valid), max(1, batch_size)):
+            chunk = valid[start:start + max(1, batch_size)]
+            try:
+                orders = self.exchange.create_orders([{
+                    "symbol": symbol, "type": "limit", "side": level["side"], "amount": level["amount"],
+                    "price": level["price"], "params": {"orderLinkId": level["link_id"]}
+                } for level in chunk])
+            except ccxt.NetworkError as e:
+                print(f"Ошибка пачки ордеров {symbol}: {e}")
+                unknown.update({level["link_id"]: {"unknown": str(e)} for level in chunk})
+                continue
+            except Exception as e:
+                print(f"Ошибка пачки ордеров {symbol}: {e}")
+                continue
+            for o in orders:
+                if o.get("id"):
+                    by_link[o.get("clientOrderId")] = o
+                else:
+                    print(f"Ордер не принят {symbol}: {o.get('info', {}).get('msg')}")
+        return [by_link.get(level["link_id"]) or rejected.get(level["link_id"]) or unknown.get(level["link_id"]) or {}
+                for level in levels]
+
+    def find_order(self, symbol: str, link_id: str) -> Dict:
+        """Ордер по orderLinkId (открытый или недавно закрытый, v5 order/realtime); {} — биржа его не знает"""
+        market = self.exchange.market(symbol)
+        res = self.exchange.privateGetV5OrderRealtime({"category": "spot", "symbol": market["id"],
+                                                       "orderLinkId": link_id}) or {}
+        rows = (res.get("result") or {}).get("list") or []
+        return self.exchange.parse_order(rows[0], market) if rows else {}
+
+    def fetch_wallet(self) -> Dict:
+        """Аккаунт UTA из v5 wallet-balance: totalEquity, totalAvailableBalance и монеты"""
+        res = self.exchange.privateGetV5AccountWalletBalance({"accountType": "UNIFIED"}) or {}
+        return ((res.get("result") or {}).get("list") or [{}])[0]
+
+    def fetch_executions(self, since_ms: int) -> List[Dict]:
+        """Сделки спота с since_ms (v5 execution/list), по возрастанию времени.
+        Один запрос на тик, пока сделок меньше страницы, — сколько бы уровней ни стояло."""
+        rows: List[Dict] = []
+        cursor = ""
+        while True:
+            req = {"category": "spot", "startTime": since_ms, "limit": EXEC_PAGE}
+            if cursor:
+                req["cursor"] = cursor
+            res = self.exchange.privateGetV5ExecutionList(req) or {}
+            page = (res.get("result") or {}).get("list") or []
+            rows.extend(page)
+            cursor = (res.get("result") or {}).get("nextPageCursor") or ""
+            if not cursor or len(page) < EXEC_PAGE:
+                break
+        rows.sort(key=lambda r: int(r.get("execTime") or 0))
+        return rows
+
 # ========== УПРАВЛЕНИЕ СЕТКОЙ ==========
 class GridManager:
-    def __init__(self, client: BybitClient, config: GridConfig):
+    def __init__(self, client: BybitClient, config: GridConfig, metrics: BotMetrics = None):
         self.client = client
         self.config = config
+        self.metrics = metrics
+        self.balance_at = 0.0  # time.monotonic() последнего снятия баланса
         self.grids: Dict[str, List[Dict]] = {}
-        self.db_path = "/app/shared/grid_trading.db"
+        # order_id -> (пара, уровень): исполнение находит свой уровень без обхода сеток
+        self.by_order: Dict[str, Tuple[str, Dict]] = {}
+        # сделки раньше старта не наши; execId на граничной миллисекунде — против повторного учёта
+        self.exec_since = int(time.time() * 1000)
+        self.exec_seen: set = set()
+        # пары, у которых после размещения остались не вставшие уровни: повтор на каждом тике
+        self.unplaced: set = set()
+        self.db_path = config.db_path
         self.init_database()
     
     def init_database(self):
@@ -178,6 +310,7 @@ class GridManager:
                     INSERT INTO grids (symbol, level, side, amount, price)
                     VALUES (?, ?, ?, ?, ?)
                 """, (symbol, level["level"], level["side"], level["amount"], level["price"]))
+                level["row_id"] = cursor.lastrowid
             
             conn.commit()
             conn.close()
@@ -185,42 +318,209 @@ class GridManager:
             print(f"Ошибка сохранения сетки в БД: {e}")
     
     def place_grid_orders(self, symbol: str):
-        """Разместить ордера сетки"""
+        """Разместить ордера сетки пачками; не вставшие уровни — повторно, до batch_retries раз"""
         try:
             if symbol not in self.grids:
                 return
             
             grid = self.grids[symbol]
-            for level in grid:
-                if level["status"] == "pending":
-                    order = self.client.place_order(
-                        symbol=symbol,
-                        side=level["side"],
-                        amount=level["amount"],
-                        price=level["price"]
-                    )
-                    
-                    if order and "id" in order:
+            touched = []
+            for attempt in range(self.config.batch_retries + 1):
+                pending = [level for level in grid if level["status"] == "pending"]
+                if not pending:
+                    break
+                for level in pending:
+                    # тот же orderLinkId при повторе: дошедший до биржи ордер не встанет вторым
+                    level.setdefault("link_id", f"grid-{self.client.exchange.uuid22()}")
+                # пачка с неизвестным исходом: сперва ищем её ордера по orderLinkId, иначе повтор
+                # упрётся в дубль, а вставший ордер останется без уровня
+                send, found = [], []
+                for level in pending:
+                    if not level.get("unknown"):
+                        send.append(level)
+                        continue
+                    try:
+                        order = self.client.find_order(symbol, level["link_id"])
+                    except Exception as e:
+                        print(f"Ошибка поиска ордера {symbol}: {e}")
+                        continue
+                    level.pop("unknown")
+                    if order.get("id"):
+                        found.append((level, order))
+                    else:
+                        send.append(level)
+                placed = self.client.place_orders(symbol, send, self.config.batch_size) if send else []
+                for level, order in found + list(zip(send, placed)):
+                    if "unknown" in order:
+                        level["unknown"] = True
+                    elif order and "id" in order:
                         level["order_id"] = order["id"]
                         level["status"] = "active"
+                        level["placed_at"] = time.time()
+                        self.by_order[order["id"]] = (symbol, level)
+                        touched.append(level)
                         print(f"Ордер размещён: {symbol} {level['side']} {level['amount']} @ {level['price']}")
-                    
-                    time.sleep(0.1)  # Задержка между ордерами
+                    elif "rejected" in order:
+                        level["status"] = "rejected"
+                        touched.append(level)
+                if attempt < self.config.batch_retries and any(level["status"] == "pending" for level in grid):
+                    time.sleep(0.5 * (attempt + 1))  # пауза перед повтором не вставших уровней
+            self.update_levels_in_db(touched)
+            if any(level["status"] == "pending" for level in grid):
+                self.unplaced.add(symbol)
+            else:
+                self.unplaced.discard(symbol)
                     
         except Exception as e:
             print(f"Ошибка размещения ордеров сетки {symbol}: {e}")
 
+    def update_levels_in_db(self, levels: List[Dict]):
+        """Записать order_id и статус уровней в их строки grids"""
+        rows = [(level.get("order_id"), level["status"], level["row_id"]) for level in levels if "row_id" in level]
+        if not rows:
+            return
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany("UPDATE grids SET order_id = ?, status = ? WHERE id = ?", rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Ошибка обновления сетки в БД: {e}")
+
+    def check_fills(self) -> int:
+        """Тик мониторинга: сделки с прошлого тика → встречные ордера пачкой и прибыль в trades.
+        API: execution/list и по пачке на пару с исполнениями или не вставшими уровнями.
+        Возвращает число исполненных уровней."""
+        rows = self.client.fetch_executions(self.exec_since)
+        last = max([self.exec_since] + [int(r.get("execTime") or 0) for r in rows])
+        fresh = [r for r in rows if r.get("execId") not in self.exec_seen]
+        edge = {r.get("execId") for r in rows if int(r.get("execTime") or 0) == last}
+        self.exec_seen = edge | (self.exec_seen if last == self.exec_since else set())
+        self.exec_since = last
+
+        done: List[Tuple[str, Dict]] = []
+        for r in fresh:
+            found = self.by_order.get(r.get("orderId"))
+            if found is None:
+                continue   # не ордер сетки
+            symbol, level = found
+            qty = float(r.get("execQty") or 0)
+            price = float(r.get("execPrice") or 0)
+            fee = float(r.get("execFee") or 0)
+            if (r.get("feeCurrency") or "USDT") != "USDT":
+                # комиссия покупки на споте — в монете: её нет в купленном объёме; в прибыль — в USDT
+                level["fee_base"] = level.get("fee_base", 0.0) + fee
+                fee *= price
+            level["filled"] = level.get("filled", 0.0) + qty
+            level["cost"] = level.get("cost", 0.0) + qty * price
+            level["fee"] = level.get("fee", 0.0) + fee
+            if float(r.get("leavesQty") or 0) <= 0:
+                del self.by_order[r["orderId"]]
+                level["status"] = "filled"
+                done.append((symbol, level))
+                if self.metrics is not None and "placed_at" in level:
+                    # от выставления ордера до последней сделки по нему
+                    filled_at = int(r.get("execTime") or 0) / 1000.0
+                    self.metrics.order_fill.observe(max(0.0, filled_at - level["placed_at"]), kind="grid")
+        if not done:
+            self.retry_unplaced(set())
+            return 0
+
+        trades, counters = [], {}
+        for symbol, level in done:
+            avg = level["cost"] / level["filled"]
+            # прибыль — у закрывающей ноги: продажа выше купленного или откуп ниже проданного
+            profit = 0.0
+            if "entry_price" in level:
+                sign = 1.0 if level["side"] == "sell" else -1.0
+                profit = sign * (avg - level["entry_price"]) * level["filled"] - level["fee"] - level["entry_fee"]
+            trades.append((symbol, level["side"], level["filled"], avg, profit))
+            print(f"Исполнен: {symbol} {level['side']} {level['filled']} @ {avg:.6f}, прибыль {profit:.4f} USDT")
+
+            # встречный ордер на шаг сетки в другую сторону — на место исполненного уровня
+            side = "sell" if level["side"] == "buy" else "buy"
+            step = 1 + self.config.grid_spread if side == "sell" else 1 - self.config.grid_spread
+            # продаём то, что пришло на счёт: исполненное минус комиссия в монете, вниз до шага объёма
+            amount = level["filled"] - level.get("fee_base", 0.0)
+            try:
+                amount = float(self.client.exchange.amount_to_precision(symbol, amount))
+            except Exception:
+                pass   # ниже минимума — уровень отсеет place_orders как rejected
+            counter = {
+                "level": level["level"],
+                "side": side,
+                "price": round(avg * step, 6),
+                "amount": amount,
+                "status": "pending"
+            }
+            # круг открывает только нога без входа; встречный к закрывающей ноге — новый круг, без входа
+            if "entry_price" not in level:
+                counter.update(entry_price=avg, entry_fee=level["fee"])
+            grid = self.grids[symbol]
+            grid[next(i for i, item in enumerate(grid) if item is level)] = counter
+            counters.setdefault(symbol, []).append(counter)
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany("INSERT INTO trades (symbol, side, amount, price, profit) VALUES (?, ?, ?, ?, ?)", trades)
+            conn.executemany("UPDATE grids SET status = 'filled' WHERE id = ?",
+                             [(level["row_id"],) for _, level in done if "row_id" in level])
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Ошибка записи сделок в БД: {e}")
+        for symbol, levels in counters.items():
+            self.save_grid_to_db(symbol, levels)
+
+        self.retry_unplaced(set(counters))
+        return len(done)
+
+    def retry_unplaced(self, symbols: set):
+        """Выставить встречные ордера пар symbols и повторить не вставшие уровни прошлых тиков"""
+        symbols = symbols | self.unplaced
+        if not symbols:
+            return
+        with ThreadPoolExecutor(max_workers=max(1, self.config.place_workers)) as pool:
+            list(pool.map(self.place_grid_orders, symbols))
+
+    def report_account(self):
+        """equity, доступные USDT и монеты пар сетки в USDT — в метрики (bot_equity_usdt и др.)"""
+        acc = self.client.fetch_wallet()
+        self.balance_at = time.monotonic()
+        self.metrics.equity.set(float(acc.get("totalEquity") or 0.0))
+        self.metrics.available.set(float(acc.get("totalAvailableBalance") or 0.0))
+        coins = {c.get("coin"): c for c in acc.get("coin") or []}
+        exposure = {}
+        for symbol in self.grids:
+            coin = coins.get(symbol.split("/")[0])
+            if coin is not None and float(coin.get("usdValue") or 0.0):
+                exposure[(symbol, "spot")] = float(coin["usdValue"])
+        self.metrics.exposure.replace(exposure)
+
+    def run(self, metrics: BotMetrics):
+        """Мониторинг исполнений раз в monitor_interval_sec, баланс — раз в balance_interval_sec"""
+        while True:
+            t0 = time.monotonic()
+            try:
+                self.check_fills()
+                metrics.cycle.observe(time.monotonic() - t0)
+            except Exception as e:
+                print(f"Ошибка мониторинга: {e}")
+            if self.metrics is not None and time.monotonic() - self.balance_at >= self.config.balance_interval_sec:
+                try:
+                    self.report_account()
+                except Exception as e:
+                    print(f"Ошибка запроса баланса: {e}")
+            time.sleep(self.config.monitor_interval_sec)
+
 # ========== ОСНОВНОЙ ЦИКЛ ==========
-def main():
-    print("🚀 Grid Trading Bot запущен!")
-    
-    # Инициализация
-    config = GridConfig()
-    client = BybitClient(config)
-    grid_manager = GridManager(client, config)
+def bootstrap(config: GridConfig, metrics: BotMetrics) -> GridManager:
+    """Создать и выставить сетки по всем парам конфигурации"""
+    client = BybitClient(config, metrics)
+    grid_manager = GridManager(client, config, metrics)
     
-    # Создание сеток для всех пар
-    for symbol in config.symbols:
+    def activate(symbol: str):
+        t0 = time.monotonic()
         try:
             ticker = client.get_ticker(symbol)
             if ticker and "last" in ticker:
@@ -228,13 +528,34 @@ def main():
                 grid_manager.create_grid(symbol, current_price)
                 grid_manager.place_grid_orders(symbol)
                 print(f"Сетка активирована для {symbol}")
+                metrics.cycle.observe(time.monotonic() - t0)
             else:
                 print(f"Не удалось получить цену для {symbol}")
         except Exception as e:
             print(f"Ошибка инициализации {symbol}: {e}")
+
+    # Создание сеток для всех пар — пары параллельно, уровни пары пачками;
+    # тип аккаунта create_orders узнаёт один раз здесь, а не в каждом потоке
+    try:
+        client.exchange.is_unified_enabled()
+    except Exception as e:
+        print(f"Ошибка запроса типа аккаунта: {e}")
+    with ThreadPoolExecutor(max_workers=max(1, config.place_workers)) as pool:
+        list(pool.map(activate, config.symbols))
+    return grid_manager
+
+def main():
+    print("🚀 Grid Trading Bot запущен!")
+    
+    # Инициализация
+    config = GridConfig()
+    metrics = BotMetrics("grid", config.metrics_dir)
+    metrics.start()
+    grid_manager = bootstrap(config, metrics)
     
     print("✅ Все сетки созданы и активированы!")
     print("📊 Мониторинг активен...")
+    grid_manager.run(metrics)
 
 if __name__ == "__main__":
     main()
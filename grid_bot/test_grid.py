@@ -7,7 +7,7 @@ import sys
 import os
 sys.path.append('/app')
 
-from main import GridConfig, GridManager
+from main import BybitClient, GridConfig, GridManager
 
 def test_grid_creation():
     """Тестируем создание сеток"""
@@ -78,5 +78,190 @@ def test_grid_creation():
     else:
         print("❌ Ошибка создания сетки")
 
+def fake_manager(tmp_path=None, metrics=None, **kw):
+    """GridManager на имитации Bybit: ETH/USDT, 3 уровня в каждую сторону"""
+    import tempfile
+    from common.fake_bybit import FakeBybit, Venue
+
+    v = Venue(markets=20, usdt=1_000.0, maker_fill_prob=0.0, vol=0.0)
+    v.coins["ETH"] = 1.0
+    client = BybitClient.__new__(BybitClient)
+    client.exchange = FakeBybit({"enableRateLimit": False}, venue=v)
+    client.exchange.load_markets()
+    client.gateway = None
+    db = os.path.join(str(tmp_path or tempfile.mkdtemp()), "grid.db")
+    config = GridConfig(symbols=["ETH/USDT"], grid_levels=3, level_amount=30.0, db_path=db, **kw)
+    return v, GridManager(client, config, metrics), db
+
+def test_batch_timeout_adopts_live_orders(tmp_path=None):
+    """Пачка дошла до биржи, ответ потерян: повтор находит ордера по orderLinkId, а не ставит вторые"""
+    import ccxt
+
+    v, manager, _ = fake_manager(tmp_path)
+    ex = manager.client.exchange
+    real = ex.create_orders
+    lost = [1]
+
+    def create_orders(orders, params={}):
+        res = real(orders, params)
+        if lost:
+            lost.pop()
+            raise ccxt.RequestTimeout("lost reply")
+        return res
+    ex.create_orders = create_orders
+
+    manager.create_grid("ETH/USDT", v.markets["ETH"].px)
+    manager.place_grid_orders("ETH/USDT")
+    levels = manager.grids["ETH/USDT"]
+    assert all(level["status"] == "active" for level in levels)
+    assert len(v.orders) == 6 and set(manager.by_order) == set(v.orders)
+    assert v.calls["v5/order/create-batch"] == 1 and v.calls["v5/order/realtime"] == 6
+    print("✅ Потерянный ответ пачки — ордера подхвачены по orderLinkId")
+
+def test_fill_cycle(tmp_path=None):
+    """Исполнение уровня → встречный ордер; закрытие круга → прибыль в trades"""
+    import sqlite3
+
+    v, manager, db = fake_manager(tmp_path)
+
+    px = v.markets["ETH"].px
+    manager.create_grid("ETH/USDT", px)
+    manager.place_grid_orders("ETH/USDT")
+    assert len(manager.by_order) == 6 and v.calls["v5/order/create-batch"] == 1
+
+    # цена проходит первый уровень покупки
+    v.calls.clear()
+    v.markets["ETH"].px = px * 0.975
+    assert manager.check_fills() == 1
+    assert v.calls["v5/execution/list"] == 1 and v.calls["v5/order/create-batch"] == 1
+    counter = [level for level in manager.grids["ETH/USDT"] if "entry_price" in level]
+    assert len(counter) == 1 and counter[0]["side"] == "sell" and counter[0]["status"] == "active"
+    assert abs(counter[0]["price"] - round(px * 0.98 * 1.02, 6)) < 1e-6
+
+    # тихий тик: один запрос, без ордеров
+    v.calls.clear()
+    assert manager.check_fills() == 0 and sum(v.calls.values()) == 1
+
+    # встречная продажа исполняется — круг закрыт с прибылью
+    v.markets["ETH"].px = px * 1.005
+    assert manager.check_fills() == 1
+    conn = sqlite3.connect(db)
+    trades = conn.execute("SELECT side, profit FROM trades ORDER BY id").fetchall()
+    statuses = dict(conn.execute("SELECT status, COUNT(*) FROM grids GROUP BY status").fetchall())
+    conn.close()
+    assert [t[0] for t in trades] == ["buy", "sell"] and trades[0][1] == 0 and trades[1][1] > 0
+    assert statuses == {"active": 6, "filled": 2}
+    print(f"✅ Круг сетки: прибыль {trades[1][1]:.4f} USDT")
+
+def exec_row(level, exec_id, qty, leaves, ms, fee=0.0, fee_coin="USDT"):
+    """Строка v5 execution/list по ордеру уровня"""
+    return {"orderId": level["order_id"], "execId": exec_id, "execQty": str(qty), "execPrice": str(level["price"]),
+            "execFee": str(fee), "feeCurrency": fee_coin, "leavesQty": str(leaves), "execTime": str(ms)}
+
+def test_partial_fill_and_boundary_exec(tmp_path=None):
+    """Частичное исполнение ждёт остатка; execId на граничной миллисекунде не считается дважды"""
+    v, manager, _ = fake_manager(tmp_path)
+    manager.create_grid("ETH/USDT", v.markets["ETH"].px)
+    manager.place_grid_orders("ETH/USDT")
+    level = next(level for level in manager.grids["ETH/USDT"] if level["side"] == "buy")
+    half = level["amount"] / 2
+    ms = manager.exec_since + 1
+    feed = []
+    manager.client.fetch_executions = lambda since: [r for r in feed if int(r["execTime"]) >= since]
+
+    feed.append(exec_row(level, "e1", half, half, ms))
+    assert manager.check_fills() == 0
+    assert level["status"] == "active" and level["order_id"] in manager.by_order
+    # тот же e1 снова на граничной миллисекунде — не второе исполнение
+    assert manager.check_fills() == 0 and abs(level["filled"] - half) < 1e-12
+
+    # остаток в ту же миллисекунду: e1 отсеян, e2 закрывает уровень
+    feed.append(exec_row(level, "e2", half, 0, ms, fee=half * 0.001, fee_coin="ETH"))
+    assert manager.check_fills() == 1 and abs(level["filled"] - level["amount"]) < 1e-12
+    counter = next(item for item in manager.grids["ETH/USDT"] if "entry_price" in item)
+    # продаётся пришедшее на счёт: минус комиссия в монете, по шагу объёма рынка
+    ex = manager.client.exchange
+    assert counter["amount"] == float(ex.amount_to_precision("ETH/USDT", level["amount"] - half * 0.001))
+    assert counter["amount"] < level["amount"] and counter["status"] == "active"
+    assert manager.check_fills() == 0
+    print("✅ Частичное исполнение и граничный execId")
+
+def test_failed_counter_retried(tmp_path=None):
+    """Встречный ордер, не вставший на бирже, повторяется на следующем тике без новых исполнений"""
+    v, manager, _ = fake_manager(tmp_path, batch_retries=0)
+    manager.create_grid("ETH/USDT", v.markets["ETH"].px)
+    manager.place_grid_orders("ETH/USDT")
+    level = next(level for level in manager.grids["ETH/USDT"] if level["side"] == "buy")
+    feed = [exec_row(level, "e1", level["amount"], 0, manager.exec_since + 1)]
+    manager.client.fetch_executions = lambda since: [r for r in feed if int(r["execTime"]) >= since]
+
+    v.coins["ETH"] = 0.0   # продавать нечего — встречная продажа отвергнута
+    assert manager.check_fills() == 1
+    counter = next(item for item in manager.grids["ETH/USDT"] if "entry_price" in item)
+    assert counter["status"] == "pending" and manager.unplaced == {"ETH/USDT"}
+
+    v.coins["ETH"] = 1.0
+    v.calls.clear()
+    assert manager.check_fills() == 0
+    assert counter["status"] == "active" and counter["order_id"] in manager.by_order
+    assert v.calls["v5/order/create-batch"] == 1 and not manager.unplaced
+    v.calls.clear()
+    assert manager.check_fills() == 0 and not v.calls["v5/order/create-batch"]
+    print("✅ Не вставший встречный ордер повторён на следующем тике")
+
+def test_alternating_fills_profit(tmp_path=None):
+    """b1, s1, b2, s2 на одном уровне: прибыль — только у закрывающих продаж, каждая нога — один раз"""
+    import sqlite3
+
+    v, manager, db = fake_manager(tmp_path)
+    manager.create_grid("ETH/USDT", v.markets["ETH"].px)
+    manager.place_grid_orders("ETH/USDT")
+    grid = manager.grids["ETH/USDT"]
+    slot = next(i for i, level in enumerate(grid) if level["side"] == "buy")
+    feed = []
+    manager.client.fetch_executions = lambda since: [r for r in feed if int(r["execTime"]) >= since]
+
+    fills, fee = [], 0.01
+    for n in range(4):
+        level = grid[slot]
+        fills.append((level["side"], level["price"], level["amount"]))
+        feed.append(exec_row(level, f"e{n}", level["amount"], 0, manager.exec_since + 1, fee=fee))
+        assert manager.check_fills() == 1 and grid[slot]["status"] == "active"
+    assert [f[0] for f in fills] == ["buy", "sell", "buy", "sell"]
+
+    (_, b1, q1), (_, s1, _), (_, b2, q2), (_, s2, _) = fills
+    expected = (s1 - b1) * q1 + (s2 - b2) * q2 - 4 * fee
+    conn = sqlite3.connect(db)
+    profits = [r[0] for r in conn.execute("SELECT profit FROM trades ORDER BY id")]
+    conn.close()
+    assert profits[0] == 0 and profits[2] == 0
+    assert abs(sum(profits) - expected) < 1e-9
+    print(f"✅ Чередование покупок и продаж: прибыль {sum(profits):.4f} USDT без двойного счёта")
+
+def test_metrics(tmp_path=None):
+    """Метрики grid: equity/доступные USDT/позиция пары из wallet-balance, время от выставления до исполнения"""
+    from common.metrics import BotMetrics
+
+    metrics = BotMetrics("grid", "")
+    v, manager, _ = fake_manager(tmp_path, metrics=metrics)
+    px = v.markets["ETH"].px
+    manager.create_grid("ETH/USDT", px)
+    manager.place_grid_orders("ETH/USDT")
+    v.markets["ETH"].px = px * 0.975
+    assert manager.check_fills() == 1
+    assert metrics.order_fill.count(kind="grid") == 1
+
+    manager.report_account()
+    assert metrics.equity.get() > 1_000.0 and 0 < metrics.available.get() <= metrics.equity.get()
+    assert abs(metrics.exposure.get(symbol="ETH/USDT", leg="spot") - v.coins["ETH"] * v.markets["ETH"].px) < 1e-6
+    assert "bot_pair_exposure_usdt" in metrics.registry.render()
+    print("✅ Метрики grid: баланс, позиция, время исполнения")
+
 if __name__ == "__main__":
     test_grid_creation()
+    test_batch_timeout_adopts_live_orders()
+    test_fill_cycle()
+    test_partial_fill_and_boundary_exec()
+    test_failed_counter_retried()
+    test_alternating_fills_profit()
+    test_metrics()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк цикла L1: синхронный main-цикл против asyncio (L1_ASYNC_ENABLE)
+на имитации биржи с фиксированной задержкой каждого вызова.
+
+Для каждого размера L1_SYMBOLS меряются два цикла с чистого аккаунта:
+  entry — все пары проходят фильтры и открываются (по 3 вызова на пару);
+  idle  — пары уже хеджированы, только рыночные данные и проверки.
+
+Запуск (из корня репозитория):
+    python l1_bot/bench_cycle.py --latency 0.05 --symbols 10,50,200
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.dirname(HERE)]
+
+import ccxt
+import ccxt.async_support as ccxt_async
+
+from common import markets_cache
+
+TMP = tempfile.mkdtemp(prefix="l1_bench_")
+MAX_SYMBOLS = 200
+
+
+class Book:
+    """Состояние имитации: рынки, цены, FR, баланс UTA и позиции; считает вызовы API."""
+
+    def __init__(self, n: int, latency: float):
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.bases = [f"C{i:03d}" for i in range(n)]
+        self.px = {b: 10.0 + i for i, b in enumerate(self.bases)}
+        self.markets = []
+        for b in self.bases:
+            self.markets.append({
+                "id": f"{b}USDT", "symbol": f"{b}/USDT", "base": b, "quote": "USDT", "settle": None,
+                "baseId": b, "quoteId": "USDT", "type": "spot", "spot": True, "swap": False, "linear": None,
+                "active": True, "contract": False, "precision": {"amount": 0.001, "price": 0.0001},
+                "limits": {"amount": {"min": 0.001}, "cost": {"min": 1.0}}, "info": {},
+            })
+            self.markets.append({
+                "id": f"{b}USDT", "symbol": f"{b}/USDT:USDT", "base": b, "quote": "USDT", "settle": "USDT",
+                "baseId": b, "quoteId": "USDT", "settleId": "USDT", "type": "swap", "spot": False, "swap": True,
+                "linear": True, "inverse": False, "active": True, "contract": True, "contractSize": 1.0,
+                "precision": {"amount": 0.001, "price": 0.0001},
+                "limits": {"amount": {"min": 0.001}, "cost": {"min": 5.0}}, "info": {"fundingInterval": "480"},
+            })
+        self.reset()
+
+    def reset(self, usdt: float = 1_000_000.0):
+        self.usdt = usdt
+        self.coins = {}
+        self.perp = {}
+        self.calls.clear()
+
+    def _base(self, symbol: str) -> str:
+        return symbol.split("/")[0]
+
+    def tickers(self, symbols):
+        out = {}
+        next_ts = str(int(time.time() * 1000) + 3 * 3600 * 1000)
+        for s in symbols:
+            p = self.px[self._base(s)]
+            info = {"fundingRate": "0.0005", "nextFundingTime": next_ts} if ":" in s else {}
+            out[s] = {"symbol": s, "last": p, "bid": p * 0.9999, "ask": p * 1.0001, "info": info}
+        return out
+
+    def wallet(self):
+        coins = [{"coin": "USDT", "walletBalance": str(self.usdt), "availableBalance": str(self.usdt)}]
+        coins += [{"coin": b, "walletBalance": str(q)} for b, q in self.coins.items()]
+        equity = self.usdt + sum(q * self.px[b] for b, q in self.coins.items())
+        return {"result": {"list": [{"totalEquity": str(equity), "coin": coins}]}}
+
+    def positions(self):
+        rows = [{"symbol": pid, "side": "Buy" if q > 0 else "Sell", "size": str(abs(q))}
+                for pid, q in self.perp.items() if q]
+        return {"result": {"list": rows, "nextPageCursor": ""}}
+
+    def fill(self, symbol, side, amount):
+        b = self._base(symbol)
+        sign = 1.0 if side == "buy" else -1.0
+        if ":" in symbol:
+            pid = f"{b}USDT"
+            self.perp[pid] = self.perp.get(pid, 0.0) + sign * amount
+        else:
+            self.coins[b] = self.coins.get(b, 0.0) + sign * amount
+            self.usdt -= sign * amount * self.px[b]
+        return {"id": str(sum(self.calls.values())), "symbol": symbol, "side": side, "amount": amount,
+                "filled": amount, "status": "closed"}
+
+
+BOOK = Book(MAX_SYMBOLS, 0.0)
+
+
+class MockBybit(ccxt.bybit):
+    """ccxt.bybit без сети: ответы из BOOK после time.sleep(latency)."""
+
+    def __init__(self, config={}):
+        super().__init__(config)
+        self.id = "bybit_bench"
+
+    def _call(self, name):
+        BOOK.calls[name] += 1
+        time.sleep(BOOK.latency)
+
+    def fetch_currencies(self, params={}):
+        return {}
+
+    def fetch_markets(self, params={}):
+        return [dict(m) for m in BOOK.markets]
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._call("fetch_tickers")
+        return BOOK.tickers(symbols)
+
+    def private_get_v5_account_wallet_balance(self, params={}):
+        self._call("wallet_balance")
+        return BOOK.wallet()
+
+    def private_get_v5_position_list(self, params={}):
+        self._call("position_list")
+        return BOOK.positions()
+
+    def private_post_v5_position_set_leverage(self, params={}):
+        self._call("set_leverage")
+        return {"retCode": 0}
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._call("create_order")
+        return BOOK.fill(symbol, side, amount)
+
+
+class MockBybitAsync(ccxt_async.bybit):
+    """То же для ccxt.async_support: задержка через asyncio.sleep."""
+
+    async def _call(self, name):
+        BOOK.calls[name] += 1
+        await asyncio.sleep(BOOK.latency)
+
+    async def fetch_tickers(self, symbols=None, params={}):
+        await self._call("fetch_tickers")
+        return BOOK.tickers(symbols)
+
+    async def private_get_v5_account_wallet_balance(self, params={}):
+        await self._call("wallet_balance")
+        return BOOK.wallet()
+
+    async def private_get_v5_position_list(self, params={}):
+        await self._call("position_list")
+        return BOOK.positions()
+
+    async def private_post_v5_position_set_leverage(self, params={}):
+        await self._call("set_leverage")
+        return {"retCode": 0}
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        await self._call("create_order")
+        return BOOK.fill(symbol, side, amount)
+
+
+def import_main():
+    os.environ.update({
+        "BYBIT_API_KEY": "bench", "BYBIT_API_SECRET": "bench", "BYBIT_ACCOUNT_TYPE": "UNIFIED",
+        "L1_SYMBOLS": ",".join(f"{b}/USDT" for b in BOOK.bases),
+        "L1_FUNDING_THRESHOLD_8H": "0.0001", "L1_MAX_ALLOC_PCT": "0.001", "L1_PERP_LEVERAGE": "3",
+        "L1_MIN_FREE_BALANCE_USDT": "1", "L1_POLL_INTERVAL_SEC": "1", "L1_MAX_DAILY_DD_PCT": "50",
+        "L1_START_BASE_USDT": "1000000", "L1_PNL_THRESHOLD_TO_L2": "0.05", "L1_PNL_EXPORT_SHARE": "0.3",
+        "L1_MAX_TOTAL_ALLOC_PCT": "0.85", "L1_SCALEIN_ENABLE": "false", "L1_ORDER_PAUSE_SEC": "0",
+        "L1_MAKER_FALLBACK_MS": "0", "L1_RECORD_DIR": os.path.join(TMP, "md"),
+        "L1_TRACE_FILE": os.path.join(TMP, "trace.jsonl"), "METRICS_TEXTFILE_DIR": "",
+        "TG_BOT_TOKEN": "123456:bench", "TG_CHAT_ID": "0", "EXTRA_LOGS": "false",
+    })
+    ccxt.bybit = MockBybit
+    markets_cache.snapshot_path = lambda exchange_id, name, shared_dir=None: os.path.join(
+        TMP, f"markets_{exchange_id}_{name}.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as m
+    m.DB_PATH = os.path.join(TMP, "ledger.db")
+    m.tg = lambda msg, force=False: None
+    m.calendar.quiet = lambda sym, ts: False
+    return m
+
+
+def fresh_state(m, symbols):
+    """Пустой аккаунт, новая база и снимки — каждый замер с одинакового старта."""
+    BOOK.reset()
+    m.cfg.symbols = symbols
+    m.account = m.AccountSnapshot()
+    m.market = m.MarketSnapshot(m.cfg.snapshot_max_age_sec)
+    m.leverage_set.clear()
+    for f in os.listdir(TMP):
+        if f.startswith("ledger.db"):
+            os.remove(os.path.join(TMP, f))
+    con = m.sql_conn()
+    return con, m.StateStore(con, flush_interval_sec=m.cfg.state_flush_sec)
+
+
+def cycle_sync(m, st, con):
+    m.account.refresh()
+    m.daily_guard(st, con)
+    m.run_cycle(st, con, m.tradable_symbols())
+    st.flush()
+
+
+async def cycle_async(m, st, con):
+    valid = m.tradable_symbols()
+    await asyncio.gather(m.account.refresh_async(m.aex), m.market.refresh_async(m.aex, valid))
+    m.daily_guard(st, con)
+    await m.run_cycle_async(st, con, valid)
+    st.flush()
+
+
+def measure(m, mode: str, n: int):
+    symbols = [f"{b}/USDT" for b in BOOK.bases[:n]]
+    con, st = fresh_state(m, symbols)
+    rows = []
+    loop = asyncio.new_event_loop() if mode == "async" else None
+    if loop is not None:
+        m.aex = MockBybitAsync({"enableRateLimit": True})
+        m.aex.set_markets(m.ex.markets, m.ex.currencies)
+    try:
+        for phase in ("entry", "idle"):
+            BOOK.calls.clear()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if loop is None:
+                    cycle_sync(m, st, con)
+                else:
+                    loop.run_until_complete(cycle_async(m, st, con))
+            rows.append((phase, (time.perf_counter() - t0) * 1000.0, sum(BOOK.calls.values())))
+        opened = con.execute("SELECT COUNT(*) FROM trades WHERE action='open_pair'").fetchone()[0]
+    finally:
+        if loop is not None:
+            loop.run_until_complete(m.aex.close())
+            loop.close()
+            m.aex = None
+        con.close()
+    return rows, opened
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--latency", type=float, default=0.05, help="задержка одного вызова API, сек")
+    ap.add_argument("--symbols", default="10,50,200", help=f"размеры L1_SYMBOLS (не больше {MAX_SYMBOLS})")
+    args = ap.parse_args()
+    sizes = [min(MAX_SYMBOLS, int(x)) for x in args.symbols.split(",") if x.strip()]
+
+    m = import_main()
+    BOOK.latency = args.latency
+    print(f"latency={args.latency * 1000:.0f} ms/call")
+    print(f"{'symbols':>7} {'mode':>5} {'entry ms':>9} {'calls':>5} {'idle ms':>8} {'calls':>5} {'opened':>6}")
+    for n in sizes:
+        for mode in ("sync", "async"):
+            rows, opened = measure(m, mode, n)
+            (_, e_ms, e_calls), (_, i_ms, i_calls) = rows
+            print(f"{n:>7} {mode:>5} {e_ms:>9.0f} {e_calls:>5} {i_ms:>8.0f} {i_calls:>5} {opened:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Конфиг L1 из переменных окружения (.env): имена полей — атрибуты cfg в main.py,
+alias — имена переменных. Отдельный модуль, чтобы replay.py собирал тот же Cfg
+без биржи и Telegram.
+"""
+
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class Cfg(BaseModel):
+    # Bybit/API
+    key: str = Field(..., alias="BYBIT_API_KEY")
+    sec: str = Field(..., alias="BYBIT_API_SECRET")
+    acct: str = Field(..., alias="BYBIT_ACCOUNT_TYPE")
+
+    # Торговые параметры L1
+    symbols: List[str] = Field(..., alias="L1_SYMBOLS")
+    fr_thr: float = Field(..., alias="L1_FUNDING_THRESHOLD_8H")
+    max_alloc: float = Field(..., alias="L1_MAX_ALLOC_PCT")
+    lev: int = Field(..., alias="L1_PERP_LEVERAGE")
+    min_free: float = Field(..., alias="L1_MIN_FREE_BALANCE_USDT")
+    poll: int = Field(..., alias="L1_POLL_INTERVAL_SEC")
+    # Адаптивный опрос по календарю выплат (включается явно): часто внутри тихого/snipe-окна, редко вдали от payout
+    poll_adaptive: bool = Field(False, alias="L1_POLL_ADAPTIVE")
+    poll_fast_sec: float = Field(5.0, alias="L1_POLL_FAST_SEC")
+    poll_slow_sec: float = Field(120.0, alias="L1_POLL_SLOW_SEC")
+    dd_day: float = Field(..., alias="L1_MAX_DAILY_DD_PCT")
+    dd_min_eq: float = Field(200.0, alias="L1_DD_MIN_EQUITY_USDT")
+
+    # Автокомпаунд/переводы
+    start_base: float = Field(..., alias="L1_START_BASE_USDT")
+    pnl_thr_to_l2: float = Field(..., alias="L1_PNL_THRESHOLD_TO_L2")
+    pnl_export_share: float = Field(..., alias="L1_PNL_EXPORT_SHARE")
+    # Equity для flow_manager в state (L1_EQUITY_PUSH): при сдвиге на столько % от стартовой базы
+    equity_push_step_pct: float = Field(0.1, alias="L1_EQUITY_PUSH_STEP_PCT")
+
+    # Telegram
+    tg_token: str = Field(..., alias="TG_BOT_TOKEN")
+    tg_chat: str = Field(..., alias="TG_CHAT_ID")
+    # Отключать уведомления ночью (вне дневного окна)
+    tg_night_mute: bool = Field(True, alias="TG_NIGHT_MUTE")
+    # Фоновая отправка: склейка сообщений за окно, пауза между отправками, размер очереди
+    tg_coalesce_sec: float = Field(2.0, alias="TG_COALESCE_SEC")
+    tg_min_interval_sec: float = Field(1.0, alias="TG_MIN_INTERVAL_SEC")
+    tg_queue_max: int = Field(200, alias="TG_QUEUE_MAX")
+
+    # Динамический порог + дневные отчёты
+    dyn_hook: bool = Field(False, alias="L1_DYN_HOOK_ENABLE")
+    fr_lower: float = Field(0.001, alias="L1_DYN_HOOK_FR_LOWER")  # 0.1% - увеличен для лучшей маржинальности
+    fr_upper: float = Field(0.003, alias="L1_DYN_HOOK_FR_UPPER")  # 0.3% - увеличен для лучшей маржинальности
+    tz_offset_min: int = Field(0, alias="L1_TZ_OFFSET_MINUTES")  # смещение от UTC в минутах (МСК=180)
+    day_start_h: int = Field(9, alias="L1_DAY_START_HOUR")       # [start, end) локальные часы
+    day_end_h: int = Field(21, alias="L1_DAY_END_HOUR")
+    report_top_n: int = Field(4, alias="L1_REPORT_TOP_N")
+    report_min_fr: float = Field(0.0, alias="L1_REPORT_MIN_FR")  # фильтр в отчёте
+
+    # Динамическое масштабирование аллокации под высокий FR
+    alloc_scale_enable: bool = Field(True, alias="L1_ALLOC_SCALE_ENABLE")
+    alloc_scale_k: float = Field(0.5, alias="L1_ALLOC_SCALE_K")
+    alloc_scale_cap: float = Field(1.5, alias="L1_ALLOC_SCALE_CAP")
+
+    # Исполнение и фильтры качества
+    fr_extra_buffer: float = Field(0.00002, alias="L1_FR_EXTRA_BUFFER")
+    max_spread_pct: float = Field(0.003, alias="L1_MAX_SPREAD_PCT")  # 0.3%
+
+    # Выходы и гистерезис
+    hysteresis_fr: float = Field(0.00002, alias="L1_HYST_FR")
+    exit_fr_below_count: int = Field(3, alias="L1_EXIT_FR_BELOW_COUNT")
+    max_hold_min: int = Field(30, alias="L1_MAX_HOLD_MIN")  # 30 минут - минимальное время удержания для снижения комиссий
+    cooldown_min: int = Field(10, alias="L1_COOLDOWN_MIN")
+
+    max_total_alloc: float = Field(0.6, alias="L1_MAX_TOTAL_ALLOC_PCT")
+    max_pair_alloc_pct: float = Field(0.20, alias="L1_MAX_PAIR_ALLOC_PCT")  # 20% max per pair - увеличен для лучшей маржинальности
+    # Принудительное закрытие через N часов удержания (0=выкл)
+    force_close_after_h: int = Field(0, alias="L1_FORCE_CLOSE_AFTER_HOURS")
+    # Порог отсечения «пыли»: пока объём позиции в USDT меньше порога — не считаем пару хеджированной
+    dust_usd_thr: float = Field(1.0, alias="L1_DUST_USD_THRESHOLD")
+    # Порядок открытия связки: PERP_FIRST или SPOT_FIRST
+    open_order: str = Field("SPOT_FIRST", alias="L1_OPEN_ORDER")
+    # Трейлинг по пику FR (доля отката, 0=выкл)
+    trail_fr_pct: float = Field(0.0, alias="L1_TRAIL_FR_PCT")
+    # Минимум доступной маржи (USDT) для авто-редьюса
+    margin_min_usdt: float = Field(10.0, alias="L1_MARGIN_MIN_USDT")
+    auto_reduce_fraction: float = Field(0.5, alias="L1_AUTO_REDUCE_FRACTION")
+    auto_reduce_cooldown_sec: int = Field(300, alias="L1_AUTO_REDUCE_COOLDOWN_SEC")
+    # Maker-first (postOnly) с тайм-аутом fallback на market; 0 (по умолчанию) — сразу market
+    maker_fallback_ms: int = Field(0, alias="L1_MAKER_FALLBACK_MS")
+    # Период опроса исполнений лимиток maker-first
+    maker_poll_ms: int = Field(500, alias="L1_MAKER_POLL_MS")
+    # Максимальный возраст снимка тикеров (сек), старше — цены не используем
+    snapshot_max_age_sec: float = Field(60.0, alias="L1_SNAPSHOT_MAX_AGE_SEC")
+    # Потоковые цены/FR из public WebSocket вместо REST-опроса
+    stream_enable: bool = Field(False, alias="L1_STREAM_ENABLE")
+    stream_max_age_sec: float = Field(30.0, alias="L1_STREAM_MAX_AGE_SEC")
+    # Снимок рынков на диске: старт без load_markets(), обновление в фоне
+    markets_ttl_sec: int = Field(21600, alias="MARKETS_SNAPSHOT_TTL_SEC")
+    # Отложенная запись state: не реже чем раз в N сек (и в конце каждого цикла)
+    state_flush_sec: float = Field(30.0, alias="L1_STATE_FLUSH_SEC")
+    # asyncio-цикл: пары обрабатываются конкурентно, общий капитал — под замком
+    async_enable: bool = Field(False, alias="L1_ASYNC_ENABLE")
+    # Пауза после сделки по паре (после доливки — половина)
+    order_pause_sec: float = Field(2.0, alias="L1_ORDER_PAUSE_SEC")
+    # Ноги связки (спот/перп) отправлять одновременно; false — по очереди (PERP_FIRST/SPOT_FIRST)
+    legs_concurrent: bool = Field(True, alias="L1_LEGS_CONCURRENT")
+    # Запись срезов FR/цен/спредов каждого цикла (recorder.py) для replay и отчётов
+    record_enable: bool = Field(True, alias="L1_RECORD_ENABLE")
+    record_dir: str = Field("/app/shared/md", alias="L1_RECORD_DIR")
+    record_chunk_rows: int = Field(256, alias="L1_RECORD_CHUNK_ROWS")
+    record_keep_days: int = Field(30, alias="L1_RECORD_KEEP_DAYS")
+    # Сканер всех USDT linear перпов (scanner.py): топ-N по FR добавляется к L1_SYMBOLS
+    scan_enable: bool = Field(False, alias="L1_SCAN_ENABLE")
+    scan_top_n: int = Field(10, alias="L1_SCAN_TOP_N")
+    scan_min_turnover: float = Field(2_000_000.0, alias="L1_SCAN_MIN_TURNOVER_USDT")  # оборот 24h меньшей ноги
+    scan_instruments_ttl_sec: float = Field(3600.0, alias="L1_SCAN_INSTRUMENTS_TTL_SEC")
+    # Метрики Prometheus: <dir>/l1.prom для textfile collector node_exporter (пусто — выкл)
+    metrics_dir: str = Field("/app/shared/metrics", alias="METRICS_TEXTFILE_DIR")
+    metrics_interval_sec: float = Field(15.0, alias="METRICS_INTERVAL_SEC")
+    # Трассировка (common/tracer.py): доля циклов в файл JSONL, кольцо последних записей — при ошибке
+    trace_file: str = Field("/app/logs/l1_trace.jsonl", alias="L1_TRACE_FILE")
+    trace_sample: float = Field(0.01, alias="L1_TRACE_SAMPLE")
+    trace_ring: int = Field(4096, alias="L1_TRACE_RING")
+    # Планировщик REST (common/ratelimit.py): бакеты по классам эндпоинтов v5 и приоритеты вместо троттлинга ccxt
+    rate_sched_enable: bool = Field(True, alias="L1_RATE_SCHED_ENABLE")
+    rate_safety: float = Field(0.8, alias="L1_RATE_SAFETY")  # доля лимитов Bybit
+    # Имитация биржи в процессе (common/fake_bybit.py, параметры FAKE_BYBIT_*): прогоны без ключей и сети
+    fake_exchange: bool = Field(False, alias="BYBIT_FAKE")
+    # Общий шлюз (common/gateway.py): баланс/позиции/тикеры снимает один бот-лидер на всех, снимки — в GATEWAY_DIR
+    gateway_enable: bool = Field(False, alias="GATEWAY_ENABLE")
+    gateway_dir: str = Field("/app/shared/gateway", alias="GATEWAY_DIR")
+    gateway_interval_sec: float = Field(5.0, alias="GATEWAY_INTERVAL_SEC")
+    gateway_max_age_sec: float = Field(15.0, alias="GATEWAY_MAX_AGE_SEC")
+
+    # Snipe-режим вокруг funding payout
+    snipe_enable: bool = Field(False, alias="L1_SNIPE_ENABLE")
+    snipe_window_min: int = Field(12, alias="L1_SNIPE_WINDOW_MIN")
+    snipe_min_fr: float = Field(0.00020, alias="L1_SNIPE_MIN_FR")
+    snipe_close_after_min: int = Field(3, alias="L1_SNIPE_CLOSE_AFTER_MIN")
+    snipe_top_n: int = Field(3, alias="L1_SNIPE_TOP_N")
+
+
+    # Доливка (scale-in) в уже открытые связки
+    scale_in_enable: bool = Field(True, alias="L1_SCALEIN_ENABLE")
+    scale_in_min_quote: float = Field(5.0, alias="L1_SCALEIN_MIN_QUOTE_USDT")
+    scale_in_max_steps: int = Field(3, alias="L1_SCALEIN_MAX_STEPS_PER_DAY")
+    scale_in_fr_buffer: float = Field(0.0, alias="L1_SCALEIN_FR_BUFFER")
+
+    @field_validator("symbols", mode="before")
+    @classmethod
+    def parse_symbols(cls, v):
+        return [s.strip() for s in str(v).split(",") if s.strip()]
@@ -0,0 +1,99 @@
+"""
+Одновременная отправка двух ног связки (спот + перп).
+
+Последовательная отправка держит незахеджированную дельту на всё время
+round-trip первой ноги. Здесь обе ноги уходят сразу (потоки для
+синхронного ccxt, gather для asyncio), результаты собираются вместе, а
+решение о компенсации принимает вызывающий код по списку LegResult.
+В последовательном режиме (concurrent=False) после ошибки ноги
+следующие не отправляются.
+"""
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="legs")
+
+
+@dataclass
+class LegResult:
+    name: str
+    order: Optional[Any] = None
+    error: Optional[BaseException] = None
+    sent: float = 0.0  # time.monotonic() отправки
+    done: float = 0.0  # time.monotonic() ответа
+
+    @property
+    def submitted(self) -> bool:
+        return self.sent > 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.submitted and self.error is None
+
+
+def _fill_ms(r: LegResult) -> Optional[float]:
+    """Время исполнения ноги по бирже (мс epoch), если ответ его содержит."""
+    o = r.order if isinstance(r.order, dict) else {}
+    ts = o.get("lastTradeTimestamp") or o.get("timestamp")
+    return float(ts) if ts else None
+
+
+def leg_gap_ms(a: LegResult, b: LegResult) -> float:
+    """Разрыв между исполнениями двух ног: по времени биржи, иначе по моментам ответов."""
+    ta, tb = _fill_ms(a), _fill_ms(b)
+    if ta is not None and tb is not None:
+        return abs(ta - tb)
+    return abs(a.done - b.done) * 1000.0
+
+
+def _run_one(name: str, fn: Callable[[], Any]) -> LegResult:
+    r = LegResult(name, sent=time.monotonic())
+    try:
+        r.order = fn()
+    except Exception as e:
+        r.error = e
+    r.done = time.monotonic()
+    return r
+
+
+def run_legs(legs: Sequence[Tuple[str, Callable[[], Any]]], concurrent: bool = True) -> List[LegResult]:
+    """Выполнить ноги [(имя, вызов)]; исключения не пробрасываются, а лежат в LegResult.error."""
+    if not concurrent:
+        out: List[LegResult] = []
+        for name, fn in legs:
+            if out and out[-1].error is not None:
+                out.append(LegResult(name))
+                continue
+            out.append(_run_one(name, fn))
+        return out
+    # контекст вызывающего (текущий спан трассировки) переносим в потоки пула
+    futures = [_pool.submit(contextvars.copy_context().run, _run_one, name, fn) for name, fn in legs]
+    return [f.result() for f in futures]
+
+
+async def _run_one_async(name: str, fn: Callable[[], Awaitable[Any]]) -> LegResult:
+    r = LegResult(name, sent=time.monotonic())
+    try:
+        r.order = await fn()
+    except Exception as e:
+        r.error = e
+    r.done = time.monotonic()
+    return r
+
+
+async def run_legs_async(legs: Sequence[Tuple[str, Callable[[], Awaitable[Any]]]],
+                         concurrent: bool = True) -> List[LegResult]:
+    if not concurrent:
+        out: List[LegResult] = []
+        for name, fn in legs:
+            if out and out[-1].error is not None:
+                out.append(LegResult(name))
+                continue
+            out.append(await _run_one_async(name, fn))
+        return out
+    return list(await asyncio.gather(*(_run_one_async(name, fn) for name, fn in legs)))
@@ -1,7 +1,7 @@
-import os, time, math, sqlite3, datetime as dt
-from typing import List, Dict, Any
-import statistics
+import os, time, math, json, sqlite3, asyncio, atexit, threading, datetime as dt
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 import time
+from dataclasses import dataclass
 
 """
 L1 Bot - Адаптивная система арбитража спот/перп с умным управлением маржой
@@ -35,16 +35,37 @@ L1 Bot - Адаптивная система арбитража спот/пер
 """
 
 import ccxt
-from pydantic import BaseModel, Field, field_validator
+import ccxt.async_support as ccxt_async
 from telegram import Bot
 
+from common.fake_bybit import FakeBybit, FakeBybitAsync
+from common.gateway import Gateway
+from common.metrics import BotMetrics, instrument_exchange
+from common.markets_cache import load_markets_cached, refresh_markets, snapshot_path
+from common.notifier import Notifier, is_critical
+from common.ratelimit import REPORT, Scheduler, schedule_exchange
+from common.tracer import Tracer, trace_exchange
+from config import Cfg
+from recorder import Recorder
+from scanner import Scanner
+from legs import LegResult, leg_gap_ms, run_legs, run_legs_async
+from maker import ExecReport, Leg, MakerExecutor, ThreadClient
+from state_store import StateStore
+from strategy import (Budget, PayoutCalendar, entry_budget, entry_checks, entry_order, exit_reason, fr_threshold,
+                      is_hedged, pair_caps, scale_in_alloc, symbols_order)
+from ws_cache import WsTickerCache, BYBIT_WS_SPOT, BYBIT_WS_LINEAR
+
 DB_PATH = "/app/shared/ledger.db"
 
 # ========== ENV-DEBUG ==========
+# TRACE_API — трассировать каждый цикл (L1_TRACE_SAMPLE=1), сырые HTTP-дампы не пишем
 TRACE_API = os.environ.get("TRACE_API", "false").lower() in {"1","true","yes","on"}
 EXTRA_LOGS = os.environ.get("EXTRA_LOGS", "true").lower() in {"1","true","yes","on"}
 
 # ---------- Утилиты ----------
+# источник времени (секунды epoch); replay и тесты подставляют свой
+clock: Callable[[], float] = time.time
+
 def sfloat(x: Any, default: float = 0.0) -> float:
     try:
         if x is None:
@@ -54,7 +75,7 @@ def sfloat(x: Any, default: float = 0.0) -> float:
         return default
 
 def now() -> dt.datetime:
-    return dt.datetime.utcnow()
+    return dt.datetime.utcfromtimestamp(clock())
 
 def now_s() -> str:
     return now().strftime("%Y-%m-%d %H:%M:%S")
@@ -67,137 +88,192 @@ def dlog(msg: str):
         print(msg)
 
 # ---------- Конфиг ----------
-class Cfg(BaseModel):
-    # Bybit/API
-    key: str = Field(..., alias="BYBIT_API_KEY")
-    sec: str = Field(..., alias="BYBIT_API_SECRET")
-    acct: str = Field(..., alias="BYBIT_ACCOUNT_TYPE")
-
-    # Торговые параметры L1
-    symbols: List[str] = Field(..., alias="L1_SYMBOLS")
-    fr_thr: float = Field(..., alias="L1_FUNDING_THRESHOLD_8H")
-    max_alloc: float = Field(..., alias="L1_MAX_ALLOC_PCT")
-    lev: int = Field(..., alias="L1_PERP_LEVERAGE")
-    min_free: float = Field(..., alias="L1_MIN_FREE_BALANCE_USDT")
-    poll: int = Field(..., alias="L1_POLL_INTERVAL_SEC")
-    dd_day: float = Field(..., alias="L1_MAX_DAILY_DD_PCT")
-    dd_min_eq: float = Field(200.0, alias="L1_DD_MIN_EQUITY_USDT")
-
-    # Автокомпаунд/переводы
-    start_base: float = Field(..., alias="L1_START_BASE_USDT")
-    pnl_thr_to_l2: float = Field(..., alias="L1_PNL_THRESHOLD_TO_L2")
-    pnl_export_share: float = Field(..., alias="L1_PNL_EXPORT_SHARE")
-
-    # Telegram
-    tg_token: str = Field(..., alias="TG_BOT_TOKEN")
-    tg_chat: str = Field(..., alias="TG_CHAT_ID")
-    # Отключать уведомления ночью (вне дневного окна)
-    tg_night_mute: bool = Field(True, alias="TG_NIGHT_MUTE")
-
-    # Динамический порог + дневные отчёты
-    dyn_hook: bool = Field(False, alias="L1_DYN_HOOK_ENABLE")
-    fr_lower: float = Field(0.001, alias="L1_DYN_HOOK_FR_LOWER")  # 0.1% - увеличен для лучшей маржинальности
-    fr_upper: float = Field(0.003, alias="L1_DYN_HOOK_FR_UPPER")  # 0.3% - увеличен для лучшей маржинальности
-    tz_offset_min: int = Field(0, alias="L1_TZ_OFFSET_MINUTES")  # смещение от UTC в минутах (МСК=180)
-    day_start_h: int = Field(9, alias="L1_DAY_START_HOUR")       # [start, end) локальные часы
-    day_end_h: int = Field(21, alias="L1_DAY_END_HOUR")
-    report_top_n: int = Field(4, alias="L1_REPORT_TOP_N")
-    report_min_fr: float = Field(0.0, alias="L1_REPORT_MIN_FR")  # фильтр в отчёте
-
-    # Динамическое масштабирование аллокации под высокий FR
-    alloc_scale_enable: bool = Field(True, alias="L1_ALLOC_SCALE_ENABLE")
-    alloc_scale_k: float = Field(0.5, alias="L1_ALLOC_SCALE_K")
-    alloc_scale_cap: float = Field(1.5, alias="L1_ALLOC_SCALE_CAP")
-
-    # Исполнение и фильтры качества
-    fr_extra_buffer: float = Field(0.00002, alias="L1_FR_EXTRA_BUFFER")
-    max_spread_pct: float = Field(0.003, alias="L1_MAX_SPREAD_PCT")  # 0.3%
-
-    # Выходы и гистерезис
-    hysteresis_fr: float = Field(0.00002, alias="L1_HYST_FR")
-    exit_fr_below_count: int = Field(3, alias="L1_EXIT_FR_BELOW_COUNT")
-    max_hold_min: int = Field(30, alias="L1_MAX_HOLD_MIN")  # 30 минут - минимальное время удержания для снижения комиссий
-    cooldown_min: int = Field(10, alias="L1_COOLDOWN_MIN")
-
-    max_total_alloc: float = Field(0.6, alias="L1_MAX_TOTAL_ALLOC_PCT")
-    max_pair_alloc_pct: float = Field(0.20, alias="L1_MAX_PAIR_ALLOC_PCT")  # 20% max per pair - увеличен для лучшей маржинальности
-    # Принудительное закрытие через N часов удержания (0=выкл)
-    force_close_after_h: int = Field(0, alias="L1_FORCE_CLOSE_AFTER_HOURS")
-    # Порог отсечения «пыли»: пока объём позиции в USDT меньше порога — не считаем пару хеджированной
-    dust_usd_thr: float = Field(1.0, alias="L1_DUST_USD_THRESHOLD")
-    # Порядок открытия связки: PERP_FIRST или SPOT_FIRST
-    open_order: str = Field("SPOT_FIRST", alias="L1_OPEN_ORDER")
-    # Трейлинг по пику FR (доля отката, 0=выкл)
-    trail_fr_pct: float = Field(0.0, alias="L1_TRAIL_FR_PCT")
-    # Минимум доступной маржи (USDT) для авто-редьюса
-    margin_min_usdt: float = Field(10.0, alias="L1_MARGIN_MIN_USDT")
-    auto_reduce_fraction: float = Field(0.5, alias="L1_AUTO_REDUCE_FRACTION")
-    auto_reduce_cooldown_sec: int = Field(300, alias="L1_AUTO_REDUCE_COOLDOWN_SEC")
-    # Maker-first (postOnly) с тайм-аутом fallback на market
-    maker_fallback_ms: int = Field(3000, alias="L1_MAKER_FALLBACK_MS")
-
-    # Snipe-режим вокруг funding payout
-    snipe_enable: bool = Field(False, alias="L1_SNIPE_ENABLE")
-    snipe_window_min: int = Field(12, alias="L1_SNIPE_WINDOW_MIN")
-    snipe_min_fr: float = Field(0.00020, alias="L1_SNIPE_MIN_FR")
-    snipe_close_after_min: int = Field(3, alias="L1_SNIPE_CLOSE_AFTER_MIN")
-    snipe_top_n: int = Field(3, alias="L1_SNIPE_TOP_N")
-
-
-    # Доливка (scale-in) в уже открытые связки
-    scale_in_enable: bool = Field(True, alias="L1_SCALEIN_ENABLE")
-    scale_in_min_quote: float = Field(5.0, alias="L1_SCALEIN_MIN_QUOTE_USDT")
-    scale_in_max_steps: int = Field(3, alias="L1_SCALEIN_MAX_STEPS_PER_DAY")
-    scale_in_fr_buffer: float = Field(0.0, alias="L1_SCALEIN_FR_BUFFER")
-
-    @field_validator("symbols", mode="before")
-    @classmethod
-    def parse_symbols(cls, v):
-        return [s.strip() for s in str(v).split(",") if s.strip()]
-
 cfg = Cfg(**os.environ)
 
 # ---------- Telegram ----------
 bot = Bot(token=cfg.tg_token)
+notifier = Notifier(
+    lambda text: bot.send_message(chat_id=cfg.tg_chat, text=text, disable_web_page_preview=True),
+    window_sec=cfg.tg_coalesce_sec, min_interval_sec=cfg.tg_min_interval_sec, max_queue=cfg.tg_queue_max,
+)
+atexit.register(notifier.close, 5.0)
 
 def tg(msg: str, force: bool = False):
-    """Отправка сообщения в TG. Ночные уведомления глушим, кроме критических.
-    Критичными считаем сообщения, начинающиеся с ❗️ или ⛔️.
+    """Сообщение в TG через фоновую очередь (сеть не ждём). Ночные уведомления глушим,
+    кроме критических. Критичными считаем сообщения, начинающиеся с ❗️ или ⛔️.
     """
     try:
-        is_critical = str(msg).startswith("❗️") or str(msg).startswith("⛔️")
-        if cfg.tg_night_mute and (not is_daytime()) and (not force) and (not is_critical):
+        critical = is_critical(msg)
+        if cfg.tg_night_mute and (not is_daytime()) and (not force) and (not critical):
             return
-        bot.send_message(chat_id=cfg.tg_chat, text=msg[:4000], disable_web_page_preview=True)
+        notifier.notify(msg, critical=critical)
     except Exception as e:
         print("TG error:", e)
 
+# ---------- Метрики ----------
+# гистограммы цикла/REST/исполнений, счётчики ошибок API, гейджи аккаунта; файл пишется из main()
+metrics = BotMetrics("l1", cfg.metrics_dir, cfg.metrics_interval_sec)
+# спаны REST/решений/записей в БД: кольцо в памяти, выборка циклов — в файл фоновым потоком
+tracer = Tracer(cfg.trace_file, 1.0 if TRACE_API else cfg.trace_sample, cfg.trace_ring)
+# бюджет запросов по классам v5: ордера → позиции/баланс → рынок → отчёты
+scheduler = Scheduler(safety=cfg.rate_safety, registry=metrics.registry)
+# пауза цикла после 10006, дошедшего до него (минимум; дольше — если лимит сбросится позже)
+RATE_LIMIT_PAUSE_SEC = 1.2
+
+
+def schedule(c):
+    """Метрики и спаны — вокруг самого вызова биржи, планировщик — снаружи: ожидание бюджета в задержку REST не входит."""
+    c = trace_exchange(instrument_exchange(c, metrics), tracer)
+    return schedule_exchange(c, scheduler) if cfg.rate_sched_enable else c
+
+
 # ---------- Клиент биржи ----------
-ex = ccxt.bybit({
+# BYBIT_FAKE: те же вызовы ccxt, но ответы — от имитации в процессе
+ex = (FakeBybit if cfg.fake_exchange else ccxt.bybit)({
     "apiKey": cfg.key,
     "secret": cfg.sec,
     "enableRateLimit": True,
     "options": {"defaultType": "unified"},
 })
-ex.load_markets()
-ex.verbose = TRACE_API
+schedule(ex)
+
+# GATEWAY_ENABLE: баланс/позиции/тикеры — из снимков лидера в GATEWAY_DIR (лидером может стать и L1)
+gateway = Gateway(ex, "l1", cfg.gateway_dir, cfg.gateway_interval_sec, cfg.gateway_max_age_sec,
+                  acct=cfg.acct, account=True) if cfg.gateway_enable else None
+
+
+# ---------- Индекс спот↔перп ----------
+
+@dataclass(frozen=True)
+class PairInfo:
+    spot: str
+    perp: str
+    spot_id: str
+    perp_id: str
+    spot_min_amount: float
+    perp_min_amount: float
+    spot_min_cost: float
+    perp_min_cost: float
+    spot_amount_prec: Any
+    perp_amount_prec: Any
+    funding_interval_h: int
+
+
+class MarketIndex:
+    """Спот-символ -> PairInfo (перп, id, лимиты, точность, интервал funding).
+    Строится один раз после load_markets(); все помощники читают отсюда за O(1).
+    """
+
+    def __init__(self, markets: Dict[str, Dict[str, Any]]):
+        self.pairs: Dict[str, PairInfo] = {}
+        # (base, quote) -> первый встреченный swap, как в прежнем линейном поиске
+        swaps: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for m in markets.values():
+            if m.get("swap"):
+                swaps.setdefault((m.get("base"), m.get("quote")), m)
+        keys = {f"{b}/{q}" for b, q in swaps} | {k for k, m in markets.items() if m.get("spot")}
+        for sym in keys:
+            base, quote = sym.split("/")
+            guess = markets.get(f"{sym}:USDT")
+            m_perp = guess if guess and guess.get("swap") else (swaps.get((base, quote)) or swaps.get((base, "USDT")))
+            if m_perp is None:
+                continue
+            m_spot = markets.get(sym) or {}
+            lim_s, lim_p = m_spot.get("limits") or {}, m_perp.get("limits") or {}
+            self.pairs[sym] = PairInfo(
+                spot=sym,
+                perp=m_perp["symbol"],
+                spot_id=m_spot.get("id") or "",
+                perp_id=m_perp["id"],
+                spot_min_amount=sfloat((lim_s.get("amount") or {}).get("min"), 0.0),
+                perp_min_amount=sfloat((lim_p.get("amount") or {}).get("min"), 0.0),
+                spot_min_cost=sfloat((lim_s.get("cost") or {}).get("min"), 0.0),
+                perp_min_cost=sfloat((lim_p.get("cost") or {}).get("min"), 0.0),
+                spot_amount_prec=(m_spot.get("precision") or {}).get("amount"),
+                perp_amount_prec=(m_perp.get("precision") or {}).get("amount"),
+                # instruments-info: fundingInterval в минутах
+                funding_interval_h=max(1, int(sfloat((m_perp.get("info") or {}).get("fundingInterval"), 480.0) // 60)),
+            )
+
+    def get(self, sym: str):
+        return self.pairs.get(sym)
+
+
+# asyncio-клиент (L1_ASYNC_ENABLE); рынки берёт у синхронного ex
+aex = None
+
+
+def make_async_exchange():
+    a = (FakeBybitAsync if cfg.fake_exchange else ccxt_async.bybit)({
+        "apiKey": cfg.key,
+        "secret": cfg.sec,
+        "enableRateLimit": True,
+        "options": {"defaultType": "unified"},
+    })
+    a.set_markets(ex.markets, ex.currencies)
+    return schedule(a)
+
+
+async def warm_account_type(a):
+    """Тип аккаунта (UTA) — один раз до ордеров: кэш ccxt заполняется только после ответа,
+    и параллельные ордера первого цикла иначе спрашивают user/query-api и account/info каждый сам."""
+    try:
+        await a.is_unified_enabled()
+    except Exception as e:
+        print("account type error:", e)
+
+
+# (пара, плечо), выставленные на бирже; сбрасывается с обновлением рынков и на ошибках ордера про плечо
+leverage_set: set = set()
+
+
+def reindex_markets():
+    global index
+    index = MarketIndex(ex.markets)
+    if aex is not None:
+        aex.set_markets(ex.markets, ex.currencies)
+    leverage_set.clear()
+
+
+# базы, под которые держим рынки в ex.markets (снимок урезан до них): L1_SYMBOLS + кандидаты сканера
+market_symbols = set(cfg.symbols)
+markets_thread: threading.Thread = None
+
+
+def refresh_markets_bg(done_msg: str = ""):
+    """Обновить рынки market_symbols в фоне. Единственное место, где ex.markets меняется после старта:
+    обновление на старте и догрузка кандидатов сканера не затирают друг друга урезанным снимком."""
+    global markets_thread
+
+    def load():
+        try:
+            with scheduler.priority(REPORT):
+                refresh_markets(ex, sorted(market_symbols), snapshot_path(ex.id, "l1"), on_refresh=reindex_markets)
+            if done_msg:
+                dlog(done_msg)
+        except Exception as e:
+            print("markets refresh error:", e)
+
+    markets_thread = threading.Thread(target=load, name="markets-refresh", daemon=True)
+    markets_thread.start()
+
+
+if load_markets_cached(ex, cfg.symbols, "l1", ttl_sec=cfg.markets_ttl_sec, background=False) != "api":
+    refresh_markets_bg()
+index = MarketIndex(ex.markets)
 
 
 def to_perp_symbol(sym_spot: str) -> str:
-    """ 'BTC/USDT' -> 'BTC/USDT:USDT' (linear swap). Если не найдено — пытаемся поискать по базе/квоте. """
-    guess = f"{sym_spot}:USDT"
-    if guess in ex.markets and ex.markets[guess].get("swap"):
-        return guess
-    base, quote = sym_spot.split("/")
-    for m in ex.markets.values():
-        if m.get("swap") and m.get("base") == base and m.get("quote") in (quote, "USDT"):
-            return m["symbol"]
+    """ 'BTC/USDT' -> 'BTC/USDT:USDT' (linear swap) по индексу. Если не найдено — фоллбэк на спот. """
+    info = index.get(sym_spot)
+    if info is not None:
+        return info.perp
     dlog(f"[to_perp_symbol] swap не найден для {sym_spot}, fallback на спот")
     return sym_spot
 
 # ---------- SQLite ----------
 def sql_conn():
-    os.makedirs("/app/shared", exist_ok=True)
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     con = sqlite3.connect(DB_PATH)
     try:
         con.execute("PRAGMA journal_mode=WAL;")
@@ -216,309 +292,684 @@ def sql_conn():
     return con
 
 
-def sget(con, k, default=""):
-    cur = con.execute("SELECT v FROM state WHERE k=?", (k,))
-    r = cur.fetchone()
-    return r[0] if r else default
+def sget(st: StateStore, k, default=""):
+    return st.get(k, default)
 
 
-def sset(con, k, v):
-    con.execute("INSERT OR REPLACE INTO state(k,v) VALUES(?,?)", (k, str(v)))
-    con.commit()
+def sset(st: StateStore, k, v):
+    st.set(k, v)
 
 
-def is_marked_open(con, sym: str) -> bool:
-    return sget(con, f"pair:{sym}:open", "0") == "1"
+def is_marked_open(st: StateStore, sym: str) -> bool:
+    return sget(st, f"pair:{sym}:open", "0") == "1"
 
 
-def mark_open(con, sym: str, opened: bool):
-    sset(con, f"pair:{sym}:open", "1" if opened else "0")
+def mark_open(st: StateStore, sym: str, opened: bool):
+    sset(st, f"pair:{sym}:open", "1" if opened else "0")
 
-# ---------- Безопасные обёртки к API ----------
+# ---------- Снимок аккаунта ----------
 
-def fetch_balance_safe() -> Dict[str, Dict[str, float]]:
-    try:
-        bal = ex.fetch_balance(params={"type": "unified"}) or {}
-        if TRACE_API:
-            dlog(f"[fetch_balance_safe] raw={bal}")
-        total = {k: sfloat(v, 0.0) for k, v in (bal.get("total") or {}).items()}
-        free = {k: sfloat(v, 0.0) for k, v in (bal.get("free") or {}).items()}
-        used = {k: sfloat(v, 0.0) for k, v in (bal.get("used") or {}).items()}
-
-        # Фоллбэк для Bybit UNIFIED: иногда ccxt возвращает None для free; берём из v5 wallet-balance
-        usdt_total = sfloat(total.get("USDT"), 0.0)
-        usdt_free = sfloat(free.get("USDT"), 0.0)
-        if usdt_total > 0.0 and usdt_free == 0.0:
-            try:
-                acct = (cfg.acct or "UNIFIED").upper()
-                wb = ex.private_get_v5_account_wallet_balance({"accountType": acct})
-                coin_list = ((((wb or {}).get("result") or {}).get("list") or [{}])[0].get("coin") or [])
-                for c in coin_list:
-                    if (c.get("coin") or "").upper() == "USDT":
-                        # availableBalance — эквивалент свободных средств для торговли
-                        ab = sfloat(c.get("availableBalance"), 0.0)
-                        if ab <= 0.0:
-                            ab = sfloat(c.get("availableToWithdraw"), 0.0)
-                        if ab <= 0.0:
-                            # Оценка free через walletBalance - залоки/маржа/проценты
-                            wbv = sfloat(c.get("walletBalance"), 0.0)
-                            locked = sfloat(c.get("locked"), 0.0)
-                            im_ord = sfloat(c.get("totalOrderIM"), 0.0)
-                            im_pos = sfloat(c.get("totalPositionIM"), 0.0)
-                            acci = sfloat(c.get("accruedInterest"), 0.0)
-                            est = wbv - (locked + im_ord + im_pos + acci)
-                            if est > 0.0:
-                                ab = est
-                        if ab > 0.0:
-                            free["USDT"] = ab
-                        break
-            except Exception as e:
-                if TRACE_API:
-                    dlog(f"[fetch_balance_safe] v5 wallet-balance fallback error: {e}")
-        return {"total": total, "free": free, "used": used}
-    except Exception as e:
-        print("fetch_balance_safe error:", e)
-        return {"total": {}, "free": {}, "used": {}}
+class AccountSnapshot:
+    """Баланс и позиции аккаунта одним срезом на цикл: один v5 wallet-balance
+    и один v5 position/list?settleCoin=USDT (все linear-позиции сразу).
+    После своих сделок срез правится локально (apply_fill), при неясном исходе
+    сбрасывается (invalidate) и перечитывается при следующем обращении.
+    """
 
+    def __init__(self):
+        self.equity = 0.0     # totalEquity аккаунта (USDT)
+        self.free = 0.0       # свободные USDT
+        self.available = 0.0  # доступная маржа USDT
+        self.coins: Dict[str, float] = {}  # coin -> walletBalance
+        self.perp: Dict[str, float] = {}   # id перпа -> размер (лонг +, шорт -)
+        self.valid = False
+        self.ts = 0.0
+        self.changed_at = 0.0  # time.time() своей сделки/invalidate: снимок шлюза старше него не годится
+
+    def _from_gateway(self) -> bool:
+        snap = gateway.account(newer_than=self.changed_at) if gateway is not None else None
+        if snap is None:
+            return False
+        self.load(*snap)
+        return True
 
-def account_total_equity_usdt() -> float:
-    """Возвращает общий equity аккаунта (Unified) в USDT по v5 wallet-balance.
-    Это корректный источник для суммарного эквити, включая спот и деривативы.
-    """
-    try:
-        acct = (cfg.acct or "UNIFIED").upper()
-        wb = ex.private_get_v5_account_wallet_balance({"accountType": acct}) or {}
-        res = (wb.get("result") or {})
-        lst = res.get("list") or []
-        if not lst:
-            return 0.0
-        acc = lst[0] or {}
-        # Bybit v5: totalEquity — строка
-        te = sfloat(acc.get("totalEquity"), 0.0)
-        if te <= 0.0:
-            # Фоллбэк — попробуем accountIM или walletBalance суммарно
-            te = sfloat(acc.get("walletBalance"), 0.0)
-        return max(0.0, te)
-    except Exception as e:
-        if TRACE_API:
-            dlog(f"[account_total_equity_usdt] error: {e}")
-        return 0.0
+    def refresh(self):
+        if self._from_gateway():
+            return
+        wb = ex.private_get_v5_account_wallet_balance({"accountType": (cfg.acct or "UNIFIED").upper()})
+        pages = []
+        cursor = ""
+        while True:
+            pos = ex.private_get_v5_position_list(self._position_req(cursor)) or {}
+            pages.append(pos)
+            cursor = (pos.get("result") or {}).get("nextPageCursor") or ""
+            if not cursor:
+                break
+        self.load(wb, pages)
+
+    async def refresh_async(self, aex):
+        """То же, что refresh(), через asyncio-клиент: баланс и позиции запрашиваются параллельно."""
+        if self._from_gateway():
+            return
+
+        async def positions_pages():
+            pages, cursor = [], ""
+            while True:
+                pos = await aex.private_get_v5_position_list(self._position_req(cursor)) or {}
+                pages.append(pos)
+                cursor = (pos.get("result") or {}).get("nextPageCursor") or ""
+                if not cursor:
+                    return pages
+        wb, pages = await asyncio.gather(
+            aex.private_get_v5_account_wallet_balance({"accountType": (cfg.acct or "UNIFIED").upper()}),
+            positions_pages(),
+        )
+        self.load(wb, pages)
+
+    @staticmethod
+    def _position_req(cursor: str) -> Dict[str, Any]:
+        req = {"category": "linear", "settleCoin": "USDT", "limit": 200}
+        if cursor:
+            req["cursor"] = cursor
+        return req
+
+    def load(self, wb: Dict[str, Any], position_pages: List[Dict[str, Any]]):
+        """Разобрать ответы v5 wallet-balance и страницы position/list."""
+        wb = wb or {}
+        acc = ((wb.get("result") or {}).get("list") or [{}])[0] or {}
+        coins: Dict[str, float] = {}
+        free = available = 0.0
+        for c in acc.get("coin", []) or []:
+            name = (c.get("coin") or "").upper()
+            wbv = sfloat(c.get("walletBalance"), 0.0)
+            coins[name] = wbv
+            if name != "USDT":
+                continue
+            # availableBalance — эквивалент свободных средств; дальше — оценки по walletBalance
+            ab = sfloat(c.get("availableBalance"), 0.0)
+            if ab <= 0.0:
+                ab = sfloat(c.get("availableToWithdraw"), 0.0)
+            im_ord = sfloat(c.get("totalOrderIM"), 0.0)
+            im_pos = sfloat(c.get("totalPositionIM"), 0.0)
+            available = ab if ab > 0.0 else max(0.0, wbv - (im_ord + im_pos))
+            if ab <= 0.0:
+                locked = sfloat(c.get("locked"), 0.0)
+                acci = sfloat(c.get("accruedInterest"), 0.0)
+                ab = max(0.0, wbv - (locked + im_ord + im_pos + acci))
+            free = ab
+        # Bybit v5: totalEquity — строка; фоллбэк — только USDT-остаток (может занижать)
+        equity = sfloat(acc.get("totalEquity"), 0.0)
+        if equity <= 0.0:
+            equity = coins.get("USDT", 0.0)
+
+        perp: Dict[str, float] = {}
+        for pos in position_pages:
+            for p in (pos.get("result") or {}).get("list") or []:
+                side = (p.get("side") or "").lower()
+                sz = sfloat(p.get("size"), 0.0)
+                if side in ("buy", "sell"):
+                    perp[p.get("symbol")] = perp.get(p.get("symbol"), 0.0) + (sz if side == "buy" else -sz)
+
+        self.equity, self.free, self.available = max(0.0, equity), free, available
+        self.coins, self.perp = coins, perp
+        tracer.event("account", equity=self.equity, available=available, positions=len(perp))
+        self.valid = True
+        self.ts = time.monotonic()
+
+    def ensure(self):
+        if not self.valid:
+            self.refresh()
+
+    def invalidate(self):
+        self.valid = False
+        self.changed_at = time.time()
+
+    def positions(self, sym: str) -> Dict[str, float]:
+        self.ensure()
+        base = sym.split("/")[0]
+        info = index.get(sym)
+        perp_qty = self.perp.get(info.perp_id, 0.0) if info else 0.0
+        return {"spot": self.coins.get(base, 0.0), "perp": perp_qty}
+
+    def apply_fill(self, sym: str, spot_delta: float = 0.0, perp_delta: float = 0.0, quote_delta: float = 0.0):
+        """Локально учесть собственную сделку: изменения спота/перпа (в базе) и USDT."""
+        base = sym.split("/")[0]
+        info = index.get(sym)
+        self.coins[base] = max(0.0, self.coins.get(base, 0.0) + spot_delta)
+        if info is not None:
+            self.perp[info.perp_id] = self.perp.get(info.perp_id, 0.0) + perp_delta
+        self.free = max(0.0, self.free + quote_delta)
+        self.available = max(0.0, self.available + quote_delta)
+        self.changed_at = time.time()
+
+
+account = AccountSnapshot()
+
+
+async def shared_refresh(owner, start: Callable[[], Awaitable]):
+    """Конкурентные пары asyncio-цикла ждут одно общее обновление owner, а не шлют каждая своё."""
+    task = getattr(owner, "_refresh_task", None)
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = owner._refresh_task = asyncio.ensure_future(start())
+    await asyncio.shield(task)
+
+
+async def ensure_account_async():
+    """account.ensure() для asyncio-цикла: после invalidate() снимок перечитывается через aex,
+    синхронный ex.refresh() на потоке event loop остановил бы все пары."""
+    if not account.valid:
+        await shared_refresh(account, lambda: account.refresh_async(aex))
 
 
 def available_balance_usdt() -> float:
-    """Доступная маржа в USDT из v5 wallet-balance (Unified)."""
-    try:
-        acct = (cfg.acct or "UNIFIED").upper()
-        wb = ex.private_get_v5_account_wallet_balance({"accountType": acct}) or {}
-        acc = ((wb.get("result") or {}).get("list") or [{}])[0]
-        for c in acc.get("coin", []) or []:
-            if (c.get("coin") or "").upper() == "USDT":
-                ab = sfloat(c.get("availableBalance"), 0.0)
-                if ab <= 0.0:
-                    ab = sfloat(c.get("availableToWithdraw"), 0.0)
-                if ab <= 0.0:
-                    # fallback: walletBalance - IM
-                    wbv = sfloat(c.get("walletBalance"), 0.0)
-                    im_ord = sfloat(c.get("totalOrderIM"), 0.0)
-                    im_pos = sfloat(c.get("totalPositionIM"), 0.0)
-                    ab = max(0.0, wbv - (im_ord + im_pos))
-                return max(0.0, ab)
-        return 0.0
-    except Exception as e:
-        if TRACE_API:
-            dlog(f"[available_balance_usdt] error: {e}")
-        return 0.0
+    """Доступная маржа в USDT из снимка аккаунта (v5 wallet-balance, Unified)."""
+    account.ensure()
+    return account.available
 
 
 def total_equity() -> float:
-    # Пытаемся получить точное общее equity из v5 wallet-balance
-    te = account_total_equity_usdt()
-    if te > 0.0:
-        return te
-    # Фоллбэк: только USDT-остаток (может занижать при наличии альт-активов)
-    bal = fetch_balance_safe()
-    return sfloat(bal["total"].get("USDT"), 0.0)
+    account.ensure()
+    return account.equity
 
 
 def free_equity() -> float:
-    bal = fetch_balance_safe()
-    return sfloat(bal["free"].get("USDT"), 0.0)
+    account.ensure()
+    return account.free
+
+
+# ---------- Снимок рынка ----------
+
+class MarketSnapshot:
+    """Тикеры спота и линейных перпов, загружаемые пачкой один раз за цикл.
+    mark()/spread_pct()/min_quote_required() читают только отсюда, без REST на символ.
+    При включённом стриме (L1_STREAM_ENABLE) свежие данные берутся из WebSocket-кэша,
+    а REST-пачка нужна только пока стрим не подключён или отстал.
+    """
+
+    def __init__(self, max_age_sec: float, stream: WsTickerCache = None):
+        self.max_age_sec = max_age_sec
+        self.stream = stream
+        self.symbols: List[str] = []
+        self.tickers: Dict[str, Dict[str, Any]] = {}
+        # спот-символ -> (rate за 8h, next_funding_time_ms, interval_h) из тех же linear-тикеров
+        self.funding: Dict[str, Tuple[float, int, int]] = {}
+        self.ts = 0.0  # time.monotonic() последнего успешного обновления
+
+    def refresh(self, symbols: List[str]):
+        """Bybit v5 tickers принимает одну category за запрос: один вызов на спот, один на linear."""
+        pairs = self._prepare(symbols)
+        if pairs is None:
+            return
+        tickers: Dict[str, Dict[str, Any]] = {}
+        for group in ([p.spot for p in pairs], [p.perp for p in pairs]):
+            if group:
+                tickers.update(ex.fetch_tickers(group) or {})
+        self.load(pairs, tickers)
+
+    async def refresh_async(self, aex, symbols: List[str]):
+        """То же, что refresh(), через asyncio-клиент: спот и linear запрашиваются параллельно."""
+        pairs = self._prepare(symbols)
+        if pairs is None:
+            return
+        groups = [g for g in ([p.spot for p in pairs], [p.perp for p in pairs]) if g]
+        tickers: Dict[str, Dict[str, Any]] = {}
+        for res in await asyncio.gather(*(aex.fetch_tickers(g) for g in groups)):
+            tickers.update(res or {})
+        self.load(pairs, tickers)
+
+    def _prepare(self, symbols: List[str]):
+        """Пары цикла и подписка стрима; None — стрим свежий, REST не нужен."""
+        pairs = [index.get(s) for s in dict.fromkeys(symbols)]
+        pairs = [p for p in pairs if p is not None and p.spot_id]
+        self.symbols = [p.spot for p in pairs]
+        if self.stream is not None:
+            self.stream.subscribe("spot", {p.spot_id: p.spot for p in pairs})
+            self.stream.subscribe("linear", {p.perp_id: p.perp for p in pairs})
+            if self._stream_fresh():
+                return None
+        return pairs
+
+    def load(self, pairs: List[PairInfo], tickers: Dict[str, Dict[str, Any]]):
+        tracer.event("market", pairs=len(pairs), tickers=len(tickers))
+        funding: Dict[str, Tuple[float, int, int]] = {}
+        for p in pairs:
+            if p.perp in tickers:
+                funding[p.spot] = parse_funding(tickers[p.perp], p.funding_interval_h)
+        self.tickers = tickers
+        self.funding = funding
+        self.ts = time.monotonic()
+
+    def _stream_fresh(self) -> bool:
+        """Стрим подключён и по всем символам цикла (спот и перп) есть свежие данные."""
+        if self.stream is None or not self.symbols:
+            return False
+        return all(not self.stream.is_stale(s) and not self.stream.is_stale(to_perp_symbol(s))
+                   for s in self.symbols)
+
+    def age(self) -> float:
+        return (time.monotonic() - self.ts) if self.ts > 0 else float("inf")
+
+    def is_stale(self) -> bool:
+        return self.age() > self.max_age_sec and not self._stream_fresh()
+
+    def ticker(self, sym: str):
+        """Тикер из стрима или снимка; None если символа нет или данные устарели."""
+        if self.stream is not None:
+            t = self.stream.ticker(sym)
+            if t is not None:
+                return t
+        if self.age() > self.max_age_sec:
+            return None
+        return self.tickers.get(sym)
+
+    def funding_map(self, symbols: List[str]) -> Dict[str, Tuple[float, int, int]]:
+        """{symbol: (rate за 8h, next_funding_time_ms, interval_h)}; при отсутствии данных — нулевая ставка."""
+        fresh = self.age() <= self.max_age_sec
+        out: Dict[str, Tuple[float, int, int]] = {}
+        for s in symbols:
+            info = index.get(s)
+            t = self.stream.ticker(info.perp) if self.stream is not None and info is not None else None
+            if t is not None:
+                out[s] = parse_funding(t, info.funding_interval_h)
+            else:
+                out[s] = (self.funding.get(s) if fresh else None) or (0.0, 0, 8)
+        return out
+
+
+def parse_funding(t: Dict[str, Any], default_interval_h: int = 8) -> Tuple[float, int, int]:
+    """(rate, next_funding_time_ms, interval_h) из linear-тикера v5 /market/tickers.
+    Интервал берём из тикера, иначе из индекса (instruments-info fundingInterval).
+    rate приводится к 8h (ставка за интервал × 8 / interval_h) — в единицах L1_FUNDING_THRESHOLD_8H:
+    в ней FR сравнивают entry_checks, fr_threshold, сканер и пишет recorder.
+    """
+    info = t.get("info") or {}
+    interval_h = max(1, int(sfloat(info.get("fundingIntervalHour"), 0.0)) or default_interval_h)
+    rate = sfloat(info.get("fundingRate"), 0.0) * 8.0 / interval_h
+    next_ts = int(sfloat(info.get("nextFundingTime"), 0.0))
+    return rate, next_ts, interval_h
+
+
+market = MarketSnapshot(cfg.snapshot_max_age_sec)
 
 
 def mark(sym: str) -> float:
-    """ Берём last; если None — mid(bid,ask); иначе mid по книге. """
-    try:
-        t = ex.fetch_ticker(sym) or {}
-        if TRACE_API:
-            dlog(f"[mark] {sym} ticker={t}")
-        last = sfloat(t.get("last"), 0.0)
-        if last > 0:
-            return last
-        bid = sfloat(t.get("bid"), 0.0)
-        ask = sfloat(t.get("ask"), 0.0)
-        if bid > 0 and ask > 0:
-            return (bid + ask) / 2.0
-        ob = ex.fetch_order_book(sym)
-        best_bid = sfloat(ob.get("bids", [[0]])[0][0], 0.0) if ob.get("bids") else 0.0
-        best_ask = sfloat(ob.get("asks", [[0]])[0][0], 0.0) if ob.get("asks") else 0.0
-        if best_bid > 0 and best_ask > 0:
-            return (best_bid + best_ask) / 2.0
-        return 0.0
-    except Exception as e:
-        print("mark error:", e)
+    """ Берём last; если None — mid(bid,ask). Источник — снимок рынка текущего цикла. """
+    t = market.ticker(sym)
+    if t is None:
+        dlog(f"[mark] {sym} нет в снимке или снимок устарел (age={market.age():.1f}s)")
         return 0.0
+    last = sfloat(t.get("last"), 0.0)
+    if last > 0:
+        return last
+    bid = sfloat(t.get("bid"), 0.0)
+    ask = sfloat(t.get("ask"), 0.0)
+    if bid > 0 and ask > 0:
+        return (bid + ask) / 2.0
+    return 0.0
 
 
 def funding_8h(sym: str) -> float:
-    """ Ожидаемая ставка финансирования за 8ч (Bybit linear swap через ccxt.fetchFundingRate). """
-    try:
-        perp = to_perp_symbol(sym)
-        fr = ex.fetchFundingRate(perp, params={"category": "linear"}) or {}
-        if TRACE_API:
-            dlog(f"[funding_8h] sym={sym} perp={perp} raw={fr}")
-        rate = sfloat(fr.get("fundingRate"), 0.0)
-        if rate == 0.0:
-            info = fr.get("info") or {}
-            rate = sfloat(info.get("fundingRate"), 0.0) or sfloat(info.get("funding_rate"), 0.0)
-        return rate
-    except Exception as e:
-        print("funding_8h error:", e)
-        return 0.0
+    """ Текущая ставка финансирования перпа из снимка (один v5 linear tickers на все пары). """
+    return market.funding_map([sym])[sym][0]
 
 
 def spread_pct(sym: str) -> float:
-    try:
-        t = ex.fetch_ticker(sym) or {}
-        bid = sfloat(t.get("bid"), 0.0)
-        ask = sfloat(t.get("ask"), 0.0)
-        if bid > 0 and ask > 0 and ask >= bid:
-            mid = (bid + ask) / 2.0
-            if mid > 0:
-                return (ask - bid) / mid
-        return 0.0
-    except Exception as e:
-        print("spread_pct error:", e)
-        return 0.0
+    t = market.ticker(sym) or {}
+    bid = sfloat(t.get("bid"), 0.0)
+    ask = sfloat(t.get("ask"), 0.0)
+    if bid > 0 and ask > 0 and ask >= bid:
+        mid = (bid + ask) / 2.0
+        if mid > 0:
+            return (ask - bid) / mid
+    return 0.0
+
+
+def _leverage_unchanged(e: Exception) -> bool:
+    # Bybit 110043: leverage not modified — плечо уже такое
+    return "110043" in str(e)
+
+
+# ответы ордера, после которых плечо на бирже могло разойтись с кэшем (сменили руками, риск-лимит)
+LEVERAGE_ERRORS = ("110013", "110044", "110090", "leverage")
+
+
+def forget_leverage(sym: str, e: Exception = None):
+    """Выкинуть плечо пары из кэша: следующий вход выставит его заново. e — ошибка ордера:
+    кэш сбрасывается, только если она про плечо."""
+    if e is not None and not any(code in str(e).lower() for code in LEVERAGE_ERRORS):
+        return
+    for key in [k for k in leverage_set if k[0] == sym]:
+        leverage_set.discard(key)
+
+
+def _leverage_done(sym: str, lev: int):
+    forget_leverage(sym)
+    leverage_set.add((sym, lev))
 
 
 def set_leverage(sym: str, lev: int):
+    if (sym, lev) in leverage_set:
+        return
     try:
         perp = to_perp_symbol(sym)
         try:
             ex.setLeverage(lev, perp, params={"marginMode": "cross"})
             dlog(f"[set_leverage] setLeverage {perp} -> {lev}x")
+            _leverage_done(sym, lev)
             return
         except Exception:
             pass
-        mkt = ex.market(perp)
-        ex.private_post_v5_position_set_leverage({
-            "category": "linear",
-            "symbol": mkt["id"],
-            "buyLeverage": str(lev),
-            "sellLeverage": str(lev),
-        })
+        info = index.get(sym)
+        if info is None:
+            raise RuntimeError(f"no linear swap for {sym}")
+        try:
+            ex.private_post_v5_position_set_leverage({
+                "category": "linear",
+                "symbol": info.perp_id,
+                "buyLeverage": str(lev),
+                "sellLeverage": str(lev),
+            })
+        except Exception as e:
+            if not _leverage_unchanged(e):
+                raise
+        _leverage_done(sym, lev)
         dlog(f"[set_leverage] raw set_leverage {perp} -> {lev}x")
     except Exception as e:
         print("set_leverage error:", e)
 
 
 def positions(sym: str) -> Dict[str, float]:
-    base = sym.split("/")[0]
-    bal = fetch_balance_safe()
-    spot = sfloat(bal["total"].get(base), 0.0)
-    perp_qty = 0.0
-    try:
-        perp = to_perp_symbol(sym)
-        mkt = ex.market(perp)
-        pos = ex.private_get_v5_position_list({"category": "linear", "symbol": mkt["id"]})
-        lst = ((pos or {}).get("result") or {}).get("list") or []
-        if TRACE_API:
-            dlog(f"[positions] sym={sym} perp={perp} raw={pos}")
-        for p in lst:
-            side = (p.get("side") or "").lower()
-            sz = sfloat(p.get("size"), 0.0)
-            if side == "buy":
-                perp_qty += sz
-            elif side == "sell":
-                perp_qty -= sz
-    except Exception as e:
-        print("positions error:", e)
-    return {"spot": spot, "perp": perp_qty}
+    return account.positions(sym)
+
+
+# ---------- Ноги связки ----------
+# Ордера строятся для клиента c (ex или aex): у синхронного вызов возвращает ответ,
+# у asyncio — корутину; исполнение и компенсация — через legs.run_legs(_async).
+
+COMPENSATION_ERR = {
+    "spot": "compensation sell spot failed:",
+    "perp": "compensation close perp failed:",
+}
 
 
-def order_spot_buy(sym: str, quote_usdt: float):
+def open_legs(c, sym: str, base: float) -> Dict[str, Tuple[Callable, Callable]]:
+    """{нога: (ордер открытия, откат)} для спот-лонга + перп-шорта на base."""
+    perp = to_perp_symbol(sym)
+    return {
+        "spot": (lambda: c.create_order(sym, type="market", side="buy", amount=base),
+                 lambda: c.create_order(sym, type="market", side="sell", amount=base)),
+        "perp": (lambda: c.create_order(perp, type="market", side="sell", amount=base, params={"reduceOnly": False}),
+                 lambda: c.create_order(perp, type="market", side="buy", amount=base, params={"reduceOnly": True})),
+    }
+
+
+def close_legs(c, sym: str, spot_qty: float, perp_qty: float) -> List[Tuple[str, Callable]]:
+    """Ноги сокращения связки: reduceOnly по перпу и продажа спота (нулевые пропускаются)."""
+    perp = to_perp_symbol(sym)
+    legs = []
+    if abs(perp_qty) > 1e-6:
+        legs.append(("perp", lambda: c.create_order(perp, type="market", side=("buy" if perp_qty < 0 else "sell"),
+                                                     amount=abs(perp_qty), params={"reduceOnly": True})))
+    if spot_qty > 1e-6:
+        legs.append(("spot", lambda: c.create_order(sym, type="market", side="sell", amount=spot_qty)))
+    return legs
+
+
+def leg_order(order: str) -> List[str]:
+    # при последовательной отправке (L1_LEGS_CONCURRENT=false) порядок важен для маржи
+    return ["perp", "spot"] if order == "PERP_FIRST" else ["spot", "perp"]
+
+
+def _failed_legs(sym: str, res: List[LegResult]) -> List[LegResult]:
+    for r in res:
+        if r.ok:  # market: ответ create_order — уже исполнение
+            metrics.order_fill.observe(r.done - r.sent, kind="market")
+    failed = [r for r in res if r.error is not None]
+    tracer.event("legs", sym=sym, legs={r.name: round((r.done - r.sent) * 1000.0, 1) if r.ok else str(r.error)
+                                        for r in res})
+    if failed:
+        dlog(f"[legs] {sym} " + ", ".join(f"{r.name}={'ok' if r.ok else r.error}" for r in res))
+    return failed
+
+
+def open_pair(sym: str, base: float, order: str) -> float:
+    """Открыть связку спот-лонг + перп-шорт на base; обе ноги уходят одновременно.
+    Если одна нога не прошла — исполненная откатывается, исключение пробрасывается.
+    Возвращает разрыв между исполнениями ног, мс.
+    """
+    set_leverage(sym, cfg.lev)
+    if cfg.maker_fallback_ms > 0:
+        return asyncio.run(open_pair_maker(ThreadClient(ex), sym, base))
+    legs = open_legs(ex, sym, base)
+    res = run_legs([(n, legs[n][0]) for n in leg_order(order)], concurrent=cfg.legs_concurrent)
+    failed = _failed_legs(sym, res)
+    if failed:
+        for r in res:
+            if r.ok:
+                try:
+                    legs[r.name][1]()
+                except Exception as e2:
+                    account.invalidate()
+                    print(COMPENSATION_ERR[r.name], e2)
+        forget_leverage(sym, failed[0].error)
+        raise failed[0].error
+    return leg_gap_ms(*res)
+
+
+def scale_in_base(sym: str, quote_usdt: float) -> float:
     px = mark(sym)
     if px <= 0:
         raise RuntimeError(f"mark price unavailable for {sym}")
-    base = round((quote_usdt / px) * 0.998, 6)  # запас на комиссии
-    o = ex.create_order(sym, type="market", side="buy", amount=base)
-    if TRACE_API:
-        dlog(f"[order_spot_buy] sym={sym} base={base} quote={quote_usdt} resp={o}")
-    return base, o
+    return round((quote_usdt / px) * 0.998, 6)  # запас на комиссии
 
 
-def order_perp_sell(sym: str, base: float):
-    set_leverage(sym, cfg.lev)
-    perp = to_perp_symbol(sym)
-    o = ex.create_order(perp, type="market", side="sell", amount=base, params={"reduceOnly": False})
-    if TRACE_API:
-        dlog(f"[order_perp_sell] perp={perp} base={base} resp={o}")
-    return o
+def apply_close_legs(sym: str, res: List[LegResult], spot_qty: float, perp_qty: float):
+    """Учесть в снимке исполненные ноги сокращения; при ошибке любой — снимок перечитать."""
+    for r in res:
+        if r.ok and r.name == "perp":
+            account.apply_fill(sym, perp_delta=-perp_qty)
+        elif r.ok and r.name == "spot":
+            account.apply_fill(sym, spot_delta=-spot_qty, quote_delta=spot_qty * mark(sym))
+    failed = _failed_legs(sym, res)
+    if failed:
+        account.invalidate()
+        raise failed[0].error
 
 
 def order_close_pair(sym: str):
     pos = positions(sym)
+    if cfg.maker_fallback_ms > 0:
+        try:
+            asyncio.run(close_pair_maker(ThreadClient(ex), sym, pos))
+        except Exception as e:
+            account.invalidate()
+            print("order_close_pair error:", e)
+        return
+    try:
+        res = run_legs(close_legs(ex, sym, pos["spot"], pos["perp"]), concurrent=cfg.legs_concurrent)
+        apply_close_legs(sym, res, pos["spot"], pos["perp"])
+    except Exception as e:
+        account.invalidate()
+        print("order_close_pair error:", e)
+
+
+def reduce_pair(sym: str, pos: Dict[str, float], base_reduce: float):
+    """Частично сжать связку: reduceOnly по перпу и продажа спота одновременно.
+    Всегда market: авто-редьюс срочный, ждать maker-исполнения при нехватке маржи нельзя.
+    """
+    perp_qty = base_reduce if pos["perp"] > 0 else -base_reduce
+    res = run_legs(close_legs(ex, sym, base_reduce, perp_qty), concurrent=cfg.legs_concurrent)
+    apply_close_legs(sym, res, base_reduce, perp_qty)
+
+
+# ---------- Ордера (asyncio) ----------
+# Те же операции через aex; логика и компенсации совпадают с синхронными версиями выше.
+
+async def set_leverage_async(sym: str, lev: int):
+    if (sym, lev) in leverage_set:
+        return
     try:
         perp = to_perp_symbol(sym)
-        if abs(pos["perp"]) > 1e-6:
-            o1 = ex.create_order(perp, type="market",
-                                 side=("buy" if pos["perp"] < 0 else "sell"),
-                                 amount=abs(pos["perp"]), params={"reduceOnly": True})
-            if TRACE_API:
-                dlog(f"[order_close_pair] close perp={perp} qty={abs(pos['perp'])} resp={o1}")
-        if pos["spot"] > 1e-6:
-            o2 = ex.create_order(sym, type="market", side="sell", amount=pos["spot"])
-            if TRACE_API:
-                dlog(f"[order_close_pair] sell spot sym={sym} qty={pos['spot']} resp={o2}")
+        # как set_leverage: унифицированный setLeverage, при ошибке — raw v5
+        try:
+            await aex.set_leverage(lev, perp, params={"marginMode": "cross"})
+            dlog(f"[set_leverage] setLeverage {perp} -> {lev}x")
+            _leverage_done(sym, lev)
+            return
+        except Exception:
+            pass
+        info = index.get(sym)
+        if info is None:
+            raise RuntimeError(f"no linear swap for {sym}")
+        try:
+            await aex.private_post_v5_position_set_leverage({
+                "category": "linear",
+                "symbol": info.perp_id,
+                "buyLeverage": str(lev),
+                "sellLeverage": str(lev),
+            })
+        except Exception as e:
+            if not _leverage_unchanged(e):
+                raise
+        _leverage_done(sym, lev)
+        dlog(f"[set_leverage] raw set_leverage {perp} -> {lev}x")
     except Exception as e:
+        print("set_leverage error:", e)
+
+
+async def open_pair_async(sym: str, base: float, order: str) -> float:
+    await set_leverage_async(sym, cfg.lev)
+    if cfg.maker_fallback_ms > 0:
+        return await open_pair_maker(aex, sym, base)
+    legs = open_legs(aex, sym, base)
+    res = await run_legs_async([(n, legs[n][0]) for n in leg_order(order)], concurrent=cfg.legs_concurrent)
+    failed = _failed_legs(sym, res)
+    if failed:
+        for r in res:
+            if r.ok:
+                try:
+                    await legs[r.name][1]()
+                except Exception as e2:
+                    account.invalidate()
+                    print(COMPENSATION_ERR[r.name], e2)
+        forget_leverage(sym, failed[0].error)
+        raise failed[0].error
+    return leg_gap_ms(*res)
+
+
+async def order_close_pair_async(sym: str):
+    await ensure_account_async()
+    pos = positions(sym)
+    if cfg.maker_fallback_ms > 0:
+        try:
+            await close_pair_maker(aex, sym, pos)
+        except Exception as e:
+            account.invalidate()
+            print("order_close_pair error:", e)
+        return
+    try:
+        res = await run_legs_async(close_legs(aex, sym, pos["spot"], pos["perp"]), concurrent=cfg.legs_concurrent)
+        apply_close_legs(sym, res, pos["spot"], pos["perp"])
+    except Exception as e:
+        account.invalidate()
         print("order_close_pair error:", e)
 
 
-def minutes_to_next_payout() -> int:
-    t = now()
-    windows = (0, 8, 16)
-    nxt = None
-    for i in range(24):
-        c = (t + dt.timedelta(hours=i)).replace(minute=0, second=0, microsecond=0)
-        if c.hour in windows and c > t:
-            nxt = c
-            break
-    if nxt is None:
-        nxt = (t + dt.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-    return max(0, int((nxt - t).total_seconds() // 60))
-
-def minutes_since_prev_payout() -> int:
-    t = now()
-    windows = (0, 8, 16)
-    prev = None
-    for i in range(24):
-        c = (t - dt.timedelta(hours=i)).replace(minute=0, second=0, microsecond=0)
-        if c.hour in windows and c < t:
-            prev = c
-            break
-    if prev is None:
-        prev = (t - dt.timedelta(days=1)).replace(hour=16, minute=0, second=0, microsecond=0)
-    return max(0, int((t - prev).total_seconds() // 60))
-
-def in_snipe_open_window() -> bool:
-    if not cfg.snipe_enable:
-        return True
-    return 0 < minutes_to_next_payout() <= max(1, cfg.snipe_window_min)
+async def reduce_pair_async(sym: str, pos: Dict[str, float], base_reduce: float):
+    perp_qty = base_reduce if pos["perp"] > 0 else -base_reduce
+    res = await run_legs_async(close_legs(aex, sym, base_reduce, perp_qty), concurrent=cfg.legs_concurrent)
+    apply_close_legs(sym, res, base_reduce, perp_qty)
+
 
-def in_snipe_close_window() -> bool:
-    if not cfg.snipe_enable:
-        return False
-    return 0 <= minutes_since_prev_payout() <= max(1, cfg.snipe_close_after_min)
+# ---------- Maker-first ----------
+# postOnly-лимитки на обе ноги, добор отставшей ноги и остатка market (maker.py).
+# Корутины общие: синхронный цикл запускает их через asyncio.run с ThreadClient(ex),
+# asyncio-цикл — с aex. Порядок ног (SPOT_FIRST/PERP_FIRST) здесь не важен: котируются обе.
+
+def _bbo(sym: str) -> Tuple[float, float]:
+    t = market.ticker(sym) or {}
+    return sfloat(t.get("bid"), 0.0), sfloat(t.get("ask"), 0.0)
+
+
+def leg_min_amount(min_amount: float, min_cost: float, px: float) -> float:
+    """Минимальный лот ноги в базе: меньшие остатки биржа не примет ни лимиткой, ни market."""
+    return max(min_amount, min_cost / px if px > 0 else 0.0)
+
+
+def maker_legs(sym: str, spot_side: str, spot_qty: float, perp_side: str, perp_qty: float,
+               reduce: bool) -> List[Leg]:
+    info = index.get(sym)
+    if info is None:
+        raise RuntimeError(f"no linear swap for {sym}")
+    px = mark(sym)
+    spot_bbo, perp_bbo = _bbo(sym), _bbo(info.perp)
+    legs = []
+    if perp_qty > 1e-6:
+        legs.append(Leg("perp", info.perp, perp_side, perp_qty, params={"reduceOnly": reduce},
+                        min_amount=leg_min_amount(info.perp_min_amount, info.perp_min_cost, px),
+                        price_hint=perp_bbo[0] if perp_side == "buy" else perp_bbo[1]))
+    if spot_qty > 1e-6:
+        legs.append(Leg("spot", sym, spot_side, spot_qty,
+                        min_amount=leg_min_amount(info.spot_min_amount, info.spot_min_cost, px),
+                        price_hint=spot_bbo[0] if spot_side == "buy" else spot_bbo[1]))
+    return legs
+
+
+async def execute_maker(c, sym: str, legs: List[Leg]) -> ExecReport:
+    t0 = time.monotonic()
+    rep = await MakerExecutor(c, cfg.maker_fallback_ms, cfg.maker_poll_ms,
+                              fetch_params={"acknowledged": True}).execute(legs)
+    for leg in rep.legs:
+        if leg.done_at > 0:
+            metrics.order_fill.observe(leg.done_at - t0, kind="maker")
+    dlog(f"[maker] {sym} maker={rep.maker_pct:.0f}% requotes={rep.requotes} catchups={rep.catchups} "
+         f"{rep.elapsed_ms:.0f} ms " + ", ".join(
+             f"{leg.name}={leg.filled:g}/{leg.amount:g}@{leg.avg_price:g}" + (f" {leg.error}" if leg.error else "")
+             for leg in rep.legs))
+    return rep
+
+
+async def open_pair_maker(c, sym: str, base: float) -> float:
+    """open_pair() через maker-first; при ошибке ноги исполненный объём откатывается market."""
+    rep = await execute_maker(c, sym, maker_legs(sym, "buy", base, "sell", base, reduce=False))
+    if rep.error is not None:
+        for leg in rep.legs:
+            if leg.filled <= 0:
+                continue
+            try:
+                await c.create_order(leg.symbol, "market", "sell" if leg.side == "buy" else "buy", leg.filled,
+                                     None, {"reduceOnly": True} if leg.name == "perp" else {})
+            except Exception as e2:
+                account.invalidate()
+                print(COMPENSATION_ERR[leg.name], e2)
+        forget_leverage(sym, rep.error)
+        raise rep.error
+    return rep.gap_ms
+
+
+async def close_pair_maker(c, sym: str, pos: Dict[str, float]):
+    """Закрыть связку через maker-first; в снимок идут фактически исполненные объёмы."""
+    perp_side = "buy" if pos["perp"] < 0 else "sell"
+    rep = await execute_maker(c, sym, maker_legs(sym, "sell", pos["spot"], perp_side, abs(pos["perp"]), reduce=True))
+    for leg in rep.legs:
+        if leg.name == "perp":
+            account.apply_fill(sym, perp_delta=leg.filled if leg.side == "buy" else -leg.filled)
+        else:
+            account.apply_fill(sym, spot_delta=-leg.filled, quote_delta=leg.cost)
+    if rep.error is not None:
+        account.invalidate()
+        raise rep.error
+
+
+# окна payout по паре: интервал и nextFundingTime из funding_map, обновляется в build_cycle()
+calendar = PayoutCalendar()
+
+
+def poll_delay(symbols: List[str]) -> float:
+    """Пауза между циклами: по календарю выплат (L1_POLL_ADAPTIVE) или ровно L1_POLL_INTERVAL_SEC."""
+    if not cfg.poll_adaptive:
+        return cfg.poll
+    return calendar.next_poll(cfg, symbols, clock())
 
 # ---------- Время суток, динамический порог, отчёты ----------
 
@@ -528,21 +979,13 @@ def min_quote_required(sym: str) -> float:
     """
     try:
         px = mark(sym)
-        if px <= 0:
+        info = index.get(sym)
+        if px <= 0 or info is None:
             return 0.0
-        # лимиты спота
-        m_spot = ex.market(sym)
-        lim_spot = (m_spot.get("limits") or {}).get("amount") or {}
-        min_spot = sfloat(lim_spot.get("min"), 0.0)
-        # лимиты перпа
-        perp = to_perp_symbol(sym)
-        m_perp = ex.market(perp)
-        lim_perp = (m_perp.get("limits") or {}).get("amount") or {}
-        min_perp = sfloat(lim_perp.get("min"), 0.0)
-        # также учитываем стоимостные минимумы, если заданы
-        cost_spot_min = sfloat(((m_spot.get("limits") or {}).get("cost") or {}).get("min"), 0.0)
-        cost_perp_min = sfloat(((m_perp.get("limits") or {}).get("cost") or {}).get("min"), 0.0)
-        base_min = max(min_spot, min_perp)
+        # минимальные количества спота и перпа, а также стоимостные минимумы, если заданы
+        cost_spot_min = info.spot_min_cost
+        cost_perp_min = info.perp_min_cost
+        base_min = max(info.spot_min_amount, info.perp_min_amount)
         if base_min <= 0.0:
             return 0.0
         # запас на комиссии 0.2%
@@ -557,13 +1000,10 @@ def min_quote_required(sym: str) -> float:
 
 
 def round_amount(sym: str, amount: float) -> float:
-    try:
-        m = ex.market(sym)
-        prec = (m.get("precision") or {}).get("amount")
-        if isinstance(prec, int) and prec >= 0:
-            return float(f"{amount:.{prec}f}")
-    except Exception:
-        pass
+    info = index.get(sym)
+    prec = info.spot_amount_prec if info is not None else None
+    if isinstance(prec, int) and prec >= 0:
+        return float(f"{amount:.{prec}f}")
     return round(amount, 6)
 
 def local_datetime() -> dt.datetime:
@@ -586,68 +1026,9 @@ def should_send_9am_assets_report(tag_prev: str) -> bool:
         return True
     return False
 
-def minutes_to_next_funding_window() -> int:
-    """ Funding выплата на 00:00, 08:00, 16:00 UTC. Считаем минуты до ближайшего окна. """
-    t = now()
-    windows = [0, 8, 16]
-    # следующий целый час UTC среди окон
-    next_hour = None
-    for i in range(24):
-        cand = (t + dt.timedelta(hours=i)).replace(minute=0, second=0, microsecond=0)
-        if cand.hour in windows and cand > t:
-            next_hour = cand
-            break
-    if next_hour is None:
-        next_hour = (t + dt.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-    return max(0, int((next_hour - t).total_seconds() // 60))
-
-
 def current_fr_threshold(fr_values: List[float]) -> float:
-    """Динамический порог: простая и устойчивая логика вокруг базового порога.
-    - low, если медиана < 0.75 * base
-    - high, если медиана > 1.5 * base
-    - иначе base
-    """
-    if not cfg.dyn_hook or not fr_values:
-        return cfg.fr_thr
-    try:
-        med = statistics.median(fr_values)
-        low, base, high = cfg.fr_lower, cfg.fr_thr, cfg.fr_upper
-        low_border = base * 0.75
-        high_border = base * 1.50
-        if med <= low_border:
-            return low
-        if med >= high_border:
-            return min(high, max(base, med))
-        return base
-    except Exception:
-        return cfg.fr_thr
-
-
-def in_funding_window() -> bool:
-    # за 2–3 минуты до часа (00/08/16 UTC)
-    t = now()
-    return t.minute in (57, 58)
-
+    return fr_threshold(cfg, fr_values)
 
-def minutes_since_prev_funding_window() -> int:
-    """Минут с момента предыдущего окна выплаты funding (00:00, 08:00, 16:00 UTC)."""
-    t = now()
-    windows = [0, 8, 16]
-    prev_point = None
-    for i in range(24):
-        cand = (t - dt.timedelta(hours=i)).replace(minute=0, second=0, microsecond=0)
-        if cand.hour in windows and cand < t:
-            prev_point = cand
-            break
-    if prev_point is None:
-        prev_point = (t - dt.timedelta(days=1)).replace(hour=16, minute=0, second=0, microsecond=0)
-    return max(0, int((t - prev_point).total_seconds() // 60))
-
-
-def in_funding_quiet_period() -> bool:
-    """Тихое окно вокруг payout: не входим за 5 минут до него и 2 минуты после."""
-    return minutes_to_next_funding_window() <= 5 or minutes_since_prev_funding_window() <= 2
 
 # ---------- Учёт/PNL ----------
 
@@ -655,12 +1036,13 @@ def update_daily_pnl(con, day_start_equity: float, current_equity: float):
     """Сохраняет накопленный дневной PnL: equity_today - day_start_equity."""
     d = daily_key()
     pnl_today = (current_equity - day_start_equity) if day_start_equity > 0 else 0.0
-    cur = con.execute("SELECT pnl FROM daily_pnl WHERE d=?", (d,)).fetchone()
-    if cur:
-        con.execute("UPDATE daily_pnl SET pnl=? WHERE d=?", (pnl_today, d))
-    else:
-        con.execute("INSERT INTO daily_pnl(d,pnl) VALUES(?,?)", (d, pnl_today))
-    con.commit()
+    with tracer.span("db.daily_pnl"):
+        cur = con.execute("SELECT pnl FROM daily_pnl WHERE d=?", (d,)).fetchone()
+        if cur:
+            con.execute("UPDATE daily_pnl SET pnl=? WHERE d=?", (pnl_today, d))
+        else:
+            con.execute("INSERT INTO daily_pnl(d,pnl) VALUES(?,?)", (d, pnl_today))
+        con.commit()
     return pnl_today
 
 
@@ -676,443 +1058,677 @@ def daily_drawdown_exceeded(con, start_e: float):
 
 # ---------- Основной цикл ----------
 
+@dataclass
+class Cycle:
+    """Общие данные одного прохода по парам."""
+    eq: float
+    free: float
+    dyn_thr: float
+    now_ts: int
+    symbols: List[str]                            # пары с linear swap
+    order: List[str]                              # порядок обхода (snipe: топ-N по FR)
+    fr_info: Dict[str, Tuple[float, int, int]]
+    fr_map: Dict[str, float]
+    px_map: Dict[str, float]
+
+
+@dataclass
+class PairView:
+    sym: str
+    perp: str
+    fr: float
+    px: float
+    pos: Dict[str, float]
+    hedged: bool
+    min_quote: float
+    spr: float
+    now_ts: int
+    quiet: bool                                   # окна payout своей пары (PayoutCalendar)
+    snipe_open: bool
+    snipe_close: bool
+
+
+def tradable_symbols(st: StateStore = None) -> List[str]:
+    # предфильтр символов: только имеющие swap
+    valid_symbols = []
+    for sym in dict.fromkeys(cfg.symbols + scan_symbols(st)):
+        if index.get(sym) is not None:
+            valid_symbols.append(sym)
+        else:
+            dlog(f"{now_s()} [SKIP] {sym} no linear swap")
+    return valid_symbols
+
+
+# ---------- Сканер вселенной (L1_SCAN_ENABLE) ----------
+
+scanner = Scanner(ex, top_n=cfg.scan_top_n, min_turnover=cfg.scan_min_turnover,
+                  instruments_ttl_sec=cfg.scan_instruments_ttl_sec)
+# динамический порог прошлого цикла: скан идёт до build_cycle()
+scan_thr = cfg.fr_thr
+
+
+def scan_symbols(st: StateStore = None) -> List[str]:
+    """Кандидаты последнего скана + открытые ранее пары вне L1_SYMBOLS (чтобы их закрыть)."""
+    if not cfg.scan_enable:
+        return []
+    opened = [k[5:-5] for k, v in (st.cache.items() if st is not None else ())
+              if k.startswith("pair:") and k.endswith(":open") and v == "1"]
+    out = list(dict.fromkeys((scanner.last.ranked if scanner.last is not None else []) + opened))
+    ensure_markets(out)
+    return out
+
+
+def ensure_markets(symbols: List[str]):
+    """Догрузить рынки новых кандидатов фоном; до этого пара пропускается как «no linear swap».
+    Пока идёт прошлое обновление — ждём его: пропавшие пары попадут в следующее."""
+    missing = [s for s in symbols if index.get(s) is None]
+    if not missing or (markets_thread is not None and markets_thread.is_alive()):
+        return
+    market_symbols.update(missing)
+    refresh_markets_bg(f"[scan] рынки догружены: {', '.join(missing)}")
+
+
+def scan_args() -> Tuple[float, float, float]:
+    """Порог FR(8h), спред и аллокация на пару для векторных фильтров; alloc 0 — баланса ещё нет."""
+    per_pair_alloc, cap_per_pair = pair_caps(cfg, total_equity())
+    return scan_thr + cfg.fr_extra_buffer, cfg.max_spread_pct, min(per_pair_alloc, cap_per_pair)
+
+
+def log_scan(res):
+    dlog(f"[scan] {len(res.symbols)} пар, прошли {int(res.ok.sum())} за {res.elapsed_ms:.0f} ms: "
+         + ", ".join(f"{s} {res.fr[res.symbols.index(s)]:.5f}" for s in res.ranked))
+
+
+def run_scan():
+    if not cfg.scan_enable:
+        return
+    try:
+        with scheduler.priority(REPORT):
+            log_scan(scanner.run(*scan_args()))
+    except Exception as e:
+        print("scan error:", e)
+
+
+async def run_scan_async():
+    if not cfg.scan_enable:
+        return
+    try:
+        with scheduler.priority(REPORT):
+            log_scan(await scanner.run_async(aex, *scan_args()))
+    except Exception as e:
+        print("scan error:", e)
+
+
+def daily_guard(st: StateStore, con) -> bool:
+    """Дневные метрики и лимит просадки по свежему снимку аккаунта. True — торговлю ставим на паузу."""
+    if daily_key() != sget(st, "last_day", ""):
+        sset(st, "last_day", daily_key())
+        sset(st, "day_start_equity", total_equity())
+
+    day_start_equity = sfloat(sget(st, "day_start_equity", "0"), 0.0)
+    if day_start_equity == 0.0:
+        day_start_equity = total_equity()
+        sset(st, "day_start_equity", day_start_equity)
+
+    exceeded, dd = daily_drawdown_exceeded(con, day_start_equity)
+    if exceeded:
+        tg(f"⛔️ Дневной лимит просадки {cfg.dd_day}% достигнут ({dd:.2f}%). Пауза 1ч.")
+        return True
+    update_daily_pnl(con, day_start_equity, total_equity())
+    return False
+
+
+# heartbeat пуша: без сдвига equity flow_manager всё равно видит, что L1 жив
+EQUITY_PUSH_HEARTBEAT_SEC = 300
+
+
+def push_equity(st: StateStore):
+    """Снимок equity для flow_manager в state L1_EQUITY_PUSH (уходит с flush цикла):
+    при сдвиге на L1_EQUITY_PUSH_STEP_PCT от стартовой базы или раз в EQUITY_PUSH_HEARTBEAT_SEC."""
+    if not account.valid:
+        return
+    try:
+        last = json.loads(sget(st, "L1_EQUITY_PUSH", "") or "{}")
+    except ValueError:
+        last = {}
+    step = cfg.start_base * cfg.equity_push_step_pct / 100.0
+    if (abs(account.equity - sfloat(last.get("equity"), -1.0)) < step
+            and time.time() - sfloat(last.get("ts"), 0.0) < EQUITY_PUSH_HEARTBEAT_SEC):
+        return
+    sset(st, "L1_EQUITY_PUSH", json.dumps({"ts": round(time.time(), 3), "equity": round(account.equity, 4),
+                                           "free": round(account.free, 4)}))
+
+
+def build_cycle(valid_symbols: List[str]) -> Cycle:
+    """FR/цены по всем парам из снимка рынка + dyn threshold."""
+    global scan_thr
+    fr_info = market.funding_map(valid_symbols)
+    calendar.update_many(fr_info)
+    fr_map = {sym: fr_info[sym][0] for sym in valid_symbols}
+    px_map = {sym: mark(sym) for sym in valid_symbols}
+    dyn_thr = current_fr_threshold(list(fr_map.values()))
+    scan_thr = dyn_thr
+    return Cycle(
+        eq=total_equity(), free=free_equity(), dyn_thr=dyn_thr, now_ts=int(clock()),
+        symbols=valid_symbols, order=symbols_order(cfg, valid_symbols, fr_map), fr_info=fr_info, fr_map=fr_map, px_map=px_map,
+    )
+
+
+# срезы FR/цен/спредов за цикл; буфер в памяти, файлы — раз в L1_RECORD_CHUNK_ROWS циклов
+recorder = Recorder(cfg.record_dir, chunk_rows=cfg.record_chunk_rows, keep_days=cfg.record_keep_days)
+atexit.register(recorder.flush)
+
+
+def record_cycle(cyc: Cycle):
+    if not cfg.record_enable:
+        return
+    try:
+        recorder.record(cyc.now_ts, cyc.symbols, [cyc.fr_map[s] for s in cyc.symbols],
+                        [cyc.px_map[s] for s in cyc.symbols], [spread_pct(s) for s in cyc.symbols],
+                        interval_h=[cyc.fr_info[s][2] for s in cyc.symbols])
+    except Exception as e:
+        print("recorder error:", e)
+
+
+def export_metrics(cyc: Cycle):
+    """Гейджи аккаунта и позиций по парам цикла (ноги в USDT по mark)."""
+    try:
+        metrics.equity.set(cyc.eq)
+        metrics.available.set(account.available)
+        exposure = {}
+        for sym in cyc.symbols:
+            pos = positions(sym)
+            for leg in ("spot", "perp"):
+                if pos[leg]:
+                    exposure[(sym, leg)] = pos[leg] * cyc.px_map[sym]
+        metrics.exposure.replace(exposure)
+    except Exception as e:
+        print("metrics error:", e)
+
+
+def pair_view(st: StateStore, sym: str, cyc: Cycle):
+    """Срез по паре для решений; None — пару в этом цикле пропускаем."""
+    perp_sym = to_perp_symbol(sym)
+    px = cyc.px_map[sym]
+    if px <= 0:
+        dlog(f"{now_s()} [{sym}] perp={perp_sym} mark price unavailable, skip")
+        return None
+    pos = positions(sym)
+    # считаем хеджированной только если объёмы больше «пыли» в USDT
+    hedged = is_hedged(cfg, pos["spot"], pos["perp"], px)
+    if is_marked_open(st, sym) and not hedged:
+        # пометка устарела — очищаем
+        mark_open(st, sym, False)
+    # учёт минимального размера ордера спота/перпа (в USDT)
+    min_quote = min_quote_required(sym)
+    # СНИЖЕННЫЙ ПОРОГ для максимизации входов: 60% вместо 80% от equity
+    if min_quote > 0 and min_quote > cyc.eq * 0.6:
+        dlog(f"{now_s()} [{sym}] min_quote≈{min_quote:.2f} USDT > 60% equity≈{cyc.eq:.2f}, skip")
+        return None
+    ts = clock()
+    return PairView(sym=sym, perp=perp_sym, fr=cyc.fr_map[sym], px=px, pos=pos, hedged=hedged,
+                    min_quote=min_quote, spr=spread_pct(sym), now_ts=int(ts), quiet=calendar.quiet(sym, ts),
+                    snipe_open=calendar.snipe_open(cfg, sym, ts), snipe_close=calendar.snipe_close(cfg, sym, ts))
+
+
+def want_open(st: StateStore, v: PairView, cyc: Cycle, b: Budget, avail: float, free: float) -> bool:
+    with tracer.span("decide.entry", sym=v.sym) as attrs:
+        checks = entry_checks(cfg, v.fr, cyc.dyn_thr, v.spr, free, avail, b, v.min_quote, v.hedged,
+                              v.quiet, v.snipe_open)
+        cd_until = int(sfloat(sget(st, f"cooldown_until:{v.sym}", "0"), 0.0))
+        checks["not_in_cooldown"] = v.now_ts >= cd_until
+        checks["not_marked_open"] = not is_marked_open(st, v.sym)
+        ok = all(checks.values())
+        # бывший [ENTER_CHECK]: только проваленные условия и числа, из-за которых решение принято
+        attrs.update(ok=ok, failed=[k for k, c in checks.items() if not c], fr=v.fr, dyn_thr=cyc.dyn_thr,
+                     spr=v.spr, eff_alloc=round(b.eff_alloc, 4), avail=round(avail, 4), free=round(free, 4),
+                     total_after=round(b.total_after, 4), total_cap=round(b.total_cap, 4))
+        return ok
+
+
+def want_close(st: StateStore, v: PairView, cyc: Cycle) -> str:
+    """Причина выхода из exit_reason() (пустая — держим) под спаном decide.exit."""
+    with tracer.span("decide.exit", sym=v.sym) as attrs:
+        reason = exit_reason(cfg, st, v.sym, v.fr, cyc.dyn_thr, v.hedged, v.now_ts, v.snipe_close)
+        attrs["reason"] = reason
+        return reason
+
+
+def record_trade(con, sym: str, action: str, base: float, quote: float, info: str):
+    with tracer.span("db.trade", sym=sym, action=action):
+        con.execute(
+            "INSERT INTO trades(ts,sym,action,base,quote,info) VALUES(?,?,?,?,?,?)",
+            (now_s(), sym, action, base, quote, info)
+        )
+        con.commit()
+
+
+def after_open(st: StateStore, con, v: PairView, cyc: Cycle, base: float, alloc: float, gap_ms: float) -> str:
+    # отметка времени открытия; leg_gap_ms — разрыв между исполнениями спота и перпа
+    sset(st, f"open_ts:{v.sym}", str(v.now_ts))
+    dlog(f"[legs] {v.sym} open gap={gap_ms:.0f} ms")
+    record_trade(con, v.sym, "open_pair", base, alloc,
+                 f"fr={v.fr} min_quote={v.min_quote:.4f} leg_gap_ms={gap_ms:.0f}")
+    return f"🟢 L1 OPEN {v.sym} (perp {v.perp}) • FR={v.fr:.5f} thr={cyc.dyn_thr:.5f} • alloc≈{alloc:.2f} USDT"
+
+
+def after_close(st: StateStore, con, v: PairView) -> str:
+    record_trade(con, v.sym, "close_pair", 0, 0, f"fr={v.fr}")
+    # сброс счётчика и установка cooldown
+    sset(st, f"below_thr_count:{v.sym}", "0")
+    sset(st, f"cooldown_until:{v.sym}", str(v.now_ts + max(0, cfg.cooldown_min) * 60))
+    return f"🔴 L1 CLOSE {v.sym} (perp {v.perp}) • FR={v.fr:.5f}"
+
+
+def after_scale_in(st: StateStore, con, v: PairView, key_steps: str, steps: int, base_add: float, alloc: float,
+                   gap_ms: float) -> str:
+    sset(st, key_steps, str(steps + 1))
+    record_trade(con, v.sym, "scale_in", base_add, alloc, f"fr={v.fr} leg_gap_ms={gap_ms:.0f}")
+    return f"🟦 L1 SCALE-IN {v.sym} • FR={v.fr:.5f} • +≈{alloc:.2f} USDT"
+
+
+def process_symbol(st: StateStore, con, sym: str, cyc: Cycle):
+    # цикл мог затянуться (сон после ордеров) — освежаем снимок одним batch-запросом
+    if market.is_stale():
+        market.refresh(cyc.symbols)
+        cyc.px_map[sym] = mark(sym)
+    v = pair_view(st, sym, cyc)
+    if v is None:
+        return
+
+    # АДАПТИВНАЯ АЛЛОКАЦИЯ: умное использование доступной маржи
+    avail = available_balance_usdt()
+    b = entry_budget(cfg, cyc.eq, cyc.free, avail, v.fr, cyc.dyn_thr, v.min_quote, v.pos["spot"], v.px)
+
+    # вход
+    if want_open(st, v, cyc, b, avail, cyc.free):
+        try:
+            mark_open(st, sym, True)
+            # Расчёт размера позиции с учётом адаптивной аллокации
+            base = round_amount(sym, (b.eff_alloc / v.px) * 0.998)
+            try:
+                gap_ms = open_pair(sym, base, entry_order(avail))
+            except Exception:
+                mark_open(st, sym, False)
+                raise
+            account.apply_fill(sym, spot_delta=base, perp_delta=-base, quote_delta=-b.eff_alloc)
+            tg(after_open(st, con, v, cyc, base, b.eff_alloc, gap_ms))
+            time.sleep(cfg.order_pause_sec)
+            # сбрасываем пометку, чтобы не мешать повторным входам в будущем
+            mark_open(st, sym, False)
+            return
+        except Exception as e:
+            print("open_pair error:", e)
+            tracer.dump(f"open_pair {sym}: {e}")
+            tg(f"⚠️ Не удалось открыть связку {sym} (perp {v.perp}): {e}")
+
+    # выход: отрицательный funding, FR ниже порога N раз подряд, тайм-аут удержания
+    if want_close(st, v, cyc):
+        try:
+            order_close_pair(sym)
+            tg(after_close(st, con, v))
+            time.sleep(cfg.order_pause_sec)
+            return
+        except Exception as e:
+            print("close_pair error:", e)
+            tracer.dump(f"close_pair {sym}: {e}")
+            tg(f"⚠️ Не удалось закрыть связку {sym} (perp {v.perp}): {e}")
+
+    print(f"{now_s()} [{sym} | perp={v.perp}] FR(8h)={v.fr:.6f} (thr={cyc.dyn_thr:.6f}) px={v.px:.2f} hedged={v.hedged} OK")
+
+    # --------- ДОЛИВКА (scale-in) при высоком FR ---------
+    if cfg.scale_in_enable and v.hedged:
+        key_steps = f"scalein_steps:{daily_key()}:{sym}"
+        steps = int(sfloat(sget(st, key_steps, "0"), 0.0))
+        alloc_si = scale_in_alloc(cfg, v.fr, cyc.dyn_thr, v.spr, v.quiet, v.snipe_open, steps,
+                                  cyc.eq, cyc.free, positions(sym)["spot"], v.px)
+        if alloc_si > 0:
+            try:
+                # доливка: спот на alloc_si и перп шорт на то же количество базы
+                base_add = scale_in_base(sym, alloc_si)
+                gap_ms = open_pair(sym, base_add, "SPOT_FIRST")
+                account.apply_fill(sym, spot_delta=base_add, perp_delta=-base_add, quote_delta=-alloc_si)
+                tg(after_scale_in(st, con, v, key_steps, steps, base_add, alloc_si, gap_ms))
+                time.sleep(cfg.order_pause_sec / 2)
+            except Exception as e:
+                print("scale_in error:", e)
+                tg(f"⚠️ Не удалось долить {sym}: {e}")
+
+
+def reduce_candidates(st: StateStore, cyc: Cycle) -> Tuple[float, List[Tuple[str, Dict[str, float], float]]]:
+    """АВТО-REDUCE ПРИ НИЗКОЙ МАРЖЕ: (доступная маржа, [(пара, позиции, объём сжатия)]);
+    пустой список — маржи хватает или не вышел cooldown.
+    """
+    if cfg.margin_min_usdt <= 0:
+        return 0.0, []
+    avail = available_balance_usdt()
+    last_reduce_ts = int(sfloat(sget(st, "auto_reduce_last_ts", "0"), 0.0))
+    if avail >= cfg.margin_min_usdt or (cyc.now_ts - last_reduce_ts) < max(0, cfg.auto_reduce_cooldown_sec):
+        return avail, []
+    sset(st, "auto_reduce_last_ts", str(cyc.now_ts))
+    out = []
+    for sym in cyc.symbols:
+        pos = positions(sym)
+        if pos["spot"] > 1e-6 and abs(pos["perp"]) > 1e-6:
+            base_reduce = max(0.0, min(pos["spot"], abs(pos["perp"])) * cfg.auto_reduce_fraction)
+            if base_reduce > 0:
+                out.append((sym, pos, base_reduce))
+    return avail, out
+
+
+def send_reports(st: StateStore, cyc: Cycle):
+    # ------- ЕЖЕДНЕВНЫЙ ОТЧЁТ АКТИВОВ В 09:00 ЛОКАЛЬНО -------
+    if should_send_9am_assets_report(sget(st, "last_assets_report_tag", "")):
+        sset(st, "last_assets_report_tag", local_datetime().strftime("%Y-%m-%d_%H"))
+        try:
+            total = total_equity()
+            free_b = free_equity()
+            day_start_equity = sfloat(sget(st, "day_start_equity", "0"), 0.0)
+            pnl_today = total - day_start_equity if day_start_equity > 0 else 0.0
+            pnl_today_pct = (pnl_today / day_start_equity * 100.0) if day_start_equity > 0 else 0.0
+            start_base_cfg = sfloat(sget(st, "L1_START_BASE_USDT", str(cfg.start_base)), cfg.start_base)
+            pnl_cum = total - start_base_cfg
+            pnl_cum_pct = (pnl_cum / start_base_cfg * 100.0) if start_base_cfg > 0 else 0.0
+            tg(
+                f"📊 Ежедневный отчёт (09:00): equity≈{total:.2f} USDT (free≈{free_b:.2f}). "
+                f"PnL сегодня≈{pnl_today:+.2f} USDT ({pnl_today_pct:+.2f}%). "
+                f"PnL с запуска≈{pnl_cum:+.2f} USDT ({pnl_cum_pct:+.2f}%)",
+                force=True,
+            )
+        except Exception as e:
+            print("assets_report error:", e)
+
+    # ------- Часовой отчёт по funding только в дневные часы -------
+    if is_daytime():
+        tag = local_datetime().strftime("%Y-%m-%d_%H")
+        if tag != sget(st, "last_report_tag", ""):
+            sset(st, "last_report_tag", tag)
+            # ближайшая выплата по календарю пар (интервал и nextFundingTime из снимка)
+            ts = clock()
+            mins = min((calendar.minutes_to(sym, ts) for sym in cyc.symbols), default=calendar.minutes_to("", ts))
+            # фильтр по минимальному FR и сортировка по убыванию
+            pairs = [(sym, fr) for sym, fr in cyc.fr_map.items() if fr >= cfg.report_min_fr]
+            pairs.sort(key=lambda kv: kv[1], reverse=True)
+            top = pairs[:max(1, cfg.report_top_n)]
+            lines = [
+                f"⏰ Дневной отчёт FR (локал.час {local_hour_24():02d}) • dyn_thr={cyc.dyn_thr:.5f} • мин до payout≈{mins}"
+            ]
+            for sym, frv in top:
+                lines.append(f"• {sym}: {frv:.5f}/8h (выплата раз в {cyc.fr_info[sym][2]}h)")
+            if len(top) == 0:
+                lines.append(f"• Нет пар ≥ {cfg.report_min_fr:.5f}")
+            tg("\n".join(lines))
+
+
+def run_cycle(st: StateStore, con, valid_symbols: List[str]):
+    """Один проход по парам после account.refresh() и daily_guard()."""
+    # один batch-запрос тикеров на цикл вместо fetch_ticker/fetchFundingRate на каждый символ
+    market.refresh(valid_symbols)
+    cyc = build_cycle(valid_symbols)
+    record_cycle(cyc)
+    export_metrics(cyc)
+    for sym in cyc.order:
+        with tracer.span("symbol", sym=sym):
+            process_symbol(st, con, sym, cyc)
+
+    try:
+        avail, reduce = reduce_candidates(st, cyc)
+        for sym, pos, base_reduce in reduce:
+            try:
+                reduce_pair(sym, pos, base_reduce)
+                tg(f"🔧 Auto-reduce {sym} на {base_reduce:.6f} base из-за низкой маржи ({avail:.2f} USDT)")
+            except Exception as e:
+                account.invalidate()
+                dlog(f"auto-reduce error {sym}: {e}")
+    except Exception as e:
+        dlog(f"auto-reduce block error: {e}")
+
+    with scheduler.priority(REPORT):
+        send_reports(st, cyc)
+
+
+# ---------- Основной цикл (asyncio) ----------
+
+async def process_symbol_async(st: StateStore, con, sym: str, cyc: Cycle, capital: asyncio.Lock):
+    """Как process_symbol(), но пары идут конкурентно. Под замком capital — только расчёт
+    аллокации по живому снимку аккаунта и резерв USDT под вход/доливку; ордера — вне замка.
+    """
+    # как в process_symbol(): после снов за ордерами снимок мог устареть — одно общее обновление
+    if market.is_stale():
+        await shared_refresh(market, lambda: market.refresh_async(aex, cyc.symbols))
+        cyc.px_map[sym] = mark(sym)
+    await ensure_account_async()
+    v = pair_view(st, sym, cyc)
+    if v is None:
+        return
+
+    async with capital:
+        avail = account.available
+        b = entry_budget(cfg, cyc.eq, account.free, avail, v.fr, cyc.dyn_thr, v.min_quote, v.pos["spot"], v.px)
+        opening = want_open(st, v, cyc, b, avail, account.free)
+        if opening:
+            mark_open(st, sym, True)
+            # резерв: следующие пары увидят уменьшенные free/available и total_after
+            account.apply_fill(sym, quote_delta=-b.eff_alloc)
+
+    if opening:
+        try:
+            base = round_amount(sym, (b.eff_alloc / v.px) * 0.998)
+            try:
+                gap_ms = await open_pair_async(sym, base, entry_order(avail))
+            except Exception:
+                account.apply_fill(sym, quote_delta=b.eff_alloc)
+                mark_open(st, sym, False)
+                raise
+            account.apply_fill(sym, spot_delta=base, perp_delta=-base)
+            tg(after_open(st, con, v, cyc, base, b.eff_alloc, gap_ms))
+            await asyncio.sleep(cfg.order_pause_sec)
+            mark_open(st, sym, False)
+            return
+        except Exception as e:
+            print("open_pair error:", e)
+            tracer.dump(f"open_pair {sym}: {e}")
+            tg(f"⚠️ Не удалось открыть связку {sym} (perp {v.perp}): {e}")
+
+    if want_close(st, v, cyc):
+        try:
+            await order_close_pair_async(sym)
+            tg(after_close(st, con, v))
+            await asyncio.sleep(cfg.order_pause_sec)
+            return
+        except Exception as e:
+            print("close_pair error:", e)
+            tracer.dump(f"close_pair {sym}: {e}")
+            tg(f"⚠️ Не удалось закрыть связку {sym} (perp {v.perp}): {e}")
+
+    print(f"{now_s()} [{sym} | perp={v.perp}] FR(8h)={v.fr:.6f} (thr={cyc.dyn_thr:.6f}) px={v.px:.2f} hedged={v.hedged} OK")
+
+    if cfg.scale_in_enable and v.hedged:
+        key_steps = f"scalein_steps:{daily_key()}:{sym}"
+        steps = int(sfloat(sget(st, key_steps, "0"), 0.0))
+        await ensure_account_async()
+        async with capital:
+            alloc_si = scale_in_alloc(cfg, v.fr, cyc.dyn_thr, v.spr, v.quiet, v.snipe_open, steps,
+                                      cyc.eq, account.free, positions(sym)["spot"], v.px)
+            if alloc_si > 0:
+                account.apply_fill(sym, quote_delta=-alloc_si)
+        if alloc_si > 0:
+            try:
+                try:
+                    base_add = scale_in_base(sym, alloc_si)
+                    gap_ms = await open_pair_async(sym, base_add, "SPOT_FIRST")
+                except Exception:
+                    account.apply_fill(sym, quote_delta=alloc_si)
+                    raise
+                account.apply_fill(sym, spot_delta=base_add, perp_delta=-base_add)
+                tg(after_scale_in(st, con, v, key_steps, steps, base_add, alloc_si, gap_ms))
+                await asyncio.sleep(cfg.order_pause_sec / 2)
+            except Exception as e:
+                print("scale_in error:", e)
+                tg(f"⚠️ Не удалось долить {sym}: {e}")
+
+
+async def run_cycle_async(st: StateStore, con, valid_symbols: List[str]):
+    """Один проход после account/market refresh_async() и daily_guard(): все пары конкурентно."""
+    cyc = build_cycle(valid_symbols)
+    record_cycle(cyc)
+    export_metrics(cyc)
+    capital = asyncio.Lock()
+
+    async def one(sym):
+        with tracer.span("symbol", sym=sym):
+            await process_symbol_async(st, con, sym, cyc, capital)
+
+    results = await asyncio.gather(*(one(sym) for sym in cyc.order), return_exceptions=True)
+    errors = [(sym, r) for sym, r in zip(cyc.order, results) if isinstance(r, Exception)]
+    for sym, e in errors[1:]:
+        print(f"[{sym}] cycle error:", e)
+    if errors:
+        raise errors[0][1]
+
+    async def reduce(avail, sym, pos, base_reduce):
+        try:
+            await reduce_pair_async(sym, pos, base_reduce)
+            tg(f"🔧 Auto-reduce {sym} на {base_reduce:.6f} base из-за низкой маржи ({avail:.2f} USDT)")
+        except Exception as e:
+            account.invalidate()
+            dlog(f"auto-reduce error {sym}: {e}")
+
+    try:
+        await ensure_account_async()
+        avail, candidates = reduce_candidates(st, cyc)
+        await asyncio.gather(*(reduce(avail, *c) for c in candidates))
+    except Exception as e:
+        dlog(f"auto-reduce block error: {e}")
+
+    with scheduler.priority(REPORT):
+        await ensure_account_async()
+        send_reports(st, cyc)
+
+
+async def iteration_async(st: StateStore, con) -> Optional[List[str]]:
+    """Одна итерация asyncio-цикла; пары цикла или None — дневной лимит просадки (пауза)."""
+    # кандидаты сканера — с прошлого цикла: скан идёт параллельно со снимками
+    valid_symbols = tradable_symbols(st)
+    # баланс, позиции и тикеры — одним параллельным заходом
+    await asyncio.gather(account.refresh_async(aex), market.refresh_async(aex, valid_symbols),
+                         run_scan_async())
+    push_equity(st)
+    if daily_guard(st, con):
+        return None
+    with tracer.span("cycle", mode="async", symbols=len(valid_symbols)):
+        await run_cycle_async(st, con, valid_symbols)
+    st.flush()
+    return valid_symbols
+
+
+async def main_async(st: StateStore, con):
+    global aex
+    aex = make_async_exchange()
+    await warm_account_type(aex)
+    try:
+        while True:
+            t0 = time.monotonic()
+            try:
+                valid_symbols = await iteration_async(st, con)
+                if valid_symbols is None:
+                    await asyncio.sleep(3600)
+                    continue
+                metrics.cycle.observe(time.monotonic() - t0)
+                await asyncio.sleep(poll_delay(valid_symbols))
+
+            except ccxt.RateLimitExceeded:
+                # 10006 дошёл до цикла (ордер/POST не повторяется): пауза — до сброса лимита, не меньше прежних 1.2 с
+                await asyncio.sleep(max(RATE_LIMIT_PAUSE_SEC, scheduler.penalty_sec()))
+            except ccxt.NetworkError as e:
+                print("NetworkError:", e); await asyncio.sleep(2.0)
+            except ccxt.ExchangeError as e:
+                print("ExchangeError:", e); await asyncio.sleep(3.0)
+            except Exception as e:
+                print("Loop error:", e)
+                tracer.dump(f"loop error: {e}")
+                tg(f"❗️L1 error: {e}")
+                await asyncio.sleep(5.0)
+            finally:
+                try:
+                    st.flush()
+                except Exception as e:
+                    print("state flush error:", e)
+    finally:
+        await aex.close()
+
+
+def iteration(st: StateStore, con) -> Optional[List[str]]:
+    """Одна итерация синхронного цикла; пары цикла или None — дневной лимит просадки (пауза)."""
+    # один срез баланса/позиций на цикл (wallet-balance + position/list)
+    account.refresh()
+    push_equity(st)
+    # инициализация дневных метрик и лимит дневной просадки
+    if daily_guard(st, con):
+        return None
+    run_scan()
+    valid_symbols = tradable_symbols(st)
+    with tracer.span("cycle", mode="sync", symbols=len(valid_symbols)):
+        run_cycle(st, con, valid_symbols)
+    st.flush()
+    return valid_symbols
+
+
 def main():
     con = sql_conn()
+    st = StateStore(con, flush_interval_sec=cfg.state_flush_sec)
+    st.flush = tracer.wrap(st.flush, "db.state_flush")
+    tracer.install_signal()
+    atexit.register(tracer.flush, 2.0)
+    metrics.start()
+    if cfg.stream_enable:
+        market.stream = WsTickerCache({"spot": BYBIT_WS_SPOT, "linear": BYBIT_WS_LINEAR},
+                                      max_age_sec=cfg.stream_max_age_sec)
+        market.stream.start()
+    elif gateway is not None:
+        # тикеры шлюза — тот же интерфейс, что у WebSocket-кэша
+        market.stream = gateway
+    if gateway is not None:
+        gateway.start()
     tg("🚀 L1 бот (автокомпаунд, дневные отчёты, dyn-threshold) запущен.")
     # Синхронизация стартовой базы с SQLite
-    saved_base = sget(con, "L1_START_BASE_USDT", "")
+    saved_base = sget(st, "L1_START_BASE_USDT", "")
     if saved_base:
         cfg.start_base = sfloat(saved_base, cfg.start_base)
     else:
-        sset(con, "L1_START_BASE_USDT", cfg.start_base)
-    last_equity = total_equity()
+        sset(st, "L1_START_BASE_USDT", cfg.start_base)
 
-    last_report_tag = sget(con, "last_report_tag", "")  # YYYY-MM-DD_HH (локально)
-    last_assets_report_tag = sget(con, "last_assets_report_tag", "")
+    if cfg.async_enable:
+        asyncio.run(main_async(st, con))
+        return
 
     while True:
+        t0 = time.monotonic()
         try:
-            # инициализация дневных метрик
-            if daily_key() != sget(con, "last_day", ""):
-                sset(con, "last_day", daily_key())
-                sset(con, "day_start_equity", total_equity())
-
-            day_start_equity = sfloat(sget(con, "day_start_equity", "0"), 0.0)
-            if day_start_equity == 0.0:
-                day_start_equity = total_equity()
-                sset(con, "day_start_equity", day_start_equity)
-
-            # лимит дневной просадки
-            exceeded, dd = daily_drawdown_exceeded(con, day_start_equity)
-            if exceeded:
-                tg(f"⛔️ Дневной лимит просадки {cfg.dd_day}% достигнут ({dd:.2f}%). Пауза 1ч.")
+            valid_symbols = iteration(st, con)
+            if valid_symbols is None:
                 time.sleep(3600)
                 continue
-
-            eq = total_equity()
-            update_daily_pnl(con, day_start_equity, eq)
-            last_equity = eq
-            free = free_equity()
-
-            # ------- FR по всем парам + dyn threshold -------
-            fr_map: Dict[str, float] = {}
-            px_map: Dict[str, float] = {}
-            # предфильтр символов: только имеющие swap
-            valid_symbols = []
-            for sym in cfg.symbols:
-                perp_sym = f"{sym}:USDT"
-                if perp_sym in ex.markets and ex.markets[perp_sym].get("swap"):
-                    valid_symbols.append(sym)
-                else:
-                    dlog(f"{now_s()} [SKIP] {sym} no linear swap")
-
-            for sym in valid_symbols:
-                fr_map[sym] = funding_8h(sym)
-                px_map[sym] = mark(sym)
-            dyn_thr = current_fr_threshold(list(fr_map.values()))
-
-            per_pair_alloc = max(0.0, eq * cfg.max_alloc)
-            cap_per_pair = max(0.0, eq * max(0.0, min(cfg.max_pair_alloc_pct, 0.99)))
-            # snipe: отранжировать пары по FR/моментуму и ограничить топ-N
-            symbols_order = valid_symbols
-            if cfg.snipe_enable:
-                # моментум FR: разница между текущим FR и порогом dyn_thr
-                ranked = sorted(
-                    [(sym, fr_map.get(sym, 0.0)) for sym in valid_symbols],
-                    key=lambda kv: kv[1], reverse=True,
-                )
-                top_n = max(1, sfloat(cfg.snipe_top_n, 3))
-                symbols_order = [s for s, _ in ranked[:int(top_n)]]
-
-            for sym in symbols_order:
-                perp_sym = to_perp_symbol(sym)
-                fr = fr_map[sym]
-                px = px_map[sym]
-                if px <= 0:
-                    dlog(f"{now_s()} [{sym}] perp={perp_sym} mark price unavailable, skip")
-                    continue
-
-                pos = positions(sym)
-                # считаем хеджированной только если объёмы больше «пыли» в USDT
-                spot_usd = pos["spot"] * px
-                perp_usd = abs(pos["perp"]) * px
-                significant = (spot_usd >= cfg.dust_usd_thr) and (perp_usd >= cfg.dust_usd_thr)
-                hedged = significant and (pos["spot"] > 1e-6) and (pos["perp"] < -1e-6) and (abs(pos["perp"]) >= pos["spot"] * 0.95)
-                if is_marked_open(con, sym) and not hedged:
-                    # пометка устарела — очищаем
-                    mark_open(con, sym, False)
-                msg = f"[{sym} | perp={perp_sym}] FR(8h)={fr:.6f} (thr={dyn_thr:.6f}) px={px:.2f} hedged={hedged}"
-
-                # динамическое масштабирование аллокации при высоком FR
-                scaled_alloc = min(per_pair_alloc, cap_per_pair)
-                if cfg.alloc_scale_enable and dyn_thr > 0:
-                    excess = max(0.0, fr - dyn_thr)
-                    scale = 1.0 + cfg.alloc_scale_k * (excess / max(dyn_thr, 1e-9))
-                    scale = max(1.0, min(scale, cfg.alloc_scale_cap))
-                    scaled_alloc = min(per_pair_alloc * scale, cap_per_pair)
-
-                # учёт минимального размера ордера спота/перпа (в USDT)
-                min_quote = min_quote_required(sym)
-                # СНИЖЕННЫЙ ПОРОГ для максимизации входов: 60% вместо 80% от equity
-                if min_quote > 0 and min_quote > eq * 0.6:
-                    dlog(f"{now_s()} [{sym}] min_quote≈{min_quote:.2f} USDT > 60% equity≈{eq:.2f}, skip")
-                    continue
-                
-                # учтём текущую стоимость уже купленного спота, чтобы не превысить cap на пару
-                current_spot_quote = max(0.0, pos["spot"] * px)
-                remaining_cap_for_pair = max(0.0, cap_per_pair - current_spot_quote)
-                
-                # АДАПТИВНАЯ АЛЛОКАЦИЯ: умное использование доступной маржи
-                avail = available_balance_usdt()
-                
-                # Базовый размер из конфига
-                base_alloc = max(scaled_alloc, min_quote)
-                
-                # УВЕЛИЧЕНИЕ БАЗОВОГО РАЗМЕРА на 50% для достижения 1.0% маржинальности
-                base_alloc = max(scaled_alloc * 1.5, min_quote)
-                
-                # МАКСИМАЛЬНО АГРЕССИВНАЯ АЛЛОКАЦИЯ для достижения 1.0% маржинальности в день
-                if avail >= 25.0:
-                    # Очень много маржи - используем до 80% доступной
-                    eff_alloc = min(base_alloc, avail * 0.8)
-                elif avail >= 15.0:
-                    # Много маржи - используем до 90% доступной
-                    eff_alloc = min(base_alloc, avail * 0.9)
-                elif avail >= 8.0:
-                    # Средняя маржа - используем до 95% доступной
-                    eff_alloc = min(base_alloc, avail * 0.95)
-                elif avail >= 4.0:
-                    # Мало маржи - используем до 98% доступной
-                    eff_alloc = min(base_alloc, avail * 0.98)
-                elif avail >= 2.0:
-                    # Минимальная маржа - используем до 99% доступной
-                    eff_alloc = min(base_alloc, avail * 0.99)
-                else:
-                    # Недостаточно маржи - вход невозможен
-                    eff_alloc = 0.0
-                
-                # Дополнительные ограничения
-                if eff_alloc > 0:
-                    # Ограничение по лимиту на пару
-                    eff_alloc = min(eff_alloc, remaining_cap_for_pair) if remaining_cap_for_pair > 0 else 0.0
-                    # Ограничение по глобальному капу (стабилизация)
-                    total_used_approx = max(0.0, eq - free)
-                    total_after = total_used_approx + eff_alloc
-                    # Стабилизация капа: буфер 15% вместо 1%
-                    total_cap = eq * max(0.0, min(cfg.max_total_alloc, 0.85))
-                    if total_after > total_cap:
-                        eff_alloc = max(0.0, total_cap - total_used_approx)
-                        total_after = total_used_approx + eff_alloc
-                else:
-                    total_used_approx = max(0.0, eq - free)
-                    total_after = total_used_approx
-                    total_cap = eq * max(0.0, min(cfg.max_total_alloc, 0.85))
-
-                # доп. фильтры: спред, FR-буфер, совокупная аллокация
-                spr = spread_pct(sym)
-
-                # гистерезис удержания: снижение порога для проверки выхода (ниже)
-                hold_thr = max(0.0, dyn_thr - cfg.hysteresis_fr)
-
-                # вход
-                can_enter = (
-                    (not hedged)
-                    and (fr >= (dyn_thr + cfg.fr_extra_buffer))
-                    and (free >= max(eff_alloc, cfg.min_free))
-                    and (not in_funding_quiet_period()) and (not cfg.snipe_enable or (in_snipe_open_window() and fr >= cfg.snipe_min_fr))
-                    and (spr <= cfg.max_spread_pct)
-                    and (total_after <= total_cap)
-                    and (eff_alloc >= min_quote)  # проверка минимального размера
-                    and (avail >= 1.5)  # СНИЖЕННЫЙ ПОРОГ: 1.5 вместо 4.0 для максимизации входов
-                )
-                # cooldown
-                cd_until = int(sfloat(sget(con, f"cooldown_until:{sym}", "0"), 0.0))
-                now_ts = int(now().timestamp())
-                not_in_cooldown = now_ts >= cd_until
-                if EXTRA_LOGS:
-                    dbg = {
-                        "fr_ok": fr >= (dyn_thr + cfg.fr_extra_buffer),
-                        "free_ok": free >= max(eff_alloc, cfg.min_free),
-                        "not_quiet": not in_funding_quiet_period(), "snipe_ok": (not cfg.snipe_enable or (in_snipe_open_window() and fr >= cfg.snipe_min_fr)),
-                        "spread_ok": spr <= cfg.max_spread_pct,
-                        "cap_ok": total_after <= total_cap,
-                        "not_hedged": not hedged,
-                        "not_in_cooldown": not_in_cooldown,
-                        "marked_open": is_marked_open(con, sym),
-                        "eff_alloc": round(eff_alloc, 4),
-                        "free": round(free, 4),
-                        "avail": round(avail, 4),
-                        "spr": round(spr, 6),
-                        "dyn_thr": round(dyn_thr, 6),
-                        "fr": round(fr, 6),
-                        "total_after": round(total_after, 4),
-                        "total_cap": round(total_cap, 4),
-                    }
-                    print(f"{now_s()} [ENTER_CHECK] {sym} {dbg}")
-
-                if can_enter and not is_marked_open(con, sym) and not_in_cooldown:
-                    try:
-                        mark_open(con, sym, True)
-                        px_enter = px
-                        
-                        # ГИБРИДНЫЙ ПОРЯДОК ВХОДА: PERP_FIRST для экономии, SPOT_FIRST для скорости
-                        if avail >= 20.0:
-                            order = "SPOT_FIRST"  # Быстрый вход при избытке маржи
-                        else:
-                            order = "PERP_FIRST"  # Экономия при ограниченной марже
-                        
-                        # Расчёт размера позиции с учётом адаптивной аллокации
-                        base = round_amount(sym, (eff_alloc / px_enter) * 0.998)
-                        
-                        if order == "PERP_FIRST":
-                            # 1) сначала открываем перп шорт (используем маржу)
-                            try:
-                                _ = order_perp_sell(sym, base)
-                            except Exception as e:
-                                mark_open(con, sym, False)
-                                raise e
-                            # 2) затем покупаем спот тем же количеством базовой валюты
-                            try:
-                                _ = ex.create_order(sym, type="market", side="buy", amount=base)
-                            except Exception as e:
-                                # откатываем перп при неуспехе спота
-                                try:
-                                    perp = to_perp_symbol(sym)
-                                    _ = ex.create_order(perp, type="market", side="buy", amount=base, params={"reduceOnly": True})
-                                except Exception as e2:
-                                    print("compensation close perp failed:", e2)
-                                mark_open(con, sym, False)
-                                raise e
-                        else:
-                            # SPOT_FIRST (если явно указан)
-                            # 1) сначала покупаем спот
-                            try:
-                                _ = ex.create_order(sym, type="market", side="buy", amount=base)
-                            except Exception as e:
-                                mark_open(con, sym, False)
-                                raise e
-                            # 2) затем открываем перп шорт на ту же базу; при неуспехе — откатываем спот
-                            try:
-                                _ = order_perp_sell(sym, base)
-                            except Exception as e:
-                                try:
-                                    _ = ex.create_order(sym, type="market", side="sell", amount=base)
-                                except Exception as e2:
-                                    print("compensation sell spot failed:", e2)
-                                mark_open(con, sym, False)
-                                raise e
-                        # отметка времени открытия
-                        sset(con, f"open_ts:{sym}", str(now_ts))
-                        con.execute(
-                            "INSERT INTO trades(ts,sym,action,base,quote,info) VALUES(?,?,?,?,?,?)",
-                            (now_s(), sym, "open_pair", base, eff_alloc, f"fr={fr} min_quote={min_quote:.4f}")
-                        )
-                        con.commit()
-                        tg(f"🟢 L1 OPEN {sym} (perp {perp_sym}) • FR={fr:.5f} thr={dyn_thr:.5f} • alloc≈{eff_alloc:.2f} USDT")
-                        time.sleep(2)
-                        # сбрасываем пометку, чтобы не мешать повторным входам в будущем
-                        mark_open(con, sym, False)
-                        continue
-                    except Exception as e:
-                        print("open_pair error:", e)
-                        tg(f"⚠️ Не удалось открыть связку {sym} (perp {perp_sym}): {e}")
-
-                # выход по отрицательному funding
-                below_key = f"below_thr_count:{sym}"
-                if hedged:
-                    if fr < hold_thr:
-                        cnt = int(sfloat(sget(con, below_key, "0"), 0.0)) + 1
-                        sset(con, below_key, str(cnt))
-                    else:
-                        if sget(con, below_key, "0") != "0":
-                            sset(con, below_key, "0")
-
-                exit_due_to_negative = hedged and (fr < -0.00005)
-                exit_due_to_below = hedged and (int(sfloat(sget(con, below_key, "0"), 0.0)) >= cfg.exit_fr_below_count)
-
-                # тайм-аут удержания
-                exit_due_to_time = False
-                if hedged and cfg.max_hold_min > 0:
-                    ots = int(sfloat(sget(con, f"open_ts:{sym}", "0"), 0.0))
-                    if ots > 0:
-                        held_min = max(0, int((now_ts - ots) // 60))
-                        exit_due_to_time = (held_min >= cfg.max_hold_min) and (fr < dyn_thr) or (cfg.snipe_enable and in_snipe_close_window())
-                        # принудительное закрытие после N часов независимо от FR
-                        if cfg.force_close_after_h > 0 and held_min >= max(1, cfg.force_close_after_h) * 60:
-                            exit_due_to_time = True
-                        # трейлинг по пику FR: запоминаем максимум и закрываем при откате
-                        if cfg.trail_fr_pct > 0 and hedged:
-                            key_peak = f"fr_peak:{sym}"
-                            peak = sfloat(sget(con, key_peak, "0"), 0.0)
-                            if fr > peak:
-                                sset(con, key_peak, fr)
-                            elif peak > 0:
-                                if fr <= peak * max(0.0, 1.0 - cfg.trail_fr_pct):
-                                    exit_due_to_time = True
-
-                if exit_due_to_negative or exit_due_to_below or exit_due_to_time:
-                    try:
-                        order_close_pair(sym)
-                        con.execute(
-                            "INSERT INTO trades(ts,sym,action,base,quote,info) VALUES(?,?,?,?,?,?)",
-                            (now_s(), sym, "close_pair", 0, 0, f"fr={fr}")
-                        )
-                        con.commit()
-                        tg(f"🔴 L1 CLOSE {sym} (perp {perp_sym}) • FR={fr:.5f}")
-                        # сброс счётчика и установка cooldown
-                        sset(con, below_key, "0")
-                        cd_until = now_ts + max(0, cfg.cooldown_min) * 60
-                        sset(con, f"cooldown_until:{sym}", str(cd_until))
-                        time.sleep(2)
-                        continue
-                    except Exception as e:
-                        print("close_pair error:", e)
-                        tg(f"⚠️ Не удалось закрыть связку {sym} (perp {perp_sym}): {e}")
-
-                print(f"{now_s()} {msg} OK")
-
-                # --------- ДОЛИВКА (scale-in) при высоком FR ---------
-                if cfg.scale_in_enable and hedged:
-                    # проверяем дневной лимит шагов
-                    key_steps = f"scalein_steps:{daily_key()}:{sym}"
-                    steps = int(sfloat(sget(con, key_steps, "0"), 0.0))
-                    if steps < max(0, cfg.scale_in_max_steps):
-                        # условия доливки: FR выше порога + буфер, спред ок, есть свободные средства и не в тихом окне
-                        can_scale = (
-                            fr >= (dyn_thr + max(0.0, cfg.scale_in_fr_buffer))
-                            and spr <= cfg.max_spread_pct
-                            and (not in_funding_quiet_period()) and (not cfg.snipe_enable or (in_snipe_open_window() and fr >= cfg.snipe_min_fr))
-                        )
-                        if can_scale:
-                            # размер доливки: минимум из scale_in_min_quote и доступного free, но не превышаем cap
-                            # не превышаем лимит на пару с учётом текущего спота
-                            current_spot_quote = max(0.0, positions(sym)["spot"] * px)
-                            remaining_cap_for_pair = max(0.0, cap_per_pair - current_spot_quote)
-                            alloc_si = min(cfg.scale_in_min_quote, free, remaining_cap_for_pair)
-                            total_after_si = total_used_approx + alloc_si
-                            if alloc_si >= cfg.scale_in_min_quote and total_after_si <= total_cap:
-                                try:
-                                    # доливка: купить спот на alloc_si и долить перп шорт на то же количество базы
-                                    base_add, _ = order_spot_buy(sym, alloc_si)
-                                    try:
-                                        _ = order_perp_sell(sym, base_add)
-                                    except Exception as e:
-                                        # если перп не смогли — откатываем спот
-                                        try:
-                                            _ = ex.create_order(sym, type="market", side="sell", amount=base_add)
-                                        except Exception as e2:
-                                            print("scale-in compensation sell spot failed:", e2)
-                                        raise e
-                                    steps += 1
-                                    sset(con, key_steps, str(steps))
-                                    con.execute(
-                                        "INSERT INTO trades(ts,sym,action,base,quote,info) VALUES(?,?,?,?,?,?)",
-                                        (now_s(), sym, "scale_in", base_add, alloc_si, f"fr={fr}")
-                                    )
-                                    con.commit()
-                                    tg(f"🟦 L1 SCALE-IN {sym} • FR={fr:.5f} • +≈{alloc_si:.2f} USDT")
-                                    time.sleep(1)
-                                except Exception as e:
-                                    print("scale_in error:", e)
-                                    tg(f"⚠️ Не удалось долить {sym}: {e}")
-
-            # ------- АВТО-REDUCE ПРИ НИЗКОЙ МАРЖЕ -------
-            try:
-                if cfg.margin_min_usdt > 0:
-                    avail = available_balance_usdt()
-                    last_reduce_ts = int(sfloat(sget(con, "auto_reduce_last_ts", "0"), 0.0))
-                    if avail < cfg.margin_min_usdt and (now_ts - last_reduce_ts) >= max(0, cfg.auto_reduce_cooldown_sec):
-                        # пробуем частично сжать все открытые пары
-                        for sym in valid_symbols:
-                            pos = positions(sym)
-                            if pos["spot"] > 1e-6 and abs(pos["perp"]) > 1e-6:
-                                try:
-                                    base_reduce = max(0.0, min(pos["spot"], abs(pos["perp"])) * cfg.auto_reduce_fraction)
-                                    if base_reduce > 0:
-                                        perp = to_perp_symbol(sym)
-                                        _ = ex.create_order(perp, type="market", side=("buy" if pos["perp"]<0 else "sell"), amount=base_reduce, params={"reduceOnly": True})
-                                        _ = ex.create_order(sym, type="market", side="sell", amount=base_reduce)
-                                        tg(f"🔧 Auto-reduce {sym} на {base_reduce:.6f} base из-за низкой маржи ({avail:.2f} USDT)")
-                                except Exception as e:
-                                    dlog(f"auto-reduce error {sym}: {e}")
-                        sset(con, "auto_reduce_last_ts", str(now_ts))
-            except Exception as e:
-                dlog(f"auto-reduce block error: {e}")
-
-            # ------- ЕЖЕДНЕВНЫЙ ОТЧЁТ АКТИВОВ В 09:00 ЛОКАЛЬНО -------
-            if should_send_9am_assets_report(last_assets_report_tag):
-                last_assets_report_tag = local_datetime().strftime("%Y-%m-%d_%H")
-                sset(con, "last_assets_report_tag", last_assets_report_tag)
-                try:
-                    total = total_equity()
-                    free_b = free_equity()
-                    day_start_equity = sfloat(sget(con, "day_start_equity", "0"), 0.0)
-                    pnl_today = total - day_start_equity if day_start_equity > 0 else 0.0
-                    pnl_today_pct = (pnl_today / day_start_equity * 100.0) if day_start_equity > 0 else 0.0
-                    start_base_cfg = sfloat(sget(con, "L1_START_BASE_USDT", str(cfg.start_base)), cfg.start_base)
-                    pnl_cum = total - start_base_cfg
-                    pnl_cum_pct = (pnl_cum / start_base_cfg * 100.0) if start_base_cfg > 0 else 0.0
-                    tg(
-                        f"📊 Ежедневный отчёт (09:00): equity≈{total:.2f} USDT (free≈{free_b:.2f}). "
-                        f"PnL сегодня≈{pnl_today:+.2f} USDT ({pnl_today_pct:+.2f}%). "
-                        f"PnL с запуска≈{pnl_cum:+.2f} USDT ({pnl_cum_pct:+.2f}%)",
-                        force=True,
-                    )
-                except Exception as e:
-                    print("assets_report error:", e)
-
-            # ------- Часовой отчёт по funding только в дневные часы -------
-            if is_daytime():
-                tag = local_datetime().strftime("%Y-%m-%d_%H")
-                if tag != last_report_tag:
-                    last_report_tag = tag
-                    sset(con, "last_report_tag", last_report_tag)
-                    mins = minutes_to_next_funding_window()
-                    # фильтр по минимальному FR и сортировка по убыванию
-                    pairs = [(sym, fr) for sym, fr in fr_map.items() if fr >= cfg.report_min_fr]
-                    pairs.sort(key=lambda kv: kv[1], reverse=True)
-                    top = pairs[:max(1, cfg.report_top_n)]
-                    lines = [
-                        f"⏰ Дневной отчёт FR (локал.час {local_hour_24():02d}) • dyn_thr={dyn_thr:.5f} • мин до payout≈{mins}"
-                    ]
-                    for sym, frv in top:
-                        lines.append(f"• {sym}: {frv:.5f}")
-                    if len(top) == 0:
-                        lines.append(f"• Нет пар ≥ {cfg.report_min_fr:.5f}")
-                    tg("\n".join(lines))
-
-            time.sleep(cfg.poll)
+            metrics.cycle.observe(time.monotonic() - t0)
+            time.sleep(poll_delay(valid_symbols))
 
         except ccxt.RateLimitExceeded:
-            time.sleep(1.2)
+            time.sleep(max(RATE_LIMIT_PAUSE_SEC, scheduler.penalty_sec()))
         except ccxt.NetworkError as e:
             print("NetworkError:", e); time.sleep(2.0)
         except ccxt.ExchangeError as e:
             print("ExchangeError:", e); time.sleep(3.0)
         except Exception as e:
             print("Loop error:", e)
+            tracer.dump(f"loop error: {e}")
             tg(f"❗️L1 error: {e}")
             time.sleep(5.0)
+        finally:
+            # после ошибки тоже сбрасываем накопленное (в обычном цикле — no-op)
+            try:
+                st.flush()
+            except Exception as e:
+                print("state flush error:", e)
 
 if __name__ == "__main__":
     main()
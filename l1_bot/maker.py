@@ -0,0 +1,207 @@
+"""
+Maker-first исполнение связки: postOnly-лимитки на лучшей цене своей стороны,
+досрочный market на отставшую ногу и market на остаток после тайм-аута.
+
+Обе ноги котируются одновременно. Каждые poll_ms читаются исполнения.
+Если одна нога исполнена (в долях объёма) больше другой хотя бы на лот,
+лимитка отставшей ноги снимается, разница добирается market-ордером,
+и остаток котируется заново. Так незахеджированная дельта не превышает
+одного лота плюс исполнений за один опрос. postOnly, отменённый биржей
+(цена пересекла спред), перекотируется по свежему стакану. По истечении
+fallback_ms всё снимается и остатки добираются market-ордерами.
+
+Клиент — asyncio-интерфейс ccxt (create_order / fetch_order / cancel_order /
+fetch_order_book); для синхронного ccxt есть обёртка ThreadClient.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import ccxt
+
+DONE_STATUSES = {"closed", "canceled", "cancelled", "rejected", "expired"}
+
+
+@dataclass
+class Leg:
+    name: str
+    symbol: str
+    side: str                    # buy / sell
+    amount: float
+    params: Dict[str, Any] = field(default_factory=dict)  # reduceOnly и т.п.
+    min_amount: float = 0.0      # минимальный лот: меньшие остатки не добираем
+    price_hint: float = 0.0      # цена первой котировки (из снимка), 0 — взять стакан
+    filled: float = 0.0
+    maker_filled: float = 0.0
+    taker_filled: float = 0.0
+    cost: float = 0.0            # сумма qty * цена исполнения
+    order_id: Optional[str] = None
+    order_filled: float = 0.0    # исполнено по текущей лимитке
+    order_price: float = 0.0
+    done_at: float = 0.0         # time.monotonic(), когда нога добрана
+    error: Optional[Exception] = None
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.amount - self.filled)
+
+    @property
+    def frac(self) -> float:
+        return self.filled / self.amount if self.amount > 0 else 1.0
+
+    @property
+    def complete(self) -> bool:
+        return self.remaining < max(self.min_amount, self.amount * 1e-9)
+
+    @property
+    def avg_price(self) -> float:
+        return self.cost / self.filled if self.filled > 0 else 0.0
+
+
+@dataclass
+class ExecReport:
+    legs: List[Leg]
+    elapsed_ms: float = 0.0
+    requotes: int = 0
+    catchups: int = 0
+
+    @property
+    def error(self) -> Optional[Exception]:
+        return next((leg.error for leg in self.legs if leg.error is not None), None)
+
+    @property
+    def maker_pct(self) -> float:
+        filled = sum(leg.filled for leg in self.legs)
+        return 100.0 * sum(leg.maker_filled for leg in self.legs) / filled if filled > 0 else 0.0
+
+    @property
+    def gap_ms(self) -> float:
+        """Разрыв между моментами, когда ноги добраны полностью."""
+        done = [leg.done_at for leg in self.legs if leg.done_at > 0]
+        return (max(done) - min(done)) * 1000.0 if len(done) == len(self.legs) and done else 0.0
+
+
+class ThreadClient:
+    """Синхронный ccxt-клиент с asyncio-интерфейсом: вызовы идут в пуле потоков."""
+
+    def __init__(self, ex):
+        self.ex = ex
+
+    async def create_order(self, *args, **kwargs):
+        return await asyncio.to_thread(self.ex.create_order, *args, **kwargs)
+
+    async def fetch_order(self, *args, **kwargs):
+        return await asyncio.to_thread(self.ex.fetch_order, *args, **kwargs)
+
+    async def cancel_order(self, *args, **kwargs):
+        return await asyncio.to_thread(self.ex.cancel_order, *args, **kwargs)
+
+    async def fetch_order_book(self, *args, **kwargs):
+        return await asyncio.to_thread(self.ex.fetch_order_book, *args, **kwargs)
+
+
+class MakerExecutor:
+    def __init__(self, client, fallback_ms: int, poll_ms: int = 500,
+                 fetch_params: Optional[Dict[str, Any]] = None):
+        self.client = client
+        self.fallback_sec = max(0.0, fallback_ms / 1000.0)
+        self.poll_sec = max(0.01, poll_ms / 1000.0)
+        # Bybit UTA: fetch_order требует {"acknowledged": True}
+        self.fetch_params = dict(fetch_params or {})
+
+    async def execute(self, legs: List[Leg]) -> ExecReport:
+        rep = ExecReport(legs)
+        t0 = time.monotonic()
+        deadline = t0 + self.fallback_sec
+        await self._each(legs, lambda leg: self._quote(rep, leg, leg.price_hint, initial=True))
+        while rep.error is None and not all(leg.complete for leg in legs) and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_sec)
+            await self._each([leg for leg in legs if leg.order_id], self._sync)
+            if rep.error is not None:
+                break
+            await self._rebalance(rep, legs)
+            if time.monotonic() < deadline:
+                # снятые биржей postOnly и остаток после добора — котируем заново
+                await self._each([leg for leg in legs if leg.order_id is None and not leg.complete],
+                                 lambda leg: self._quote(rep, leg))
+        await self._each([leg for leg in legs if leg.order_id], self._cancel)
+        if rep.error is None:
+            await self._each([leg for leg in legs if not leg.complete], lambda leg: self._market(leg, leg.remaining))
+        rep.elapsed_ms = (time.monotonic() - t0) * 1000.0
+        return rep
+
+    async def _each(self, legs: List[Leg], fn):
+        async def guarded(leg):
+            try:
+                await fn(leg)
+            except Exception as e:
+                leg.error = e
+        await asyncio.gather(*(guarded(leg) for leg in legs))
+
+    async def _quote(self, rep: ExecReport, leg: Leg, price: float = 0.0, initial: bool = False):
+        if price <= 0:
+            ob = await self.client.fetch_order_book(leg.symbol, 1)
+            side = ob.get("bids") if leg.side == "buy" else ob.get("asks")
+            if not side:
+                return  # пустой стакан — добор по тайм-ауту
+            price = float(side[0][0])
+        params = dict(leg.params, postOnly=True)
+        o = await self.client.create_order(leg.symbol, "limit", leg.side, leg.remaining, price, params)
+        leg.order_id, leg.order_filled, leg.order_price = o["id"], 0.0, price
+        if not initial:
+            rep.requotes += 1
+
+    async def _sync(self, leg: Leg):
+        o = await self.client.fetch_order(leg.order_id, leg.symbol, self.fetch_params)
+        filled = float(o.get("filled") or 0.0)
+        delta = filled - leg.order_filled
+        if delta > 0:
+            px = float(o.get("average") or o.get("price") or leg.order_price)
+            leg.order_filled = filled
+            leg.filled += delta
+            leg.maker_filled += delta
+            leg.cost += delta * px
+            if leg.complete and not leg.done_at:
+                leg.done_at = time.monotonic()
+        if (o.get("status") or "").lower() in DONE_STATUSES:
+            leg.order_id = None
+
+    async def _cancel(self, leg: Leg):
+        try:
+            await self.client.cancel_order(leg.order_id, leg.symbol)
+        except ccxt.OrderNotFound:
+            pass  # уже исполнена или снята
+        oid = leg.order_id
+        await self._sync(leg)
+        if leg.order_id == oid:
+            leg.order_id = None
+
+    async def _market(self, leg: Leg, qty: float):
+        if qty < max(leg.min_amount, 1e-12):
+            return
+        params = dict(leg.params)
+        o = await self.client.create_order(leg.symbol, "market", leg.side, qty, None, params)
+        got = float(o.get("filled") or 0.0) or qty  # Bybit отвечает только id — считаем исполненным целиком
+        px = float(o.get("average") or o.get("price") or leg.order_price or leg.price_hint or 0.0)
+        leg.filled += got
+        leg.taker_filled += got
+        leg.cost += got * px
+        if leg.complete and not leg.done_at:
+            leg.done_at = time.monotonic()
+
+    async def _rebalance(self, rep: ExecReport, legs: List[Leg]):
+        """Отставшую ногу добрать market до доли лидирующей."""
+        lead = max(leg.frac for leg in legs)
+        for leg in legs:
+            deficit = lead * leg.amount - leg.filled
+            if deficit < max(leg.min_amount, leg.amount * 1e-9):
+                continue
+            try:
+                if leg.order_id:
+                    await self._cancel(leg)
+                await self._market(leg, lead * leg.amount - leg.filled)
+                rep.catchups += 1
+            except Exception as e:
+                leg.error = e
@@ -0,0 +1,140 @@
+"""
+Колоночная запись рыночных срезов L1 (FR, цена, спред по каждой паре за цикл).
+
+record() копирует строку цикла в преаллоцированный буфер [chunk_rows, N]
+float32 — O(N), без I/O. Буфер сбрасывается в отдельный файл
+<root>/<YYYY-MM-DD>/part-<HHMMSS>-<pid>-<seq>.npz, когда заполнен, когда меняется
+день (UTC) или набор символов и не реже чем раз в flush_sec. Запись атомарная
+(tmp + os.replace), каталоги дней старше keep_days удаляются. Память — один
+буфер, независимо от длины истории.
+
+load() собирает части в общую сетку (ts, symbols, fr, px, spr) для replay.py
+и отчётов; символы, которых не было в части, — NaN. FR — в единицах 8h, как
+fr_map в main; интервал выплат по паре (часы) пишется на часть, intervals()
+отдаёт последний известный.
+"""
+
+import datetime as dt
+import glob
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_ROOT = "/app/shared/md"
+
+
+def day_of(ts: float) -> str:
+    return dt.datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+class Recorder:
+    def __init__(self, root: str = DEFAULT_ROOT, chunk_rows: int = 256, flush_sec: float = 600.0,
+                 keep_days: int = 30):
+        self.root = root
+        self.chunk_rows = max(1, chunk_rows)
+        self.flush_sec = flush_sec
+        self.keep_days = keep_days
+        self.symbols: Tuple[str, ...] = ()
+        self.day = ""
+        self.rows = 0
+        self.seq = 0
+        self.started = 0.0         # time.monotonic() первой строки в буфере
+        self.ts = np.zeros(self.chunk_rows, dtype=np.int64)
+        self.data = np.zeros((3, self.chunk_rows, 0), dtype=np.float32)
+        self.interval_h: Optional[Tuple[int, ...]] = None
+        self.files = 0
+
+    def record(self, ts: float, symbols: Sequence[str], fr: Sequence[float], px: Sequence[float],
+               spr: Sequence[float], interval_h: Optional[Sequence[int]] = None):
+        symbols = tuple(symbols)
+        day = day_of(ts)
+        if self.rows and (symbols != self.symbols or day != self.day):
+            self.flush()
+        if symbols != self.symbols:
+            self.symbols = symbols
+            self.data = np.zeros((3, self.chunk_rows, len(symbols)), dtype=np.float32)
+            self.interval_h = None
+        if not self.rows:
+            self.day, self.started = day, time.monotonic()
+        i = self.rows
+        self.ts[i] = int(ts)
+        if interval_h is not None:
+            self.interval_h = tuple(int(h) for h in interval_h)
+        self.data[0, i], self.data[1, i], self.data[2, i] = fr, px, spr
+        self.rows += 1
+        if self.rows >= self.chunk_rows or time.monotonic() - self.started >= self.flush_sec:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        n = self.rows
+        self.rows = 0
+        d = os.path.join(self.root, self.day)
+        os.makedirs(d, exist_ok=True)
+        self.seq += 1
+        hhmmss = dt.datetime.utcfromtimestamp(int(self.ts[0])).strftime("%H%M%S")
+        path = os.path.join(d, f"part-{hhmmss}-{os.getpid()}-{self.seq:05d}.npz")
+        tmp = path + ".tmp"
+        extra = {} if self.interval_h is None else {"interval_h": np.array(self.interval_h, dtype=np.int16)}
+        with open(tmp, "wb") as f:
+            np.savez(f, ts=self.ts[:n].copy(), symbols=np.array(self.symbols, dtype=str),
+                     fr=self.data[0, :n], px=self.data[1, :n], spr=self.data[2, :n], **extra)
+        os.replace(tmp, path)
+        self.files += 1
+        self.rotate()
+
+    def rotate(self):
+        """Удалить каталоги дней старше keep_days (0 — хранить всё)."""
+        if self.keep_days <= 0 or not os.path.isdir(self.root):
+            return
+        oldest = day_of(time.time() - self.keep_days * 86400)
+        for name in os.listdir(self.root):
+            if len(name) == 10 and name < oldest:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+
+def parts(root: str, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[str]:
+    out = []
+    for d in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if (start_day and d < start_day) or (end_day and d > end_day):
+            continue
+        out.extend(sorted(glob.glob(os.path.join(root, d, "part-*.npz"))))
+    return out
+
+
+def load(root: str = DEFAULT_ROOT, start_day: Optional[str] = None, end_day: Optional[str] = None):
+    """(ts [T], symbols, fr [T, N], px [T, N], spr [T, N]) по всем частям в диапазоне дней."""
+    chunks = []
+    for p in parts(root, start_day, end_day):
+        with np.load(p, allow_pickle=False) as z:
+            chunks.append((z["ts"], [str(s) for s in z["symbols"]], z["fr"], z["px"], z["spr"]))
+    symbols = sorted({s for c in chunks for s in c[1]})
+    col = {s: j for j, s in enumerate(symbols)}
+    total = sum(len(c[0]) for c in chunks)
+    ts = np.zeros(total, dtype=np.int64)
+    out = np.full((3, total, len(symbols)), np.nan, dtype=np.float64)
+    r = 0
+    for c_ts, c_sym, fr, px, spr in chunks:
+        n = len(c_ts)
+        idx = [col[s] for s in c_sym]
+        ts[r:r + n] = c_ts
+        for k, v in enumerate((fr, px, spr)):
+            out[k][r:r + n][:, idx] = v
+        r += n
+    order = np.argsort(ts, kind="stable")
+    return ts[order], symbols, out[0][order], out[1][order], out[2][order]
+
+
+def intervals(root: str = DEFAULT_ROOT, start_day: Optional[str] = None,
+              end_day: Optional[str] = None) -> Dict[str, int]:
+    """{symbol: интервал выплат, ч} по последней части, где он записан; части без него пропускаются."""
+    out: Dict[str, int] = {}
+    for p in parts(root, start_day, end_day):
+        with np.load(p, allow_pickle=False) as z:
+            if "interval_h" in z.files:
+                out.update(zip((str(s) for s in z["symbols"]), (int(h) for h in z["interval_h"])))
+    return out
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Replay/бэктест решений L1 на записанных рядах FR и цен.
+
+Через симулированный аккаунт прогоняются те же функции, что и в main.py
+(strategy.py): динамический порог, условия входа с бюджетом и капами,
+выходы с гистерезисом/тайм-аутом, доливка, cooldown, тихое окно и snipe.
+Время берётся из ленты (ts), а не из часов. Учитываются комиссии
+taker по обеим ногам, половина спреда на ногу, funding на выплатах
+по сетке каждой пары (PayoutCalendar, как в main: интервал 1/4/8ч от 00:00
+UTC) и дневной лимит просадки (пауза 1ч). Тихое окно и snipe — тоже по
+сетке пары. Авто-редьюс по марже не моделируется.
+
+Лента — общая сетка времени и матрицы [T, N] (FR в единицах 8h, как fr_map
+в main; цена; спред) и интервал выплат по паре, ч (по умолчанию 8): каталог
+recorder.py, CSV в длинном формате ts,symbol,fr,px[,spr][,interval_h] или
+.npz с ключами ts, symbols, fr, px[, spr][, interval_h]. Без файла —
+синтетическая лента.
+
+Запуск (из корня репозитория):
+    python l1_bot/replay.py --days 90 --symbols 50 \\
+        --grid L1_FUNDING_THRESHOLD_8H=0.0001,0.0002 --grid L1_EXIT_FR_BELOW_COUNT=3,6
+"""
+
+import argparse
+import csv
+import datetime as dt
+import itertools
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+import numpy as np
+
+import recorder
+from config import Cfg
+from strategy import (PayoutCalendar, entry_budget, entry_checks, exit_reason, fr_threshold, is_hedged, margin_share,
+                      scale_in_alloc, symbols_order, total_cap)
+
+# обязательные поля Cfg, которые replay не использует или берёт из ленты
+BASE_ENV = {
+    "BYBIT_API_KEY": "replay", "BYBIT_API_SECRET": "replay", "BYBIT_ACCOUNT_TYPE": "UNIFIED",
+    "L1_SYMBOLS": "BTC/USDT", "L1_FUNDING_THRESHOLD_8H": "0.0001", "L1_MAX_ALLOC_PCT": "0.1",
+    "L1_PERP_LEVERAGE": "3", "L1_MIN_FREE_BALANCE_USDT": "1", "L1_POLL_INTERVAL_SEC": "60",
+    "L1_MAX_DAILY_DD_PCT": "5", "L1_START_BASE_USDT": "1000", "L1_PNL_THRESHOLD_TO_L2": "0.05",
+    "L1_PNL_EXPORT_SHARE": "0.3", "TG_BOT_TOKEN": "replay", "TG_CHAT_ID": "0",
+}
+
+
+def ffill(a: np.ndarray) -> np.ndarray:
+    """Заполнить NaN по столбцам последним известным значением; NaN в начале — 0."""
+    mask = np.isnan(a)
+    if not mask.any():
+        return a
+    idx = np.where(~mask, np.arange(a.shape[0])[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    out = a[idx, np.arange(a.shape[1])]
+    return np.nan_to_num(out, nan=0.0)
+
+
+@dataclass
+class Tape:
+    ts: np.ndarray        # [T] секунды epoch, по возрастанию
+    symbols: List[str]
+    fr: np.ndarray        # [T, N] ставка funding, приведённая к 8h
+    px: np.ndarray        # [T, N] цена (mark)
+    spr: np.ndarray       # [T, N] спред, доля от mid
+    interval_h: Optional[np.ndarray] = None   # [N] интервал выплат, ч; None — 8 у всех
+
+    def __post_init__(self):
+        if self.interval_h is None:
+            self.interval_h = np.full(len(self.symbols), 8, dtype=np.int64)
+        self.interval_h = np.asarray(self.interval_h, dtype=np.int64)
+
+    @classmethod
+    def load(cls, path: str) -> "Tape":
+        if os.path.isdir(path):
+            # каталог recorder.py (/app/shared/md): пропуски — предыдущим значением, до первого — 0
+            ts, symbols, fr, px, spr = recorder.load(path)
+            hours = recorder.intervals(path)
+            return cls(ts, symbols, ffill(fr), ffill(px), ffill(spr), [hours.get(s, 8) for s in symbols])
+        if path.endswith(".npz"):
+            z = np.load(path, allow_pickle=False)
+            fr = np.asarray(z["fr"], dtype=float)
+            spr = np.asarray(z["spr"], dtype=float) if "spr" in z.files else np.zeros_like(fr)
+            hours = z["interval_h"] if "interval_h" in z.files else None
+            return cls(np.asarray(z["ts"], dtype=np.int64), [str(s) for s in z["symbols"]], fr,
+                       np.asarray(z["px"], dtype=float), spr, hours)
+        rows: Dict[int, Dict[str, tuple]] = {}
+        hours: Dict[str, int] = {}
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for r in csv.DictReader(f):
+                rows.setdefault(int(float(r["ts"])), {})[r["symbol"]] = (
+                    float(r["fr"]), float(r["px"]), float(r.get("spr") or 0.0))
+                if r.get("interval_h"):
+                    hours[r["symbol"]] = int(float(r["interval_h"]))
+        symbols = sorted({s for row in rows.values() for s in row})
+        col = {s: j for j, s in enumerate(symbols)}
+        ts = sorted(rows)
+        data = np.zeros((3, len(ts), len(symbols)))
+        for i, t in enumerate(ts):
+            if i:
+                data[:, i] = data[:, i - 1]  # пропуски — предыдущим значением
+            for s, vals in rows[t].items():
+                data[:, i, col[s]] = vals
+        return cls(np.asarray(ts, dtype=np.int64), symbols, data[0], data[1], data[2],
+                   [hours.get(s, 8) for s in symbols])
+
+    @classmethod
+    def synthetic(cls, n_symbols: int = 50, days: int = 90, step_sec: int = 300, seed: int = 1,
+                  start_ts: int = 1_704_067_200, intervals: Sequence[int] = (8,)) -> "Tape":
+        """FR — AR(1) вокруг своего среднего на символ со сменой режимов; цена — случайное блуждание.
+        Интервалы выплат раздаются символам по кругу из intervals.
+        """
+        rng = np.random.default_rng(seed)
+        t_n = days * 86400 // step_sec
+        ts = start_ts + step_sec * np.arange(t_n, dtype=np.int64)
+        mean = rng.normal(0.0001, 0.00015, n_symbols)
+        fr = np.empty((t_n, n_symbols))
+        cur = mean.copy()
+        for i in range(t_n):
+            if rng.random() < 0.002:
+                mean = rng.normal(0.0001, 0.00015, n_symbols)
+            cur = cur + 0.01 * (mean - cur) + rng.normal(0.0, 0.000005, n_symbols)
+            fr[i] = cur
+        px = 10.0 * np.exp(np.cumsum(rng.normal(0.0, 0.002, (t_n, n_symbols)), axis=0))
+        spr = np.abs(rng.normal(0.0005, 0.0003, (t_n, n_symbols)))
+        return cls(ts, [f"S{i:02d}/USDT" for i in range(n_symbols)], fr, px, spr, np.resize(intervals, n_symbols))
+
+
+@dataclass
+class Fees:
+    spot: float = 0.001       # Bybit VIP0 spot taker
+    perp: float = 0.00055     # Bybit VIP0 linear taker
+
+
+class MemoryState:
+    """get/set как у StateStore, без SQLite."""
+
+    def __init__(self):
+        self.data: Dict[str, str] = {}
+
+    def get(self, k: str, default: str = "") -> str:
+        return self.data.get(k, default)
+
+    def set(self, k: str, v):
+        self.data[k] = str(v)
+
+
+@dataclass
+class SimAccount:
+    cash: float
+    lev: int
+    fees: Fees
+    spot: Dict[int, float] = field(default_factory=dict)
+    perp: Dict[int, float] = field(default_factory=dict)        # < 0 — шорт
+    perp_entry: Dict[int, float] = field(default_factory=dict)
+    funding: float = 0.0
+    fees_paid: float = 0.0
+    spread_paid: float = 0.0
+    turnover: float = 0.0
+
+    def equity(self, px: List[float]) -> float:
+        e = self.cash
+        for j, q in self.spot.items():
+            e += q * px[j]
+        for j, q in self.perp.items():
+            e += q * (px[j] - self.perp_entry[j])
+        return e
+
+    def available(self, px: List[float]) -> float:
+        im = sum(abs(q) * px[j] for j, q in self.perp.items()) / max(1, self.lev)
+        return max(0.0, self.cash - im)
+
+    def hedge(self, j: int, qty: float, px: float, spr: float):
+        """qty > 0 — купить спот и зашортить перп, qty < 0 — сократить связку."""
+        notional = abs(qty) * px
+        self.cash -= qty * px
+        self.spot[j] = self.spot.get(j, 0.0) + qty
+        p = self.perp.get(j, 0.0)
+        if qty > 0:
+            self.perp_entry[j] = (abs(p) * self.perp_entry.get(j, px) + qty * px) / (abs(p) + qty)
+        else:
+            self.cash += -qty * (self.perp_entry[j] - px)   # реализованный PnL шорта
+        self.perp[j] = p - qty
+        if self.spot[j] <= 1e-12:
+            self.spot.pop(j)
+            self.perp.pop(j)
+            self.perp_entry.pop(j)
+        cost = notional * (self.fees.spot + self.fees.perp) + notional * spr  # по половине спреда на ногу
+        self.cash -= cost
+        self.fees_paid += notional * (self.fees.spot + self.fees.perp)
+        self.spread_paid += notional * spr
+        self.turnover += 2 * notional
+
+    def pay_funding(self, fr: List[float], px: List[float], due: List[float]):
+        """due[j] — доля 8h-ставки к выплате по паре: выплат с прошлой строки × interval_h / 8."""
+        for j, q in self.perp.items():
+            if not due[j]:
+                continue
+            amt = -q * px[j] * fr[j] * due[j]   # FR > 0 — шорт получает
+            self.cash += amt
+            self.funding += amt
+
+
+@dataclass
+class Result:
+    label: str
+    final_equity: float
+    pnl: float
+    pnl_pct: float
+    funding: float
+    fees: float
+    spread: float
+    turnover: float
+    opens: int
+    closes: int
+    scale_ins: int
+    max_dd_pct: float
+    elapsed_sec: float
+
+
+def make_cfg(overrides: Optional[Dict[str, str]] = None, env_file: Optional[str] = None) -> Cfg:
+    env = dict(BASE_ENV)
+    if env_file:
+        with open(env_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, v = line.split("=", 1)
+                    env[k.strip()] = v.strip()
+    env.update(overrides or {})
+    return Cfg(**env)
+
+
+def replay(cfg: Cfg, tape: Tape, equity: float = 1000.0, fees: Fees = Fees(), min_quote: float = 5.0,
+           label: str = "") -> Result:
+    t0 = time.perf_counter()
+    st = MemoryState()
+    acct = SimAccount(equity, cfg.lev, fees)
+    symbols = tape.symbols
+    n = len(symbols)
+    held = np.zeros(n, dtype=bool)
+    opens = closes = scale_ins = 0
+    peak, max_dd = equity, 0.0
+    day, day_start, paused_until = "", equity, 0
+
+    # шаг цикла — L1_POLL_INTERVAL_SEC, но не мельче ленты
+    step = float(np.median(np.diff(tape.ts))) if len(tape.ts) > 1 else 1.0
+    stride = max(1, int(round(max(cfg.poll, 1) / max(step, 1.0))))
+    # сетка выплат по паре, как calendar в main; в ленте нет nextFundingTime — от 00:00 UTC
+    calendar = PayoutCalendar()
+    for sym, h in zip(symbols, tape.interval_h.tolist()):
+        calendar.update(sym, h, 0)
+    period = np.array([calendar.get(s)[0] for s in symbols], dtype=np.int64)
+    anchor = np.array([calendar.get(s)[1] for s in symbols], dtype=np.int64)
+    share = period / (8 * 3600.0)
+    last_k = (int(tape.ts[0]) - anchor) // period
+    prev_fr, prev_px = tape.fr[0].tolist(), tape.px[0].tolist()
+
+    for i in range(0, len(tape.ts), stride):
+        now_ts = int(tape.ts[i])
+        fr_arr, px_arr = tape.fr[i], tape.px[i]
+        fr, px, spr = fr_arr.tolist(), px_arr.tolist(), tape.spr[i].tolist()
+
+        # выплата между прошлой и текущей строкой — по последней ставке до неё (как расчёт биржи)
+        k = (now_ts - anchor) // period
+        if (k != last_k).any():
+            acct.pay_funding(prev_fr, prev_px, ((k - last_k) * share).tolist())
+            last_k = k
+        prev_fr, prev_px = fr, px
+
+        eq = acct.equity(px)
+        peak = max(peak, eq)
+        max_dd = max(max_dd, (peak - eq) / peak * 100.0 if peak > 0 else 0.0)
+
+        # дневной лимит просадки (daily_guard): пауза 1ч
+        d = dt.datetime.utcfromtimestamp(now_ts).strftime("%Y-%m-%d")
+        if d != day:
+            day, day_start = d, eq
+        if now_ts < paused_until:
+            continue
+        if day_start >= max(1.0, cfg.dd_min_eq) and (day_start - eq) / day_start * 100.0 >= cfg.dd_day:
+            paused_until = now_ts + 3600
+            continue
+
+        free = avail = acct.available(px)
+        dyn_thr = fr_threshold(cfg, fr)
+        # остаток глобального капа (eq и free на цикл фиксированы, как в main): меньше min_quote —
+        # ни одна пара не пройдёт min_ok; тихое окно и snipe — по сетке выплат пары
+        room = total_cap(cfg, eq) - max(0.0, eq - free)
+
+        # быстрый отсев: без позиции и с FR ниже порога входа пара ничего не делает
+        active = held | (fr_arr >= dyn_thr + cfg.fr_extra_buffer)
+        if cfg.snipe_enable:
+            order = symbols_order(cfg, symbols, dict(zip(symbols, fr)))
+            pos_of = {s: j for j, s in enumerate(symbols)}
+            idx = [pos_of[s] for s in order if active[pos_of[s]]]
+        else:
+            idx = np.flatnonzero(active).tolist()
+
+        for j in idx:
+            sym, p = symbols[j], px[j]
+            if p <= 0 or min_quote > eq * 0.6:
+                continue
+            spot_qty, perp_qty = acct.spot.get(j, 0.0), acct.perp.get(j, 0.0)
+            hedged = is_hedged(cfg, spot_qty, perp_qty, p)
+            quiet, snipe_open = calendar.quiet(sym, now_ts), calendar.snipe_open(cfg, sym, now_ts)
+            # необходимые условия входа до расчёта бюджета: не хедж, есть место под min_quote, нет cooldown
+            b = None
+            if not hedged and not quiet and room >= min_quote and min(avail * margin_share(avail), room) >= min_quote \
+                    and now_ts >= int(float(st.get(f"cooldown_until:{sym}", "0"))):
+                b = entry_budget(cfg, eq, free, avail, fr[j], dyn_thr, min_quote, spot_qty, p)
+            if b is not None and all(entry_checks(cfg, fr[j], dyn_thr, spr[j], free, avail, b, min_quote, hedged,
+                                                  quiet, snipe_open).values()):
+                acct.hedge(j, round((b.eff_alloc / p) * 0.998, 6), p, spr[j])
+                held[j] = True
+                avail = acct.available(px)
+                st.set(f"open_ts:{sym}", now_ts)
+                opens += 1
+                continue
+
+            if hedged and exit_reason(cfg, st, sym, fr[j], dyn_thr, hedged, now_ts,
+                                     calendar.snipe_close(cfg, sym, now_ts)):
+                acct.hedge(j, -spot_qty, p, spr[j])
+                held[j] = False
+                avail = acct.available(px)
+                st.set(f"below_thr_count:{sym}", "0")
+                st.set(f"cooldown_until:{sym}", now_ts + max(0, cfg.cooldown_min) * 60)
+                closes += 1
+                continue
+
+            if cfg.scale_in_enable and hedged:
+                key_steps = f"scalein_steps:{d}:{sym}"
+                steps = int(float(st.get(key_steps, "0")))
+                alloc = scale_in_alloc(cfg, fr[j], dyn_thr, spr[j], quiet, snipe_open, steps, eq, free, spot_qty, p)
+                if alloc > 0:
+                    acct.hedge(j, round((alloc / p) * 0.998, 6), p, spr[j])
+                    avail = acct.available(px)
+                    st.set(key_steps, steps + 1)
+                    scale_ins += 1
+
+    final = acct.equity(tape.px[-1].tolist())
+    return Result(label, final, final - equity, (final - equity) / equity * 100.0, acct.funding, acct.fees_paid,
+                  acct.spread_paid, acct.turnover, opens, closes, scale_ins, max_dd, time.perf_counter() - t0)
+
+
+def grid_configs(grid: List[str]) -> List[Dict[str, str]]:
+    """["KEY=v1,v2", ...] -> декартово произведение переопределений."""
+    axes = []
+    for g in grid:
+        k, vals = g.split("=", 1)
+        axes.append([(k.strip(), v.strip()) for v in vals.split(",") if v.strip()])
+    return [dict(c) for c in itertools.product(*axes)] if axes else [{}]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay решений L1 на записанных рядах FR/цен")
+    ap.add_argument("--tape", help="каталог recorder (/app/shared/md), CSV (ts,symbol,fr,px[,spr]) или .npz; "
+                                   "без него — синтетика")
+    ap.add_argument("--days", type=int, default=90, help="синтетика: дней")
+    ap.add_argument("--symbols", type=int, default=50, help="синтетика: символов")
+    ap.add_argument("--step-sec", type=int, default=300, help="синтетика: шаг ленты, сек")
+    ap.add_argument("--intervals", default="8", help="синтетика: интервалы выплат, ч, по кругу (например 1,4,8)")
+    ap.add_argument("--env", help="файл .env с параметрами L1_*")
+    ap.add_argument("--grid", action="append", default=[], help="KEY=v1,v2 (можно несколько)")
+    ap.add_argument("--equity", type=float, default=1000.0)
+    ap.add_argument("--spot-fee", type=float, default=Fees.spot)
+    ap.add_argument("--perp-fee", type=float, default=Fees.perp)
+    ap.add_argument("--json", help="записать результаты в JSON")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    tape = Tape.load(args.tape) if args.tape else Tape.synthetic(
+        args.symbols, args.days, args.step_sec, intervals=[int(h) for h in args.intervals.split(",") if h.strip()])
+    print(f"tape: {len(tape.ts)} шагов × {len(tape.symbols)} символов, загрузка {time.perf_counter() - t0:.2f} s")
+    fees = Fees(args.spot_fee, args.perp_fee)
+    results = []
+    configs = grid_configs(args.grid)
+    labels = [" ".join(f"{k}={v}" for k, v in ov.items()) or "base" for ov in configs]
+    w = max(len(x) for x in labels)
+    print(f"{'config':<{w}} {'pnl %':>7} {'funding':>9} {'fees':>8} {'spread':>8} {'turnover':>10} "
+          f"{'open':>5} {'close':>5} {'scale':>5} {'maxDD%':>6} {'sec':>5}")
+    for ov, label in zip(configs, labels):
+        r = replay(make_cfg(ov, args.env), tape, args.equity, fees, label=label)
+        results.append(r)
+        print(f"{label:<{w}} {r.pnl_pct:>7.2f} {r.funding:>9.2f} {r.fees:>8.2f} {r.spread:>8.2f} "
+              f"{r.turnover:>10.0f} {r.opens:>5} {r.closes:>5} {r.scale_ins:>5} {r.max_dd_pct:>6.2f} "
+              f"{r.elapsed_sec:>5.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
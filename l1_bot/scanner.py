@@ -0,0 +1,228 @@
+"""
+Сканер всех USDT linear перпов Bybit, у которых есть спот в паре.
+
+На цикл — две пачки: v5 /market/tickers category=linear (FR, bid/ask,
+оборот 24h) и category=spot; лимиты и интервал funding берутся из
+instruments-info и обновляются раз в instruments_ttl_sec. Сырые ответы
+разбираются без ccxt.parse_ticker и раскладываются в массивы numpy, дальше
+фильтры входа из strategy.entry_checks, не зависящие от позиций и баланса,
+считаются векторно (FR 1h/4h перпов приводится к 8h — как порог):
+  FR(8h) ≥ динамический порог + L1_FR_EXTRA_BUFFER, спред спота ≤ L1_MAX_SPREAD_PCT,
+  min_quote_required ≤ аллокации на пару, оборот 24h (меньший из ног) ≥ минимума.
+Кандидаты — топ-N прошедших по FR (при равенстве — по обороту). Полные
+проверки входа main() делает уже по паре в цикле.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+LINEAR = "linear"
+SPOT = "spot"
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x) if x not in (None, "") else 0.0
+    except Exception:
+        return 0.0
+
+
+def _rows(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return ((resp or {}).get("result") or {}).get("list") or []
+
+
+@dataclass
+class Universe:
+    """Пары спот↔перп из instruments-info; массивы выровнены по symbols."""
+    symbols: List[str]
+    spot_ids: List[str]
+    perp_ids: List[str]
+    base_min: np.ndarray      # max(minOrderQty спота, перпа)
+    cost_min: np.ndarray      # max(minOrderAmt спота, minNotionalValue перпа)
+    interval_h: np.ndarray
+    spot_pos: Dict[str, int] = field(default_factory=dict)
+    perp_pos: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, spot_rows: List[Dict[str, Any]], linear_rows: List[Dict[str, Any]]) -> "Universe":
+        spots = {r.get("baseCoin"): r for r in spot_rows
+                 if r.get("quoteCoin") == "USDT" and r.get("status") == "Trading"}
+        symbols, spot_ids, perp_ids, base_min, cost_min, interval_h = [], [], [], [], [], []
+        for p in linear_rows:
+            if (p.get("contractType") != "LinearPerpetual" or p.get("quoteCoin") != "USDT"
+                    or p.get("status") != "Trading"):
+                continue
+            s = spots.get(p.get("baseCoin"))
+            if s is None:
+                continue
+            lot_s, lot_p = s.get("lotSizeFilter") or {}, p.get("lotSizeFilter") or {}
+            symbols.append(f"{p['baseCoin']}/USDT")
+            spot_ids.append(s["symbol"])
+            perp_ids.append(p["symbol"])
+            base_min.append(max(_f(lot_s.get("minOrderQty")), _f(lot_p.get("minOrderQty"))))
+            cost_min.append(max(_f(lot_s.get("minOrderAmt")), _f(lot_p.get("minNotionalValue"))))
+            interval_h.append(max(1, int(_f(p.get("fundingInterval")) or 480) // 60))
+        return cls(symbols, spot_ids, perp_ids, np.array(base_min, dtype=np.float64),
+                   np.array(cost_min, dtype=np.float64), np.array(interval_h, dtype=np.int64),
+                   {sid: i for i, sid in enumerate(spot_ids)}, {pid: i for i, pid in enumerate(perp_ids)})
+
+
+@dataclass
+class Scan:
+    symbols: List[str]
+    fr: np.ndarray            # за 8h
+    px: np.ndarray
+    spr: np.ndarray
+    turnover: np.ndarray
+    min_quote: np.ndarray
+    ok: np.ndarray
+    ranked: List[str]         # кандидаты, лучшие первыми
+    elapsed_ms: float = 0.0
+
+
+def scan(u: Universe, spot_rows: List[Dict[str, Any]], linear_rows: List[Dict[str, Any]], thr: float,
+         max_spread: float, alloc: float, min_turnover: float = 0.0, top_n: int = 10) -> Scan:
+    """Фильтры и ранжирование по сырым тикерам; alloc <= 0 — выполнимость по минимумам не проверяем."""
+    n = len(u.symbols)
+    fr = np.full(n, np.nan)
+    t_perp = np.zeros(n)
+    bid, ask, last, t_spot = np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n)
+    for r in linear_rows:
+        i = u.perp_pos.get(r.get("symbol"))
+        if i is not None:
+            fr[i] = _f(r.get("fundingRate"))
+            t_perp[i] = _f(r.get("turnover24h"))
+    for r in spot_rows:
+        i = u.spot_pos.get(r.get("symbol"))
+        if i is not None:
+            bid[i], ask[i] = _f(r.get("bid1Price")), _f(r.get("ask1Price"))
+            last[i], t_spot[i] = _f(r.get("lastPrice")), _f(r.get("turnover24h"))
+    # ставка за интервал funding пары → за 8h, в масштабе порога L1_FUNDING_THRESHOLD_8H
+    fr *= 8.0 / u.interval_h
+
+    quoted = (bid > 0) & (ask >= bid)
+    mid = np.where(quoted, (bid + ask) / 2.0, 0.0)
+    # как mark(): last, иначе mid
+    px = np.where(last > 0, last, mid)
+    spr = np.divide(ask - bid, mid, out=np.full(n, np.nan), where=mid > 0)
+    turnover = np.minimum(t_spot, t_perp)
+    # как min_quote_required(): без минимального количества — 0
+    min_quote = np.where(u.base_min > 0, np.maximum(u.base_min * px / 0.998, u.cost_min), 0.0)
+
+    ok = (fr >= thr) & (spr <= max_spread) & (px > 0) & (turnover >= min_turnover)
+    if alloc > 0:
+        ok &= min_quote <= alloc
+    idx = np.flatnonzero(ok)
+    best = idx[np.lexsort((-turnover[idx], -fr[idx]))][:max(0, top_n)]
+    return Scan(u.symbols, fr, px, spr, turnover, min_quote, ok, [u.symbols[i] for i in best])
+
+
+class Scanner:
+    """Вселенная с ленивым обновлением instruments-info и пачки тикеров через ccxt implicit API."""
+
+    def __init__(self, ex, top_n: int = 10, min_turnover: float = 0.0, instruments_ttl_sec: float = 3600.0):
+        self.ex = ex
+        self.top_n = top_n
+        self.min_turnover = min_turnover
+        self.instruments_ttl_sec = instruments_ttl_sec
+        self.universe: Optional[Universe] = None
+        self.universe_ts = 0.0     # time.monotonic() последней загрузки instruments-info
+        self.last: Optional[Scan] = None
+
+    def _stale(self) -> bool:
+        return self.universe is None or time.monotonic() - self.universe_ts > self.instruments_ttl_sec
+
+    def _set_universe(self, spot_rows, linear_rows):
+        self.universe = Universe.build(spot_rows, linear_rows)
+        self.universe_ts = time.monotonic()
+
+    def _instruments(self, category: str) -> List[Dict[str, Any]]:
+        out, cursor = [], ""
+        while True:
+            req = {"category": category, "limit": 1000}
+            if cursor:
+                req["cursor"] = cursor
+            resp = self.ex.publicGetV5MarketInstrumentsInfo(req)
+            out.extend(_rows(resp))
+            cursor = ((resp or {}).get("result") or {}).get("nextPageCursor") or ""
+            if not cursor:
+                return out
+
+    async def _instruments_async(self, aex, category: str) -> List[Dict[str, Any]]:
+        out, cursor = [], ""
+        while True:
+            req = {"category": category, "limit": 1000}
+            if cursor:
+                req["cursor"] = cursor
+            resp = await aex.publicGetV5MarketInstrumentsInfo(req)
+            out.extend(_rows(resp))
+            cursor = ((resp or {}).get("result") or {}).get("nextPageCursor") or ""
+            if not cursor:
+                return out
+
+    def _scan(self, spot_rows, linear_rows, thr, max_spread, alloc, t0) -> Scan:
+        res = scan(self.universe, spot_rows, linear_rows, thr, max_spread, alloc, self.min_turnover, self.top_n)
+        res.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        self.last = res
+        return res
+
+    def run(self, thr: float, max_spread: float, alloc: float) -> Scan:
+        t0 = time.perf_counter()
+        if self._stale():
+            self._set_universe(self._instruments(SPOT), self._instruments(LINEAR))
+        spot_rows = _rows(self.ex.publicGetV5MarketTickers({"category": SPOT}))
+        linear_rows = _rows(self.ex.publicGetV5MarketTickers({"category": LINEAR}))
+        return self._scan(spot_rows, linear_rows, thr, max_spread, alloc, t0)
+
+    async def run_async(self, aex, thr: float, max_spread: float, alloc: float) -> Scan:
+        """То же, что run(): обе категории запрашиваются параллельно."""
+        t0 = time.perf_counter()
+        if self._stale():
+            self._set_universe(*await asyncio.gather(self._instruments_async(aex, SPOT),
+                                                     self._instruments_async(aex, LINEAR)))
+        spot, linear = await asyncio.gather(aex.publicGetV5MarketTickers({"category": SPOT}),
+                                            aex.publicGetV5MarketTickers({"category": LINEAR}))
+        return self._scan(_rows(spot), _rows(linear), thr, max_spread, alloc, t0)
+
+
+def synthetic_rows(n: int, seed: int = 0):
+    """(spot instruments, linear instruments, spot tickers, linear tickers) для n пар — замер и тесты."""
+    rng = np.random.default_rng(seed)
+    si, li, st, lt = [], [], [], []
+    for i in range(n):
+        base, px = f"C{i:04d}", float(rng.uniform(0.01, 500.0))
+        half = px * float(rng.uniform(0.00002, 0.004)) / 2
+        si.append({"symbol": f"{base}USDT", "baseCoin": base, "quoteCoin": "USDT", "status": "Trading",
+                   "lotSizeFilter": {"minOrderQty": "0.01", "minOrderAmt": "5"}})
+        li.append({"symbol": f"{base}USDT", "baseCoin": base, "quoteCoin": "USDT", "status": "Trading",
+                   "contractType": "LinearPerpetual", "fundingInterval": 480,
+                   "lotSizeFilter": {"minOrderQty": "0.1", "minNotionalValue": "5"}})
+        st.append({"symbol": f"{base}USDT", "bid1Price": str(px - half), "ask1Price": str(px + half),
+                   "lastPrice": str(px), "turnover24h": str(rng.uniform(1e4, 1e8))})
+        lt.append({"symbol": f"{base}USDT", "fundingRate": str(rng.normal(0.0001, 0.0002)),
+                   "turnover24h": str(rng.uniform(1e4, 1e9))})
+    return si, li, st, lt
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Замер скана на синтетической вселенной")
+    ap.add_argument("--markets", type=int, default=600)
+    ap.add_argument("--runs", type=int, default=20)
+    args = ap.parse_args()
+    si, li, st, lt = synthetic_rows(args.markets)
+    t0 = time.perf_counter()
+    u = Universe.build(si, li)
+    build_ms = (time.perf_counter() - t0) * 1000
+    times = []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        res = scan(u, st, lt, thr=0.00012, max_spread=0.003, alloc=100.0, min_turnover=1e6)
+        times.append((time.perf_counter() - t0) * 1000)
+    print(f"markets={len(u.symbols)} universe {build_ms:.1f} ms, scan median {sorted(times)[len(times) // 2]:.2f} ms, "
+          f"passed {int(res.ok.sum())}, top: {', '.join(res.ranked[:5])}")
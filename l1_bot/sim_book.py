@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Локальный симулятор стакана для maker.py: одна лучшая котировка на символ,
+случайное блуждание mid, частичные исполнения лимиток на лучшей цене,
+отмена postOnly при пересечении спреда, комиссии maker/taker.
+
+Интерфейс — подмножество ccxt.async_support (create_order / fetch_order /
+cancel_order / fetch_order_book), поэтому MakerExecutor работает с ним как
+с биржей. Запуск замера (из корня репозитория):
+    python l1_bot/sim_book.py --runs 200 --fallback-ms 300 --poll-ms 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+import ccxt
+
+from maker import Leg, MakerExecutor
+
+# Bybit VIP0: спот 0.1% / 0.1%, USDT-перпы 0.02% / 0.055%
+FEES = {"spot": (0.001, 0.001), "swap": (0.0002, 0.00055)}
+
+
+@dataclass
+class SimOrder:
+    id: str
+    symbol: str
+    type: str
+    side: str
+    amount: float
+    price: float
+    filled: float = 0.0
+    cost: float = 0.0
+    status: str = "open"
+
+    def view(self) -> Dict:
+        avg = self.cost / self.filled if self.filled else None
+        return {"id": self.id, "symbol": self.symbol, "type": self.type, "side": self.side,
+                "amount": self.amount, "price": self.price, "filled": self.filled,
+                "remaining": self.amount - self.filled, "average": avg, "status": self.status}
+
+
+@dataclass
+class SimBook:
+    """Стакан с лучшими bid/ask; исполнения — при каждом опросе ордера (fetch_order)."""
+    mid: Dict[str, float]
+    tick: float = 0.01
+    spread_ticks: int = 2
+    fill_prob: float = 0.5          # шанс встречного объёма на лучшей цене за опрос
+    fill_frac: tuple = (0.3, 1.0)   # доля остатка, исполняемая за раз
+    move_prob: float = 0.1          # шанс сдвига mid на тик за опрос
+    fail: Dict[str, Exception] = field(default_factory=dict)  # символ -> ошибка create_order
+    seed: int = 1
+    orders: Dict[str, SimOrder] = field(default_factory=dict)
+    fees: float = 0.0
+    calls: int = 0
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+
+    def bbo(self, symbol: str):
+        half = self.spread_ticks * self.tick / 2.0
+        m = self.mid[symbol]
+        return round(m - half, 10), round(m + half, 10)
+
+    def _kind(self, symbol: str) -> str:
+        return "swap" if ":" in symbol else "spot"
+
+    def _fill(self, o: SimOrder, qty: float, px: float, maker: bool):
+        qty = min(qty, o.amount - o.filled)
+        o.filled += qty
+        o.cost += qty * px
+        self.fees += qty * px * FEES[self._kind(o.symbol)][0 if maker else 1]
+        if o.amount - o.filled <= 1e-12:
+            o.status = "closed"
+
+    def _step(self, symbol: str):
+        if self.rng.random() < self.move_prob:
+            self.mid[symbol] += self.tick if self.rng.random() < 0.5 else -self.tick
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self.calls += 1
+        if symbol in self.fail:
+            raise self.fail[symbol]
+        bid, ask = self.bbo(symbol)
+        o = SimOrder(str(len(self.orders) + 1), symbol, type, side, float(amount), float(price or 0.0))
+        self.orders[o.id] = o
+        if type == "market":
+            self._fill(o, o.amount, ask if side == "buy" else bid, maker=False)
+        elif params.get("postOnly") and ((side == "buy" and o.price >= ask) or (side == "sell" and o.price <= bid)):
+            o.status = "canceled"  # как Bybit: postOnly, пересекающий спред, снимается без исполнения
+        return {"id": o.id, "info": {}}
+
+    async def fetch_order(self, id, symbol=None, params={}):
+        self.calls += 1
+        o = self.orders[id]
+        self._step(o.symbol)
+        if o.status == "open":
+            bid, ask = self.bbo(o.symbol)
+            at_touch = o.price >= bid if o.side == "buy" else o.price <= ask
+            if at_touch and self.rng.random() < self.fill_prob:
+                rest = o.amount - o.filled
+                self._fill(o, rest * self.rng.uniform(*self.fill_frac), o.price, maker=True)
+        return o.view()
+
+    async def cancel_order(self, id, symbol=None, params={}):
+        self.calls += 1
+        o = self.orders.get(id)
+        if o is None or o.status != "open":
+            raise ccxt.OrderNotFound(f"sim: order {id} not open")
+        o.status = "canceled"
+        return o.view()
+
+    async def fetch_order_book(self, symbol, limit=None, params={}):
+        self.calls += 1
+        bid, ask = self.bbo(symbol)
+        return {"bids": [[bid, 1e9]], "asks": [[ask, 1e9]]}
+
+    def qty(self, symbol: str, side: Optional[str] = None, maker: Optional[bool] = None) -> float:
+        """Исполненный объём по символу (и стороне/типу ордера, если заданы)."""
+        out = 0.0
+        for o in self.orders.values():
+            if o.symbol != symbol or (side and o.side != side):
+                continue
+            if maker is not None and (o.type == "limit") != maker:
+                continue
+            out += o.filled
+        return out
+
+
+def pair_legs(spot: str, perp: str, qty: float, min_amount: float = 0.001):
+    return [Leg("spot", spot, "buy", qty, min_amount=min_amount),
+            Leg("perp", perp, "sell", qty, min_amount=min_amount)]
+
+
+async def run_once(seed: int, fallback_ms: int, poll_ms: int, fill_prob: float, maker: bool):
+    """Открыть связку 1.0 BASE; вернуть (комиссии, стоимость против mid, доля maker, разница ног)."""
+    spot, perp = "X/USDT", "X/USDT:USDT"
+    book = SimBook({spot: 100.0, perp: 100.02}, fill_prob=fill_prob, seed=seed)
+    mid0 = dict(book.mid)
+    legs = pair_legs(spot, perp, 1.0)
+    if maker:
+        rep = await MakerExecutor(book, fallback_ms, poll_ms).execute(legs)
+        maker_pct = rep.maker_pct
+    else:
+        for leg in legs:
+            await book.create_order(leg.symbol, "market", leg.side, leg.amount)
+        maker_pct = 0.0
+    slip = sum(o.cost - o.filled * mid0[o.symbol] if o.side == "buy" else o.filled * mid0[o.symbol] - o.cost
+               for o in book.orders.values())
+    return book.fees, book.fees + slip, maker_pct, book.qty(spot, "buy") - book.qty(perp, "sell")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Замер maker-first против market на симуляторе стакана")
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--fallback-ms", type=int, default=300)
+    ap.add_argument("--poll-ms", type=int, default=20)
+    ap.add_argument("--fill-prob", default="0.1,0.3,0.6")
+    args = ap.parse_args()
+
+    print(f"{'fill_prob':>9} {'mode':>6} {'maker %':>8} {'fee bps':>8} {'cost bps':>9} {'max Δqty':>9}")
+    for p in [float(x) for x in args.fill_prob.split(",")]:
+        for maker in (False, True):
+            rows = [asyncio.run(run_once(s, args.fallback_ms, args.poll_ms, p, maker)) for s in range(args.runs)]
+            notional = 2 * 100.0  # обе ноги по 1.0 BASE
+            fee = sum(r[0] for r in rows) / len(rows) / notional * 1e4
+            cost = sum(r[1] for r in rows) / len(rows) / notional * 1e4
+            mk = sum(r[2] for r in rows) / len(rows)
+            gap = max(abs(r[3]) for r in rows)
+            print(f"{p:>9.2f} {'maker' if maker else 'market':>6} {mk:>8.1f} {fee:>8.2f} {cost:>9.2f} {gap:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Таблица state (k -> v) в памяти с отложенной записью в SQLite.
+
+Чтение — из dict. Запись помечает ключ грязным; грязные ключи сбрасываются
+одной транзакцией раз в цикл (flush) или по таймеру. Ключи, охраняющие
+выставление ордеров (pair:*:open, open_ts:* и т.п.), пишутся сразу с commit,
+чтобы после падения процесса бот не открыл связку повторно.
+Ключи, которые меняют другие процессы (flow_manager), читаются из базы.
+"""
+
+import sqlite3
+import time
+from typing import Dict, Tuple
+
+# Ключи, от которых зависит выставление ордеров: пишем синхронно
+WRITE_THROUGH_PREFIXES: Tuple[str, ...] = (
+    "pair:", "open_ts:", "cooldown_until:", "scalein_steps:", "auto_reduce_last_ts",
+)
+# Ключи, которые пишут другие процессы: читаем из базы, пишем синхронно
+SHARED_KEYS: Tuple[str, ...] = ("L1_START_BASE_USDT",)
+
+
+class StateStore:
+    def __init__(self, con: sqlite3.Connection, flush_interval_sec: float = 30.0,
+                 write_through: Tuple[str, ...] = WRITE_THROUGH_PREFIXES,
+                 shared: Tuple[str, ...] = SHARED_KEYS):
+        self.con = con
+        self.flush_interval_sec = flush_interval_sec
+        self.write_through = write_through
+        self.shared = shared
+        self.cache: Dict[str, str] = dict(con.execute("SELECT k, v FROM state").fetchall())
+        self.dirty: Dict[str, str] = {}
+        self.commits = 0
+        self._last_flush = time.monotonic()
+
+    def get(self, k: str, default: str = "") -> str:
+        if k in self.shared:
+            r = self.con.execute("SELECT v FROM state WHERE k=?", (k,)).fetchone()
+            if r is not None:
+                self.cache[k] = r[0]
+            return r[0] if r else default
+        return self.cache.get(k, default)
+
+    def set(self, k: str, v):
+        v = str(v)
+        if self.cache.get(k) == v and k not in self.shared:
+            return
+        self.cache[k] = v
+        self.dirty[k] = v
+        if k.startswith(self.write_through) or k in self.shared:
+            self.flush()
+        elif time.monotonic() - self._last_flush >= self.flush_interval_sec:
+            self.flush()
+
+    def flush(self):
+        """Записать все грязные ключи одной транзакцией."""
+        self._last_flush = time.monotonic()
+        if not self.dirty:
+            return
+        items = list(self.dirty.items())
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO state(k,v) VALUES(?,?)", items)
+        self.commits += 1
+        for k, v in items:
+            if self.dirty.get(k) == v:
+                del self.dirty[k]
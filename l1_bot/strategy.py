@@ -0,0 +1,301 @@
+"""
+Решения L1 по одной паре без обращений к бирже: аллокация под вход,
+условия входа, выхода и доливки, динамический порог и окна payout.
+
+Общие для синхронного цикла и asyncio-движка в main.py и для replay.py:
+всё, что нужно, передаётся аргументами (cfg, снимок баланса, FR, цена,
+позиции, время в секундах epoch), а счётчики выхода хранятся в StateStore
+(get/set).
+"""
+
+import statistics
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+# выплаты funding в 00:00, 08:00, 16:00 UTC (у пар с другим интервалом — PayoutCalendar)
+PAYOUT_PERIOD_SEC = 8 * 3600
+# тихое окно: минут до выплаты и после неё
+QUIET_BEFORE_MIN, QUIET_AFTER_MIN = 5, 2
+
+
+@dataclass
+class Budget:
+    eff_alloc: float      # USDT под вход в пару
+    total_used: float     # занято по аккаунту (equity - free)
+    total_after: float    # занято после входа
+    total_cap: float      # глобальный кап
+    remaining_cap: float  # остаток лимита на пару с учётом купленного спота
+
+
+def is_hedged(cfg, spot_qty: float, perp_qty: float, px: float) -> bool:
+    """Связка хеджирована, если спот и шорт перпа больше «пыли» и перп покрывает ≥95% спота."""
+    significant = (spot_qty * px >= cfg.dust_usd_thr) and (abs(perp_qty) * px >= cfg.dust_usd_thr)
+    return significant and (spot_qty > 1e-6) and (perp_qty < -1e-6) and (abs(perp_qty) >= spot_qty * 0.95)
+
+
+def pair_caps(cfg, eq: float) -> Tuple[float, float]:
+    """(аллокация на пару из L1_MAX_ALLOC_PCT, жёсткий лимит на пару)."""
+    per_pair_alloc = max(0.0, eq * cfg.max_alloc)
+    cap_per_pair = max(0.0, eq * max(0.0, min(cfg.max_pair_alloc_pct, 0.99)))
+    return per_pair_alloc, cap_per_pair
+
+
+def total_cap(cfg, eq: float) -> float:
+    # Стабилизация капа: буфер 15% вместо 1%
+    return eq * max(0.0, min(cfg.max_total_alloc, 0.85))
+
+
+def margin_share(avail: float) -> float:
+    """Доля доступной маржи под вход: чем её меньше, тем полнее используем (до 99%)."""
+    if avail >= 25.0:
+        return 0.8
+    if avail >= 15.0:
+        return 0.9
+    if avail >= 8.0:
+        return 0.95
+    if avail >= 4.0:
+        return 0.98
+    if avail >= 2.0:
+        return 0.99
+    return 0.0  # недостаточно маржи — вход невозможен
+
+
+def entry_budget(cfg, eq: float, free: float, avail: float, fr: float, dyn_thr: float,
+                 min_quote: float, spot_qty: float, px: float) -> Budget:
+    per_pair_alloc, cap_per_pair = pair_caps(cfg, eq)
+    # динамическое масштабирование аллокации при высоком FR
+    scaled_alloc = min(per_pair_alloc, cap_per_pair)
+    if cfg.alloc_scale_enable and dyn_thr > 0:
+        excess = max(0.0, fr - dyn_thr)
+        scale = 1.0 + cfg.alloc_scale_k * (excess / max(dyn_thr, 1e-9))
+        scale = max(1.0, min(scale, cfg.alloc_scale_cap))
+        scaled_alloc = min(per_pair_alloc * scale, cap_per_pair)
+
+    # учтём текущую стоимость уже купленного спота, чтобы не превысить cap на пару
+    remaining_cap = max(0.0, cap_per_pair - max(0.0, spot_qty * px))
+    # УВЕЛИЧЕНИЕ БАЗОВОГО РАЗМЕРА на 50% для достижения 1.0% маржинальности
+    base_alloc = max(scaled_alloc * 1.5, min_quote)
+    eff_alloc = min(base_alloc, avail * margin_share(avail))
+
+    total_used = max(0.0, eq - free)
+    cap = total_cap(cfg, eq)
+    if eff_alloc > 0:
+        eff_alloc = min(eff_alloc, remaining_cap) if remaining_cap > 0 else 0.0
+        if total_used + eff_alloc > cap:
+            eff_alloc = max(0.0, cap - total_used)
+    else:
+        eff_alloc = 0.0
+    return Budget(eff_alloc, total_used, total_used + eff_alloc, cap, remaining_cap)
+
+
+def fr_threshold(cfg, fr_values: List[float]) -> float:
+    """Динамический порог: простая и устойчивая логика вокруг базового порога.
+    - low, если медиана < 0.75 * base
+    - high, если медиана > 1.5 * base
+    - иначе base
+    """
+    if not cfg.dyn_hook or not fr_values:
+        return cfg.fr_thr
+    try:
+        med = statistics.median(fr_values)
+        low, base, high = cfg.fr_lower, cfg.fr_thr, cfg.fr_upper
+        low_border = base * 0.75
+        high_border = base * 1.50
+        if med <= low_border:
+            return low
+        if med >= high_border:
+            return min(high, max(base, med))
+        return base
+    except Exception:
+        return cfg.fr_thr
+
+
+def minutes_to_payout(ts: float, period: int = PAYOUT_PERIOD_SEC, anchor: int = 0) -> int:
+    """Минут до следующей выплаты (строго после ts: ровно в момент выплаты — до следующей).
+    Выплаты — anchor + k * period (с epoch); по умолчанию 00:00/08:00/16:00 UTC.
+    """
+    return int(((anchor - ts) % period or period) // 60)
+
+
+def minutes_since_payout(ts: float, period: int = PAYOUT_PERIOD_SEC, anchor: int = 0) -> int:
+    """Минут с предыдущей выплаты (строго до ts)."""
+    return int(((ts - anchor) % period or period) // 60)
+
+
+def funding_quiet(ts: float, period: int = PAYOUT_PERIOD_SEC, anchor: int = 0) -> bool:
+    """Тихое окно вокруг payout: не входим за 5 минут до него и 2 минуты после."""
+    return minutes_to_payout(ts, period, anchor) <= QUIET_BEFORE_MIN or \
+        minutes_since_payout(ts, period, anchor) <= QUIET_AFTER_MIN
+
+
+def snipe_open_window(cfg, ts: float, period: int = PAYOUT_PERIOD_SEC, anchor: int = 0) -> bool:
+    if not cfg.snipe_enable:
+        return True
+    return 0 < minutes_to_payout(ts, period, anchor) <= max(1, cfg.snipe_window_min)
+
+
+def snipe_close_window(cfg, ts: float, period: int = PAYOUT_PERIOD_SEC, anchor: int = 0) -> bool:
+    if not cfg.snipe_enable:
+        return False
+    return 0 <= minutes_since_payout(ts, period, anchor) <= max(1, cfg.snipe_close_after_min)
+
+
+class PayoutCalendar:
+    """Сетка выплат по символам: (период, опорная выплата) в секундах epoch.
+
+    У Bybit есть перпы с выплатой раз в 1, 4 и 8 часов, поэтому окна считаются
+    по интервалу и nextFundingTime каждой пары. Сетка пересчитывается только
+    при смене интервала или выплаты (update), запросы по паре — O(1).
+    Для пары без данных — 00:00/08:00/16:00 UTC.
+    """
+
+    def __init__(self, default_interval_h: int = 8):
+        self.default = (max(1, default_interval_h) * 3600, 0)
+        self.grid: Dict[str, Tuple[int, int]] = {}
+
+    def update(self, sym: str, interval_h: int, next_ms: int):
+        period = max(1, int(interval_h)) * 3600
+        if next_ms <= 0:
+            # нет nextFundingTime: прежняя сетка, если интервал тот же, иначе — от 00:00 UTC
+            old = self.grid.get(sym)
+            self.grid[sym] = old if old is not None and old[0] == period else (period, 0)
+            return
+        self.grid[sym] = (period, int(next_ms // 1000) % period)
+
+    def update_many(self, fr_info: Dict[str, Tuple[float, int, int]]):
+        """Из funding_map: {symbol: (rate, next_funding_time_ms, interval_h)}."""
+        for sym, (_, next_ms, interval_h) in fr_info.items():
+            self.update(sym, interval_h, next_ms)
+
+    def get(self, sym: str) -> Tuple[int, int]:
+        return self.grid.get(sym, self.default)
+
+    def minutes_to(self, sym: str, ts: float) -> int:
+        return minutes_to_payout(ts, *self.get(sym))
+
+    def minutes_since(self, sym: str, ts: float) -> int:
+        return minutes_since_payout(ts, *self.get(sym))
+
+    def quiet(self, sym: str, ts: float) -> bool:
+        return funding_quiet(ts, *self.get(sym))
+
+    def snipe_open(self, cfg, sym: str, ts: float) -> bool:
+        return snipe_open_window(cfg, ts, *self.get(sym))
+
+    def snipe_close(self, cfg, sym: str, ts: float) -> bool:
+        return snipe_close_window(cfg, ts, *self.get(sym))
+
+    def next_poll(self, cfg, symbols: List[str], ts: float) -> float:
+        """Пауза до следующего цикла, с: poll_fast_sec внутри тихого/snipe-окна любой пары,
+        иначе — до начала ближайшего окна, но не реже poll_slow_sec и не чаще poll_fast_sec.
+        """
+        fast, slow = cfg.poll_fast_sec, max(cfg.poll_fast_sec, cfg.poll_slow_sec)
+        before = max(QUIET_BEFORE_MIN, cfg.snipe_window_min if cfg.snipe_enable else 0) * 60
+        after = max(QUIET_AFTER_MIN, cfg.snipe_close_after_min if cfg.snipe_enable else 0) * 60
+        wait = slow
+        for sym in symbols:
+            period, anchor = self.get(sym)
+            to_next = (anchor - ts) % period or period
+            if to_next <= before + 60 or period - to_next <= after + 60:
+                return fast
+            wait = min(wait, to_next - before - 60)
+        return max(fast, wait)
+
+
+def symbols_order(cfg, symbols: List[str], fr_map: Dict[str, float]) -> List[str]:
+    """Порядок обхода пар: snipe — топ-N по FR, иначе как в L1_SYMBOLS."""
+    if not cfg.snipe_enable:
+        return symbols
+    ranked = sorted(symbols, key=lambda s: fr_map.get(s, 0.0), reverse=True)
+    return ranked[:int(max(1, _f(cfg.snipe_top_n, 3)))]
+
+
+def snipe_ok(cfg, fr: float, snipe_open: bool) -> bool:
+    return (not cfg.snipe_enable) or (snipe_open and fr >= cfg.snipe_min_fr)
+
+
+def entry_checks(cfg, fr: float, dyn_thr: float, spr: float, free: float, avail: float,
+                 budget: Budget, min_quote: float, hedged: bool, quiet: bool, snipe_open: bool) -> Dict[str, bool]:
+    """Условия входа по отдельности (для лога); вход — если все True."""
+    return {
+        "fr_ok": fr >= (dyn_thr + cfg.fr_extra_buffer),
+        "free_ok": free >= max(budget.eff_alloc, cfg.min_free),
+        "not_quiet": not quiet,
+        "snipe_ok": snipe_ok(cfg, fr, snipe_open),
+        "spread_ok": spr <= cfg.max_spread_pct,
+        "cap_ok": budget.total_after <= budget.total_cap,
+        "min_ok": budget.eff_alloc >= min_quote,  # проверка минимального размера
+        "avail_ok": avail >= 1.5,  # СНИЖЕННЫЙ ПОРОГ: 1.5 вместо 4.0 для максимизации входов
+        "not_hedged": not hedged,
+    }
+
+
+def entry_order(avail: float) -> str:
+    """ГИБРИДНЫЙ ПОРЯДОК ВХОДА: SPOT_FIRST при избытке маржи, PERP_FIRST для экономии."""
+    return "SPOT_FIRST" if avail >= 20.0 else "PERP_FIRST"
+
+
+def exit_reason(cfg, st, sym: str, fr: float, dyn_thr: float, hedged: bool,
+                now_ts: int, snipe_close: bool) -> str:
+    """Обновляет счётчик below_thr_count и пик FR в st; возвращает причину выхода
+    ("negative" / "below" / "time") или "" — держим.
+    """
+    if not hedged:
+        return ""
+    # гистерезис удержания: сниженный порог для проверки выхода
+    hold_thr = max(0.0, dyn_thr - cfg.hysteresis_fr)
+    below_key = f"below_thr_count:{sym}"
+    if fr < hold_thr:
+        st.set(below_key, str(int(_f(st.get(below_key, "0"))) + 1))
+    elif st.get(below_key, "0") != "0":
+        st.set(below_key, "0")
+
+    # тайм-аут удержания
+    due_time = False
+    if cfg.max_hold_min > 0:
+        ots = int(_f(st.get(f"open_ts:{sym}", "0")))
+        if ots > 0:
+            held_min = max(0, int((now_ts - ots) // 60))
+            due_time = (held_min >= cfg.max_hold_min) and (fr < dyn_thr) or (cfg.snipe_enable and snipe_close)
+            # принудительное закрытие после N часов независимо от FR
+            if cfg.force_close_after_h > 0 and held_min >= max(1, cfg.force_close_after_h) * 60:
+                due_time = True
+            # трейлинг по пику FR: запоминаем максимум и закрываем при откате
+            if cfg.trail_fr_pct > 0:
+                key_peak = f"fr_peak:{sym}"
+                peak = _f(st.get(key_peak, "0"))
+                if fr > peak:
+                    st.set(key_peak, fr)
+                elif peak > 0 and fr <= peak * max(0.0, 1.0 - cfg.trail_fr_pct):
+                    due_time = True
+
+    if fr < -0.00005:
+        return "negative"
+    if int(_f(st.get(below_key, "0"))) >= cfg.exit_fr_below_count:
+        return "below"
+    return "time" if due_time else ""
+
+
+def scale_in_alloc(cfg, fr: float, dyn_thr: float, spr: float, quiet: bool, snipe_open: bool,
+                   steps: int, eq: float, free: float, spot_qty: float, px: float) -> float:
+    """Размер доливки в USDT; 0.0 — доливать не нужно или некуда."""
+    if steps >= max(0, cfg.scale_in_max_steps):
+        return 0.0
+    # FR выше порога + буфер, спред ок, не в тихом окне
+    if not (fr >= (dyn_thr + max(0.0, cfg.scale_in_fr_buffer)) and spr <= cfg.max_spread_pct
+            and not quiet and snipe_ok(cfg, fr, snipe_open)):
+        return 0.0
+    # минимум из scale_in_min_quote и free, не превышая лимит на пару с учётом текущего спота
+    _, cap_per_pair = pair_caps(cfg, eq)
+    remaining_cap = max(0.0, cap_per_pair - max(0.0, spot_qty * px))
+    alloc = min(cfg.scale_in_min_quote, free, remaining_cap)
+    if alloc < cfg.scale_in_min_quote or max(0.0, eq - free) + alloc > total_cap(cfg, eq):
+        return 0.0
+    return alloc
+
+
+def _f(x, default: float = 0.0) -> float:
+    try:
+        return float(x) if x is not None else default
+    except Exception:
+        return default
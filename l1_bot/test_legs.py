@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Проверка legs.py: обе ноги уходят одновременно, ошибки не теряются,
+последовательный режим останавливается на первой ошибке, разрыв исполнения.
+"""
+
+import asyncio
+import time
+
+from legs import LegResult, leg_gap_ms, run_legs, run_legs_async
+
+
+def slow(result, delay=0.2):
+    def call():
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return call
+
+
+def test_concurrent_legs_overlap():
+    t0 = time.monotonic()
+    res = run_legs([("spot", slow({"id": "s"})), ("perp", slow({"id": "p"}))])
+    assert time.monotonic() - t0 < 0.35
+    assert [r.name for r in res] == ["spot", "perp"] and all(r.ok for r in res)
+    assert leg_gap_ms(*res) < 100
+
+
+def test_failure_reported_and_sequential_stops():
+    res = run_legs([("spot", slow({"id": "s"}, 0.01)), ("perp", slow(RuntimeError("margin"), 0.01))])
+    assert res[0].ok and not res[1].ok and str(res[1].error) == "margin"
+    res = run_legs([("perp", slow(RuntimeError("margin"), 0.01)), ("spot", slow({"id": "s"}, 0.01))],
+                   concurrent=False)
+    assert not res[0].ok and not res[1].submitted and res[1].error is None
+
+
+def test_async_legs_and_exchange_timestamps():
+    async def leg(ts, delay):
+        await asyncio.sleep(delay)
+        return {"timestamp": ts}
+    t0 = time.monotonic()
+    res = asyncio.run(run_legs_async([("spot", lambda: leg(1_000, 0.2)), ("perp", lambda: leg(1_035, 0.2))]))
+    assert time.monotonic() - t0 < 0.35
+    # время исполнения по бирже важнее моментов ответа
+    assert leg_gap_ms(*res) == 35.0
+    gap = leg_gap_ms(LegResult("a", {}, sent=1.0, done=1.010), LegResult("b", None, sent=1.0, done=1.0))
+    assert abs(gap - 10.0) < 1e-6
+
+
+if __name__ == "__main__":
+    test_concurrent_legs_overlap()
+    test_failure_reported_and_sequential_stops()
+    test_async_legs_and_exchange_timestamps()
+    print("✅ legs OK")
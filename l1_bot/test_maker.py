@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Проверка maker-first исполнения (maker.py) на локальном симуляторе стакана
+(sim_book.py): исполнение лимитками, добор по тайм-ауту, выравнивание ног
+при частичных исполнениях, перекотировка postOnly, ошибка одной ноги и
+экономия на комиссиях против market.
+"""
+
+import asyncio
+
+import ccxt
+
+from maker import MakerExecutor
+from sim_book import SimBook, pair_legs, run_once
+
+SPOT, PERP = "X/USDT", "X/USDT:USDT"
+
+
+def make_book(**kw):
+    kw.setdefault("move_prob", 0.0)
+    return SimBook({SPOT: 100.0, PERP: 100.02}, **kw)
+
+
+def run(book, fallback_ms=300, poll_ms=10, qty=1.0):
+    return asyncio.run(MakerExecutor(book, fallback_ms, poll_ms).execute(pair_legs(SPOT, PERP, qty)))
+
+
+def test_full_maker_fill():
+    book = make_book(fill_prob=1.0, fill_frac=(1.0, 1.0))
+    rep = run(book)
+    assert rep.error is None and rep.maker_pct == 100.0 and rep.catchups == 0
+    assert book.qty(SPOT, "buy", maker=True) == 1.0 and book.qty(PERP, "sell", maker=True) == 1.0
+    # спот куплен по bid, перп продан по ask
+    assert rep.legs[0].avg_price == book.bbo(SPOT)[0] and rep.legs[1].avg_price == book.bbo(PERP)[1]
+
+
+def test_fallback_to_market_after_timeout():
+    book = make_book(fill_prob=0.0)
+    rep = run(book, fallback_ms=100)
+    assert rep.error is None and rep.maker_pct == 0.0 and rep.elapsed_ms >= 100
+    assert book.qty(SPOT, "buy", maker=False) == 1.0 and book.qty(PERP, "sell", maker=False) == 1.0
+    assert not [o for o in book.orders.values() if o.status == "open"]
+
+
+def test_partial_fills_keep_legs_hedged():
+    for seed in range(20):
+        book = make_book(fill_prob=0.5, fill_frac=(0.1, 0.6), move_prob=0.2, seed=seed)
+        rep = run(book, fallback_ms=200)
+        assert rep.error is None
+        spot, perp = book.qty(SPOT, "buy"), book.qty(PERP, "sell")
+        assert abs(spot - 1.0) < 0.001 and abs(perp - 1.0) < 0.001
+        assert abs(spot - perp) < 0.001
+
+
+def test_post_only_cross_is_requoted():
+    book = make_book(fill_prob=1.0, fill_frac=(1.0, 1.0))
+    legs = pair_legs(SPOT, PERP, 1.0)[:1]  # одна нога: иначе исполненный перп вызовет добор market
+    legs[0].price_hint = 101.0  # устаревшая цена выше ask — postOnly будет снят
+    rep = asyncio.run(MakerExecutor(book, 300, 10).execute(legs))
+    assert rep.error is None and rep.requotes >= 1 and rep.maker_pct == 100.0
+    assert book.orders["1"].status == "canceled" and book.orders["1"].filled == 0.0
+
+
+def test_leg_error_stops_other_leg():
+    book = make_book(fill_prob=0.0, fail={PERP: ccxt.InsufficientFunds("no margin")})
+    rep = run(book)
+    assert isinstance(rep.error, ccxt.InsufficientFunds)
+    assert rep.legs[0].filled == 0.0 and not [o for o in book.orders.values() if o.status == "open"]
+
+
+def test_fee_savings_vs_market():
+    runs = 20
+    market = [asyncio.run(run_once(s, 100, 10, 0.5, maker=False)) for s in range(runs)]
+    maker = [asyncio.run(run_once(s, 100, 10, 0.5, maker=True)) for s in range(runs)]
+    assert sum(r[2] for r in maker) / runs > 30.0  # доля maker-исполнений
+    assert sum(r[0] for r in maker) < sum(r[0] for r in market)  # комиссии
+    assert sum(r[1] for r in maker) < sum(r[1] for r in market)  # комиссии + спред
+
+
+if __name__ == "__main__":
+    test_full_maker_fill()
+    test_fallback_to_market_after_timeout()
+    test_partial_fills_keep_legs_hedged()
+    test_post_only_cross_is_requoted()
+    test_leg_error_stops_other_leg()
+    test_fee_savings_vs_market()
+    print("✅ maker OK")
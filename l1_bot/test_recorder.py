@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Проверка recorder.py: сброс по заполнению буфера и смене дня, смена набора
+символов (NaN → ffill в Tape.load), интервалы выплат, удаление старых дней.
+"""
+
+import datetime as dt
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from recorder import Recorder, intervals, load, parts
+from replay import Tape
+
+
+def ts(day, h, m=0):
+    return dt.datetime(2024, 1, day, h, m, tzinfo=dt.timezone.utc).timestamp()
+
+
+def test_chunks_and_day_rotation():
+    with tempfile.TemporaryDirectory() as d:
+        rec = Recorder(d, chunk_rows=2, keep_days=0)
+        for i, t in enumerate((ts(1, 23, 50), ts(1, 23, 55), ts(1, 23, 58), ts(2, 0, 1))):
+            rec.record(t, ["A/USDT", "B/USDT"], [0.0001 * i, 0.0002], [10.0 + i, 20.0], [0.01, 0.02])
+        # 2 строки — полный буфер, третья — сброс при смене дня, четвёртая ещё в памяти
+        assert rec.files == 2 and rec.rows == 1
+        rec.flush()
+        assert [os.path.basename(os.path.dirname(p)) for p in parts(d)] == ["2024-01-01"] * 2 + ["2024-01-02"]
+        t, symbols, fr, px, spr = load(d)
+    assert symbols == ["A/USDT", "B/USDT"] and len(t) == 4
+    assert px[:, 0].tolist() == [10.0, 11.0, 12.0, 13.0] and np.allclose(spr[:, 1], 0.02)
+    assert len(load(d + "-none")[0]) == 0
+
+
+def test_symbol_change_and_tape_load():
+    with tempfile.TemporaryDirectory() as d:
+        rec = Recorder(d, chunk_rows=100, keep_days=0)
+        rec.record(ts(1, 1), ["A/USDT"], [0.0001], [10.0], [0.0])
+        rec.record(ts(1, 2), ["A/USDT", "C/USDT"], [0.0002, 0.0003], [11.0, 30.0], [0.0, 0.0], interval_h=[8, 4])
+        rec.record(ts(1, 3), ["C/USDT"], [0.0004], [31.0], [0.0], interval_h=[1])
+        rec.flush()
+        assert rec.files == 3
+        _, symbols, _, px, _ = load(d)
+        assert symbols == ["A/USDT", "C/USDT"]
+        assert np.isnan(px[0, 1]) and np.isnan(px[2, 0])
+        assert intervals(d) == {"A/USDT": 8, "C/USDT": 1}
+        tape = Tape.load(d)
+    # пропуски добираются предыдущим значением, до первого появления — 0
+    assert tape.px.tolist() == [[10.0, 0.0], [11.0, 30.0], [11.0, 31.0]]
+    # интервал — по последней части с ним
+    assert tape.interval_h.tolist() == [8, 1]
+
+
+def test_old_days_removed():
+    with tempfile.TemporaryDirectory() as d:
+        old = dt.datetime.utcfromtimestamp(time.time() - 10 * 86400).strftime("%Y-%m-%d")
+        os.makedirs(os.path.join(d, old))
+        rec = Recorder(d, chunk_rows=1, keep_days=3)
+        rec.record(time.time(), ["A/USDT"], [0.0], [1.0], [0.0])
+        assert os.listdir(d) == [dt.datetime.utcnow().strftime("%Y-%m-%d")]
+
+
+if __name__ == "__main__":
+    test_chunks_and_day_rotation()
+    test_symbol_change_and_tape_load()
+    test_old_days_removed()
+    print("✅ recorder OK")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Проверка replay.py: окна payout по времени ленты, один вход/выход на
+ручной ленте с funding и комиссиями, выплаты и окна по интервалу пары,
+загрузка CSV.
+"""
+
+import datetime as dt
+import os
+import tempfile
+
+import numpy as np
+
+from replay import Fees, Tape, make_cfg, replay
+from strategy import funding_quiet, minutes_since_payout, minutes_to_payout
+
+
+def ts(h, m=0, s=0):
+    return dt.datetime(2024, 1, 1, h, m, s, tzinfo=dt.timezone.utc).timestamp()
+
+
+def test_payout_windows():
+    assert minutes_to_payout(ts(7, 30, 20)) == 29 and minutes_since_payout(ts(7, 30, 20)) == 450
+    # ровно в момент выплаты: следующая через 8ч, предыдущая — 8ч назад
+    assert minutes_to_payout(ts(8)) == 480 and minutes_since_payout(ts(8)) == 480
+    assert funding_quiet(ts(23, 56)) and funding_quiet(ts(16, 2)) and not funding_quiet(ts(16, 3))
+
+
+def test_open_hold_close_with_funding():
+    # 1 символ, шаг 1ч: FR высокий 24ч (3 выплаты), затем отрицательный
+    n = 30
+    t = np.array([int(ts(0, 30)) + 3600 * i for i in range(n)], dtype=np.int64)
+    fr = np.where(np.arange(n) < 24, 0.0005, -0.0002).reshape(n, 1)
+    tape = Tape(t, ["X/USDT"], fr, np.full((n, 1), 100.0), np.zeros((n, 1)))
+    cfg = make_cfg({"L1_POLL_INTERVAL_SEC": "3600", "L1_SCALEIN_ENABLE": "false", "L1_MAX_HOLD_MIN": "0"})
+    r = replay(cfg, tape, equity=1000.0, fees=Fees(0.001, 0.0005))
+    assert (r.opens, r.closes) == (1, 1)
+    # вход упирается в лимит на пару 20% = 200 USDT; выплаты в 08/16/24 — по ставке до выплаты (FR>0)
+    qty = round(200.0 / 100.0 * 0.998, 6)
+    assert abs(r.funding - 3 * qty * 100.0 * 0.0005) < 1e-9
+    assert abs(r.fees - 2 * qty * 100.0 * 0.0015) < 1e-9
+    assert abs(r.pnl - (r.funding - r.fees)) < 1e-9
+
+
+def test_hourly_symbol_payouts_and_quiet():
+    # пара с выплатой раз в 1ч: 8h-ставка платится каждый час по 1/8
+    n = 30
+    t = np.array([int(ts(0, 30)) + 3600 * i for i in range(n)], dtype=np.int64)
+    tape = Tape(t, ["H/USDT"], np.full((n, 1), 0.0008), np.full((n, 1), 100.0), np.zeros((n, 1)), [1])
+    cfg = make_cfg({"L1_POLL_INTERVAL_SEC": "3600", "L1_SCALEIN_ENABLE": "false", "L1_MAX_HOLD_MIN": "0"})
+    r = replay(cfg, tape, equity=1000.0, fees=Fees(0.0, 0.0))
+    assert (r.opens, r.closes) == (1, 0)
+    # вход в 00:30 на 200 USDT, дальше 29 часовых выплат
+    qty = round(200.0 / 100.0 * 0.998, 6)
+    assert abs(r.funding - 29 * qty * 100.0 * 0.0008 / 8) < 1e-9
+
+    # в xx:58 тихое окно только у 1h-пары: она не входит, 8h-пара входит
+    t = np.array([int(ts(3, 58))], dtype=np.int64)
+    tape = Tape(t, ["H/USDT", "X/USDT"], np.full((1, 2), 0.0008), np.full((1, 2), 100.0), np.zeros((1, 2)), [1, 8])
+    r = replay(cfg, tape, equity=1000.0, fees=Fees(0.0, 0.0))
+    assert r.opens == 1 and r.funding == 0.0
+
+
+def test_tape_from_csv():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "tape.csv")
+        with open(path, "w") as f:
+            f.write("ts,symbol,fr,px,interval_h\n100,A/USDT,0.0001,10,4\n100,B/USDT,0.0002,20,\n"
+                    "160,A/USDT,0.0003,11,4\n")
+        tape = Tape.load(path)
+    assert tape.symbols == ["A/USDT", "B/USDT"] and tape.ts.tolist() == [100, 160]
+    # пропуск B на втором шаге заполняется предыдущим значением
+    assert tape.fr[1].tolist() == [0.0003, 0.0002] and tape.px[1].tolist() == [11.0, 20.0]
+    # интервал без значения — 8ч
+    assert tape.interval_h.tolist() == [4, 8]
+
+
+if __name__ == "__main__":
+    test_payout_windows()
+    test_open_hold_close_with_funding()
+    test_hourly_symbol_payouts_and_quiet()
+    test_tape_from_csv()
+    print("✅ replay OK")
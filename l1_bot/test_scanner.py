@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Проверка scanner.py: сборка вселенной из instruments-info (только USDT
+перпы с парным спотом), векторные фильтры входа и ранжирование, время
+скана на 600 рынках.
+"""
+
+import time
+
+from scanner import Scanner, Universe, scan, synthetic_rows
+
+
+def inst(base, spot=True, contract="LinearPerpetual", min_qty="1", min_amt="5", interval=240):
+    s = {"symbol": f"{base}USDT", "baseCoin": base, "quoteCoin": "USDT", "status": "Trading",
+         "lotSizeFilter": {"minOrderQty": min_qty, "minOrderAmt": min_amt}}
+    p = {"symbol": f"{base}USDT", "baseCoin": base, "quoteCoin": "USDT", "status": "Trading",
+         "contractType": contract, "fundingInterval": interval, "lotSizeFilter": {"minOrderQty": min_qty}}
+    return ([s] if spot else []), [p]
+
+
+def tick(base, fr, bid, ask, turnover=1e7):
+    return ({"symbol": f"{base}USDT", "bid1Price": str(bid), "ask1Price": str(ask), "lastPrice": "",
+             "turnover24h": str(turnover)},
+            {"symbol": f"{base}USDT", "fundingRate": str(fr), "turnover24h": str(turnover)})
+
+
+def universe():
+    si, li = [], []
+    for args in (("AAA",), ("BBB",), ("CCC",), ("DDD",), ("EEE",), ("NOS", False), ("FUT", True, "LinearFutures"),
+                 ("BIG", True, "LinearPerpetual", "10")):
+        s, p = inst(*args)
+        si += s
+        li += p
+    return Universe.build(si, li)
+
+
+def test_filters_and_ranking():
+    u = universe()
+    assert u.symbols == ["AAA/USDT", "BBB/USDT", "CCC/USDT", "DDD/USDT", "EEE/USDT", "BIG/USDT"]
+    assert u.interval_h.tolist() == [4] * 6
+    rows = [tick("AAA", 0.0003, 9.99, 10.01), tick("BBB", 0.0005, 9.99, 10.01),
+            tick("CCC", 0.0009, 9.0, 11.0),                  # широкий спред
+            tick("DDD", 0.00004, 9.99, 10.01),              # FR(8h) ниже порога
+            tick("EEE", 0.0003, 9.99, 10.01, turnover=5e7),
+            tick("BIG", 0.0010, 9.99, 10.01)]               # 10 шт × 10 USDT > аллокации
+    res = scan(u, [r[0] for r in rows], [r[1] for r in rows], thr=0.0001, max_spread=0.003, alloc=50.0,
+               min_turnover=1e6, top_n=5)
+    assert res.ranked == ["BBB/USDT", "EEE/USDT", "AAA/USDT"]
+    assert abs(res.min_quote[5] - 10 * 10.0 / 0.998) < 1e-9 and res.px[0] == 10.0
+    # без проверки аллокации BIG выходит первым; top_n режет хвост
+    assert scan(u, [r[0] for r in rows], [r[1] for r in rows], 0.0001, 0.003, 0.0, top_n=2).ranked == \
+        ["BIG/USDT", "BBB/USDT"]
+
+
+def test_rates_scaled_to_8h():
+    si, li = [], []
+    for base, interval in (("AAA", 60), ("BBB", 480), ("CCC", 480), ("DDD", 60)):
+        s, p = inst(base, interval=interval)
+        si += s
+        li += p
+    u = Universe.build(si, li)
+    rows = [tick("AAA", 0.0002, 9.99, 10.01), tick("BBB", 0.001, 9.99, 10.01),
+            tick("CCC", 0.00015, 9.99, 10.01),              # 8h ниже порога
+            tick("DDD", 0.00003, 9.99, 10.01)]              # 1h × 8 = 0.00024 — выше
+    res = scan(u, [r[0] for r in rows], [r[1] for r in rows], thr=0.0002, max_spread=0.003, alloc=0.0)
+    assert res.ranked == ["AAA/USDT", "BBB/USDT", "DDD/USDT"]
+    assert abs(res.fr[0] - 0.0016) < 1e-12 and abs(res.fr[1] - 0.001) < 1e-12
+
+
+class RawEx:
+    def __init__(self, n):
+        self.si, self.li, self.st, self.lt = synthetic_rows(n)
+        self.calls = []
+
+    def publicGetV5MarketInstrumentsInfo(self, req):
+        self.calls.append(("instruments", req["category"], req.get("cursor", "")))
+        rows = self.si if req["category"] == "spot" else self.li
+        # linear — двумя страницами, как с nextPageCursor у Bybit
+        if req["category"] == "linear" and not req.get("cursor"):
+            return {"result": {"list": rows[:400], "nextPageCursor": "p2"}}
+        return {"result": {"list": rows[400:] if req.get("cursor") else rows, "nextPageCursor": ""}}
+
+    def publicGetV5MarketTickers(self, req):
+        self.calls.append(("tickers", req["category"]))
+        return {"result": {"list": self.st if req["category"] == "spot" else self.lt}}
+
+
+def test_scanner_600_markets_fast():
+    ex = RawEx(600)
+    sc = Scanner(ex, top_n=10, min_turnover=1e6)
+    res = sc.run(0.00012, 0.003, 100.0)
+    assert len(res.symbols) == 600 and len(res.ranked) == 10
+    assert [c[0] for c in ex.calls].count("instruments") == 3
+    t0 = time.perf_counter()
+    sc.run(0.00012, 0.003, 100.0)
+    assert time.perf_counter() - t0 < 0.25
+    # instruments-info кэшируется, тикеры — две пачки на скан
+    assert ex.calls[-2:] == [("tickers", "spot"), ("tickers", "linear")] and len(ex.calls) == 7
+
+
+if __name__ == "__main__":
+    test_filters_and_ranking()
+    test_rates_scaled_to_8h()
+    test_scanner_600_markets_fast()
+    print("✅ scanner OK")
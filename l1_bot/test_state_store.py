@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Проверка StateStore: отложенная запись, синхронные ключи ордеров,
+чтение ключей, которые пишет flow_manager.
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from state_store import StateStore
+
+
+def make_db():
+    path = os.path.join(tempfile.mkdtemp(), "ledger.db")
+    con = sqlite3.connect(path, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL;")
+    con.execute("CREATE TABLE IF NOT EXISTS state(k TEXT PRIMARY KEY, v TEXT)")
+    con.commit()
+    return path, con
+
+
+def db_get(path, k):
+    with sqlite3.connect(path) as other:
+        r = other.execute("SELECT v FROM state WHERE k=?", (k,)).fetchone()
+    return r[0] if r else None
+
+
+def test_write_behind_single_commit():
+    path, con = make_db()
+    st = StateStore(con, flush_interval_sec=3600)
+    for i in range(50):
+        st.set(f"below_thr_count:S{i}", i)
+        st.set(f"fr_peak:S{i}", 0.001 * i)
+    assert st.get("fr_peak:S3") == "0.003"
+    assert db_get(path, "fr_peak:S3") is None
+    st.set("below_thr_count:S1", 1)  # без изменений — не грязный
+    st.flush()
+    assert st.commits == 1
+    assert db_get(path, "fr_peak:S3") == "0.003"
+    st.flush()
+    assert st.commits == 1
+    # новый процесс видит то же состояние
+    assert StateStore(sqlite3.connect(path)).get("below_thr_count:S49") == "49"
+
+
+def test_order_keys_written_through():
+    path, con = make_db()
+    st = StateStore(con, flush_interval_sec=3600)
+    st.set("fr_peak:BTC/USDT", "0.0004")
+    st.set("pair:BTC/USDT:open", "1")
+    assert db_get(path, "pair:BTC/USDT:open") == "1"
+    # синхронная запись забирает и накопленные ключи
+    assert db_get(path, "fr_peak:BTC/USDT") == "0.0004"
+    st.set("open_ts:BTC/USDT", 1718000000)
+    assert db_get(path, "open_ts:BTC/USDT") == "1718000000"
+    assert st.commits == 2
+
+
+def test_shared_key_read_from_db():
+    path, con = make_db()
+    st = StateStore(con, flush_interval_sec=3600)
+    assert st.get("L1_START_BASE_USDT", "0") == "0"
+    with sqlite3.connect(path) as other:  # flow_manager
+        other.execute("INSERT OR REPLACE INTO state(k,v) VALUES(?,?)", ("L1_START_BASE_USDT", "1234.5"))
+    assert st.get("L1_START_BASE_USDT", "0") == "1234.5"
+
+
+if __name__ == "__main__":
+    test_write_behind_single_commit()
+    test_order_keys_written_through()
+    test_shared_key_read_from_db()
+    print("✅ state_store OK")
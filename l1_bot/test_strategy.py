@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Проверка решений по паре из strategy.py (без биржи): аллокация и кап,
+условия входа, выходы с гистерезисом, доливка и календарь выплат.
+"""
+
+import sqlite3
+from types import SimpleNamespace
+
+from state_store import StateStore
+from strategy import PayoutCalendar, entry_budget, entry_checks, exit_reason, is_hedged, scale_in_alloc
+
+CFG = dict(
+    max_alloc=0.1, max_pair_alloc_pct=0.2, max_total_alloc=0.6, alloc_scale_enable=True,
+    alloc_scale_k=0.5, alloc_scale_cap=1.5, fr_extra_buffer=0.00002, min_free=1.0,
+    max_spread_pct=0.003, snipe_enable=False, snipe_min_fr=0.0002, dust_usd_thr=1.0,
+    hysteresis_fr=0.00002, exit_fr_below_count=3, max_hold_min=30, force_close_after_h=0,
+    trail_fr_pct=0.0, scale_in_max_steps=3, scale_in_min_quote=5.0, scale_in_fr_buffer=0.0,
+)
+
+
+def make_cfg(**kw):
+    return SimpleNamespace(**dict(CFG, **kw))
+
+
+def make_store():
+    con = sqlite3.connect(":memory:")
+    con.execute("CREATE TABLE state(k TEXT PRIMARY KEY, v TEXT)")
+    return StateStore(con)
+
+
+def test_entry_budget_caps():
+    cfg = make_cfg()
+    # 10% от 1000 * 1.5 = 150, FR на пороге — без масштабирования
+    b = entry_budget(cfg, eq=1000, free=1000, avail=1000, fr=0.0001, dyn_thr=0.0001,
+                     min_quote=5, spot_qty=0, px=100)
+    assert round(b.eff_alloc, 6) == 150.0 and b.total_cap == 600.0
+    # лимит на пару 200 USDT, спота уже на 120 — осталось 80
+    b = entry_budget(cfg, 1000, 1000, 1000, 0.0001, 0.0001, 5, spot_qty=1.2, px=100)
+    assert round(b.eff_alloc, 6) == 80.0
+    # занято 550 из капа 600 — под вход остаётся 50
+    b = entry_budget(cfg, 1000, 450, 1000, 0.0001, 0.0001, 5, 0, 100)
+    assert round(b.eff_alloc, 6) == 50.0 and round(b.total_after, 6) == 600.0
+    # мало маржи: 3 USDT * 0.99
+    b = entry_budget(cfg, 1000, 1000, 3.0, 0.0001, 0.0001, 1, 0, 100)
+    assert round(b.eff_alloc, 6) == 2.97
+    assert entry_budget(cfg, 1000, 1000, 1.9, 0.0001, 0.0001, 1, 0, 100).eff_alloc == 0.0
+
+
+def test_entry_checks():
+    cfg = make_cfg()
+    b = entry_budget(cfg, 1000, 1000, 1000, 0.0005, 0.0001, 5, 0, 100)
+    ok = entry_checks(cfg, 0.0005, 0.0001, 0.001, 1000, 1000, b, 5, hedged=False, quiet=False, snipe_open=True)
+    assert all(ok.values())
+    bad = entry_checks(cfg, 0.0005, 0.0001, 0.01, 1000, 1000, b, 5, hedged=True, quiet=True, snipe_open=True)
+    assert [k for k, v in bad.items() if not v] == ["not_quiet", "spread_ok", "not_hedged"]
+    assert is_hedged(cfg, 1.0, -0.96, 100) and not is_hedged(cfg, 1.0, -0.5, 100)
+    assert not is_hedged(cfg, 0.001, -0.001, 100)  # пыль
+
+
+def test_exit_reason_hysteresis_and_timeout():
+    cfg = make_cfg()
+    st = make_store()
+    now_ts = 1_718_000_000
+    st.set("open_ts:X/USDT", now_ts - 60)
+    # FR чуть ниже порога, но выше порога удержания — счётчик не растёт
+    assert exit_reason(cfg, st, "X/USDT", 0.000085, 0.0001, True, now_ts, False) == ""
+    assert st.get("below_thr_count:X/USDT", "0") == "0"
+    for _ in range(2):
+        assert exit_reason(cfg, st, "X/USDT", 0.00005, 0.0001, True, now_ts, False) == ""
+    assert exit_reason(cfg, st, "X/USDT", 0.00005, 0.0001, True, now_ts, False) == "below"
+    assert exit_reason(cfg, st, "X/USDT", -0.0001, 0.0001, True, now_ts, False) == "negative"
+    assert exit_reason(cfg, st, "X/USDT", -0.0001, 0.0001, False, now_ts, False) == ""
+    # держим дольше max_hold_min при FR ниже порога (счётчик сброшен хорошим FR)
+    exit_reason(cfg, st, "X/USDT", 0.0002, 0.0001, True, now_ts, False)
+    later = now_ts + 31 * 60
+    assert exit_reason(cfg, st, "X/USDT", 0.00009, 0.0001, True, later, False) == "time"
+
+
+def test_scale_in_alloc():
+    cfg = make_cfg()
+    assert scale_in_alloc(cfg, 0.0005, 0.0001, 0.001, False, True, 0, eq=1000, free=900, spot_qty=1, px=100) == 5.0
+    assert scale_in_alloc(cfg, 0.0005, 0.0001, 0.001, False, True, 3, 1000, 900, 1, 100) == 0.0
+    # лимит на пару исчерпан
+    assert scale_in_alloc(cfg, 0.0005, 0.0001, 0.001, False, True, 0, 1000, 900, 1.98, 100) == 0.0
+    # глобальный кап: занято 598 из 600
+    assert scale_in_alloc(cfg, 0.0005, 0.0001, 0.001, False, True, 0, 1000, 402, 1, 100) == 0.0
+
+
+def test_payout_calendar():
+    day = 1_700_000_000 // 86400 * 86400  # 00:00 UTC
+    cal = PayoutCalendar()
+    cal.update("BTC/USDT", 8, (day + 8 * 3600) * 1000)
+    cal.update("PEPE/USDT", 1, (day + 3600) * 1000)
+    cal.update("ODD/USDT", 4, (day + 2 * 3600) * 1000)  # сетка 02:00, 06:00, ...
+    ts = day + 5 * 3600 + 57 * 60  # 05:57
+    assert cal.minutes_to("BTC/USDT", ts) == 123 and cal.minutes_to("PEPE/USDT", ts) == 3
+    assert cal.minutes_to("ODD/USDT", ts) == 3 and cal.minutes_since("ODD/USDT", ts) == 237
+    assert cal.quiet("PEPE/USDT", ts) and not cal.quiet("BTC/USDT", ts)
+    assert cal.minutes_to("NEW/USDT", ts) == 123  # без данных — 00/08/16 UTC
+    # без nextFundingTime сетка не сбрасывается
+    cal.update("ODD/USDT", 4, 0)
+    assert cal.minutes_to("ODD/USDT", ts) == 3
+
+    cfg = make_cfg(snipe_enable=True, snipe_window_min=12, snipe_close_after_min=3,
+                   poll_fast_sec=5.0, poll_slow_sec=120.0)
+    assert cal.snipe_open(cfg, "PEPE/USDT", ts) and not cal.snipe_open(cfg, "BTC/USDT", ts)
+    assert cal.snipe_close(cfg, "PEPE/USDT", ts + 4 * 60)
+    # опрос: часто в окне любой пары, иначе — до начала ближайшего окна, не реже poll_slow_sec
+    assert cal.next_poll(cfg, ["BTC/USDT", "PEPE/USDT"], ts) == 5.0
+    assert cal.next_poll(cfg, ["BTC/USDT"], ts) == 120.0
+    assert cal.next_poll(cfg, ["BTC/USDT"], day + 7 * 3600 + 46 * 60) == 60.0  # окно с 07:47 (12 мин + 1)
+
+
+if __name__ == "__main__":
+    test_entry_budget_caps()
+    test_entry_checks()
+    test_exit_reason_hysteresis_and_timeout()
+    test_scale_in_alloc()
+    test_payout_calendar()
+    print("✅ strategy OK")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Проверка WsTickerCache против локального WebSocket-стенда,
+который отдаёт записанные сообщения Bybit public v5 (spot + linear).
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from aiohttp import web
+
+from ws_cache import WsTickerCache
+
+# Записанные сообщения (сокращённые поля) в порядке получения
+RECORDED = {
+    "spot": [
+        {"success": True, "ret_msg": "subscribe", "op": "subscribe"},
+        {"topic": "tickers.BTCUSDT", "ts": 1718000000000, "type": "snapshot",
+         "data": {"symbol": "BTCUSDT", "lastPrice": "67010.5", "volume24h": "8123.1"}},
+        {"topic": "orderbook.1.BTCUSDT", "ts": 1718000000010, "type": "snapshot",
+         "data": {"s": "BTCUSDT", "b": [["67010.1", "0.5"]], "a": [["67010.9", "0.7"]], "u": 1}},
+    ],
+    "linear": [
+        {"success": True, "ret_msg": "", "op": "subscribe"},
+        {"topic": "tickers.BTCUSDT", "ts": 1718000000000, "type": "snapshot",
+         "data": {"symbol": "BTCUSDT", "lastPrice": "67030.0", "bid1Price": "67029.9", "ask1Price": "67030.1",
+                  "fundingRate": "0.0001", "nextFundingTime": "1718006400000"}},
+        {"topic": "tickers.BTCUSDT", "ts": 1718000000100, "type": "delta",
+         "data": {"symbol": "BTCUSDT", "fundingRate": "0.00025"}},
+    ],
+}
+
+
+class StandIn:
+    """Локальный сервер: на subscribe проигрывает RECORDED[category]; умеет рвать соединения."""
+
+    def __init__(self):
+        self.connections = {"spot": 0, "linear": 0}
+        self.subscribed = {"spot": [], "linear": []}
+        self.sockets = []
+        self.loop = None
+        self.port = 0
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._main, daemon=True)
+
+    async def _handler(self, request):
+        cat = request.match_info["cat"]
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections[cat] += 1
+        self.sockets.append(ws)
+        async for msg in ws:
+            req = json.loads(msg.data)
+            if req.get("op") == "ping":
+                await ws.send_str(json.dumps({"op": "pong", "success": True}))
+            elif req.get("op") == "subscribe":
+                self.subscribed[cat].extend(req["args"])
+                for rec in RECORDED[cat]:
+                    await ws.send_str(json.dumps(rec))
+        return ws
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/{cat}", self._handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def _main(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._start())
+        self._ready.set()
+        self.loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def drop_all(self):
+        socks, self.sockets = self.sockets, []
+        for ws in socks:
+            asyncio.run_coroutine_threadsafe(ws.close(), self.loop).result(5)
+
+    def url(self, cat):
+        return f"ws://127.0.0.1:{self.port}/{cat}"
+
+
+def wait_until(cond, timeout=5.0):
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < timeout:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def make_cache(srv, **kw):
+    cache = WsTickerCache({"spot": srv.url("spot"), "linear": srv.url("linear")}, **kw)
+    cache.subscribe("spot", {"BTCUSDT": "BTC/USDT"})
+    cache.subscribe("linear", {"BTCUSDT": "BTC/USDT:USDT"})
+    return cache
+
+
+def test_replay_fills_cache():
+    srv = StandIn().start()
+    cache = make_cache(srv)
+    cache.start()
+    try:
+        assert wait_until(lambda: cache.ticker("BTC/USDT") and cache.ticker("BTC/USDT:USDT"))
+        assert sorted(srv.subscribed["spot"]) == ["orderbook.1.BTCUSDT", "tickers.BTCUSDT"]
+        spot = cache.ticker("BTC/USDT")
+        assert spot["last"] == 67010.5 and spot["bid"] == 67010.1 and spot["ask"] == 67010.9
+        # delta сливается со снимком: цена из snapshot, FR из delta
+        assert wait_until(lambda: cache.ticker("BTC/USDT:USDT")["info"]["fundingRate"] == "0.00025")
+        perp = cache.ticker("BTC/USDT:USDT")
+        assert perp["last"] == 67030.0 and perp["bid"] == 67029.9
+        assert perp["info"]["nextFundingTime"] == "1718006400000"
+        assert cache.ticker("ETH/USDT") is None
+    finally:
+        cache.stop()
+
+
+def test_reconnect_resubscribes_and_flags_stale():
+    srv = StandIn().start()
+    cache = make_cache(srv, reconnect_max_sec=0.2)
+    cache.start()
+    try:
+        assert wait_until(lambda: cache.ticker("BTC/USDT") is not None)
+        srv.drop_all()
+        assert wait_until(lambda: not cache.connected["spot"], 2.0)
+        assert cache.is_stale("BTC/USDT")
+        assert wait_until(lambda: srv.connections["spot"] >= 2 and cache.ticker("BTC/USDT") is not None)
+        assert cache.reconnects["spot"] >= 1
+        assert srv.subscribed["spot"].count("tickers.BTCUSDT") >= 2
+    finally:
+        cache.stop()
+
+
+def test_silent_stream_goes_stale():
+    srv = StandIn().start()
+    cache = make_cache(srv, max_age_sec=0.3, ping_interval_sec=5.0)
+    cache.start()
+    try:
+        assert wait_until(lambda: cache.ticker("BTC/USDT:USDT") is not None)
+        assert wait_until(lambda: cache.ticker("BTC/USDT:USDT") is None, 2.0)
+        assert cache.connected["linear"]
+    finally:
+        cache.stop()
+
+
+if __name__ == "__main__":
+    test_replay_fills_cache()
+    test_reconnect_resubscribes_and_flags_stale()
+    test_silent_stream_goes_stale()
+    print("✅ ws_cache OK")
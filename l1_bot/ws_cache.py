@@ -0,0 +1,222 @@
+"""
+Потоковый кэш рыночных данных Bybit (public WebSocket v5).
+
+Фоновый поток держит по одному соединению на category (spot / linear),
+подписывается на tickers.<id> (для спота ещё orderbook.1.<id> — в спотовом
+tickers нет bid/ask) и хранит последнее значение по каждому символу.
+Чтение из кэша не делает сетевых вызовов.
+
+Устаревание: символ считается несвежим, если его поток не подключён,
+после (пере)подключения по нему ещё не пришёл снимок, либо поток молчит
+дольше max_age_sec (пинги тоже считаются сообщениями). Сам Bybit пушит
+только изменения, поэтому тишина по символу при живом соединении — норма.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+BYBIT_WS_SPOT = "wss://stream.bybit.com/v5/public/spot"
+BYBIT_WS_LINEAR = "wss://stream.bybit.com/v5/public/linear"
+
+SUBSCRIBE_CHUNK = 10      # spot принимает не более 10 args в одном subscribe
+PING_INTERVAL_SEC = 20.0  # Bybit рвёт соединение без пинга примерно через 30 с
+
+
+def _f(x: Any) -> float:
+    try:
+        return float(x) if x not in (None, "") else 0.0
+    except Exception:
+        return 0.0
+
+
+class WsTickerCache:
+    """Последние тикеры по подписанным символам, обновляемые из WebSocket.
+
+    streams: category -> url, например {"spot": BYBIT_WS_SPOT, "linear": BYBIT_WS_LINEAR}.
+    """
+
+    def __init__(self, streams: Dict[str, str], max_age_sec: float = 30.0,
+                 ping_interval_sec: float = PING_INTERVAL_SEC, reconnect_max_sec: float = 30.0):
+        self.urls = dict(streams)
+        self.max_age_sec = max_age_sec
+        self.ping_interval_sec = ping_interval_sec
+        self.reconnect_max_sec = reconnect_max_sec
+        # category -> {market_id: unified symbol}
+        self._ids: Dict[str, Dict[str, str]] = {c: {} for c in self.urls}
+        self._cat: Dict[str, str] = {}                  # symbol -> category
+        self._raw: Dict[str, Dict[str, Any]] = {}       # symbol -> слитый ticker (сырые поля Bybit)
+        self._bbo: Dict[str, tuple] = {}                # symbol -> (bid, ask) из orderbook.1
+        self._ts: Dict[str, float] = {}                 # symbol -> monotonic последнего апдейта
+        self._seen: Dict[str, set] = {c: set() for c in self.urls}
+        self._last_msg: Dict[str, float] = {c: 0.0 for c in self.urls}
+        self.connected: Dict[str, bool] = {c: False for c in self.urls}
+        self.reconnects: Dict[str, int] = {c: 0 for c in self.urls}
+        self._lock = threading.Lock()
+        self._ws: Dict[str, Optional[aiohttp.ClientWebSocketResponse]] = {c: None for c in self.urls}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # ---------- управление ----------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._thread_main, name="ws-ticker-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping = True
+        loop = self._loop
+        if loop is not None:
+            for ws in list(self._ws.values()):
+                if ws is not None:
+                    asyncio.run_coroutine_threadsafe(ws.close(), loop)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def subscribe(self, category: str, ids: Dict[str, str]):
+        """Добавить символы {market_id: symbol}; на живом соединении подписка уходит сразу."""
+        with self._lock:
+            known = self._ids[category]
+            new = [mid for mid in ids if mid not in known]
+            known.update(ids)
+            self._cat.update({sym: category for sym in ids.values()})
+        ws, loop = self._ws.get(category), self._loop
+        if new and ws is not None and loop is not None:
+            asyncio.run_coroutine_threadsafe(self._send_subscribe(ws, category, new), loop)
+
+    # ---------- чтение ----------
+
+    def age(self, sym: str) -> float:
+        ts = self._ts.get(sym, 0.0)
+        return (time.monotonic() - ts) if ts > 0 else float("inf")
+
+    def is_stale(self, sym: str) -> bool:
+        cat = self._cat.get(sym)
+        if cat is None or not self.connected.get(cat):
+            return True
+        if sym not in self._seen[cat]:
+            return True
+        return (time.monotonic() - self._last_msg[cat]) > self.max_age_sec
+
+    def ticker(self, sym: str) -> Optional[Dict[str, Any]]:
+        """Тикер в форме ccxt (symbol/last/bid/ask/info); None если данных нет или они несвежие."""
+        if self.is_stale(sym):
+            return None
+        with self._lock:
+            raw = dict(self._raw.get(sym) or {})
+            bbo = self._bbo.get(sym)
+        bid = _f(raw.get("bid1Price"))
+        ask = _f(raw.get("ask1Price"))
+        if bbo is not None:
+            bid, ask = bbo
+        return {"symbol": sym, "last": _f(raw.get("lastPrice")) or None,
+                "bid": bid or None, "ask": ask or None, "info": raw}
+
+    # ---------- фоновый цикл ----------
+
+    def _thread_main(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            self._loop = None
+            loop.close()
+
+    async def _main(self):
+        await asyncio.gather(*(self._run(cat) for cat in self.urls))
+
+    def _topics(self, category: str, ids: List[str]) -> List[str]:
+        topics = [f"tickers.{mid}" for mid in ids]
+        if category == "spot":
+            topics += [f"orderbook.1.{mid}" for mid in ids]
+        return topics
+
+    async def _send_subscribe(self, ws, category: str, ids: List[str]):
+        topics = self._topics(category, ids)
+        for i in range(0, len(topics), SUBSCRIBE_CHUNK):
+            await ws.send_str(json.dumps({"op": "subscribe", "args": topics[i:i + SUBSCRIBE_CHUNK]}))
+
+    async def _run(self, category: str):
+        delay = 1.0
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                try:
+                    async with session.ws_connect(self.urls[category]) as ws:
+                        self._ws[category] = ws
+                        with self._lock:
+                            self._seen[category] = set()
+                            ids = list(self._ids[category])
+                        self._last_msg[category] = time.monotonic()
+                        self.connected[category] = True
+                        if ids:
+                            await self._send_subscribe(ws, category, ids)
+                        delay = 1.0
+                        await self._read(ws, category)
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    if not self._stopping:
+                        print(f"[ws_cache] {category} connection error: {e}")
+                finally:
+                    self._ws[category] = None
+                    self.connected[category] = False
+                if self._stopping:
+                    break
+                self.reconnects[category] += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2.0, self.reconnect_max_sec)
+
+    async def _read(self, ws, category: str):
+        while not self._stopping:
+            try:
+                msg = await ws.receive(timeout=self.ping_interval_sec)
+            except asyncio.TimeoutError:
+                if (time.monotonic() - self._last_msg[category]) > 2 * self.ping_interval_sec:
+                    raise
+                await ws.send_str(json.dumps({"op": "ping"}))
+                continue
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self._last_msg[category] = time.monotonic()
+                try:
+                    self._on_message(category, json.loads(msg.data))
+                except ValueError:
+                    pass
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                              aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                return
+
+    def _on_message(self, category: str, msg: Dict[str, Any]):
+        topic = msg.get("topic") or ""
+        data = msg.get("data")
+        if not topic or not isinstance(data, dict):
+            return  # ответы на subscribe/ping
+        kind, _, rest = topic.partition(".")
+        mid = rest.split(".", 1)[1] if kind == "orderbook" else rest
+        with self._lock:
+            sym = self._ids[category].get(mid)
+            if sym is None:
+                return
+            if kind == "tickers":
+                if msg.get("type") == "delta" and sym in self._raw:
+                    self._raw[sym].update(data)
+                else:
+                    self._raw[sym] = dict(data)
+            elif kind == "orderbook":
+                bids, asks = data.get("b") or [], data.get("a") or []
+                prev_bid, prev_ask = self._bbo.get(sym, (0.0, 0.0))
+                bid = _f(bids[0][0]) if bids else prev_bid
+                ask = _f(asks[0][0]) if asks else prev_ask
+                self._bbo[sym] = (bid, ask)
+            else:
+                return
+            self._ts[sym] = time.monotonic()
+            self._seen[category].add(sym)